@@ -20,11 +20,12 @@ from gofer.messaging.auth import ValidationFailed
 
 from pulp.common.bundle import Bundle
 from pulp.common.config import parse_bool
+from pulp.common.util import calculate_profile_hash
 from pulp.agent.lib.dispatcher import Dispatcher
 from pulp.agent.lib.conduit import Conduit as HandlerConduit
 from pulp.bindings.server import PulpConnection
 from pulp.bindings.bindings import Bindings
-from pulp.bindings.exceptions import NotFoundException
+from pulp.bindings.exceptions import BadRequestException, NotFoundException
 from pulp.client.consumer.config import read_config
 
 
@@ -477,6 +478,7 @@ class Profile(object):
         """
         Send the content profile(s) to the server.
         Delegated to the handlers.
+        Only the hash of a profile is sent when the server already has it.
         :return: A dispatch report.
         :rtype: DispatchReport
         """
@@ -495,7 +497,13 @@ class Profile(object):
                 continue
 
             details = profile_report['details']
-            http = bindings.profile.send(consumer_id, type_id, details)
+            profile_hash = calculate_profile_hash(details)
+            try:
+                # The full profile is only sent when the server does not already have it
+                http = bindings.profile.send_hash(consumer_id, type_id, profile_hash)
+            except (NotFoundException, BadRequestException):
+                # Servers that do not support reporting the hash reject it as a bad request
+                http = bindings.profile.send(consumer_id, type_id, details)
 
             msg = _('profile (%(t)s), reported: %(r)s')
             log.info(msg, {'t': type_id, 'r': http.response_code})
@@ -6,6 +6,7 @@ from M2Crypto import RSA, BIO
 from mock import patch, Mock
 
 from pulp.common.config import Config
+from pulp.common.util import calculate_profile_hash
 from pulp.devel.unit.util import SideEffect
 
 
@@ -873,4 +874,29 @@ class TestProfile(PluginTest):
 
         # validation
         mock_dispatcher().profile.assert_called_with(mock_conduit())
+        mock_bindings().profile.send_hash.assert_called_once_with(
+            TEST_CN, 'BB', calculate_profile_hash(5678))
+        self.assertFalse(mock_bindings().profile.send.called)
+
+    @patch('pulp.agent.gofer.pulpplugin.NotFoundException', NotFoundException)
+    @patch('pulp.agent.gofer.pulpplugin.ConsumerX509Bundle')
+    @patch('pulp.agent.gofer.pulpplugin.Conduit')
+    @patch('pulp.agent.gofer.pulpplugin.Dispatcher')
+    @patch('pulp.agent.gofer.pulpplugin.PulpBindings')
+    def test_send_not_recognized(self, mock_bindings, mock_dispatcher, mock_conduit,
+                                 mock_bundle):
+        mock_bundle().cn = Mock(return_value=TEST_CN)
+        mock_bindings().profile.send_hash.side_effect = NotFoundException
+
+        _report = Mock()
+        _report.details = {
+            'BB': {'succeeded': True, 'details': 5678}
+        }
+        mock_dispatcher().profile.return_value = _report
+
+        # test
+        profile = self.plugin.Profile()
+        profile.send()
+
+        # validation
         mock_bindings().profile.send.assert_called_once_with(TEST_CN, 'BB', 5678)
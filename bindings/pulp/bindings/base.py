@@ -1,3 +1,7 @@
+# The response header carrying the token that resumes a paged listing at the next page
+RESUME_TOKEN_HEADER = 'pulp-resume-token'
+
+
 class PulpAPI(object):
     """
     Base api class that allows an internal server object to be set at instantiation
@@ -8,3 +12,26 @@ class PulpAPI(object):
         @type:   pulp_connection: pulp.bindings.server.PulpConnection
         """
         self.server = pulp_connection
+
+    def _get_all_pages(self, get_page):
+        """
+        Fetch every page of a listing the server returns a page at a time. Each full page is
+        returned with a resume token, which is passed back to fetch the next page.
+
+        @param get_page: called with the resume token of the page to fetch, or None for the
+                         first page, and returns the L{Response} for it
+        @type  get_page: callable
+
+        @return: response for the first page with the results of all pages in its response_body
+        @rtype:  L{pulp.bindings.responses.Response}
+        """
+        response = get_page(None)
+        resume_token = response.headers.get(RESUME_TOKEN_HEADER)
+        while resume_token:
+            page = get_page(resume_token)
+            results = list(page.response_body)
+            if not results:
+                break
+            response.response_body.extend(results)
+            resume_token = page.headers.get(RESUME_TOKEN_HEADER)
+        return response
@@ -173,6 +173,28 @@ class ProfilesAPI(PulpAPI):
         data = {'content_type': content_type, 'profile': profile}
         return self.server.POST(path, data)
 
+    def send_hash(self, id, content_type, profile_hash):
+        """
+        Report only the hash of a profile, as calculated by
+        pulp.common.util.calculate_profile_hash(). The server does not change the
+        profile when it was last reported with the same hash.
+
+        :param id:           the consumer ID
+        :type  id:           str
+        :param content_type: the profile (content) type ID
+        :type  content_type: str
+        :param profile_hash: the hash of the profile
+        :type  profile_hash: str
+        :return:             server response
+        :rtype:              pulp.bindings.responses.Response
+
+        :raises NotFoundException: if the server does not recognize the hash and the full
+                                   profile needs to be sent
+        """
+        path = self.BASE_PATH % id
+        data = {'content_type': content_type, 'profile_hash': profile_hash}
+        return self.server.POST(path, data)
+
 
 class ConsumerHistoryAPI(PulpAPI):
     """
@@ -459,6 +459,8 @@ class RepositoryUnitAPI(PulpAPI):
         :param kwargs:  search options input by the user and passed in by okaara
         :type  kwargs:  dict
 
+        When no limit is given, every page of results the server returns is fetched.
+
         :return:    server response
         """
         criteria = self._generate_search_criteria(**kwargs)
@@ -480,8 +482,19 @@ class RepositoryUnitAPI(PulpAPI):
             criteria['skip'] = skip
 
         path = self.SEARCH_PATH % repo_id
-        data = {'criteria': criteria}
-        return self.server.POST(path, data)
+        if limit:
+            return self.server.POST(path, {'criteria': criteria})
+
+        def get_page(resume_token):
+            data = {'criteria': criteria}
+            if resume_token:
+                # the token resumes after the skipped units
+                page_criteria = dict(criteria)
+                page_criteria.pop('skip', None)
+                data = {'criteria': page_criteria, 'resume_token': resume_token}
+            return self.server.POST(path, data)
+
+        return self._get_all_pages(get_page)
 
     def copy(self, source_repo_id, destination_repo_id, override_config=None, **kwargs):
         """
@@ -19,10 +19,13 @@ COMPLETED_STATES = (STATE_FINISHED, STATE_ERROR, STATE_CANCELED, STATE_SKIPPED)
 class Response(object):
     """
     Contains the data received from the server on a successful request.
+
+    The headers are a dictionary of the response headers with lower case names.
     """
-    def __init__(self, response_code, response_body):
+    def __init__(self, response_code, response_body, headers=None):
         self.response_code = response_code
         self.response_body = response_body
+        self.headers = headers or {}
 
     def __str__(self):
         return _("Response: code [%(c)s] body [%(b)s]") % {'c': self.response_code,
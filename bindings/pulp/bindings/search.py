@@ -81,6 +81,9 @@ class SearchAPI(PulpAPI):
         Pass in name-based parameters only that match the values accepted by
         pulp.server.db.model.criteria.Criteria.__init__
 
+        When no limit is given, every page of results the server returns is
+        fetched.
+
         @return:    response body from the server
         """
         if not set(kwargs.keys()) <= self._ALL_ARGS:
@@ -92,8 +95,19 @@ class SearchAPI(PulpAPI):
         if filters:
             kwargs['filters'] = filters
         self._strip_criteria_kwargs(kwargs)
-        response = self.server.POST(self.PATH, {'criteria': kwargs})
-        return response.response_body
+        if kwargs.get('limit'):
+            return self.server.POST(self.PATH, {'criteria': kwargs}).response_body
+
+        def get_page(resume_token):
+            body = {'criteria': kwargs}
+            if resume_token:
+                # the token resumes after the skipped results
+                criteria = dict(kwargs)
+                criteria.pop('skip', None)
+                body = {'criteria': criteria, 'resume_token': resume_token}
+            return self.server.POST(self.PATH, body)
+
+        return self._get_all_pages(get_page).response_body
 
     def _strip_criteria_kwargs(self, kwargs):
         for field_name in kwargs.keys():
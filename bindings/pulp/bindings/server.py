@@ -1,8 +1,12 @@
 from types import NoneType
 import base64
+import errno
+import httplib
 import locale
 import logging
 import os
+import socket
+import threading
 import urllib
 try:
     import oauth2 as oauth
@@ -149,7 +153,10 @@ class PulpConnection(object):
             body = json.dumps(body)
         self.log.debug('sending %s request to %s' % (method, url))
 
-        response_code, response_body = self.server_wrapper.request(method, url, body)
+        result = self.server_wrapper.request(method, url, body)
+        response_code, response_body = result[:2]
+        # Wrappers that return only the status and body are still supported
+        response_headers = result[2] if len(result) > 2 else {}
 
         if self.api_responses_logger:
             if log_request_body:
@@ -172,7 +179,7 @@ class PulpConnection(object):
             else:
                 body = Task(response_body)
 
-        return Response(response_code, body)
+        return Response(response_code, body, response_headers)
 
     def _process_body(self, body):
         """
@@ -254,6 +261,10 @@ class HTTPSServerWrapper(object):
     This abstraction is used to simplify mocking. In this implementation, the
     intricacies (read: ugliness) of invoking and getting the response from
     the HTTPConnection class are hidden in favor of a simpler API to mock.
+
+    Connections are kept open and reused for subsequent requests made by the same thread, so that
+    a series of requests, such as the segments of an upload, doesn't pay for a new TLS handshake
+    each time. Connections are not shared between threads.
     """
 
     def __init__(self, pulp_connection):
@@ -262,12 +273,17 @@ class HTTPSServerWrapper(object):
         :type pulp_connection: PulpConnection
         """
         self.pulp_connection = pulp_connection
+        self._local = threading.local()
 
     def request(self, method, url, body):
         """
-        Make the request against the Pulp server, returning a tuple of (status_code, respose_body).
-        This method creates a new connection each time since HTTPSConnection has problems
-        reusing a connection for multiple calls (as claimed by a prior comment in this module).
+        Make the request against the Pulp server, returning a tuple of (status_code, respose_body,
+        headers).
+        The connection used by the previous request of the calling thread is reused when it is
+        still open and was made with the same settings. When the server has closed a reused
+        connection in the meantime, the request is retried once on a new connection. The request
+        is only retried when it could not be sent or when the server closed the connection
+        without responding, so that a request the server may have handled is not made twice.
 
         :param method: The HTTP method to be used for the request (GET, POST, etc.)
         :type  method: str
@@ -275,42 +291,20 @@ class HTTPSServerWrapper(object):
         :type  url:    str
         :param body:   The body to pass with the request
         :type  body:   str
-        :return:       A 2-tuple of the status_code and response_body. status_code is the HTTP
-                       status code (200, 404, etc.). If the server's response is valid json,
+        :return:       A 3-tuple of the status_code, response_body and headers. status_code is the
+                       HTTP status code (200, 404, etc.). If the server's response is valid json,
                        it will be parsed and response_body will be a dictionary. If not, it will be
-                       returned as a string.
+                       returned as a string. headers is a dictionary of the response headers
+                       with lower case names.
         :rtype:        tuple
         """
         headers = dict(self.pulp_connection.headers)  # copy so we don't affect the calling method
 
-        # Despite the confusing name, 'sslv23' configures m2crypto to use any available protocol in
-        # the underlying openssl implementation.
-        ssl_context = SSL.Context('sslv23')
-        # This restricts the protocols we are willing to do by configuring m2 not to do SSLv2.0 or
-        # SSLv3.0. EL 5 does not have support for TLS > v1.0, so we have to leave support for
-        # TLSv1.0 enabled.
-        ssl_context.set_options(m2.SSL_OP_NO_SSLv2 | m2.SSL_OP_NO_SSLv3)
-
-        if self.pulp_connection.verify_ssl:
-            ssl_context.set_verify(SSL.verify_peer, depth=100)
-            # We need to stat the ca_path to see if it exists (error if it doesn't), and if so
-            # whether it is a file or a directory. m2crypto has different directives depending on
-            # which type it is.
-            if os.path.isfile(self.pulp_connection.ca_path):
-                ssl_context.load_verify_locations(cafile=self.pulp_connection.ca_path)
-            elif os.path.isdir(self.pulp_connection.ca_path):
-                ssl_context.load_verify_locations(capath=self.pulp_connection.ca_path)
-            else:
-                # If it's not a file and it's not a directory, it's not a valid setting
-                raise exceptions.MissingCAPathException(self.pulp_connection.ca_path)
-        ssl_context.set_session_timeout(self.pulp_connection.timeout)
-
-        if self.pulp_connection.username and self.pulp_connection.password:
+        basic_auth = self.pulp_connection.username and self.pulp_connection.password
+        if basic_auth:
             raw = ':'.join((self.pulp_connection.username, self.pulp_connection.password))
             encoded = base64.b64encode(raw)
             headers['Authorization'] = 'Basic ' + encoded
-        elif self.pulp_connection.cert_filename:
-            ssl_context.load_cert(self.pulp_connection.cert_filename)
 
         # oauth configuration. This block is only True if oauth is not None, so it won't run on RHEL
         # 5.
@@ -331,14 +325,39 @@ class HTTPSServerWrapper(object):
             headers.update(oauth_header)
             headers['pulp-user'] = self.pulp_connection.oauth_user
 
-        connection = httpslib.HTTPSConnection(
-            self.pulp_connection.host, self.pulp_connection.port, ssl_context=ssl_context)
+        # The client certificate is only used when basic authentication isn't.
+        cert_filename = None if basic_auth else self.pulp_connection.cert_filename
+        settings = (self.pulp_connection.host, self.pulp_connection.port,
+                    self.pulp_connection.verify_ssl, self.pulp_connection.ca_path, cert_filename)
 
         try:
-            # Request against the server
-            connection.request(method, url, body=body, headers=headers)
-            response = connection.getresponse()
+            connection, reused = self._get_connection(settings)
+            try:
+                # Request against the server
+                connection.request(method, url, body=body, headers=headers)
+            except socket.timeout:
+                raise
+            except (httplib.HTTPException, socket.error):
+                if not reused:
+                    raise
+                response = None
+            else:
+                try:
+                    response = connection.getresponse()
+                except (httplib.BadStatusLine, socket.error), err:
+                    if not reused or not self._closed_without_response(err):
+                        raise
+                    response = None
+            if response is None:
+                # The server closed the idle connection, try again on a new one.
+                self._close_connection()
+                connection, reused = self._get_connection(settings)
+                connection.request(method, url, body=body, headers=headers)
+                response = connection.getresponse()
+            # Attempt to deserialize the body (should pass unless the server is busted)
+            response_body = response.read()
         except SSL.SSLError, err:
+            self._close_connection()
             # Translate stale login certificate to an auth exception
             if 'sslv3 alert certificate expired' == str(err):
                 raise exceptions.ClientCertificateExpiredException(
@@ -347,12 +366,89 @@ class HTTPSServerWrapper(object):
                 raise exceptions.CertificateVerificationException()
             else:
                 raise exceptions.ConnectionException(None, str(err), None)
+        except Exception:
+            self._close_connection()
+            raise
 
-        # Attempt to deserialize the body (should pass unless the server is busted)
-        response_body = response.read()
+        if response.will_close:
+            self._close_connection()
 
         try:
             response_body = json.loads(response_body)
         except Exception:
             pass
-        return response.status, response_body
+        return response.status, response_body, dict(response.getheaders())
+
+    @staticmethod
+    def _closed_without_response(err):
+        """
+        Get whether waiting for a response failed because the server closed the connection
+        without sending any part of a response, as it does when it closes an idle connection
+        just as a request is made on it.
+
+        :param err: The error raised while waiting for the response.
+        :type  err: httplib.BadStatusLine or socket.error
+        :return:    True if the server closed the connection without responding.
+        :rtype:     bool
+        """
+        if isinstance(err, httplib.BadStatusLine):
+            # The status line is empty, or replaced by a message in newer versions of httplib.
+            return not err.line.strip("'") or err.line.startswith('No status line received')
+        return getattr(err, 'errno', None) == errno.ECONNRESET
+
+    def _get_connection(self, settings):
+        """
+        Get the open connection of the calling thread, or open a new one when it has none or when
+        its connection was made with different settings.
+
+        :param settings: The settings the connection is made with: a tuple of the host, port,
+                         verify_ssl, ca_path and client certificate filename.
+        :type  settings: tuple
+        :return:         A 2-tuple of the connection and whether it was used before.
+        :rtype:          tuple
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.settings == settings:
+            return connection, True
+        self._close_connection()
+
+        host, port, verify_ssl, ca_path, cert_filename = settings
+
+        # Despite the confusing name, 'sslv23' configures m2crypto to use any available protocol in
+        # the underlying openssl implementation.
+        ssl_context = SSL.Context('sslv23')
+        # This restricts the protocols we are willing to do by configuring m2 not to do SSLv2.0 or
+        # SSLv3.0. EL 5 does not have support for TLS > v1.0, so we have to leave support for
+        # TLSv1.0 enabled.
+        ssl_context.set_options(m2.SSL_OP_NO_SSLv2 | m2.SSL_OP_NO_SSLv3)
+
+        if verify_ssl:
+            ssl_context.set_verify(SSL.verify_peer, depth=100)
+            # We need to stat the ca_path to see if it exists (error if it doesn't), and if so
+            # whether it is a file or a directory. m2crypto has different directives depending on
+            # which type it is.
+            if os.path.isfile(ca_path):
+                ssl_context.load_verify_locations(cafile=ca_path)
+            elif os.path.isdir(ca_path):
+                ssl_context.load_verify_locations(capath=ca_path)
+            else:
+                # If it's not a file and it's not a directory, it's not a valid setting
+                raise exceptions.MissingCAPathException(ca_path)
+        ssl_context.set_session_timeout(self.pulp_connection.timeout)
+
+        if cert_filename:
+            ssl_context.load_cert(cert_filename)
+
+        connection = httpslib.HTTPSConnection(host, port, ssl_context=ssl_context)
+        self._local.connection = connection
+        self._local.settings = settings
+        return connection, False
+
+    def _close_connection(self):
+        """
+        Close the open connection of the calling thread, if any.
+        """
+        connection = getattr(self._local, 'connection', None)
+        self._local.connection = None
+        if connection is not None:
+            connection.close()
@@ -49,7 +49,8 @@ class TasksAPI(PulpAPI):
         that contain all of the given tags are returned. All tasks will be
         represented by Task objects in a list in the response's response_body
         attribute. By default, completed tasks are excluded but they can be included by setting
-        include_completed to True.
+        include_completed to True. The server returns the tasks a page at a time and every page
+        is fetched.
 
         :param tags:              if specified, only tasks that contain all tags in the given
                                   list are returned; None to return all tasks
@@ -61,7 +62,11 @@ class TasksAPI(PulpAPI):
         path = '/v2/tasks/'
         tags = [('tag', t) for t in tags]
 
-        response = self.server.GET(path, queries=tags)
+        def get_page(resume_token):
+            queries = tags + [('resume_token', resume_token)] if resume_token else tags
+            return self.server.GET(path, queries=queries)
+
+        response = self._get_all_pages(get_page)
 
         tasks = []
         # sort based on id, which is chronological in mongo
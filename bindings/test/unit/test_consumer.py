@@ -2,7 +2,7 @@ import unittest
 
 import mock
 
-from pulp.bindings.consumer import ConsumerSearchAPI
+from pulp.bindings.consumer import ConsumerSearchAPI, ProfilesAPI
 
 
 class TestConsumerSearchAPI(unittest.TestCase):
@@ -10,3 +10,20 @@ class TestConsumerSearchAPI(unittest.TestCase):
         api = ConsumerSearchAPI(mock.MagicMock())
         self.assertTrue(api.PATH is not None)
         self.assertTrue(len(api.PATH) > 0)
+
+
+class TestProfilesAPI(unittest.TestCase):
+    def setUp(self):
+        self.api = ProfilesAPI(mock.MagicMock())
+
+    def test_send(self):
+        ret = self.api.send('c1', 'rpm', [{'name': 'zsh'}])
+        self.api.server.POST.assert_called_once_with(
+            '/v2/consumers/c1/profiles/', {'content_type': 'rpm', 'profile': [{'name': 'zsh'}]})
+        self.assertTrue(ret is self.api.server.POST.return_value)
+
+    def test_send_hash(self):
+        ret = self.api.send_hash('c1', 'rpm', 'abc')
+        self.api.server.POST.assert_called_once_with(
+            '/v2/consumers/c1/profiles/', {'content_type': 'rpm', 'profile_hash': 'abc'})
+        self.assertTrue(ret is self.api.server.POST.return_value)
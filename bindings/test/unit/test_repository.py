@@ -2,9 +2,11 @@ import unittest
 
 import mock
 
+from pulp.bindings.base import RESUME_TOKEN_HEADER
 from pulp.bindings.repository import (RepositoryActionsAPI, RepositorySearchAPI,
                                       RepositoryUnitAPI, RepositoryAPI,
                                       RepositoryDistributorAPI, RepositoryHistoryAPI)
+from pulp.bindings.responses import Response
 from pulp.bindings.server import PulpConnection
 from pulp.common import constants
 
@@ -19,6 +21,7 @@ class TestRepoSearchAPI(unittest.TestCase):
 class TestRepoUnitSearchAPI(unittest.TestCase):
     def setUp(self):
         self.api = RepositoryUnitAPI(mock.MagicMock())
+        self.api.server.POST.return_value.headers = {}
 
     @property
     def query(self):
@@ -45,6 +48,19 @@ class TestRepoUnitSearchAPI(unittest.TestCase):
         self.api.search('repo1', type_ids=['rpm'], skip=20)
         self.assertEqual(self.query['skip'], 20)
 
+    def test_pages(self):
+        self.api.server.POST.side_effect = [
+            Response(200, [{'unit_id': 'a'}], {RESUME_TOKEN_HEADER: 'token'}),
+            Response(200, [{'unit_id': 'b'}])]
+
+        response = self.api.search('repo1', type_ids=['rpm'], skip=20)
+
+        self.assertEqual(response.response_body, [{'unit_id': 'a'}, {'unit_id': 'b'}])
+        self.assertEqual(self.api.server.POST.call_count, 2)
+        self.assertEqual(self.api.server.POST.call_args[0][1]['resume_token'], 'token')
+        # the token resumes after the skipped units
+        self.assertTrue('skip' not in self.query)
+
     def test_unit_filters(self):
         self.api.search('repo1', type_ids=['rpm'], lte=[('count', 5)])
         self.assertEqual(self.query['filters'],
@@ -1,5 +1,7 @@
 import mock
 
+from pulp.bindings.base import RESUME_TOKEN_HEADER
+from pulp.bindings.responses import Response
 from pulp.bindings.search import SearchAPI, Operator, IntOperator, CSVOperator
 from pulp.common.compat import unittest
 
@@ -9,6 +11,7 @@ class TestSearchAPI(unittest.TestCase):
         super(TestSearchAPI, self).setUp()
         self.api = SearchAPI(mock.MagicMock())
         self.api.PATH = '/some/path'
+        self.api.server.POST.return_value.headers = {}
 
     def test_calls_post(self):
         self.api.search(limit=12)
@@ -24,6 +27,27 @@ class TestSearchAPI(unittest.TestCase):
     def test_invalid_kwargs(self):
         self.assertRaises(ValueError, self.api.search, foo=True)
 
+    def test_pages(self):
+        self.api.server.POST.side_effect = [
+            Response(200, [{'id': 'a'}], {RESUME_TOKEN_HEADER: 'token'}),
+            Response(200, [{'id': 'b'}])]
+
+        ret = self.api.search(skip=5)
+
+        self.assertEqual(ret, [{'id': 'a'}, {'id': 'b'}])
+        self.assertEqual(self.api.server.POST.call_args_list, [
+            mock.call('/some/path', {'criteria': {'skip': 5}}),
+            mock.call('/some/path', {'criteria': {}, 'resume_token': 'token'})])
+
+    def test_limit_single_page(self):
+        self.api.server.POST.return_value = Response(
+            200, [{'id': 'a'}], {RESUME_TOKEN_HEADER: 'token'})
+
+        ret = self.api.search(limit=1)
+
+        self.assertEqual(ret, [{'id': 'a'}])
+        self.assertEqual(self.api.server.POST.call_count, 1)
+
     @mock.patch('pulp.bindings.search.SearchAPI.compose_filters')
     def test_calls_compose(self, mock_compose):
         self.api.search(limit=20)
@@ -1,8 +1,12 @@
 """
 This module contains tests for the pulp.bindings.server module.
 """
+import errno
+import httplib
 import locale
 import logging
+import socket
+import threading
 import unittest
 
 from M2Crypto import m2, SSL
@@ -44,7 +48,7 @@ class TestHTTPSServerWrapper(unittest.TestCase):
         conn = server.PulpConnection('host', verify_ssl=False)
         wrapper = server.HTTPSServerWrapper(conn)
 
-        status, body = wrapper.request('GET', '/awesome/api/', '')
+        status, body, headers = wrapper.request('GET', '/awesome/api/', '')
 
         ssl_context = Context.mock_calls[0][1][0]
         # Don't let the name of this argument scare you. Despite it's misleading name, this means
@@ -75,13 +79,18 @@ class TestHTTPSServerWrapper(unittest.TestCase):
             def read(self):
                 return '{}'
 
+            def getheaders(self):
+                return [('content-type', 'application/json')]
+
             status = 200
+            will_close = False
 
         getresponse.return_value = FakeResponse()
 
-        status, body = wrapper.request('GET', '/awesome/api/', '')
+        status, body, headers = wrapper.request('GET', '/awesome/api/', '')
 
         self.assertEqual(status, 200)
+        self.assertEqual(headers, {'content-type': 'application/json'})
         self.assertEqual(body, {})
         # These should not have been called
         self.assertEqual(set_verify.call_count, 0)
@@ -127,13 +136,18 @@ class TestHTTPSServerWrapper(unittest.TestCase):
             def read(self):
                 return '{}'
 
+            def getheaders(self):
+                return [('content-type', 'application/json')]
+
             status = 200
+            will_close = False
 
         getresponse.return_value = FakeResponse()
 
-        status, body = wrapper.request('GET', '/awesome/api/', '')
+        status, body, headers = wrapper.request('GET', '/awesome/api/', '')
 
         self.assertEqual(status, 200)
+        self.assertEqual(headers, {'content-type': 'application/json'})
         self.assertEqual(body, {})
         # Make sure the SSL settings are correct
         set_verify.assert_called_once_with(SSL.verify_peer, depth=100)
@@ -160,19 +174,155 @@ class TestHTTPSServerWrapper(unittest.TestCase):
             def read(self):
                 return '{"it": "worked!"}'
 
+            def getheaders(self):
+                return [('content-type', 'application/json')]
+
             status = 200
+            will_close = False
 
         getresponse.return_value = FakeResponse()
 
-        status, body = wrapper.request('GET', '/awesome/api/', '')
+        status, body, headers = wrapper.request('GET', '/awesome/api/', '')
 
         self.assertEqual(status, 200)
+        self.assertEqual(headers, {'content-type': 'application/json'})
         self.assertEqual(body, {'it': 'worked!'})
         # Make sure the SSL settings are correct
         set_verify.assert_called_once_with(SSL.verify_peer, depth=100)
         load_verify_locations.assert_called_once_with(cafile=ca_path)
 
 
+@mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+class TestHTTPSServerWrapperConnections(unittest.TestCase):
+    """
+    Test the reuse of connections by the HTTPSServerWrapper class.
+    """
+    def setUp(self):
+        self.conn = server.PulpConnection('host', verify_ssl=False)
+        self.wrapper = server.HTTPSServerWrapper(self.conn)
+
+    @staticmethod
+    def _response(will_close=False):
+        response = mock.Mock(status=200, will_close=will_close)
+        response.read.return_value = '{}'
+        response.getheaders.return_value = []
+        return response
+
+    def test_reused(self, https_connection):
+        https_connection.return_value.getresponse.side_effect = lambda: self._response()
+
+        self.wrapper.request('GET', '/a/', '')
+        self.wrapper.request('PUT', '/b/', 'body')
+
+        self.assertEqual(https_connection.call_count, 1)
+        self.assertEqual(https_connection.return_value.request.call_count, 2)
+
+    def test_not_shared_between_threads(self, https_connection):
+        https_connection.return_value.getresponse.side_effect = lambda: self._response()
+
+        self.wrapper.request('GET', '/a/', '')
+        thread = threading.Thread(target=self.wrapper.request, args=('GET', '/b/', ''))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(https_connection.call_count, 2)
+
+    def test_settings_changed(self, https_connection):
+        https_connection.return_value.getresponse.side_effect = lambda: self._response()
+
+        self.wrapper.request('GET', '/a/', '')
+        self.conn.host = 'other-host'
+        self.wrapper.request('GET', '/a/', '')
+
+        self.assertEqual(https_connection.call_count, 2)
+        self.assertEqual(https_connection.call_args[0][:2], ('other-host', 443))
+        https_connection.return_value.close.assert_called_once_with()
+
+    def test_server_closes(self, https_connection):
+        https_connection.return_value.getresponse.side_effect = \
+            lambda: self._response(will_close=True)
+
+        self.wrapper.request('GET', '/a/', '')
+        self.wrapper.request('GET', '/a/', '')
+
+        self.assertEqual(https_connection.call_count, 2)
+        self.assertEqual(https_connection.return_value.close.call_count, 2)
+
+    def test_retry_closed_connection(self, https_connection):
+        stale = mock.Mock()
+        stale.getresponse.side_effect = [self._response(), httplib.BadStatusLine('')]
+        fresh = mock.Mock()
+        fresh.getresponse.return_value = self._response()
+        https_connection.side_effect = [stale, fresh]
+
+        self.wrapper.request('GET', '/a/', '')
+        status, body, headers = self.wrapper.request('PUT', '/b/', 'body')
+
+        self.assertEqual(status, 200)
+        stale.close.assert_called_once_with()
+        fresh.request.assert_called_once_with('PUT', '/b/', body='body', headers=mock.ANY)
+
+    def test_retry_connection_reset(self, https_connection):
+        stale = mock.Mock()
+        stale.getresponse.side_effect = [
+            self._response(), socket.error(errno.ECONNRESET, 'Connection reset by peer')]
+        fresh = mock.Mock()
+        fresh.getresponse.return_value = self._response()
+        https_connection.side_effect = [stale, fresh]
+
+        self.wrapper.request('GET', '/a/', '')
+        status, body, headers = self.wrapper.request('POST', '/b/', 'body')
+
+        self.assertEqual(status, 200)
+        fresh.request.assert_called_once_with('POST', '/b/', body='body', headers=mock.ANY)
+
+    def test_retry_send_failed(self, https_connection):
+        stale = mock.Mock()
+        stale.getresponse.return_value = self._response()
+        stale.request.side_effect = [None, socket.error(errno.EPIPE, 'Broken pipe')]
+        fresh = mock.Mock()
+        fresh.getresponse.return_value = self._response()
+        https_connection.side_effect = [stale, fresh]
+
+        self.wrapper.request('GET', '/a/', '')
+        status, body, headers = self.wrapper.request('POST', '/b/', 'body')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(stale.getresponse.call_count, 1)
+        fresh.request.assert_called_once_with('POST', '/b/', body='body', headers=mock.ANY)
+
+    def test_no_retry_timeout(self, https_connection):
+        stale = mock.Mock()
+        stale.getresponse.side_effect = [self._response(), socket.timeout('timed out')]
+        https_connection.side_effect = [stale, mock.Mock()]
+
+        self.wrapper.request('GET', '/a/', '')
+        self.assertRaises(socket.timeout, self.wrapper.request, 'POST', '/b/', 'body')
+
+        # the request was sent once, it may be handled by the server
+        self.assertEqual(https_connection.call_count, 1)
+        self.assertEqual(stale.request.call_count, 2)
+        stale.close.assert_called_once_with()
+
+    def test_no_retry_partial_response(self, https_connection):
+        stale = mock.Mock()
+        stale.getresponse.side_effect = [self._response(), httplib.BadStatusLine('HTTP/1.1 2')]
+        https_connection.side_effect = [stale, mock.Mock()]
+
+        self.wrapper.request('GET', '/a/', '')
+        self.assertRaises(httplib.BadStatusLine, self.wrapper.request, 'POST', '/b/', 'body')
+
+        self.assertEqual(https_connection.call_count, 1)
+
+    def test_no_retry_new_connection(self, https_connection):
+        https_connection.return_value.request.side_effect = socket.error('refused')
+
+        self.assertRaises(socket.error, self.wrapper.request, 'GET', '/a/', '')
+
+        self.assertEqual(https_connection.call_count, 1)
+        https_connection.return_value.close.assert_called_once_with()
+
+
 class TestPulpConnection(unittest.TestCase):
     """
     This class contains tests for the PulpConnection object.
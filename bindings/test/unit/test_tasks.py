@@ -6,7 +6,7 @@ import unittest
 
 import mock
 
-from pulp.bindings import responses, tasks
+from pulp.bindings import base, responses, tasks
 from pulp.common import tags
 
 
@@ -58,6 +58,7 @@ class TestGetAllTasks(unittest.TestCase):
         self.api = tasks.TasksAPI(self.server)
 
         self.server.GET.return_value.response_body = copy.deepcopy(TASKS)
+        self.server.GET.return_value.headers = {}
 
     def test_sorting(self):
         ret = self.api.get_all_tasks().response_body
@@ -75,6 +76,19 @@ class TestGetAllTasks(unittest.TestCase):
         for task in ret:
             self.assertTrue(isinstance(task, responses.Task))
 
+    def test_pages(self):
+        tasks_ = copy.deepcopy(TASKS)
+        self.server.GET.side_effect = [
+            responses.Response(200, tasks_[:2], {base.RESUME_TOKEN_HEADER: 'token'}),
+            responses.Response(200, tasks_[2:])]
+
+        ret = self.api.get_all_tasks(tags=['a']).response_body
+
+        self.assertEqual(len(ret), 3)
+        self.assertEqual(self.server.GET.call_args_list, [
+            mock.call('/v2/tasks/', queries=[('tag', 'a')]),
+            mock.call('/v2/tasks/', queries=[('tag', 'a'), ('resume_token', 'token')])])
+
 
 class TestPurgeTasks(unittest.TestCase):
     def setUp(self):
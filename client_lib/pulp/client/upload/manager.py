@@ -9,11 +9,18 @@ import copy
 import errno
 import os
 import pickle
+import Queue
+import sys
+import threading
+import time
 
 from pulp.common.lock import LockFile
 
 
 DEFAULT_CHUNKSIZE = 1048576  # 1 MB per upload call
+DEFAULT_CONCURRENCY = 4  # number of upload calls in flight at once
+DEFAULT_CHECKPOINT_SEGMENTS = 16  # uploaded segments between tracker file saves
+DEFAULT_CHECKPOINT_INTERVAL = 5  # seconds between tracker file saves
 
 
 class ManagerUninitializedException(Exception):
@@ -71,7 +78,9 @@ class UploadManager(object):
     on disk state files.
     """
 
-    def __init__(self, upload_working_dir, bindings, chunk_size=DEFAULT_CHUNKSIZE):
+    def __init__(self, upload_working_dir, bindings, chunk_size=DEFAULT_CHUNKSIZE,
+                 concurrency=DEFAULT_CONCURRENCY, checkpoint_segments=DEFAULT_CHECKPOINT_SEGMENTS,
+                 checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL):
         """
         @param upload_working_dir: directory in which to store client-side files
                to track upload requests; if it doesn't exist it will be created
@@ -84,10 +93,23 @@ class UploadManager(object):
         @param chunk_size: size in bytes of data to upload on each call to the
                server
         @type  chunk_size: int
+
+        @param concurrency: number of upload calls to the server in flight at once
+        @type  concurrency: int
+
+        @param checkpoint_segments: number of uploaded segments after which the
+               tracker file is saved
+        @type  checkpoint_segments: int
+
+        @param checkpoint_interval: seconds after which the tracker file is saved
+        @type  checkpoint_interval: int
         """
         self.upload_working_dir = upload_working_dir
         self.bindings = bindings
         self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.checkpoint_segments = checkpoint_segments
+        self.checkpoint_interval = checkpoint_interval
 
         # Internal state
         self.tracker_files = {}
@@ -111,7 +133,9 @@ class UploadManager(object):
         upload_working_dir = os.path.join(context.config['filesystem']['upload_working_dir'],
                                           'default')
         upload_working_dir = os.path.expanduser(upload_working_dir)
-        return cls(upload_working_dir, context.server)
+        concurrency = int(context.config.get('server', {}).get('upload_concurrency',
+                                                               DEFAULT_CONCURRENCY))
+        return cls(upload_working_dir, context.server, concurrency=concurrency)
 
     def initialize(self):
         """
@@ -187,10 +211,18 @@ class UploadManager(object):
         client-side on disk tracker files will store the current offset and
         resume the upload from where it left off on the next call to this method.
 
+        Up to concurrency segments are uploaded at once while the following
+        segments are read from the file, so segments may complete out of order.
+        The tracker file records the offset up to which every segment has been
+        uploaded and the segments completed past it, and is saved every
+        checkpoint_segments segments or checkpoint_interval seconds and when
+        the upload ends. A resumed upload only uploads the segments that were
+        not recorded as completed.
+
         The callback_func is used to get feedback on the upload process. After
         each successful upload segment call to the server, this function
-        will be invoked with the new offset in the file and the file size
-        (intended to be fed into a progress indicator). As this is called
+        will be invoked with the number of bytes uploaded so far and the file
+        size (intended to be fed into a progress indicator). As this is called
         after each upload segment call, the granularity at which it is called
         depends on the chunk_size value for this instance.
 
@@ -233,24 +265,11 @@ class UploadManager(object):
             tracker_file.is_running = True
             tracker_file.save()
 
-            source_file_size = os.path.getsize(tracker_file.source_filename)
-
             f = open(tracker_file.source_filename, 'r')
-            while True:
-                # Load the chunk to upload
-                f.seek(tracker_file.offset)
-                data = f.read(self.chunk_size)
-                if not data:
-                    break
-
-                # Server request
-                self.bindings.uploads.upload_segment(upload_id, tracker_file.offset, data)
-
-                # Status update and callback notification
-                tracker_file.offset = min(tracker_file.offset + self.chunk_size, source_file_size)
-                tracker_file.save()
-
-                callback_func(tracker_file.offset, source_file_size)
+            try:
+                self._upload_segments(tracker_file, f, callback_func)
+            finally:
+                f.close()
 
             tracker_file.is_finished_uploading = True
         finally:
@@ -259,6 +278,150 @@ class UploadManager(object):
             tracker_file.is_running = False
             tracker_file.save()
 
+    def _upload_segments(self, tracker_file, source_file, callback_func):
+        """
+        Uploads the segments of the source file that have not been uploaded yet
+        using a pool of threads, while the main thread reads the segments and
+        tracks their completion. At most twice as many segments as there are
+        threads are read ahead of their upload.
+
+        @param tracker_file: tracker of the upload
+        @type  tracker_file: UploadTracker
+
+        @param source_file: open file being uploaded
+        @type  source_file: file
+
+        @param callback_func: optional method to be called after each upload
+               call to the server
+        @type  callback_func: func
+        """
+        source_file_size = os.fstat(source_file.fileno()).st_size
+        # Segments completed past the offset, keyed by their offset. Trackers saved
+        # by older versions don't have them.
+        completed = dict(getattr(tracker_file, 'completed_segments', None) or {})
+        segments = self._missing_segments(tracker_file.offset, completed, source_file_size)
+
+        requests = Queue.Queue()
+        results = Queue.Queue()
+        for i in range(self.concurrency):
+            worker = threading.Thread(target=self._upload_worker,
+                                      args=(tracker_file.upload_id, requests, results))
+            worker.daemon = True
+            worker.start()
+
+        in_flight = 0
+        error = None
+        unsaved = 0
+        last_saved = time.time()
+        try:
+            while True:
+                # Keep the threads supplied with segments
+                while error is None and in_flight < self.concurrency * 2:
+                    segment = next(segments, None)
+                    if segment is None:
+                        break
+                    offset, length = segment
+                    source_file.seek(offset)
+                    requests.put((offset, source_file.read(length)))
+                    in_flight += 1
+
+                if not in_flight:
+                    break
+
+                offset, length, exc_info = self._next_result(results)
+                in_flight -= 1
+                if exc_info is not None:
+                    # Stop reading segments and wait for the ones in flight.
+                    error = error or exc_info
+                    continue
+
+                # Advance the offset over the contiguous run of completed segments
+                completed[offset] = length
+                while tracker_file.offset in completed:
+                    tracker_file.offset += completed.pop(tracker_file.offset)
+                tracker_file.completed_segments = completed
+
+                unsaved += 1
+                if unsaved >= self.checkpoint_segments or \
+                        time.time() - last_saved >= self.checkpoint_interval:
+                    tracker_file.save()
+                    unsaved = 0
+                    last_saved = time.time()
+
+                if callback_func:
+                    uploaded = tracker_file.offset + sum(completed.values())
+                    callback_func(uploaded, source_file_size)
+        finally:
+            # Stop the threads
+            for i in range(self.concurrency):
+                requests.put(None)
+
+        if error is not None:
+            raise error[0], error[1], error[2]
+
+    def _missing_segments(self, offset, completed, size):
+        """
+        Generates the segments that still need to be uploaded, skipping the ones
+        recorded as completed. Segments are never larger than chunk_size and
+        never overlap with a completed segment, which matters when the upload
+        is resumed with a different chunk size.
+
+        @param offset: offset up to which every segment has been uploaded
+        @type  offset: int
+
+        @param completed: lengths of the segments completed past the offset,
+               keyed by their offset
+        @type  completed: dict
+
+        @param size: size of the file being uploaded
+        @type  size: int
+
+        @return: generator of (offset, length) tuples
+        @rtype:  generator
+        """
+        completed_offsets = sorted(completed)
+        while offset < size:
+            if offset in completed:
+                offset += completed[offset]
+                continue
+            end = min(offset + self.chunk_size, size)
+            for completed_offset in completed_offsets:
+                if offset < completed_offset < end:
+                    end = completed_offset
+                    break
+            yield offset, end - offset
+            offset = end
+
+    def _upload_worker(self, upload_id, requests, results):
+        """
+        Uploads the segments put on the requests queue until None is put on it,
+        putting the offset, length and the exc_info of the failure (None when
+        the upload succeeded) of each one on the results queue.
+        """
+        while True:
+            request = requests.get()
+            if request is None:
+                return
+            offset, data = request
+            try:
+                self.bindings.uploads.upload_segment(upload_id, offset, data)
+            except Exception:
+                results.put((offset, len(data), sys.exc_info()))
+            else:
+                results.put((offset, len(data), None))
+
+    @staticmethod
+    def _next_result(results):
+        """
+        Waits for the next uploaded segment. A timeout is used so that the wait
+        can be interrupted with a KeyboardInterrupt.
+        """
+        while True:
+            try:
+                return results.get(True, 1)
+            except Queue.Empty:
+                pass
+
     def import_upload(self, upload_id):
         """
         Once the file is finished uploading, this call will request the server
@@ -397,7 +560,8 @@ class UploadTracker(object):
         # Upload call information
         self.upload_id = None
         self.location = None  # URL to the upload request on the server
-        self.offset = None  # start of next chunk to upload
+        self.offset = None  # offset up to which every chunk has been uploaded
+        self.completed_segments = {}  # lengths of chunks uploaded past offset, keyed by offset
         self.source_filename = None  # path on disk to the file to upload
 
         # Import call information
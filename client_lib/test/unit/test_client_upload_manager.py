@@ -54,6 +54,16 @@ class UploadManagerTests(unittest.TestCase):
 
         self.assertTrue(isinstance(manager, upload_util.UploadManager))
         self.assertEqual(manager.upload_working_dir, '/a/b/c/default')
+        self.assertEqual(manager.concurrency, upload_util.DEFAULT_CONCURRENCY)
+
+    def test_init_with_defaults_concurrency(self):
+        context = mock.MagicMock()
+        context.config = {'filesystem': {'upload_working_dir': '/a/b/c'},
+                          'server': {'upload_concurrency': '8'}}
+
+        manager = upload_util.UploadManager.init_with_defaults(context)
+
+        self.assertEqual(manager.concurrency, 8)
 
     def test_initialize_no_trackers(self):
         os.makedirs(self.upload_working_dir)
@@ -236,6 +246,8 @@ class UploadManagerTests(unittest.TestCase):
     def test_upload_multiple_passes(self):
         # Setup
         self.upload_manager.chunk_size = 100
+        # a single thread uploads the segments in order
+        self.upload_manager.concurrency = 1
         self.upload_manager.initialize()
         upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
                                                           {'k': 'v'}, 'm-1')
@@ -289,6 +301,104 @@ class UploadManagerTests(unittest.TestCase):
         tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
         self.assertEqual(rpm_size, tracker.offset)
 
+    def test_upload_parallel(self):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.concurrency = 4
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+
+        mock_callback = mock.Mock()
+
+        # Test
+        self.upload_manager.upload(upload_id, mock_callback.update_status)
+
+        # Verify every segment was uploaded once
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        f = open(TEST_RPM_FILENAME, 'r')
+        expected = [(upload_id, offset, f.read(100)) for offset in range(0, rpm_size, 100)]
+        f.close()
+        uploaded = sorted(c[0] for c in self.mock_upload_bindings.upload_segment.call_args_list)
+        self.assertEqual(uploaded, expected)
+
+        # The progress only increases
+        progress = [c[0][0] for c in mock_callback.update_status.call_args_list]
+        self.assertEqual(progress, sorted(progress))
+        self.assertEqual(progress[-1], rpm_size)
+
+        tracker = upload_util.UploadTracker.load(self.upload_manager._tracker_filename(upload_id))
+        self.assertEqual(rpm_size, tracker.offset)
+        self.assertEqual({}, tracker.completed_segments)
+        self.assertEqual(True, tracker.is_finished_uploading)
+
+    @mock.patch('pulp.client.upload.manager.UploadTracker.save', autospec=True)
+    def test_upload_checkpoints(self, mock_save):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.checkpoint_segments = 5
+        self.upload_manager.checkpoint_interval = 3600
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+        mock_save.reset_mock()
+
+        # Test
+        self.upload_manager.upload(upload_id, mock.Mock())
+
+        # Verify: saved when started, every 5 segments and when finished
+        num_segments = int(math.ceil(os.path.getsize(TEST_RPM_FILENAME) / 100.0))
+        self.assertEqual(mock_save.call_count, 2 + num_segments // 5)
+
+    def test_upload_resume_out_of_order(self):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.concurrency = 2
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+        uploaded = []
+
+        def upload_segment(upload_id, offset, data):
+            if offset == 200 and 200 not in failed:
+                failed.append(offset)
+                raise NotFoundException({})
+            uploaded.append(offset)
+        failed = []
+        self.mock_upload_bindings.upload_segment.side_effect = upload_segment
+
+        # Test
+        self.assertRaises(NotFoundException, self.upload_manager.upload, upload_id, mock.Mock())
+
+        # Verify the offset stops at the failed segment and later segments are recorded
+        tracker = upload_util.UploadTracker.load(self.upload_manager._tracker_filename(upload_id))
+        self.assertEqual(200, tracker.offset)
+        self.assertFalse(tracker.is_running)
+        self.assertFalse(tracker.is_finished_uploading)
+        self.assertEqual(sorted(tracker.completed_segments), [o for o in uploaded if o > 200])
+
+        # Resume with a tracker loaded from disk
+        self.upload_manager.tracker_files = {}
+        self.upload_manager.list_uploads()
+        self.upload_manager.upload(upload_id, mock.Mock())
+
+        # Every segment was uploaded exactly once
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        self.assertEqual(sorted(uploaded), range(0, rpm_size, 100))
+        tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+        self.assertEqual(rpm_size, tracker.offset)
+        self.assertEqual({}, tracker.completed_segments)
+        self.assertTrue(tracker.is_finished_uploading)
+
+    def test_missing_segments(self):
+        self.upload_manager.chunk_size = 100
+        # segments completed with a smaller chunk size
+        completed = {250: 50, 400: 50}
+
+        segments = list(self.upload_manager._missing_segments(200, completed, 520))
+
+        self.assertEqual(segments, [(200, 50), (300, 100), (450, 70)])
+
     def test_upload_concurrent_upload(self):
         # Setup
         self.upload_manager.initialize()
@@ -1,3 +1,8 @@
+from hashlib import sha256
+
+from pulp.common.compat import json
+
+
 def encode_unicode(path):
     """
     Check if given path is a unicode and if yes, return utf-8 encoded path
@@ -39,3 +44,17 @@ def partial(func, *args, **kwds):
     Python 2.4 doesn't provide functools so provide our own version of the partial method
     """
     return lambda *fargs, **fkwds: func(*(args + fargs), **dict(kwds, **fkwds))
+
+
+def calculate_profile_hash(profile):
+    """
+    Return a hash of a unit profile. The profile is serialized without whitespace and with
+    sorted dictionary keys so that equal profiles have the same hash.
+
+    :param profile: The profile structure you wish to hash
+    :type  profile: object
+    :return:        Hash of profile
+    :rtype:         basestring
+    """
+    serialized_profile = json.dumps(profile, separators=(',', ':'), sort_keys=True)
+    return sha256(serialized_profile).hexdigest()
@@ -13,19 +13,28 @@ The OID structure follows the Red Hat model. Download URLs are found at:
 The * represents the product ID and is not used as part of this calculation.
 '''
 
+import hashlib
 import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from gettext import gettext as _
+from threading import Lock
 from ConfigParser import NoOptionError, SafeConfigParser, NoSectionError
 
+from M2Crypto import X509
 from rhsm import certificate
 
-from pulp.repoauth.protected_repo_utils import ProtectedRepoUtils
+from pulp.repoauth.protected_repo_utils import ProtectedRepoListings, ProtectedRepoUtils
 from pulp.repoauth.repo_cert_utils import RepoCertUtils
 
 # This needs to be accessible on both Pulp and the CDS instances, so a
 # separate config file for repo auth purposes is used.
 CONFIG_FILENAME = '/etc/pulp/repo_auth.conf'
 
+# Defaults for the verified certificate cache; see repo_auth.conf.
+DEFAULT_CERT_CACHE_TTL = 300
+DEFAULT_CERT_CACHE_MAX_SIZE = 1000
+
 
 def authenticate(environ, config=None):
     '''
@@ -67,12 +76,100 @@ def _config():
     return config
 
 
+def _fingerprint(pem):
+    '''
+    Fingerprint of a PEM encoded certificate (or chain) used in cache keys.
+    '''
+    return hashlib.sha256(pem).hexdigest()
+
+
+def _not_after(cert_pem):
+    '''
+    The (UTC naive) notAfter date of a PEM encoded certificate; None if it cannot be read.
+    '''
+    try:
+        cert = X509.load_cert_string(cert_pem)
+        return cert.get_not_after().get_datetime().replace(tzinfo=None)
+    except Exception:
+        return None
+
+
+class CertificateCache(object):
+    """
+    Per-process cache of results derived from client certificates. A single
+    yum transaction makes hundreds of requests with the same certificate, so
+    the signature verification results and parsed entitlement certificates
+    are kept here rather than recomputed for every request.
+
+    The least recently used entries are discarded when the cache is full.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """
+        Get a cached value.
+
+        :param key: the cache key
+        :type  key: tuple
+        :return: the cached value
+        :raise KeyError: when not cached or expired
+        """
+        now = datetime.utcnow()
+        with self._lock:
+            expires, value = self._entries.pop(key)
+            if now >= expires:
+                raise KeyError(key)
+            self._entries[key] = (expires, value)
+            return value
+
+    def add(self, key, value, expires, max_size):
+        """
+        Add a value to the cache.
+
+        :param key: the cache key
+        :type  key: tuple
+        :param value: the value to cache
+        :param expires: the UTC (naive) time at which the value expires
+        :type  expires: datetime.datetime
+        :param max_size: the maximum number of cached values
+        :type  max_size: int
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, value)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Discard all cached values.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+CERT_CACHE = CertificateCache()
+
+
 class OidValidator:
     def __init__(self, config):
         self.config = config
         self.repo_cert_utils = RepoCertUtils(config)
         self.protected_repo_utils = ProtectedRepoUtils(config)
         self.repo_url_prefixes = self._get_repo_url_prefixes_from_config(config)
+        self.cert_cache_ttl = DEFAULT_CERT_CACHE_TTL
+        self.cert_cache_max_size = DEFAULT_CERT_CACHE_MAX_SIZE
+        try:
+            self.cert_cache_ttl = config.getint('main', 'cert_cache_ttl')
+        except Exception:
+            pass
+        try:
+            self.cert_cache_max_size = config.getint('main', 'cert_cache_max_size')
+        except Exception:
+            pass
 
     def is_valid(self, dest, cert_pem, log_func):
         '''
@@ -112,8 +209,7 @@ class OidValidator:
                     return False
 
                 # Make sure the client cert is signed by the correct CA
-                is_valid = self.repo_cert_utils.validate_certificate_pem(
-                    cert_pem, repo_bundle['ca'], log_func=log_func)
+                is_valid = self._validate_certificate(cert_pem, repo_bundle['ca'], log_func)
                 if not is_valid:
                     log_func('Client certificate did not match the repo consumer CA certificate')
                     return False
@@ -129,8 +225,7 @@ class OidValidator:
                     return False
 
                 # Make sure the client cert is signed by the correct CA
-                is_valid = self.repo_cert_utils.validate_certificate_pem(
-                    cert_pem, global_bundle['ca'], log_func=log_func)
+                is_valid = self._validate_certificate(cert_pem, global_bundle['ca'], log_func)
                 if not is_valid:
                     log_func('Client certificate did not match the global repo auth CA certificate')
                     return False
@@ -143,10 +238,74 @@ class OidValidator:
             log_func("OID validation successful for request")
         return is_valid
 
+    def _cache_result(self, key, value, cert_pem):
+        """
+        Cache a result derived from the client certificate. The result expires
+        after the configured TTL or when the certificate expires, whichever is first.
+
+        :param key: the cache key
+        :type  key: tuple
+        :param value: the result to cache
+        :param cert_pem: the PEM encoded client certificate
+        :type  cert_pem: str
+        """
+        if self.cert_cache_ttl <= 0 or self.cert_cache_max_size <= 0:
+            return
+        not_after = _not_after(cert_pem)
+        if not_after is None:
+            return
+        expires = min(datetime.utcnow() + timedelta(seconds=self.cert_cache_ttl), not_after)
+        CERT_CACHE.add(key, value, expires, self.cert_cache_max_size)
+
+    def _validate_certificate(self, cert_pem, ca_pem, log_func):
+        """
+        Validate the client certificate against a CA certificate (chain).
+        Results are cached by certificate and CA fingerprint.
+
+        :param cert_pem: PEM encoded client certificate
+        :type  cert_pem: str
+        :param ca_pem: PEM encoded CA certificates
+        :type  ca_pem: str
+        :param log_func: function used for logging
+        :type  log_func: callable taking 1 argument of type basestring
+        :return: true if the certificate was signed by the given CA; false otherwise
+        :rtype:  bool
+        """
+        key = ('verified', _fingerprint(cert_pem), _fingerprint(ca_pem))
+        try:
+            return CERT_CACHE.get(key)
+        except KeyError:
+            pass
+        is_valid = self.repo_cert_utils.validate_certificate_pem(
+            cert_pem, ca_pem, log_func=log_func)
+        self._cache_result(key, is_valid, cert_pem)
+        return is_valid
+
+    def _entitlement_certificate(self, cert_pem):
+        """
+        Parse the entitlement certificate. The parsed certificate, including the
+        path tree built by RHSM to check paths, is cached by certificate fingerprint.
+
+        :param cert_pem: PEM encoded client certificate
+        :type  cert_pem: str
+        :return: the parsed certificate
+        :rtype:  rhsm.certificate2.EntitlementCertificate
+        """
+        key = ('entitlement', _fingerprint(cert_pem))
+        try:
+            return CERT_CACHE.get(key)
+        except KeyError:
+            pass
+        cert = certificate.create_from_pem(cert_pem)
+        self._cache_result(key, cert, cert_pem)
+        return cert
+
     def _matching_repo_bundle(self, dest, repo_url_prefixes):
 
         # Load the path -> repo ID mappings
         prot_repos = self.protected_repo_utils.read_protected_repo_listings()
+        if not isinstance(prot_repos, ProtectedRepoListings):
+            prot_repos = ProtectedRepoListings(prot_repos)
 
         repo_id = None
         for prefix in repo_url_prefixes:
@@ -155,16 +314,11 @@ class OidValidator:
             #   Repo Portion: /my-repo/pulp/fedora-13/i386/repodata/repomd.xml
             repo_url = dest[dest.find(prefix) + len(prefix):]
 
-            # If the repo portion of the URL starts with any of the protected relative URLs,
-            # it is considered to be a request against that protected repo
-            for relative_repo_url in prot_repos.keys():
-
-                # Relative URL is inconsistent in Pulp, so a simple "startswith" tends to
-                # break. Changing this to a find helps remove issues where the leading /
-                # is missing, present, or duplicated.
-                if repo_url.find(relative_repo_url) != -1:
-                    repo_id = prot_repos[relative_repo_url]
-                    break
+            # If the repo portion of the URL contains any of the protected relative URLs,
+            # it is considered to be a request against that protected repo. Relative URL
+            # is inconsistent in Pulp, so the match ignores leading, trailing and
+            # duplicated slashes.
+            repo_id = prot_repos.match(repo_url)
 
             # break out of checking URLs once we find a matching repo id
             if repo_id:
@@ -191,7 +345,7 @@ class OidValidator:
         :return: True iff request is authorized, else False
         :rtype:  bool
         """
-        cert = certificate.create_from_pem(cert_pem)
+        cert = self._entitlement_certificate(cert_pem)
 
         valid = False
         for prefix in repo_url_prefixes:
@@ -8,6 +8,7 @@
 #
 
 from ConfigParser import SafeConfigParser, NoOptionError
+from datetime import datetime, timedelta
 import shutil
 import os
 import unittest
@@ -89,6 +90,7 @@ class TestOidValidation(unittest.TestCase):
     def setUp(self):
         self.config = SafeConfigParser()
         self.config.read(CONFIG_FILENAME)
+        oid_validation.CERT_CACHE.clear()
 
     def print_debug(self):
         valid_ca = X509.load_cert_string(VALID_CA)
@@ -784,7 +786,89 @@ class TestOidValidation(unittest.TestCase):
         validator = oid_validation.OidValidator(self.config)
 
         for path in prefixed_paths:
-            validator._check_extensions(mock.Mock(), path, mock.Mock(), path_prefixes)
+            validator._check_extensions(E_FULL, path, mock.Mock(), path_prefixes)
 
         for call in mock_cert.check_path.call_args_list:
             self.assertEqual(unprefixed_path, call[0][0])
+
+    @mock.patch('pulp.oid_validation.oid_validation._not_after')
+    @mock.patch('pulp.oid_validation.oid_validation.RepoCertUtils.validate_certificate_pem')
+    def test_validate_certificate_cached(self, validate_certificate_pem, _not_after):
+        _not_after.return_value = datetime.utcnow() + timedelta(days=1)
+        validate_certificate_pem.return_value = True
+        validator = oid_validation.OidValidator(self.config)
+
+        self.assertTrue(validator._validate_certificate(E_FULL, VALID_CA, mock.Mock()))
+        self.assertTrue(validator._validate_certificate(E_FULL, VALID_CA, mock.Mock()))
+        validator._validate_certificate(E_FULL, OTHER_CA, mock.Mock())
+        validator._validate_certificate(E_LIMITED, VALID_CA, mock.Mock())
+
+        # keyed by certificate and CA
+        self.assertEqual(validate_certificate_pem.call_count, 3)
+
+    @mock.patch('pulp.oid_validation.oid_validation._not_after')
+    @mock.patch('pulp.oid_validation.oid_validation.RepoCertUtils.validate_certificate_pem')
+    def test_validate_certificate_expired(self, validate_certificate_pem, _not_after):
+        _not_after.return_value = datetime.utcnow() - timedelta(seconds=1)
+        validator = oid_validation.OidValidator(self.config)
+
+        validator._validate_certificate(E_FULL, VALID_CA, mock.Mock())
+        validator._validate_certificate(E_FULL, VALID_CA, mock.Mock())
+
+        # never cached beyond the certificate's notAfter
+        self.assertEqual(validate_certificate_pem.call_count, 2)
+
+    @mock.patch('pulp.oid_validation.oid_validation._not_after')
+    @mock.patch('pulp.oid_validation.oid_validation.RepoCertUtils.validate_certificate_pem')
+    def test_validate_certificate_cache_disabled(self, validate_certificate_pem, _not_after):
+        _not_after.return_value = datetime.utcnow() + timedelta(days=1)
+        self.config.set('main', 'cert_cache_ttl', '0')
+        validator = oid_validation.OidValidator(self.config)
+
+        validator._validate_certificate(E_FULL, VALID_CA, mock.Mock())
+        validator._validate_certificate(E_FULL, VALID_CA, mock.Mock())
+
+        self.assertEqual(validate_certificate_pem.call_count, 2)
+
+    @mock.patch('pulp.oid_validation.oid_validation._not_after')
+    @mock.patch('pulp.oid_validation.oid_validation.certificate')
+    def test_entitlement_certificate_cached(self, mock_certificate_module, _not_after):
+        _not_after.return_value = datetime.utcnow() + timedelta(days=1)
+        validator = oid_validation.OidValidator(self.config)
+
+        cert = validator._entitlement_certificate(E_FULL)
+
+        self.assertEqual(validator._entitlement_certificate(E_FULL), cert)
+        mock_certificate_module.create_from_pem.assert_called_once_with(E_FULL)
+
+
+class TestCertificateCache(unittest.TestCase):
+
+    def test_get(self):
+        cache = oid_validation.CertificateCache()
+        cache.add('a', 1, datetime.utcnow() + timedelta(days=1), 10)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertRaises(KeyError, cache.get, 'b')
+
+    def test_get_expired(self):
+        cache = oid_validation.CertificateCache()
+        cache.add('a', 1, datetime.utcnow() - timedelta(seconds=1), 10)
+        self.assertRaises(KeyError, cache.get, 'a')
+        self.assertRaises(KeyError, cache.get, 'a')
+
+    def test_max_size(self):
+        expires = datetime.utcnow() + timedelta(days=1)
+        cache = oid_validation.CertificateCache()
+        cache.add('a', 1, expires, 2)
+        cache.add('b', 2, expires, 2)
+        cache.get('a')
+        cache.add('c', 3, expires, 2)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertRaises(KeyError, cache.get, 'b')
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_clear(self):
+        cache = oid_validation.CertificateCache()
+        cache.add('a', 1, datetime.utcnow() + timedelta(days=1), 10)
+        cache.clear()
+        self.assertRaises(KeyError, cache.get, 'a')
@@ -0,0 +1,73 @@
+"""
+Per-process cache of values derived from files on disk.
+
+Repo auth runs inside the web server for every protected content request and
+the files it reads (protected repo listings, cert bundles, configuration)
+change rarely. Cached values are invalidated when the file's modification
+time, size or inode changes so that updates written by the Pulp server are
+picked up without restarting the web server.
+"""
+
+import os
+from threading import Lock
+
+
+def file_stamp(path):
+    """
+    Get a stamp identifying the current version of a file.
+
+    :param path: absolute path to a file
+    :type  path: str
+    :return: a tuple of (mtime, size, inode); None if the file does not exist
+    :rtype:  tuple
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size, st.st_ino
+
+
+class FileCache(object):
+    """
+    Cache of values loaded from files, keyed by path.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._entries = {}
+
+    def get(self, path, load):
+        """
+        Get the value loaded from the file at *path*. The file is (re)loaded
+        when not cached or when it has changed since it was loaded.
+
+        :param path: absolute path to a file
+        :type  path: str
+        :param load: called with (path) to load the value; it is also called
+                     when the file does not exist
+        :type  load: callable
+        :return: the (cached) value returned by load()
+        """
+        stamp = file_stamp(path)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        value = load(path)
+        with self._lock:
+            self._entries[path] = (stamp, value)
+        return value
+
+    def invalidate(self, path=None):
+        """
+        Discard the cached value for *path* or all cached values when no path is given.
+
+        :param path: absolute path to a file
+        :type  path: str
+        """
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
@@ -6,10 +6,15 @@ repo information.
 import os
 from threading import RLock
 
+from pulp.repoauth.file_cache import FileCache
+
 # -- constants ----------------------------------------------------------------------
 
 WRITE_LOCK = RLock()
 
+# Per-process cache of the parsed listings files.
+LISTINGS_CACHE = FileCache()
+
 
 class ProtectedRepoUtils:
     def __init__(self, config):
@@ -39,6 +44,7 @@ class ProtectedRepoUtils:
             f.load()
             f.add_protected_repo_path(repo_relative_path, repo_id)
             f.save()
+            LISTINGS_CACHE.invalidate(f.filename)
         finally:
             WRITE_LOCK.release()
 
@@ -61,26 +67,103 @@ class ProtectedRepoUtils:
             f.load()
             f.remove_protected_repo_path(repo_relative_path)
             f.save()
+            LISTINGS_CACHE.invalidate(f.filename)
         finally:
             WRITE_LOCK.release()
 
     def read_protected_repo_listings(self):
         '''
-        Reads in the mapping of relative path URLs to repo ID.
-
-        @param filename: absolute path to the listings file
-        @type  filename: str
+        Reads in the mapping of relative path URLs to repo ID. The file is only
+        re-read when it has changed since it was last read by this process.
 
-        @return: mapping of relative path URL to repo ID
-        @rtype:  dict {str, str}
+        @return: mapping of relative path URL to repo ID; must not be modified
+        @rtype:  ProtectedRepoListings
         '''
-        f = ProtectedRepoListingFile(self.config.get('repos', 'protected_repo_listing_file'))
-        f.load()
-        return f.listings
+        return LISTINGS_CACHE.get(
+            self.config.get('repos', 'protected_repo_listing_file'), _load_listings)
+
+
+def _load_listings(filename):
+    '''
+    Load the listings file.
+
+    @param filename: absolute path to the listings file
+    @type  filename: str
+
+    @return: mapping of relative path URL to repo ID
+    @rtype:  ProtectedRepoListings
+    '''
+    f = ProtectedRepoListingFile(filename)
+    f.load()
+    return ProtectedRepoListings(f.listings)
 
 
 # -- classes -------------------------------------------------------------------------
 
+class ProtectedRepoListings(dict):
+    '''
+    Mapping of relative path URL to repo ID, indexed by a trie of the
+    URL path segments so the protected repo for a request URL can be found
+    without comparing the URL against every listing.
+
+    The trie is built on first use; instances must not be modified afterwards.
+    '''
+
+    # Key of the repo ID in a trie node. Path segments are never empty.
+    REPO_ID = ''
+
+    def __init__(self, *args, **kwargs):
+        super(ProtectedRepoListings, self).__init__(*args, **kwargs)
+        self._trie = None
+
+    def match(self, repo_url):
+        '''
+        Find the protected repo for a repo URL.
+
+        A listing matches when its path segments appear in the URL's path
+        segments, regardless of leading, trailing or duplicated slashes; the
+        longest match at the earliest position wins. A listing without any
+        path segment matches every URL.
+
+        @param repo_url: the repo portion of a request URL
+        @type  repo_url: str
+
+        @return: the repo ID or None if the URL is not protected
+        @rtype:  str
+        '''
+        if self._trie is None:
+            self._trie = self._build_trie()
+        segments = [s for s in repo_url.split('/') if s]
+        for start in range(len(segments)):
+            node = self._trie
+            repo_id = None
+            for segment in segments[start:]:
+                node = node.get(segment)
+                if node is None:
+                    break
+                repo_id = node.get(self.REPO_ID, repo_id)
+            if repo_id:
+                return repo_id
+        return self._trie.get(self.REPO_ID)
+
+    def _build_trie(self):
+        '''
+        Build the trie of listing path segments.
+
+        @return: the root node; each node is a dict of path segment to child
+                 node and the REPO_ID key holds the repo ID of a listing
+        @rtype:  dict
+        '''
+        root = {}
+        for relative_repo_url, repo_id in self.iteritems():
+            segments = [s for s in relative_repo_url.split('/') if s]
+            node = root
+            for segment in segments:
+                node = node.setdefault(segment, {})
+            node[self.REPO_ID] = repo_id
+        return root
+
+
 class ProtectedRepoListingFile:
     def __init__(self, filename):
         '''
@@ -38,6 +38,7 @@ import os
 
 from M2Crypto import X509, BIO
 from pulp.common.util import encode_unicode
+from pulp.repoauth.file_cache import FileCache
 from pulp.repoauth.openssl import Certificate
 
 
@@ -55,6 +56,29 @@ WRITE_LOCK = RLock()
 
 GLOBAL_BUNDLE_PREFIX = 'pulp-global-repo'
 
+# Per-process cache of the contents of bundle files read for access checks.
+BUNDLE_CACHE = FileCache()
+
+
+def _read_bundle_file(filename):
+    '''
+    Read a bundle file.
+
+    @param filename: absolute path to the file
+    @type  filename: str
+
+    @return: the contents of the file; None if it does not exist
+    @rtype:  str
+    '''
+    try:
+        f = open(filename, 'r')
+    except IOError:
+        return None
+    try:
+        return f.read()
+    finally:
+        f.close()
+
 
 class RepoCertUtils:
     def __init__(self, config):
@@ -90,6 +114,7 @@ class RepoCertUtils:
         if os.path.exists(repo_dir):
             LOG.info('Deleting certificate bundles at [%s]' % repo_dir)
             shutil.rmtree(repo_dir)
+            BUNDLE_CACHE.invalidate()
 
     def delete_global_cert_bundle(self):
         '''
@@ -123,10 +148,8 @@ class RepoCertUtils:
         for suffix in pieces:
             filename = os.path.join(cert_dir, '%s.%s' % (GLOBAL_BUNDLE_PREFIX, suffix))
 
-            if os.path.exists(filename):
-                f = open(filename, 'r')
-                contents = f.read()
-                f.close()
+            contents = BUNDLE_CACHE.get(filename, _read_bundle_file)
+            if contents is not None:
                 result = result or {}
                 result[suffix] = contents
             elif self.log_failed_cert_verbose and log_func:
@@ -176,10 +199,8 @@ class RepoCertUtils:
         for suffix in pieces:
             filename = os.path.join(cert_dir, 'consumer-%s.%s' % (repo_id, suffix))
 
-            if os.path.exists(filename):
-                f = open(filename, 'r')
-                contents = f.read()
-                f.close()
+            contents = BUNDLE_CACHE.get(filename, _read_bundle_file)
+            if contents is not None:
                 result = result or {}
                 result[suffix] = contents
 
@@ -491,6 +512,8 @@ class RepoCertUtils:
                 except Exception:
                     LOG.exception('Error storing certificate file [%s]' % filename)
                     raise Exception('Error storing certificate file [%s]' % filename)
+                finally:
+                    BUNDLE_CACHE.invalidate(filename)
 
             return cert_files
 
@@ -2,10 +2,17 @@ from ConfigParser import SafeConfigParser
 from pkg_resources import iter_entry_points
 
 from pulp.repoauth import auth_enabled_validation
+from pulp.repoauth.file_cache import FileCache
 
 AUTH_ENTRY_POINT = 'pulp_content_authenticators'
 CONFIG_FILENAME = '/etc/pulp/repo_auth.conf'
 
+# Per-process cache of the loaded authenticators, keyed by name.
+_authenticators = None
+
+# Per-process cache of the disabled authenticators read from CONFIG_FILENAME.
+_config_cache = FileCache()
+
 
 def allow_access(environ, host):
     """
@@ -29,12 +36,11 @@ def allow_access(environ, host):
         return True
 
     # find all of the authenticator methods we need to try
-    authenticators = {}
-    for ep in iter_entry_points(group=AUTH_ENTRY_POINT):
-        authenticators.update({ep.name: ep.load()})
+    authenticators = _load_authenticators()
 
     # load our list of disabled authenticators
-    disabled_authenticators = _get_disabled_authenticators()
+    disabled_authenticators = _config_cache.get(
+        CONFIG_FILENAME, lambda path: _get_disabled_authenticators())
 
     # loop through authenticators. If any return False, kick the user out.
     for auth_method in authenticators:
@@ -47,6 +53,23 @@ def allow_access(environ, host):
     return True
 
 
+def _load_authenticators():
+    """
+    Load the authenticators registered using entry points. The entry points are
+    only iterated and loaded on the first call made by the process.
+
+    :return: mapping of authenticator name to authenticator method
+    :rtype:  dict
+    """
+    global _authenticators
+    if _authenticators is None:
+        authenticators = {}
+        for ep in iter_entry_points(group=AUTH_ENTRY_POINT):
+            authenticators.update({ep.name: ep.load()})
+        _authenticators = authenticators
+    return _authenticators
+
+
 def _get_disabled_authenticators():
     disabled_authenticators = []
     config = SafeConfigParser()
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from pulp.repoauth.file_cache import FileCache, file_stamp
+
+
+class TestFileStamp(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_stamp(self):
+        path = os.path.join(self.tmp_dir, 'a')
+        with open(path, 'w') as f:
+            f.write('abc')
+        st = os.stat(path)
+        self.assertEqual(file_stamp(path), (st.st_mtime, 3, st.st_ino))
+
+    def test_missing(self):
+        self.assertEqual(file_stamp(os.path.join(self.tmp_dir, 'a')), None)
+
+
+class TestFileCache(unittest.TestCase):
+
+    @mock.patch('pulp.repoauth.file_cache.file_stamp')
+    def test_get_cached(self, file_stamp):
+        file_stamp.return_value = (1, 10, 1)
+        load = mock.Mock()
+        cache = FileCache()
+
+        self.assertEqual(cache.get('/a', load), load.return_value)
+        self.assertEqual(cache.get('/a', load), load.return_value)
+
+        load.assert_called_once_with('/a')
+
+    @mock.patch('pulp.repoauth.file_cache.file_stamp')
+    def test_get_changed(self, file_stamp):
+        file_stamp.side_effect = [(1, 10, 1), (1, 10, 1), (2, 10, 1), None]
+        load = mock.Mock(side_effect=['a', 'b', 'c'])
+        cache = FileCache()
+
+        self.assertEqual(cache.get('/a', load), 'a')
+        self.assertEqual(cache.get('/a', load), 'a')
+        self.assertEqual(cache.get('/a', load), 'b')
+        self.assertEqual(cache.get('/a', load), 'c')
+
+    @mock.patch('pulp.repoauth.file_cache.file_stamp')
+    def test_invalidate(self, file_stamp):
+        file_stamp.return_value = (1, 10, 1)
+        load = mock.Mock(side_effect=['a', 'b', 'c'])
+        cache = FileCache()
+
+        cache.get('/a', load)
+        cache.invalidate('/a')
+        self.assertEqual(cache.get('/a', load), 'b')
+        cache.invalidate()
+        self.assertEqual(cache.get('/a', load), 'c')
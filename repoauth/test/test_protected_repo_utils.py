@@ -5,7 +5,8 @@ import os
 import shutil
 import unittest
 
-from pulp.repoauth.protected_repo_utils import ProtectedRepoListingFile, ProtectedRepoUtils
+from pulp.repoauth.protected_repo_utils import (
+    LISTINGS_CACHE, ProtectedRepoListingFile, ProtectedRepoListings, ProtectedRepoUtils)
 
 
 # -- constants -----------------------------------------------------------------------
@@ -68,6 +69,84 @@ class TestProtectedRepoUtils(unittest.TestCase):
 
         self.assertEqual(0, len(listings))
 
+    def test_read_cached(self):
+        """
+        Tests the listings are only re-read when the file changes.
+        """
+        self.utils.add_protected_repo('path-1', 'prot-repo-1')
+        listings = self.utils.read_protected_repo_listings()
+
+        # Test
+        cached = self.utils.read_protected_repo_listings()
+
+        # Verify
+        self.assertTrue(cached is listings)
+        self.assertTrue(isinstance(cached, ProtectedRepoListings))
+
+        # Changed by another process
+        f = ProtectedRepoListingFile(TEST_FILE)
+        f.load()
+        f.add_protected_repo_path('path-2', 'prot-repo-2')
+        f.save()
+
+        listings = self.utils.read_protected_repo_listings()
+        self.assertEqual(listings, {'path-1': 'prot-repo-1', 'path-2': 'prot-repo-2'})
+
+    @mock.patch('pulp.repoauth.file_cache.file_stamp')
+    @mock.patch('pulp.repoauth.protected_repo_utils.ProtectedRepoListingFile')
+    def test_read_file_changed(self, listing_file, file_stamp):
+        """
+        Tests the listings are re-read when the file stamp changes.
+        """
+        LISTINGS_CACHE.invalidate()
+        file_stamp.side_effect = [(1, 10, 1), (1, 10, 1), (2, 10, 1)]
+        listing_file.return_value.listings = {'path-1': 'prot-repo-1'}
+
+        # Test
+        self.utils.read_protected_repo_listings()
+        self.utils.read_protected_repo_listings()
+        self.utils.read_protected_repo_listings()
+
+        # Verify
+        self.assertEqual(listing_file.return_value.load.call_count, 2)
+        LISTINGS_CACHE.invalidate()
+
+
+class TestProtectedRepoListings(unittest.TestCase):
+
+    def test_match(self):
+        listings = ProtectedRepoListings({
+            '/pulp/pulp/fedora-14/x86_64': 'repo-a',
+            'pulp/pulp/fedora-14': 'repo-b',
+            'my-repo/': 'repo-c',
+        })
+        self.assertEqual(listings.match('/repos/pulp/pulp/fedora-14/x86_64/repomd.xml'), 'repo-a')
+        self.assertEqual(listings.match('/repos/pulp/pulp/fedora-14/i386/repomd.xml'), 'repo-b')
+        self.assertEqual(listings.match('//my-repo/Packages/a.rpm'), 'repo-c')
+        self.assertEqual(listings.match('/other-repo/Packages/a.rpm'), None)
+
+    def test_match_segments_only(self):
+        listings = ProtectedRepoListings({'repo-1': 'repo-a'})
+        self.assertEqual(listings.match('/my-repo-1/a.rpm'), None)
+
+    def test_match_unprotected_not_scanned(self):
+        listings = ProtectedRepoListings(('repo-%d' % i, 'repo-%d' % i) for i in range(100))
+        listings.match('/repo-1/a.rpm')
+
+        with mock.patch.object(ProtectedRepoListings, 'iteritems') as iteritems:
+            self.assertEqual(listings.match('/other-repo/Packages/a.rpm'), None)
+
+        self.assertFalse(iteritems.called)
+
+    def test_match_no_segments(self):
+        listings = ProtectedRepoListings({'/': 'repo-a', 'repo-1': 'repo-b'})
+        self.assertEqual(listings.match('/repo-1/a.rpm'), 'repo-b')
+        self.assertEqual(listings.match('/my-repo/a.rpm'), 'repo-a')
+
+    def test_match_empty(self):
+        listings = ProtectedRepoListings()
+        self.assertEqual(listings.match('/my-repo/a.rpm'), None)
+
 
 class TestProtectedRepoListingFile(unittest.TestCase):
     def setUp(self):
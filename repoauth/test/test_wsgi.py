@@ -1,6 +1,7 @@
 import unittest
 import mock
 
+from pulp.repoauth import wsgi
 from pulp.repoauth.wsgi import allow_access, _get_disabled_authenticators
 
 
@@ -23,6 +24,10 @@ class TestWsgi(unittest.TestCase):
 
         self.entrypoint_list = [entrypoint_one, entrypoint_two]
 
+        # reset the per-process caches
+        wsgi._authenticators = None
+        wsgi._config_cache.invalidate()
+
     @mock.patch('pulp.repoauth.auth_enabled_validation.authenticate')
     def test_auth_disabled(self, auth_enabled):
         """
@@ -133,3 +138,40 @@ class TestWsgi(unittest.TestCase):
 
         mock_parser_instance.read.assert_called_once_with('/etc/pulp/repo_auth.conf')
         mock_parser_instance.has_option.assert_called_once_with('main', 'disabled_authenticators')
+
+    @mock.patch('pulp.repoauth.auth_enabled_validation.authenticate')
+    @mock.patch('pulp.repoauth.wsgi.iter_entry_points')
+    @mock.patch('pulp.repoauth.wsgi._get_disabled_authenticators')
+    def test_authenticators_cached(self, disabled_authenticators, iter_ep, auth_enabled):
+        """
+        Test that the entry points and disabled authenticators are only loaded once
+        """
+        auth_enabled.return_value = False
+        environ = mock.Mock()
+        disabled_authenticators.return_value = []
+        iter_ep.return_value = self.entrypoint_list
+
+        self.assertTrue(allow_access(environ, 'fake.host.name'))
+        self.assertTrue(allow_access(environ, 'fake.host.name'))
+
+        self.assertEqual(iter_ep.call_count, 1)
+        self.assertEqual(disabled_authenticators.call_count, 1)
+        self.assertEqual(self.auth_one.call_count, 2)
+
+    @mock.patch('pulp.repoauth.auth_enabled_validation.authenticate')
+    @mock.patch('pulp.repoauth.wsgi.iter_entry_points')
+    @mock.patch('pulp.repoauth.wsgi._get_disabled_authenticators')
+    @mock.patch('pulp.repoauth.file_cache.file_stamp')
+    def test_config_changed(self, file_stamp, disabled_authenticators, iter_ep, auth_enabled):
+        """
+        Test that the disabled authenticators are re-read when the config file changes
+        """
+        auth_enabled.return_value = False
+        environ = mock.Mock()
+        file_stamp.side_effect = [(1, 10, 1), (2, 10, 1)]
+        disabled_authenticators.side_effect = [[], ['auth_one', 'auth_two']]
+        self.auth_one.return_value = False
+        iter_ep.return_value = self.entrypoint_list
+
+        self.assertFalse(allow_access(environ, 'fake.host.name'))
+        self.assertTrue(allow_access(environ, 'fake.host.name'))
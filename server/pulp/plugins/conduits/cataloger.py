@@ -1,27 +1,44 @@
+from uuid import uuid4
+
 from pulp.server.managers import factory as managers
 
 
+# The number of added entries buffered before being written to the catalog.
+BATCH_SIZE = 1000
+
+
 class CatalogerConduit(object):
     """
     Provides access to pulp platform API.
+    Added entries are buffered and written to the catalog in batches.
+    :ivar generation: The ID of the staged generation entries are added to.
+        None when entries are added directly to the catalog.
+    :type generation: str
     """
 
-    def __init__(self, source_id, expires):
+    def __init__(self, source_id, expires, batch_size=BATCH_SIZE):
         """
         :param source_id: The content source ID.
         :type source_id: str
         :param expires: The content expiration in seconds.
         :type expires: int
+        :param batch_size: The number of added entries buffered before being
+            written to the catalog.
+        :type batch_size: int
         :return:
         """
         self.source_id = source_id
         self.expires = expires
+        self.batch_size = batch_size
+        self.generation = None
         self.added_count = 0
         self.deleted_count = 0
+        self._pending = []
 
     def add_entry(self, type_id, unit_key, url):
         """
         Add an entry to the content catalog.
+        The entry is written when the buffer is full or flushed.
         :param type_id: The content unit type ID.
         :type type_id: str
         :param unit_key: The content unit key.
@@ -29,9 +46,10 @@ class CatalogerConduit(object):
         :param url: The URL used to download content associated with the unit.
         :type url: str
         """
-        manager = managers.content_catalog_manager()
-        manager.add_entry(self.source_id, self.expires, type_id, unit_key, url)
+        self._pending.append((type_id, unit_key, url))
         self.added_count += 1
+        if len(self._pending) >= self.batch_size:
+            self.flush()
 
     def delete_entry(self, type_id, unit_key):
         """
@@ -41,10 +59,49 @@ class CatalogerConduit(object):
         :param unit_key: The content unit key.
         :type unit_key: dict
         """
+        self.flush()
         manager = managers.content_catalog_manager()
         manager.delete_entry(self.source_id, type_id, unit_key)
         self.deleted_count += 1
 
+    def flush(self):
+        """
+        Write the buffered entries to the content catalog.
+        """
+        if not self._pending:
+            return
+        pending = self._pending
+        self._pending = []
+        manager = managers.content_catalog_manager()
+        manager.add_entries(self.source_id, self.expires, pending, self.generation)
+
+    def stage(self, generation=None):
+        """
+        Start a staged generation.  Entries added after this are not visible
+        in the catalog until the generation is published.
+        :param generation: The ID of an existing staged generation to add
+            entries to.  A new generation is started when not specified.
+        :type generation: str
+        """
+        self.flush()
+        self.generation = generation or uuid4().hex
+
+    def publish(self, purge=True):
+        """
+        Publish the staged generation.
+        :param purge: Purge the entries added by previous generations.
+        :type purge: bool
+        :return: The number of entries purged.
+        :rtype: int
+        """
+        self.flush()
+        if self.generation is None:
+            return 0
+        manager = managers.content_catalog_manager()
+        purged = manager.publish(self.source_id, self.generation, purge)
+        self.generation = None
+        return purged
+
     def reset(self):
         """
         Reset statistics.
@@ -501,6 +501,28 @@ class AddUnitMixin(object):
             _logger.exception(_('Content unit association failed [%s]' % str(unit)))
             raise ImporterConduitException(e), None, sys.exc_info()[2]
 
+    def associate_units(self, units):
+        """
+        Associates units that have already been saved with the repository in bulk. This is
+        much faster than associating units one at a time when there are many of them.
+
+        This call is idempotent. Units that are already associated have their association's
+        "updated" timestamp refreshed.
+
+        :param units: units saved by save_unit or found by a search, or content unit models
+        :type  units: iterable of pulp.plugins.model.Unit or pulp.server.db.model.ContentUnit
+
+        :return: the number of units newly associated with the repository
+        :rtype:  int
+        """
+        try:
+            association_manager = manager_factory.repo_unit_association_manager()
+            return association_manager.associate_units_by_id(
+                self.repo_id, ((unit.type_id, unit.id) for unit in units))
+        except Exception, e:
+            _logger.exception(_('Content unit association failed'))
+            raise ImporterConduitException(e), None, sys.exc_info()[2]
+
     def _update_unit(self, unit, pulp_unit):
         """
         Update a unit. If it is not found, add it.
@@ -17,8 +17,16 @@ _logger = logging.getLogger(__name__)
 
 class ProfilerConduit(MultipleRepoUnitsMixin):
 
-    def __init__(self):
+    def __init__(self, cache_repo_units=False):
+        """
+        :param cache_repo_units: if True, get_repo_units() loads the units of a repository only
+                                 once for the lifetime of this conduit. This is meant for
+                                 calculating the applicability of many profiles in a row
+                                 against a repository whose content does not change meanwhile.
+        :type  cache_repo_units: bool
+        """
         MultipleRepoUnitsMixin.__init__(self, ProfilerConduitException)
+        self._repo_units_cache = {} if cache_repo_units else None
 
     def get_bindings(self, consumer_id):
         """
@@ -54,6 +62,20 @@ class ProfilerConduit(MultipleRepoUnitsMixin):
         :rtype:  list of pulp.plugins.model.Unit
         """
         additional_unit_fields = additional_unit_fields or []
+        if self._repo_units_cache is not None:
+            cache_key = (repo_id, content_type_id, tuple(sorted(additional_unit_fields)))
+            if cache_key not in self._repo_units_cache:
+                self._repo_units_cache[cache_key] = self._get_repo_units(
+                    repo_id, content_type_id, additional_unit_fields)
+            return list(self._repo_units_cache[cache_key])
+        return self._get_repo_units(repo_id, content_type_id, additional_unit_fields)
+
+    def _get_repo_units(self, repo_id, content_type_id, additional_unit_fields):
+        """
+        Load the units of the given type from the given repository.
+
+        See get_repo_units() for the parameters and return value.
+        """
         try:
             unit_key_fields = units_controller.get_unit_key_fields_for_type(content_type_id)
             serializer = units_controller.get_model_serializer_for_type(content_type_id)
@@ -241,3 +241,61 @@ class Profiler(object):
         :rtype:               list of str
         """
         raise NotImplementedError()
+
+    def calculate_applicable_units_bulk(self, unit_profiles, bound_repo_id, config, conduit):
+        """
+        Calculate applicability for many unit profiles against the same bound repository.
+
+        This is used by Pulp when the applicability of a repository is regenerated for all of
+        the consumer profiles it is bound to. Profilers that can share work between profiles,
+        such as loading the content of the bound repository only once, should override this
+        method. The default implementation calls calculate_applicable_units() once per profile.
+
+        :param unit_profiles: consumer unit profiles keyed by their profile hash
+        :type  unit_profiles: dict
+        :param bound_repo_id: repo id of a repository to be used to calculate applicability
+                              against the given consumer profiles
+        :type  bound_repo_id: str
+        :param config:        plugin configuration
+        :type  config:        pulp.server.plugins.config.PluginCallConfiguration
+        :param conduit:       provides access to relevant Pulp functionality
+        :type  conduit:       pulp.plugins.conduits.profile.ProfilerConduit
+        :return:              the applicability calculated for each profile, keyed by the
+                              profile hash
+        :rtype:               dict
+        """
+        applicability = {}
+        for profile_hash, unit_profile in unit_profiles.iteritems():
+            applicability[profile_hash] = self.calculate_applicable_units(
+                unit_profile, bound_repo_id, config, conduit)
+        return applicability
+
+    def calculate_applicable_units_delta(self, unit_profiles, bound_repo_id, added_units, config,
+                                         conduit):
+        """
+        Calculate which of the units recently added to a bound repository are applicable to
+        the given unit profiles.
+
+        Pulp uses this when units were only added to a repository since its applicability was
+        last regenerated. The returned unit ids are added to the applicability already stored
+        for each profile, so this may only be implemented by profilers for which adding units
+        never changes the applicability of the units that were already in the repository. The
+        default implementation raises NotImplementedError, in which case Pulp regenerates the
+        applicability of the profiles in full.
+
+        :param unit_profiles: consumer unit profiles keyed by their profile hash
+        :type  unit_profiles: dict
+        :param bound_repo_id: repo id of a repository to be used to calculate applicability
+                              against the given consumer profiles
+        :type  bound_repo_id: str
+        :param added_units:   ids of the units added to the repository, keyed by content type id
+        :type  added_units:   dict
+        :param config:        plugin configuration
+        :type  config:        pulp.server.plugins.config.PluginCallConfiguration
+        :param conduit:       provides access to relevant Pulp functionality
+        :type  conduit:       pulp.plugins.conduits.profile.ProfilerConduit
+        :return:              for each profile hash, a dictionary mapping content type ids to
+                              lists of newly applicable unit ids
+        :rtype:               dict
+        """
+        raise NotImplementedError()
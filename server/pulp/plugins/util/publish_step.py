@@ -1,5 +1,8 @@
 from gettext import gettext as _
+from collections import deque
 from itertools import chain, imap
+from Queue import Queue
+from threading import Event, RLock, Thread
 import copy
 import itertools
 import logging
@@ -48,6 +51,65 @@ def _post_order(step):
     yield step
 
 
+class ProgressThrottle(object):
+    """
+    Decides when the progress report of a step tree is written to the database.
+
+    Progress updates from every step in the tree are coalesced by the root step. The report is
+    written when at least `interval` seconds have passed since the last write and at least
+    `min_delta` updates have been made since then. Forced updates, such as those made when a
+    step changes state, are always written and include everything coalesced before them.
+
+    Steps running concurrently share the throttle; the lock serializes updates and writes.
+
+    :ivar writes:     The number of times the progress report was written.
+    :type writes:     int
+    :ivar suppressed: The number of updates that were not written.
+    :type suppressed: int
+    """
+
+    def __init__(self, interval=None, min_delta=None):
+        """
+        :param interval:  Minimum number of seconds between writes. Defaults to the
+                          [tasks] progress_interval setting.
+        :type  interval:  float
+        :param min_delta: Minimum number of updates between writes. Defaults to the
+                          [tasks] progress_min_delta setting.
+        :type  min_delta: int
+        """
+        if interval is None:
+            interval = pulp_config.getfloat('tasks', 'progress_interval')
+        if min_delta is None:
+            min_delta = pulp_config.getint('tasks', 'progress_min_delta')
+        self.interval = interval
+        self.min_delta = min_delta
+        self.lock = RLock()
+        self.last_write = None
+        self.pending = 0
+        self.writes = 0
+        self.suppressed = 0
+
+    def update(self, force=False):
+        """
+        Record a progress update.
+
+        :param force: Whether the update must be written
+        :type  force: bool
+        :return: True if the progress report should be written now
+        :rtype:  bool
+        """
+        self.pending += 1
+        now = time.time()
+        if not force and self.last_write is not None and \
+                (self.pending < self.min_delta or now - self.last_write < self.interval):
+            self.suppressed += 1
+            return False
+        self.pending = 0
+        self.last_write = now
+        self.writes += 1
+        return True
+
+
 class Step(object):
     """
     Base class for step processing. The only tie to the platform is an assumption of
@@ -76,10 +138,21 @@ class Step(object):
     |
     +-- post_process()
 
+    CONCURRENCY:
+
+    A step created with independent=True does not depend on the siblings next to it. Consecutive
+    independent siblings are processed concurrently, each in its own thread, after the siblings
+    before them have completed and before the siblings after them are started.
+
+    A step created with max_workers greater than 1 fans process_main() out over a pool of that
+    many threads. The results are handed to process_result() in the order the items were
+    produced by get_iterator(), in the thread processing the step. process_main() must then be
+    safe to call concurrently and should raise, rather than record, failures.
+
     """
 
     def __init__(self, step_type, status_conduit=None, non_halting_exceptions=None,
-                 disable_reporting=False):
+                 disable_reporting=False, independent=False, max_workers=1):
         """
         :param step_type: The id of the step this processes
         :type step_type: str
@@ -89,6 +162,10 @@ class Step(object):
         :type non_halting_exceptions: list of Exception
         :param disable_reporting: Disable progress reporting for this step or any child steps
         :type disable_reporting: bool
+        :param independent: This step may be processed concurrently with its independent siblings
+        :type independent: bool
+        :param max_workers: The number of threads process_main() is fanned out over
+        :type max_workers: int
         """
         self.status_conduit = status_conduit
         self.uuid = str(uuid.uuid4())
@@ -105,10 +182,13 @@ class Step(object):
         self.children = []
         self.last_report_time = 0
         self.last_reported_state = self.state
+        self.progress_throttle = None
         self.timestamp = str(time.time())
         self.non_halting_exceptions = non_halting_exceptions or []
         self.exceptions = []
         self.disable_reporting = disable_reporting
+        self.independent = independent
+        self.max_workers = max_workers
 
     def add_child(self, step):
         """
@@ -156,16 +236,39 @@ class Step(object):
         * finalize - All finalize steps will be called even if one of them throws an exception.
                      This is so that open file handles can be closed.
         * post_process
+
+        Consecutive independent siblings are processed concurrently.
         """
+        if self.parent is None and self.progress_throttle is None:
+            self.progress_throttle = ProgressThrottle()
         try:
             # Process the steps in post order
-            for step in _post_order(self):
-                step.process()
+            self._process_tree()
         finally:
             try:
                 self.report_progress(force=True)
             except Exception:
                 _logger.exception(_('Progress reporting failed'))
+            if self.progress_throttle is not None:
+                _logger.debug(_('Progress report written %(writes)s times, %(suppressed)s '
+                                'updates suppressed') %
+                              {'writes': self.progress_throttle.writes,
+                               'suppressed': self.progress_throttle.suppressed})
+
+    def _process_tree(self):
+        """
+        Process the children of this step, then this step.
+        """
+        independent = []
+        for step in self.children:
+            if step.independent:
+                independent.append(step)
+                continue
+            _process_steps(independent)
+            independent = []
+            step._process_tree()
+        _process_steps(independent)
+        self.process()
 
     def is_skipped(self):
         """
@@ -206,6 +309,20 @@ class Step(object):
 
         :param item: The item to process or None if this get_iterator is not defined
         :param item: object or None
+        :return: optional result handed to process_result()
+        """
+        pass
+
+    def process_result(self, item, result):
+        """
+        Called with the value returned by process_main() for each item, in the order the items
+        were produced by get_iterator(). When process_main() is fanned out over max_workers
+        threads, this is where work that must be done in order or in a single thread belongs.
+
+        :param item: The item that was processed or None if get_iterator is not defined
+        :type item: object or None
+        :param result: The value returned by process_main()
+        :type result: object
         """
         pass
 
@@ -231,24 +348,20 @@ class Step(object):
                 self.report_progress()
                 item_iterator = self.get_iterator()
                 if item_iterator is not None:
-                    # We are using a generator and will call _process_block for each item
-                    for item in item_iterator:
-                        if self.canceled:
-                            break
-                        try:
-                            self._process_block(item=item)
-                        except Exception as e:
-                            raise_exception = True
-                            for exception in self.non_halting_exceptions:
-                                if isinstance(e, exception):
-                                    raise_exception = False
-                                    self._record_failure(e=e)
-                                    self.exceptions.append(e)
-                                    break
-                            if raise_exception:
-                                raise
-                        # Clean out the progress_details for the individual item
-                        self.progress_details = ""
+                    if self.max_workers > 1:
+                        self._process_concurrently(item_iterator)
+                    else:
+                        # We are using a generator and will call _process_block for each item
+                        for item in item_iterator:
+                            if self.canceled:
+                                break
+                            try:
+                                self._process_block(item=item)
+                            except Exception as e:
+                                if not self._is_non_halting(e, self._item_count(item)):
+                                    raise
+                            # Clean out the progress_details for the individual item
+                            self.progress_details = ""
                     if self.exceptions:
                         raise PulpCodedTaskFailedException(error_code=error_codes.PLP0032,
                                                            task_id=self.status_conduit.task_id)
@@ -296,16 +409,132 @@ class Step(object):
         not the place. See the class doc block for more info on where to put your code.
         """
         failures = self.progress_failures
+        result = self._process_item(item)
+        self._record_batch_failures(result)
+        self._record_successes(self._item_count(item) - (self.progress_failures - failures))
+        self.process_result(item, result)
+        self.report_progress()
+
+    def _process_item(self, item=None):
+        """
+        Do the work for an item produced by get_iterator().
+
+        :param item: The item to process or None if get_iterator is not defined
+        :type item: object or None
+        :return: The value returned by process_main()
+        :rtype: object
+        """
         # Need to keep backwards compatibility
         if item:
-            self.process_main(item=item)
+            return self.process_main(item=item)
+        return self.process_main()
+
+    def _item_count(self, item):
+        """
+        The number of units of progress an item produced by get_iterator() accounts for.
+
+        :param item: An item produced by get_iterator() or None if get_iterator is not defined
+        :type item: object or None
+        :rtype: int
+        """
+        return 1
+
+    def _record_successes(self, count):
+        """
+        Record successfully processed units of progress, without exceeding the total.
+
+        :param count: The number of units of progress
+        :type count: int
+        """
+        remaining = self.get_total() - self.progress_successes - self.progress_failures
+        self.progress_successes += max(min(count, remaining), 0)
+
+    def _process_concurrently(self, item_iterator):
+        """
+        Fan process_main() out over a pool of max_workers threads. Progress is recorded and
+        results are handed to process_result() in the order the items were produced, in this
+        thread.
+
+        :param item_iterator: The items to process
+        :type item_iterator: iterable
+        """
+        queue = Queue(self.max_workers)
+        stopped = Event()
+        workers = [_ItemWorker(self, queue, stopped) for i in range(self.max_workers)]
+        for worker in workers:
+            worker.start()
+        pending = deque()
+        try:
+            for item in item_iterator:
+                if self.canceled:
+                    break
+                task = _ItemTask(item)
+                queue.put(task)
+                pending.append(task)
+                # Hand off completed items without letting the backlog grow unbounded
+                while pending and not self.canceled and \
+                        (pending[0].done.is_set() or len(pending) > 2 * self.max_workers):
+                    self._complete_item(pending.popleft())
+            # Items still pending when the step is canceled are discarded
+            while pending and not self.canceled:
+                self._complete_item(pending.popleft())
+        finally:
+            stopped.set()
+            for worker in workers:
+                queue.put(None)
+            for worker in workers:
+                worker.join()
+
+    def _complete_item(self, task):
+        """
+        Wait for an item processed by an _ItemWorker and record its outcome.
+
+        :param task: The processed item
+        :type task: _ItemTask
+        """
+        task.done.wait()
+        if task.exc_info is not None:
+            if not self._is_non_halting(task.exc_info[1], self._item_count(task.item)):
+                raise task.exc_info[0], task.exc_info[1], task.exc_info[2]
         else:
-            self.process_main()
-        if failures == self.progress_failures and \
-                self.progress_successes + failures < self.get_total():
-            self.progress_successes += 1
+            failures = self.progress_failures
+            self._record_batch_failures(task.result)
+            self._record_successes(self._item_count(task.item) -
+                                   (self.progress_failures - failures))
+            self.process_result(task.item, task.result)
+        self.progress_details = ""
         self.report_progress()
 
+    def _record_batch_failures(self, result):
+        """
+        Record the failures of the units of a batch that failed individually.
+
+        :param result: The value returned for an item by _process_item()
+        :type result: object
+        """
+        if isinstance(result, _BatchResult):
+            for e in result.exceptions:
+                self._is_non_halting(e)
+
+    def _is_non_halting(self, e, count=1):
+        """
+        Record the failure to process an item if the exception raised is one of the
+        non_halting_exceptions.
+
+        :param e: The exception raised while processing an item
+        :type e: Exception
+        :param count: The number of units of progress the item accounts for
+        :type count: int
+        :return: True if the exception was recorded and processing may continue
+        :rtype: bool
+        """
+        for exception in self.non_halting_exceptions:
+            if isinstance(e, exception):
+                self._record_failure(e=e, count=count)
+                self.exceptions.append(e)
+                return True
+        return False
+
     def _get_total(self):
         """
         DEPRECATED in favor of get_total()
@@ -324,7 +553,9 @@ class Step(object):
     def report_progress(self, force=False):
         """
         Bubble up that something has changed where progress should be reported.
-        It is up to the parent to determine what actions should be taken.
+        It is up to the root step to determine, using its progress_throttle, whether
+        the progress report is written to the database.
+
         :param force: Whether or not a write to the database should be forced
         :type force: bool
         """
@@ -338,14 +569,12 @@ class Step(object):
         if self.parent:
             self.parent.report_progress(force)
         else:
-            if force:
-                self.get_status_conduit().set_progress(self.get_progress_report())
-            else:
-                current_time = time.time()
-                if current_time != self.last_report_time:
-                    # Update at most once a second
+            if self.progress_throttle is None:
+                self.progress_throttle = ProgressThrottle()
+            with self.progress_throttle.lock:
+                if self.progress_throttle.update(force):
                     self.get_status_conduit().set_progress(self.get_progress_report())
-                    self.last_report_time = current_time
+                    self.last_report_time = self.progress_throttle.last_write
 
     def get_progress_report(self):
         """
@@ -381,7 +610,7 @@ class Step(object):
 
         return [report]
 
-    def _record_failure(self, e=None, tb=None):
+    def _record_failure(self, e=None, tb=None, count=1):
         """
         Record a failure in a step's progress sub-report.
 
@@ -389,8 +618,10 @@ class Step(object):
         :type  e: Exception or None
         :param tb: traceback instance (if any)
         :type  tb: Traceback or None
+        :param count: number of units of progress that failed
+        :type  count: int
         """
-        self.progress_failures += 1
+        self.progress_failures += count
 
         error_details = {'error': None,
                          'traceback': None}
@@ -428,6 +659,125 @@ class Step(object):
         return None
 
 
+def _process_steps(steps):
+    """
+    Process the trees rooted at the given steps, concurrently when there is more than one.
+    Once all of them have finished, the first exception raised, if any, is raised again.
+
+    :param steps: independent sibling steps
+    :type steps: list of Step
+    """
+    if len(steps) < 2:
+        for step in steps:
+            step._process_tree()
+        return
+    threads = [_StepThread(step) for step in steps]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for thread in threads:
+        if thread.exc_info is not None:
+            raise thread.exc_info[0], thread.exc_info[1], thread.exc_info[2]
+
+
+class _StepThread(Thread):
+    """
+    Processes the tree rooted at a step.
+
+    :ivar step: The step to process
+    :type step: Step
+    :ivar exc_info: The exception raised processing the step, as returned by sys.exc_info()
+    :type exc_info: tuple
+    """
+
+    def __init__(self, step):
+        super(_StepThread, self).__init__(name=step.step_id)
+        self.setDaemon(True)
+        self.step = step
+        self.exc_info = None
+
+    def run(self):
+        """
+        The thread main.
+        """
+        try:
+            self.step._process_tree()
+        except Exception:
+            self.exc_info = sys.exc_info()
+
+
+class _BatchResult(list):
+    """
+    The results of the units of a batch processed by UnitModelPluginStep.process_batch(). The
+    result of a unit that failed is None.
+
+    :ivar exceptions: The non_halting_exceptions raised by the units that failed
+    :type exceptions: list of Exception
+    """
+
+    def __init__(self):
+        super(_BatchResult, self).__init__()
+        self.exceptions = []
+
+
+class _ItemTask(object):
+    """
+    An item queued to an _ItemWorker.
+
+    :ivar item: The item to process
+    :type item: object
+    :ivar result: The value returned by process_main()
+    :type result: object
+    :ivar exc_info: The exception raised by process_main(), as returned by sys.exc_info()
+    :type exc_info: tuple
+    :ivar done: Set once the item has been processed
+    :type done: threading.Event
+    """
+
+    def __init__(self, item):
+        self.item = item
+        self.result = None
+        self.exc_info = None
+        self.done = Event()
+
+
+class _ItemWorker(Thread):
+    """
+    Processes the items queued by Step._process_concurrently().
+
+    :ivar step: The step being processed
+    :type step: Step
+    :ivar queue: The queue of _ItemTask; None is queued to stop the worker
+    :type queue: Queue.Queue
+    :ivar stopped: Set when the remaining queued items are to be discarded
+    :type stopped: threading.Event
+    """
+
+    def __init__(self, step, queue, stopped):
+        super(_ItemWorker, self).__init__(name=step.step_id)
+        self.setDaemon(True)
+        self.step = step
+        self.queue = queue
+        self.stopped = stopped
+
+    def run(self):
+        """
+        The thread main.
+        """
+        while True:
+            task = self.queue.get()
+            if task is None:
+                return
+            try:
+                if not self.stopped.is_set():
+                    task.result = self.step._process_item(task.item)
+            except Exception:
+                task.exc_info = sys.exc_info()
+            finally:
+                task.done.set()
+
+
 class PluginStep(Step):
     """
     Base plugin step. It's likely you want to inherit from this and not use it directly.
@@ -582,9 +932,16 @@ class UnitModelPluginStep(PluginStep):
     to that property will return the same list containing the same objects.
 
     The QuerySetNoCache objects themselves do not cache results, as the name implies.
+
+    When a batch_size is given, units are processed in batches of up to that many units by
+    process_batch(), which calls process_main() for each unit unless overridden. By default a
+    unit that raises one of the non_halting_exceptions counts as one failure and the rest of the
+    batch is still processed. A process_batch() override that raises one of the
+    non_halting_exceptions fails the whole batch, which counts as a failure for each of its units.
     """
     def __init__(self, step_type, model_classes, repo_content_unit_q=None, repo=None, conduit=None,
-                 config=None, working_dir=None, plugin_type=None, unit_fields=None, **kwargs):
+                 config=None, working_dir=None, plugin_type=None, unit_fields=None,
+                 batch_size=None, **kwargs):
         """
         :param step_type: The id of the step this processes
         :type  step_type: str
@@ -605,6 +962,9 @@ class UnitModelPluginStep(PluginStep):
         :type  plugin_type: str
         :param unit_fields: list of unit fields to retrieve from database, if None all are retrieved
 -       :type unit_fields: list of str
+        :param batch_size: number of units handed to process_batch() at a time, if None units are
+                           handed to process_main() one at a time
+        :type  batch_size: int
         """
         super(UnitModelPluginStep, self).__init__(step_type, repo, conduit, config, working_dir,
                                                   plugin_type, **kwargs)
@@ -612,6 +972,7 @@ class UnitModelPluginStep(PluginStep):
         self.model_classes = model_classes
         self._repo_content_unit_q = repo_content_unit_q
         self.unit_fields = unit_fields
+        self.batch_size = batch_size
 
         # the corresponding publicly-accessible values get cached here
         self._unit_querysets = None
@@ -625,10 +986,62 @@ class UnitModelPluginStep(PluginStep):
         ContentUnit results are not cached, so calling this a second time will cause results to be
         retrieved from the database a second time.
 
+        When a batch_size was given, the generator produces tuples of up to batch_size ContentUnits.
+
         :return: a generator of ContentUnit objects
         :rtype:  generator
         """
-        return itertools.chain(*self.unit_querysets)
+        units = itertools.chain(*self.unit_querysets)
+        if self.batch_size:
+            return misc.paginate(units, self.batch_size)
+        return units
+
+    def process_batch(self, units):
+        """
+        Process a batch of units when a batch_size was given. Override this to amortize work
+        across units. By default, process_main() is called for each unit and a unit that raises
+        one of the non_halting_exceptions is recorded as a failure without stopping the batch.
+
+        :param units: the units to process
+        :type  units: tuple of pulp.server.db.model.ContentUnit
+        :return: optional result handed to process_result(), by default the list of values
+                 returned by process_main(), None for the units that failed
+        """
+        results = _BatchResult()
+        for unit in units:
+            try:
+                results.append(self.process_main(item=unit))
+            except Exception as e:
+                if not any(isinstance(e, exception) for exception in self.non_halting_exceptions):
+                    raise
+                # recorded by the thread processing the step, see _record_batch_failures()
+                results.exceptions.append(e)
+                results.append(None)
+        return results
+
+    def _process_item(self, item=None):
+        """
+        Hand batches of units to process_batch() when a batch_size was given.
+
+        :param item: a unit, or a batch of units when a batch_size was given
+        :type  item: pulp.server.db.model.ContentUnit or tuple
+        :return: the value returned by process_batch() or process_main()
+        :rtype:  object
+        """
+        if self.batch_size:
+            return self.process_batch(item)
+        return super(UnitModelPluginStep, self)._process_item(item)
+
+    def _item_count(self, item):
+        """
+        :param item: a unit, or a batch of units when a batch_size was given
+        :type  item: pulp.server.db.model.ContentUnit or tuple
+        :return: the number of units the item accounts for
+        :rtype:  int
+        """
+        if self.batch_size:
+            return len(item)
+        return 1
 
     @property
     def unit_querysets(self):
@@ -0,0 +1,288 @@
+"""
+Reservation scheduling for the resource manager.
+
+The resource manager keeps an in-memory view of the online workers and of the resources they
+hold so that reserving a resource does not need to query the workers and reserved_resources
+collections. The view is updated as reservations are made and from the events written to the
+capped reservation_events collection when reservations are released and when workers come
+online or go away. A full refresh from the database is done every heartbeat interval to recover
+from missed events.
+
+The events are read from a tailable cursor that follows the events collection. The events that
+have arrived are applied before each worker is selected so that a worker that went away is not
+assigned work. When no worker is available, the resource manager waits on the same cursor rather
+than querying the workers and reserved_resources collections.
+"""
+
+from gettext import gettext as _
+import logging
+import time
+
+from pymongo import CursorType
+from pymongo.errors import OperationFailure
+
+from pulp.server.constants import PULP_PROCESS_HEARTBEAT_INTERVAL
+from pulp.server.db.model import ReservationEvent, ReservedResource, Worker
+
+
+_logger = logging.getLogger(__name__)
+
+
+class ReservationScheduler(object):
+    """
+    Selects the worker a reserved task is dispatched to.
+
+    A task reserving a resource held by an online worker is dispatched to that worker. Otherwise
+    it is dispatched to an online worker holding no reservations, waiting for one to be
+    released when all of them are busy.
+
+    :ivar workers:      The names of the online workers that may be assigned work.
+    :type workers:      set
+    :ivar reservations: Mapping of task_id to a tuple of (worker_name, resource_id).
+    :type reservations: dict
+    :ivar resources:    Mapping of resource_id to the name of the worker holding it.
+    :type resources:    dict
+    :ivar load:         Mapping of worker_name to the set of task_ids it holds reservations for.
+    :type load:         dict
+    """
+
+    # Seconds to wait for a worker to become available before reading the events cursor again.
+    POLL_INTERVAL = 0.1
+
+    # Seconds to wait before reopening an events cursor that died right after being opened.
+    RETRY_INTERVAL = 1.0
+
+    def __init__(self, worker_filter=None, refresh_interval=PULP_PROCESS_HEARTBEAT_INTERVAL):
+        """
+        :param worker_filter:    Called with a worker name; workers for which it returns False
+                                 are never assigned work.
+        :type  worker_filter:    callable
+        :param refresh_interval: Seconds between full refreshes from the database.
+        :type  refresh_interval: int
+        """
+        self.worker_filter = worker_filter or (lambda name: True)
+        self.refresh_interval = refresh_interval
+        self.workers = set()
+        self.reservations = {}
+        self.resources = {}
+        self.load = {}
+        self._holders = {}
+        self.refreshed = None
+        self.dispatched = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self._cursor = None
+
+    def refresh(self):
+        """
+        Reload the online workers and the reservations from the database.
+        """
+        self.workers = set(w['name'] for w in Worker.objects.get_online()
+                           if self.worker_filter(w['name']))
+        self.reservations = {}
+        self.resources = {}
+        self.load = {}
+        self._holders = {}
+        for reservation in ReservedResource.objects.all():
+            self._add(reservation['task_id'], reservation['worker_name'],
+                      reservation['resource_id'])
+        self.refreshed = time.time()
+        _logger.debug(_('Reservation scheduler refreshed: %(stats)s') % {'stats': self.stats()})
+
+    def reserve(self, task_id, resource_id, queued_at=None):
+        """
+        Select the worker that a task reserving a resource is dispatched to, waiting for a
+        worker to become available when necessary, and record the reservation.
+
+        The caller is responsible for saving the ReservedResource.
+
+        :param task_id:     The UUID of the task requesting the reservation.
+        :type  task_id:     basestring
+        :param resource_id: The name of the resource to reserve.
+        :type  resource_id: basestring
+        :param queued_at:   The time (seconds since the epoch) the task was queued to the
+                            resource manager, used to measure queue latency.
+        :type  queued_at:   float
+        :return:            The name of the worker the task is dispatched to.
+        :rtype:             basestring
+        """
+        started = time.time()
+        waited = False
+        while True:
+            self.drain()
+            if self.refreshed is None or time.time() - self.refreshed >= self.refresh_interval:
+                self.refresh()
+            worker_name = self._select(resource_id)
+            if worker_name is not None:
+                break
+            waited = True
+            self.wait()
+
+        self._add(task_id, worker_name, resource_id)
+        self._record(task_id, resource_id, worker_name, started, waited, queued_at)
+        return worker_name
+
+    def drain(self):
+        """
+        Apply the reservation events that have arrived without waiting for more.
+
+        :return: The number of events applied.
+        :rtype:  int
+        """
+        applied = 0
+        while True:
+            event = self._next()
+            if event is None:
+                return applied
+            self.apply(event)
+            applied += 1
+
+    def wait(self):
+        """
+        Apply the reservation events that have arrived, sleeping for POLL_INTERVAL when there
+        are none.
+
+        :return: True if an event was applied.
+        :rtype:  bool
+        """
+        if self.drain():
+            return True
+        if self._cursor is None:
+            time.sleep(self.RETRY_INTERVAL)
+        else:
+            time.sleep(self.POLL_INTERVAL)
+        return False
+
+    def apply(self, event):
+        """
+        Apply a reservation event to the in-memory view.
+
+        :param event: A document from the reservation_events collection.
+        :type  event: dict
+        """
+        task_id = event.get('task_id')
+        if task_id:
+            self._remove(task_id)
+        elif event.get('worker_name'):
+            # A worker came online or went away. The reservations of a worker that went
+            # away were deleted along with it, so reload everything.
+            self.refresh()
+
+    def stats(self):
+        """
+        Dispatch latency metrics.
+
+        :return: A dictionary of: dispatched (number of tasks dispatched), waited (number of
+                 tasks that waited for a worker), wait_total and wait_max (seconds spent waiting
+                 for a worker), latency_total and latency_max (seconds from the task being
+                 queued to it being dispatched), workers (online workers) and reserved (tasks
+                 holding reservations).
+        :rtype:  dict
+        """
+        return {
+            'dispatched': self.dispatched,
+            'waited': self.waited,
+            'wait_total': self.wait_total,
+            'wait_max': self.wait_max,
+            'latency_total': self.latency_total,
+            'latency_max': self.latency_max,
+            'workers': len(self.workers),
+            'reserved': len(self.reservations),
+        }
+
+    def _select(self, resource_id):
+        """
+        Select a worker for the resource.
+
+        :param resource_id: The name of the resource to reserve.
+        :type  resource_id: basestring
+        :return:            The name of the selected worker or None when all workers are busy.
+        :rtype:             basestring
+        """
+        worker_name = self.resources.get(resource_id)
+        if worker_name in self.workers:
+            return worker_name
+        for worker_name in self.workers:
+            if not self.load.get(worker_name):
+                return worker_name
+
+    def _add(self, task_id, worker_name, resource_id):
+        self.reservations[task_id] = (worker_name, resource_id)
+        self.resources[resource_id] = worker_name
+        self.load.setdefault(worker_name, set()).add(task_id)
+        self._holders.setdefault(resource_id, set()).add(task_id)
+
+    def _remove(self, task_id):
+        try:
+            worker_name, resource_id = self.reservations.pop(task_id)
+        except KeyError:
+            return
+        tasks = self.load.get(worker_name, set())
+        tasks.discard(task_id)
+        if not tasks:
+            self.load.pop(worker_name, None)
+        holders = self._holders.get(resource_id, set())
+        holders.discard(task_id)
+        if not holders:
+            self._holders.pop(resource_id, None)
+            self.resources.pop(resource_id, None)
+
+    def _record(self, task_id, resource_id, worker_name, started, waited, queued_at):
+        """
+        Record dispatch latency metrics for a task.
+        """
+        now = time.time()
+        wait = now - started
+        self.dispatched += 1
+        if waited:
+            self.waited += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        latency = None
+        if queued_at is not None:
+            latency = max(now - queued_at, 0.0)
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+        _logger.debug(_('Task %(task)s reserved %(resource)s on %(worker)s after waiting '
+                        '%(wait).3fs; queue latency: %(latency)s') %
+                      {'task': task_id, 'resource': resource_id, 'worker': worker_name,
+                       'wait': wait, 'latency': latency})
+
+    def _next(self):
+        """
+        Read the next reservation event without waiting for one to arrive, opening the events
+        cursor when necessary.
+
+        :return: The next event or None when there is none.
+        :rtype:  dict
+        """
+        if self._cursor is None or not self._cursor.alive:
+            self._open()
+        try:
+            return self._cursor.next()
+        except StopIteration:
+            if not self._cursor.alive:
+                self._cursor = None
+        except OperationFailure, e:
+            # The cursor fell behind the capped collection or was killed on the server. Events
+            # may have been missed so the view is reloaded when the cursor is reopened.
+            _logger.warning(_('Reservation events cursor lost: %(e)s') % {'e': e})
+            self._cursor = None
+
+    def _open(self):
+        """
+        Open a tailable cursor following the reservation events and reload the view from the
+        database. Events already in the collection are skipped since the reload reflects them.
+        """
+        collection = ReservationEvent._get_collection()
+        if collection.find_one() is None:
+            # A tailable cursor on an empty capped collection is dead as soon as it is opened.
+            ReservationEvent().save()
+        cursor = collection.find(cursor_type=CursorType.TAILABLE)
+        for _event in cursor:
+            pass
+        self._cursor = cursor
+        self.refresh()
@@ -22,9 +22,10 @@ from pulp.common import constants, dateutils, tags
 from pulp.server.async.celery_instance import celery, RESOURCE_MANAGER_QUEUE, \
     DEDICATED_QUEUE_EXCHANGE
 from pulp.server.exceptions import PulpException, MissingResource, \
-    NoWorkers, PulpCodedException, error_codes
+    PulpCodedException, error_codes
 from pulp.server.config import config
-from pulp.server.db.model import Worker, ReservedResource, TaskStatus, \
+from pulp.server.async.reservations import ReservationScheduler
+from pulp.server.db.model import Worker, ReservedResource, ReservationEvent, TaskStatus, \
     ResourceManagerLock, CeleryBeatLock
 from pulp.server.managers.repo import _common as common_utils
 from pulp.server.managers import factory as managers
@@ -108,7 +109,7 @@ class PulpTask(CeleryTask):
 
 
 @task(base=PulpTask, acks_late=True)
-def _queue_reserved_task(name, task_id, resource_id, inner_args, inner_kwargs):
+def _queue_reserved_task(name, task_id, resource_id, inner_args, inner_kwargs, queued_at=None):
     """
     A task that encapsulates another task to be dispatched later. This task being encapsulated is
     called the "inner" task, and a task name, UUID, and accepts a list of positional args
@@ -117,8 +118,8 @@ def _queue_reserved_task(name, task_id, resource_id, inner_args, inner_kwargs):
     and keyword arguments using the * and ** operators.
 
     The inner task is dispatched into a dedicated queue for a worker that is decided at dispatch
-    time. The logic deciding which queue receives a task is controlled through the
-    find_worker function.
+    time. The worker is selected by the resource manager's ReservationScheduler, which waits for
+    a reservation to be released when no worker is available.
 
     :param name:          The name of the task to be called
     :type name:           basestring
@@ -130,102 +131,53 @@ def _queue_reserved_task(name, task_id, resource_id, inner_args, inner_kwargs):
                           will ensure that no other tasks that want that same reservation will run
                           concurrently with yours.
     :type  resource_id:   basestring
+    :param queued_at:     The time (seconds since the epoch) this task was queued, used to
+                          measure dispatch latency.
+    :type  queued_at:     float
 
     :return: None
     """
-    while True:
-        try:
-            worker = get_worker_for_reservation(resource_id)
-        except NoWorkers:
-            pass
-        else:
-            break
-
-        try:
-            worker = _get_unreserved_worker()
-        except NoWorkers:
-            pass
-        else:
-            break
-
-        # No worker is ready for this work, so we need to wait
-        time.sleep(0.25)
+    worker_name = _get_scheduler().reserve(task_id, resource_id, queued_at=queued_at)
 
-    ReservedResource(task_id=task_id, worker_name=worker['name'], resource_id=resource_id).save()
+    ReservedResource(task_id=task_id, worker_name=worker_name, resource_id=resource_id).save()
 
-    inner_kwargs['routing_key'] = worker.name
+    inner_kwargs['routing_key'] = worker_name
     inner_kwargs['exchange'] = DEDICATED_QUEUE_EXCHANGE
     inner_kwargs['task_id'] = task_id
 
     try:
         celery.tasks[name].apply_async(*inner_args, **inner_kwargs)
     finally:
-        _release_resource.apply_async((task_id, ), routing_key=worker.name,
+        _release_resource.apply_async((task_id, ), routing_key=worker_name,
                                       exchange=DEDICATED_QUEUE_EXCHANGE)
 
 
-def _is_worker(worker_name):
-    """
-    Strip out workers that should never be assigned work. We need to check
-    via "startswith()" since we do not know which host the worker is running on.
-    """
-
-    if worker_name.startswith(SCHEDULER_WORKER_NAME) or \
-       worker_name.startswith(RESOURCE_MANAGER_QUEUE):
-        return False
-    return True
+_scheduler = None
 
 
-def get_worker_for_reservation(resource_id):
+def _get_scheduler():
     """
-    Return the Worker instance that is associated with a reservation of type resource_id. If
-    there are no workers with that reservation_id type a pulp.server.exceptions.NoWorkers
-    exception is raised.
+    Get the reservation scheduler of this resource manager process, creating it on first use.
 
-    :param resource_id:    The name of the resource you wish to reserve for your task.
-
-    :raises NoWorkers:     If all workers have reserved_resource entries associated with them.
-
-    :type resource_id:     basestring
-    :returns:              The Worker instance that has a reserved_resource entry of type
-                           `resource_id` associated with it.
-    :rtype:                pulp.server.db.model.resources.Worker
+    :return: The reservation scheduler.
+    :rtype:  pulp.server.async.reservations.ReservationScheduler
     """
-    reservation = ReservedResource.objects(resource_id=resource_id).first()
-    if reservation:
-        return Worker.objects(name=reservation['worker_name']).first()
-    else:
-        raise NoWorkers()
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ReservationScheduler(worker_filter=_is_worker)
+    return _scheduler
 
 
-def _get_unreserved_worker():
+def _is_worker(worker_name):
     """
-    Return the Worker instance that has no reserved_resource entries
-    associated with it. If there are no unreserved workers a
-    pulp.server.exceptions.NoWorkers exception is raised.
-
-    :raises NoWorkers: If all workers have reserved_resource entries associated with them.
-
-    :returns:          The Worker instance that has no reserved_resource
-                       entries associated with it.
-    :rtype:            pulp.server.db.model.resources.Worker
+    Strip out workers that should never be assigned work. We need to check
+    via "startswith()" since we do not know which host the worker is running on.
     """
 
-    # Build a mapping of queue names to Worker objects
-    workers_dict = dict((worker['name'], worker) for worker in Worker.objects.get_online())
-    worker_names = workers_dict.keys()
-    reserved_names = [r['worker_name'] for r in ReservedResource.objects.all()]
-
-    # Find an unreserved worker using set differences of the names, and filter
-    # out workers that should not be assigned work.
-    # NB: this is a little messy but set comprehensions are in python 2.7+
-    unreserved_workers = set(filter(_is_worker, worker_names)) - set(reserved_names)
-
-    try:
-        return workers_dict[unreserved_workers.pop()]
-    except KeyError:
-        # All workers are reserved
-        raise NoWorkers()
+    if worker_name.startswith(SCHEDULER_WORKER_NAME) or \
+       worker_name.startswith(RESOURCE_MANAGER_QUEUE):
+        return False
+    return True
 
 
 def _delete_worker(name, normal_shutdown=False):
@@ -259,6 +211,9 @@ def _delete_worker(name, normal_shutdown=False):
     # Delete all reserved_resource documents for the worker
     ReservedResource.objects(worker_name=name).delete()
 
+    # Let the resource manager know that the worker and its reservations are gone
+    ReservationEvent(worker_name=name).save()
+
     # If the worker is a resource manager, we also need to delete the associated lock
     if name.startswith(RESOURCE_MANAGER_WORKER_NAME):
         ResourceManagerLock.objects(name=name).delete()
@@ -295,6 +250,7 @@ def _release_resource(task_id):
 
         new_task.on_failure(exception, task_id, (), {}, MyEinfo)
     ReservedResource.objects(task_id=task_id).delete()
+    ReservationEvent(task_id=task_id).save()
 
 
 class TaskResult(object):
@@ -423,6 +379,7 @@ class ReservedTaskMixin(object):
         try:
             _queue_reserved_task.apply_async(
                 args=[task_name, inner_task_id, resource_id, args, kwargs],
+                kwargs={'queued_at': time.time()},
                 queue=RESOURCE_MANAGER_QUEUE
             )
         except Exception:
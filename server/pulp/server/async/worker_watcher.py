@@ -19,7 +19,7 @@ import logging
 
 from pulp.server.async.tasks import _delete_worker
 from pulp.server.constants import PULP_PROCESS_HEARTBEAT_INTERVAL
-from pulp.server.db.model import Worker
+from pulp.server.db.model import ReservationEvent, Worker
 
 
 _logger = logging.getLogger(__name__)
@@ -30,7 +30,8 @@ def handle_worker_heartbeat(worker_name):
     This is a generic function for updating worker heartbeat records.
 
     Existing Worker objects are searched for one to update. If an existing one is found, it is
-    updated. Otherwise a new Worker entry is created. Logging at the info level is also done.
+    updated. Otherwise a new Worker entry is created and a ReservationEvent is saved to notify
+    the resource manager. Logging at the info level is also done.
 
     :param worker_name: The hostname of the worker
     :type  worker_name: basestring
@@ -50,6 +51,10 @@ def handle_worker_heartbeat(worker_name):
     Worker.objects(name=worker_name).update_one(set__last_heartbeat=timestamp,
                                                 upsert=True)
 
+    if not existing_worker:
+        # Let the resource manager know that the worker can be assigned work
+        ReservationEvent(worker_name=worker_name).save()
+
     if(datetime.utcnow() - start > timedelta(seconds=PULP_PROCESS_HEARTBEAT_INTERVAL)):
         sec = (datetime.utcnow() - start).total_seconds()
         msg = _("Worker {name} heartbeat time {time}s exceeds heartbeat interval. Consider "
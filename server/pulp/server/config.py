@@ -121,7 +121,10 @@ _default_values = {
         'log_type': 'syslog',
         'key_url': '/pulp/gpg',
         'ks_url': '/pulp/ks',
-        'working_directory': '/var/cache/pulp'
+        'working_directory': '/var/cache/pulp',
+        'orphan_summary_max_age': '0',
+        'default_page_size': '1000',
+        'max_page_size': '10000',
     },
     'tasks': {
         'broker_url': 'qpid://localhost/',
@@ -131,6 +134,8 @@ _default_values = {
         'certfile': '/etc/pki/pulp/qpid/client.crt',
         'login_method': '',
         'worker_timeout': '30',
+        'progress_interval': '1',
+        'progress_min_delta': '1',
     },
     'lazy': {
         'redirect_host': socket.getfqdn(),
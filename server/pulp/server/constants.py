@@ -5,6 +5,7 @@ LOCAL_STORAGE = "/var/lib/pulp/"
 PULP_USER_METADATA_FIELDNAME = 'pulp_user_metadata'
 PULP_DJANGO_SETTINGS_MODULE = 'pulp.server.webservices.settings'
 PULP_STREAM_REQUEST_HEADER = 'Pulp-Stream-Request'
+PULP_RESUME_TOKEN_HEADER = 'Pulp-Resume-Token'
 SUPER_USER_ROLE = 'super-users'
 
 # The amount of time (in seconds) between process wakeups to "heartbeat" and perform their tasks.
@@ -10,6 +10,7 @@ BASE_URL = 'base_url'
 PATHS = 'paths'
 PRIORITY = 'priority'
 EXPIRES = 'expires'
+REFRESH_TIMEOUT = 'refresh_timeout'
 
 MAX_CONCURRENT = 'max_concurrent'
 MAX_SPEED = 'max_speed'
@@ -2,20 +2,31 @@ from collections import namedtuple
 from logging import getLogger
 from threading import Thread, RLock
 from Queue import Queue, Empty, Full
+from time import time
+import sys
 
 from nectar.listener import DownloadEventListener
 from nectar.report import DownloadReport as NectarDownloadReport, DOWNLOAD_SUCCEEDED
 from nectar.request import DownloadRequest
 
+from pulp.plugins.util.misc import paginate
 from pulp.server.content.sources.event import Started, Succeeded, Failed
-from pulp.server.content.sources.model import ContentSource, PrimarySource, \
-    DownloadReport, DownloadDetails, RefreshReport
+from pulp.server.content.sources.model import PrimarySource, \
+    DownloadReport, DownloadDetails, RefreshReport, resolve_sources, REGISTRY
 from pulp.server.managers import factory as managers
 
 
 log = getLogger(__name__)
 
 
+# The number of requests for which content sources are found
+# using a single content catalog query.
+RESOLVE_CHUNK_SIZE = 1000
+
+# The number of content sources refreshed concurrently.
+MAX_CONCURRENT_REFRESH = 4
+
+
 class DownloadFailed(Exception):
     """
     A serial download has failed.
@@ -38,12 +49,13 @@ class ContentContainer(object):
     def __init__(self, path=None, threaded=True):
         """
         :param path:     The absolute path to a directory containing
-                         content source descriptor files.
+                         content source descriptor files.  The descriptors are
+                         loaded from the process-wide descriptor registry.
         :type  path:     str
         :param threaded: Whether or not to use the threaded download method.
         :type  threaded: bool
         """
-        self.sources = ContentSource.load_all(path)
+        self.sources = REGISTRY.load(path)
         self.threaded = threaded
 
     def download(self, downloader, requests, listener=None):
@@ -77,26 +89,50 @@ class ContentContainer(object):
     def refresh(self, force=False):
         """
         Refresh the content catalog using available content sources.
+        Up to MAX_CONCURRENT_REFRESH sources are refreshed concurrently.  The refresh
+        of a source is abandoned when it takes longer than the source refresh_timeout.
+        A source already being refreshed in the process is not refreshed again; the
+        refresh in progress is waited for until its own timeout instead.
 
         :param force: Force refresh of content sources with unexpired catalog entries.
         :type force: bool
         :return: A list of refresh reports.
         :rtype: list of: pulp.server.content.sources.model.RefreshReport
         """
-        reports = []
+        sources = []
+        for source_id, source in sorted(self.sources.items()):
+            if force or not ENTRIES.has_entries(source):
+                sources.append(source)
+        reports = {}
+        refreshed = []
+        active = []
+        finished = Queue()
+        while sources or active:
+            while sources and len(active) < MAX_CONCURRENT_REFRESH:
+                thread = REFRESHES.start(sources.pop(0))
+                thread.notify(finished)
+                active.append(thread)
+            timeout = min(thread.deadline for thread in active) - time()
+            try:
+                thread = finished.get(timeout=max(timeout, 0))
+            except Empty:
+                now = time()
+                for thread in [t for t in active if t.deadline <= now]:
+                    active.remove(thread)
+                    reports[thread.source.id] = [thread.abandon()]
+                continue
+            if thread in active:
+                active.remove(thread)
+                reports[thread.source.id] = thread.reports
+                if thread.succeeded:
+                    refreshed.append(thread)
+        for source_id in reports:
+            ENTRIES.forget(source_id)
+        for thread in refreshed:
+            ENTRIES.refreshed(thread.source, thread.started)
         catalog = managers.content_catalog_manager()
-        for source_id, source in self.sources.items():
-            if force or not catalog.has_entries(source_id):
-                try:
-                    report = source.refresh()
-                    reports.extend(report)
-                except Exception, e:
-                    log.error('refresh %s, failed: %s', source_id, e)
-                    report = RefreshReport(source_id, '')
-                    report.errors.append(str(e))
-                    reports.append(report)
         catalog.purge_expired()
-        return reports
+        return [r for source_id in sorted(reports) for r in reports[source_id]]
 
     def purge_orphans(self):
         """
@@ -107,6 +143,213 @@ class ContentContainer(object):
         valid_ids = list(self.sources.keys())
         catalog = managers.content_catalog_manager()
         catalog.purge_orphans(valid_ids)
+        ENTRIES.clear()
+
+
+class EntriesCache(object):
+    """
+    Caches which content sources have unexpired entries in the content
+    catalog so that refreshing the catalog before each download does not
+    need to query the catalog for every content source.  The cache is
+    shared by all containers in the process.  A source is remembered as
+    having entries for TTL seconds at most and never past the expiration
+    of the first of its entries to expire.  A source that was refreshed
+    is remembered the same way, even when it contributed no entries, so
+    that it is not refreshed again before every download.
+    """
+
+    # Seconds a content source is remembered as having entries.
+    TTL = 300
+
+    def __init__(self):
+        self._lock = RLock()
+        self._until = {}
+
+    def has_entries(self, source):
+        """
+        Get whether the content source has unexpired entries in the catalog.
+        :param source: A content source.
+        :type source: ContentSource
+        :return: True if has entries.
+        :rtype: bool
+        """
+        with self._lock:
+            until = self._until.get(source.id)
+        if until is not None and time() < until:
+            return True
+        catalog = managers.content_catalog_manager()
+        expiration = catalog.earliest_expiration(source.id)
+        if expiration is None:
+            return False
+        with self._lock:
+            self._until[source.id] = min(time() + self.TTL, expiration)
+        return True
+
+    def refreshed(self, source, started):
+        """
+        Remember a content source that was refreshed successfully as having
+        entries until the entries added by the refresh expire.
+        :param source: A content source.
+        :type source: ContentSource
+        :param started: When the refresh started (seconds since the epoch).
+        :type started: float
+        """
+        with self._lock:
+            self._until[source.id] = started + min(self.TTL, source.expires)
+
+    def forget(self, source_id):
+        """
+        Forget a cached content source.
+        :param source_id: A content source ID.
+        :type source_id: str
+        """
+        with self._lock:
+            self._until.pop(source_id, None)
+
+    def clear(self):
+        """
+        Forget all cached content sources.
+        """
+        with self._lock:
+            self._until.clear()
+
+
+ENTRIES = EntriesCache()
+
+
+class RefreshRegistry(object):
+    """
+    Tracks the content source refreshes in progress in the process,
+    including those that were abandoned after the refresh timeout, so
+    that a content source is only refreshed by one thread at a time.
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self._running = {}
+
+    def start(self, source):
+        """
+        Start refreshing a content source unless it is already being refreshed.
+        :param source: A content source.
+        :type source: ContentSource
+        :return: The refresh of the content source in progress.
+        :rtype: SourceRefresh
+        """
+        with self._lock:
+            thread = self._running.get(source.id)
+            if thread is None:
+                thread = SourceRefresh(source, self)
+                self._running[source.id] = thread
+                thread.start()
+            return thread
+
+    def finished(self, thread):
+        """
+        Forget a refresh that has completed.
+        :param thread: The completed refresh.
+        :type thread: SourceRefresh
+        """
+        with self._lock:
+            if self._running.get(thread.source.id) is thread:
+                del self._running[thread.source.id]
+
+
+REFRESHES = RefreshRegistry()
+
+
+class SourceRefresh(Thread):
+    """
+    Refreshes the content catalog using a content source.
+    The thread is queued on the queues passed to notify() when the refresh
+    has completed.  Threads that are abandoned after the refresh timeout keep
+    running and their staged entries are published if they eventually complete.
+
+    :ivar source: The content source.
+    :type source: ContentSource
+    :ivar registry: The registry of refreshes in progress.
+    :type registry: RefreshRegistry
+    :ivar started: When the refresh started (seconds since the epoch).
+    :type started: float
+    :ivar deadline: When the refresh is abandoned (seconds since the epoch).
+    :type deadline: float
+    :ivar reports: The refresh reports.
+    :type reports: list of: RefreshReport
+    :ivar succeeded: The refresh completed without raising an exception.
+    :type succeeded: bool
+    """
+
+    def __init__(self, source, registry):
+        """
+        :param source: The content source.
+        :type source: ContentSource
+        :param registry: The registry of refreshes in progress.
+        :type registry: RefreshRegistry
+        """
+        super(SourceRefresh, self).__init__(name='refresh:%s' % source.id)
+        self.source = source
+        self.registry = registry
+        self.started = None
+        self.deadline = None
+        self.reports = []
+        self.succeeded = False
+        self._lock = RLock()
+        self._done = False
+        self._queues = []
+        self.setDaemon(True)
+
+    def start(self):
+        """
+        Start the thread and the refresh timeout.
+        """
+        self.started = time()
+        self.deadline = self.started + self.source.refresh_timeout
+        super(SourceRefresh, self).start()
+
+    def notify(self, finished):
+        """
+        Queue the thread on the specified queue when the refresh has completed,
+        right away when it already has.
+        :param finished: Used to notify a container that the refresh has completed.
+        :type finished: Queue
+        """
+        with self._lock:
+            if not self._done:
+                self._queues.append(finished)
+                return
+        finished.put(self)
+
+    def run(self):
+        """
+        The thread main.
+        """
+        try:
+            self.reports = list(self.source.refresh())
+            self.succeeded = True
+        except Exception, e:
+            log.error('refresh %s, failed: %s', self.source.id, e)
+            report = RefreshReport(self.source.id, '')
+            report.errors.append(str(e))
+            self.reports = [report]
+        finally:
+            self.registry.finished(self)
+            with self._lock:
+                self._done = True
+                queues, self._queues = self._queues, []
+            for queue in queues:
+                queue.put(self)
+
+    def abandon(self):
+        """
+        Abandon the refresh after it has timed out.
+        :return: A report of the timeout.
+        :rtype: RefreshReport
+        """
+        log.error('refresh %s, timed out after %d seconds',
+                  self.source.id, self.source.refresh_timeout)
+        report = RefreshReport(self.source.id, '')
+        report.errors.append('timed out')
+        return report
 
 
 class NectarListener(DownloadEventListener):
@@ -213,6 +456,20 @@ class Batch(object):
         """
         return self.container.sources
 
+    def resolved(self):
+        """
+        Get the requests with their content sources found.
+        The sources are found in chunks of requests using one content catalog
+        query per chunk.
+
+        :return: A generator of: pulp.server.content.sources.model.Request.
+        :rtype: generator
+        """
+        for chunk in paginate(self.requests, RESOLVE_CHUNK_SIZE):
+            resolve_sources(chunk, self.primary, self.sources)
+            for request in chunk:
+                yield request
+
     def __call__(self):
         """
         Begin processing the batch of requests.
@@ -248,10 +505,9 @@ class Serial(Batch):
         """
         report = DownloadReport()
         report.total_sources = len(self.sources)
-        for request in self.requests:
+        for request in self.resolved():
             event = Started(request)
             event(self.listener)
-            request.find_sources(self.primary, self.sources)
             for source, url in request.sources:
                 details = report.downloads.setdefault(source.id, DownloadDetails())
                 try:
@@ -424,12 +680,16 @@ class Threaded(Batch):
         report = DownloadReport()
         report.total_sources = len(self.sources)
 
+        # The sources are found for the next chunk of requests while
+        # the current one is being dispatched.
+        resolver = Resolver(self)
+        resolver.start()
         try:
-            for request in self.requests:
-                request.find_sources(self.primary, self.sources)
+            for request in resolver:
                 self.dispatch(request)
                 count += 1
         finally:
+            resolver.halt()
             self.in_progress.wait(count)
             for queue in self.queues.values():
                 queue.put(None)
@@ -449,6 +709,96 @@ class Threaded(Batch):
 Item = namedtuple('Item', ['request', 'url'])
 
 
+class Resolver(Thread):
+    """
+    Finds the content sources for the requests in a batch ahead of them being
+    dispatched.  The requests are resolved in chunks and passed to the
+    dispatching thread through a queue holding a few chunks.
+    Iterating the resolver yields the resolved requests.
+
+    :ivar batch: The batch being processed.
+    :type batch: Threaded
+    :ivar queue: Used to pass chunks of resolved requests between threads.
+        The end-of-queue marker (None) is queued when all requests are resolved.
+    :type queue: Queue
+    :ivar exc_info: The exception raised while resolving requests, as
+        returned by sys.exc_info().
+    :type exc_info: tuple
+    :ivar _halted: Flag indicating that a thread halt has been requested.
+    :type _halted: bool
+    """
+
+    # The number of chunks resolved ahead of dispatch.
+    AHEAD = 2
+
+    # Seconds to wait between checks for a halt while the queue is full.
+    POLL_INTERVAL = 1.0
+
+    def __init__(self, batch):
+        """
+        :param batch: The batch being processed.
+        :type batch: Threaded
+        """
+        super(Resolver, self).__init__(name='resolver')
+        self.batch = batch
+        self.queue = Queue(self.AHEAD)
+        self.exc_info = None
+        self._halted = False
+        self.setDaemon(True)
+
+    def run(self):
+        """
+        The thread main.
+        """
+        try:
+            for chunk in paginate(self.batch.requests, RESOLVE_CHUNK_SIZE):
+                resolve_sources(chunk, self.batch.primary, self.batch.sources)
+                if not self.put(chunk):
+                    return
+        except Exception:
+            log.exception(self.getName())
+            self.exc_info = sys.exc_info()
+        finally:
+            self.put(None)
+
+    def put(self, chunk):
+        """
+        Queue a chunk of resolved requests.
+
+        :param chunk: A list of resolved requests or None to mark the end.
+        :type chunk: list
+        :return: False if the thread was halted before the chunk could be queued.
+        :rtype: bool
+        """
+        while not self._halted:
+            try:
+                self.queue.put(chunk, timeout=self.POLL_INTERVAL)
+                return True
+            except Full:
+                continue
+        return False
+
+    def halt(self):
+        """
+        Halt the resolver thread.
+        """
+        self._halted = True
+
+    def __iter__(self):
+        """
+        Iterate the resolved requests.
+        Re-raises the exception raised while resolving requests, if any.
+        """
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                break
+            for request in chunk:
+                yield request
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+
+
 class RequestQueue(Thread):
     """
     A thread that associates a queue and a downloader.  The queue, wrapped in a
@@ -24,12 +24,16 @@ are supported:
      How long until cataloged information expires. The default unit is seconds however
      an optional suffix can (and should) be used.  Supported suffixes:
      (s=seconds, m=minutes, h=hours, d=days)
+ - refresh_timeout <str>
+     How long refreshing the catalog may take before it is abandoned. Uses the
+     same units as expires.  (1h is the default).
  - base_url <str>
      The URL used to fetch info used to refresh the catalog.
  - paths <str>
      An optional list of URL relative paths.  Delimited by space or newline.
  - max_concurrent <int>
-     Limit the number of concurrent downloads.
+     Limit the number of concurrent downloads.  Also limits the number of
+     URLs refreshed concurrently.
  - max_speed <int>
      Limit the bandwidth used during downloads.
  - ssl_ca_cert <str>
@@ -87,6 +91,7 @@ log = getLogger(__name__)
 DEFAULT = {
     constants.PRIORITY: '0',
     constants.EXPIRES: '24h',
+    constants.REFRESH_TIMEOUT: '1h',
     constants.MAX_CONCURRENT: '2',
     constants.SSL_VALIDATION: 'true'
 }
@@ -99,6 +104,7 @@ SCHEMA = [
         (constants.BASE_URL, REQUIRED, ANY),
         (constants.PRIORITY, OPTIONAL, NUMBER),
         (constants.EXPIRES, OPTIONAL, ANY),
+        (constants.REFRESH_TIMEOUT, OPTIONAL, ANY),
         (constants.PATHS, OPTIONAL, ANY),
         (constants.MAX_CONCURRENT, OPTIONAL, NUMBER),
         (constants.MAX_SPEED, OPTIONAL, NUMBER),
@@ -17,12 +17,15 @@ import re
 from urlparse import urljoin
 from logging import getLogger
 from ConfigParser import ConfigParser
+from threading import Thread, RLock
+from Queue import Queue, Empty
 
 from pulp.common.constants import PRIMARY_ID
 from pulp.plugins.conduits.cataloger import CatalogerConduit
 from pulp.plugins.loader import api as plugins
 from pulp.server.content.sources import constants
 from pulp.server.content.sources.descriptor import is_valid, to_seconds, DEFAULT
+from pulp.server.db.model.content import ContentCatalog
 from pulp.server.managers import factory as managers
 
 
@@ -35,6 +38,7 @@ PATHS_REGEX = re.compile(r'\s+')
 REFRESHING = 'Refreshing [%s] url:%s'
 REFRESH_SUCCEEDED = 'Refresh [%s] succeeded.  Added: %d, Deleted: %d'
 REFRESH_FAILED = 'Refresh [%s] url: %s, failed: %s'
+REFRESH_PUBLISHED = 'Refresh [%s] published.  Purged: %s'
 
 
 class Request(object):
@@ -81,7 +85,16 @@ class Request(object):
         self.errors = []
         self.data = None
 
-    def find_sources(self, primary, alternates):
+    @property
+    def locator(self):
+        """
+        The content catalog locator for the requested unit.
+        :return: The locator.
+        :rtype: str
+        """
+        return ContentCatalog.get_locator(self.type_id, self.unit_key)
+
+    def find_sources(self, primary, alternates, entries=None):
         """
         Find and set the list of content sources in the order they are to
         be used to satisfy the request.  The alternate sources are
@@ -90,10 +103,15 @@ class Request(object):
         :type primary: ContentSource
         :param alternates: A list of alternative sources.
         :type alternates: dict
+        :param entries: The content catalog entries for the requested unit.
+            Fetched from the catalog when not specified.
+        :type entries: list
         """
         resolved = [(primary, self.url)]
-        catalog = managers.content_catalog_manager()
-        for entry in catalog.find(self.type_id, self.unit_key):
+        if entries is None:
+            catalog = managers.content_catalog_manager()
+            entries = catalog.find(self.type_id, self.unit_key)
+        for entry in entries:
             source_id = entry[constants.SOURCE_ID]
             source = alternates.get(source_id)
             if source is None:
@@ -104,6 +122,30 @@ class Request(object):
         self.sources = iter(resolved)
 
 
+def resolve_sources(requests, primary, alternates):
+    """
+    Find and set the list of content sources for each of the requests
+    using a single content catalog query.
+    See: Request.find_sources().
+    :param requests: A list of: Request.
+    :type requests: list
+    :param primary: The primary content source.
+    :type primary: ContentSource
+    :param alternates: A list of alternative sources.
+    :type alternates: dict
+    """
+    if alternates:
+        locators = [request.locator for request in requests]
+        catalog = managers.content_catalog_manager()
+        entries = catalog.find_by_locators(locators)
+    else:
+        # Without alternate sources there is nothing to look up
+        locators = [None] * len(requests)
+        entries = {}
+    for request, locator in zip(requests, locators):
+        request.find_sources(primary, alternates, entries.get(locator, []))
+
+
 class ContentSource(object):
     """
     Represents a content source.
@@ -215,6 +257,16 @@ class ContentSource(object):
         """
         return to_seconds(self.descriptor[constants.EXPIRES])
 
+    @property
+    def refresh_timeout(self):
+        """
+        Get the duration in seconds that refreshing the content catalog
+        using this source may take before it is abandoned.
+        :return: The timeout in seconds.
+        :rtype int
+        """
+        return to_seconds(self.descriptor[constants.REFRESH_TIMEOUT])
+
     @property
     def base_url(self):
         """
@@ -296,30 +348,97 @@ class ContentSource(object):
     def refresh(self):
         """
         Refresh the content catalog using the cataloger plugin as
-        defined by the "type" descriptor property.
+        defined by the "type" descriptor property.  The entries are
+        added to a staged generation that replaces the entries from
+        previous refreshes when all of the URLs have been refreshed.
+        Up to max_concurrent URLs are refreshed concurrently.
         :return: The list of refresh reports.
         :rtype: list of: RefreshReport
         """
-        reports = []
+        urls = self.urls
         conduit = self.get_conduit()
-        plugin = self.get_cataloger()
-        for url in self.urls:
-            conduit.reset()
-            report = RefreshReport(self.id, url)
-            log.info(REFRESHING, self.id, url)
-            try:
-                plugin.refresh(conduit, self.descriptor, url)
-                log.info(REFRESH_SUCCEEDED, self.id, conduit.added_count, conduit.deleted_count)
-                report.succeeded = True
-                report.added_count = conduit.added_count
-                report.deleted_count = conduit.deleted_count
-            except Exception, e:
-                log.error(REFRESH_FAILED, self.id, url, e)
-                report.errors.append(str(e))
-            finally:
-                reports.append(report)
+        conduit.stage()
+        concurrent = min(self.max_concurrent, len(urls))
+        if concurrent > 1:
+            reports = self._refresh_concurrently(urls, concurrent, conduit.generation)
+        else:
+            plugin = self.get_cataloger()
+            reports = [self._refresh_url(conduit, plugin, url) for url in urls]
+        # Entries from previous refreshes are only purged when every URL was
+        # refreshed, otherwise they remain until they expire.
+        succeeded = all(report.succeeded for report in reports)
+        purged = conduit.publish(purge=succeeded)
+        log.debug(REFRESH_PUBLISHED, self.id, purged)
         return reports
 
+    def _refresh_concurrently(self, urls, concurrent, generation):
+        """
+        Refresh the content catalog using the specified URLs in threads.
+        Each thread uses its own conduit and cataloger plugin.
+        :param urls: The URLs to refresh.
+        :type urls: list
+        :param concurrent: The number of threads.
+        :type concurrent: int
+        :param generation: The ID of the staged generation.
+        :type generation: str
+        :return: The list of refresh reports ordered by URL.
+        :rtype: list of: RefreshReport
+        """
+        reports = {}
+        queue = Queue()
+        for url in urls:
+            queue.put(url)
+
+        def worker(conduit, plugin):
+            while True:
+                try:
+                    url = queue.get_nowait()
+                except Empty:
+                    break
+                reports[url] = self._refresh_url(conduit, plugin, url)
+
+        threads = []
+        for n in range(concurrent):
+            conduit = self.get_conduit()
+            conduit.stage(generation)
+            plugin = self.get_cataloger()
+            thread = Thread(target=worker, args=(conduit, plugin))
+            thread.setName('refresh:%s:%d' % (self.id, n))
+            thread.setDaemon(True)
+            threads.append(thread)
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return [reports[url] for url in urls]
+
+    def _refresh_url(self, conduit, plugin, url):
+        """
+        Refresh the content catalog using the specified URL.
+        :param conduit: The conduit used by the plugin.
+        :type conduit: CatalogerConduit
+        :param plugin: A cataloger plugin.
+        :type plugin: pulp.plugins.cataloger.Cataloger
+        :param url: The URL to refresh.
+        :type url: str
+        :return: The refresh report.
+        :rtype: RefreshReport
+        """
+        conduit.reset()
+        report = RefreshReport(self.id, url)
+        log.info(REFRESHING, self.id, url)
+        try:
+            plugin.refresh(conduit, self.descriptor, url)
+            conduit.flush()
+            log.info(REFRESH_SUCCEEDED, self.id, conduit.added_count, conduit.deleted_count)
+            report.succeeded = True
+            report.added_count = conduit.added_count
+            report.deleted_count = conduit.deleted_count
+        except Exception, e:
+            log.error(REFRESH_FAILED, self.id, url, e)
+            report.errors.append(str(e))
+        return report
+
     def dict(self):
         """
         Dictionary representation.
@@ -344,6 +463,79 @@ class ContentSource(object):
         return self.priority < other.priority
 
 
+class DescriptorRegistry(object):
+    """
+    Process-wide cache of loaded content source descriptors.
+    The descriptors in a directory are loaded and validated again only
+    when the modification time of the directory or of a file in the
+    directory has changed.  Loading returns new ContentSource objects
+    each time so callers may not affect each other.
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self._loaded = {}
+
+    @staticmethod
+    def stamp(conf_d):
+        """
+        Get a stamp identifying the current version of the descriptor files.
+        :param conf_d: The absolute path to a directory containing
+            content source descriptor files.
+        :type conf_d: str
+        :return: A tuple of: (mtime, list of: (name, mtime, size)).
+            None when the directory cannot be read.
+        :rtype: tuple
+        """
+        try:
+            names = sorted(os.listdir(conf_d))
+            mtime = os.stat(conf_d).st_mtime
+        except OSError:
+            return None
+        files = []
+        for name in names:
+            try:
+                st = os.stat(os.path.join(conf_d, name))
+            except OSError:
+                continue
+            files.append((name, st.st_mtime, st.st_size))
+        return mtime, tuple(files)
+
+    def load(self, conf_d=None):
+        """
+        Load all enabled content sources.
+        See: ContentSource.load_all().
+        :param conf_d: The absolute path to a directory containing
+            content source descriptor files.
+        :type conf_d: str
+        :return: Dictionary of: ContentSource keyed by source_id.
+        :rtype: dict
+        """
+        _dir = conf_d or ContentSource.CONF_D
+        stamp = self.stamp(_dir)
+        with self._lock:
+            loaded = self._loaded.get(_dir)
+        if stamp is None or loaded is None or loaded[0] != stamp:
+            sources = ContentSource.load_all(conf_d)
+            descriptors = dict((s.id, s.descriptor) for s in sources.values())
+            if stamp is not None:
+                with self._lock:
+                    self._loaded[_dir] = (stamp, descriptors)
+            return sources
+        return dict((source_id, ContentSource(source_id, dict(descriptor)))
+                    for source_id, descriptor in loaded[1].items())
+
+    def clear(self):
+        """
+        Discard all loaded descriptors.
+        """
+        with self._lock:
+            self._loaded.clear()
+
+
+REGISTRY = DescriptorRegistry()
+
+
 class PrimarySource(ContentSource):
     """
     Specialized content source used to ensure ordering and provides
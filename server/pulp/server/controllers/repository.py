@@ -1,6 +1,9 @@
 from gettext import gettext as _
+from collections import OrderedDict
 from itertools import chain
+import base64
 import copy
+import json
 import logging
 import os
 import sys
@@ -15,6 +18,8 @@ from nectar.config import DownloaderConfig
 from nectar.request import DownloadRequest
 from nectar.downloaders.threaded import HTTPThreadedDownloader
 from nectar.listener import DownloadEventListener
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
 from pulp.common import dateutils, error_codes, tags
 from pulp.common.config import parse_bool, Unparsable
@@ -50,6 +55,8 @@ from pulp.server.util import InvalidChecksumType
 
 _logger = logging.getLogger(__name__)
 
+DUPLICATE_KEY_ERROR = 11000
+
 PATH_DOWNLOADED = 'downloaded'
 CATALOG_ENTRY = 'catalog_entry'
 UNIT_ID = 'unit_id'
@@ -170,10 +177,46 @@ def get_mongoengine_unit_querysets(repo_id, repo_content_unit_q=None, file_units
             yield query_set
 
 
+def get_resume_token(unit_type_id, unit_id):
+    """
+    Create an opaque token that resumes a repository content search after the given unit.
+
+    :param unit_type_id: The type ID of the last unit returned.
+    :type  unit_type_id: str
+    :param unit_id:      The ID of the last unit returned.
+    :type  unit_id:      str
+
+    :return: A token that may be passed to find_repo_content_units() as resume_token.
+    :rtype:  str
+    """
+    return base64.urlsafe_b64encode(json.dumps([unit_type_id, unit_id]))
+
+
+def resume_token_spec(resume_token):
+    """
+    Build the query for the RepositoryContentUnits that come after the unit identified by
+    a resume token, in (unit_type_id, unit_id) order.
+
+    :param resume_token: A token created by get_resume_token().
+    :type  resume_token: str
+
+    :return: A mongo spec for RepositoryContentUnits.
+    :rtype:  dict
+
+    :raises pulp_exceptions.InvalidValue: if the token is not valid
+    """
+    try:
+        unit_type_id, unit_id = json.loads(base64.urlsafe_b64decode(str(resume_token)))
+    except (TypeError, ValueError):
+        raise pulp_exceptions.InvalidValue(['resume_token'])
+    return {'$or': [{'unit_type_id': {'$gt': unit_type_id}},
+                    {'unit_type_id': unit_type_id, 'unit_id': {'$gt': unit_id}}]}
+
+
 def find_repo_content_units(
         repository, repo_content_unit_q=None,
         units_q=None, unit_fields=None, limit=None, skip=None,
-        yield_content_unit=False):
+        yield_content_unit=False, resume_token=None):
     """
     Search content units associated with a given repository.
 
@@ -182,6 +225,12 @@ def find_repo_content_units(
     ContentUnit. If yield_content_unit is set to true then the ContentUnit will be yielded instead
     of the RepoContentUnit.
 
+    Results are ordered by unit type and unit ID. The associations are read with a cursor and
+    the units are fetched a page of associations at a time, so memory use does not depend on the
+    size of the repository. When units_q is not specified, skip and limit are applied by the
+    database. Deep pages are better fetched with a resume token created by get_resume_token()
+    from the last unit of the previous page than with a large skip.
+
     :param repository: The repository to search.
     :type repository: pulp.server.db.model.Repository
     :param repo_content_unit_q: Any query filters to apply to the RepoContentUnits.
@@ -197,35 +246,54 @@ def find_repo_content_units(
     :param yield_content_unit: Whether we should yield a ContentUnit or RepositoryContentUnit.
         If True then a ContentUnit will be yielded. Defaults to False
     :type yield_content_unit: bool
+    :param resume_token: Only return units after the unit the token was created for.
+    :type resume_token: str
 
     :return: Content unit assoociations matching the query.
     :rtype: generator of pulp.server.db.model.ContentUnit or
         pulp.server.db.model.RepositoryContentUnit
 
+    :raises pulp_exceptions.InvalidValue: if the resume token is not valid
     """
 
     qs = model.RepositoryContentUnit.objects(q_obj=repo_content_unit_q,
                                              repo_id=repository.repo_id)
-
-    type_map = {}
-    content_units = {}
+    if resume_token:
+        qs = qs.filter(__raw__=resume_token_spec(resume_token))
+    # served by the (repo_id, unit_type_id, unit_id) index
+    qs = qs.order_by('unit_type_id', 'unit_id')
+
+    if units_q is None:
+        # Each association matches exactly one unit
+        if skip:
+            qs = qs.skip(skip)
+        if limit:
+            qs = qs.limit(limit)
+        skip = limit = None
 
     yield_count = 1
     skip_count = 0
 
-    for repo_content_unit in qs:
-        id_set = type_map.setdefault(repo_content_unit.unit_type_id, set())
-        id_set.add(repo_content_unit.unit_id)
-        content_unit_set = content_units.setdefault(repo_content_unit.unit_type_id, dict())
-        content_unit_set[repo_content_unit.unit_id] = repo_content_unit
-
-    for unit_type, unit_ids in type_map.iteritems():
-        _model = plugin_api.get_unit_model_by_id(unit_type)
-        qs = _model.objects(q_obj=units_q, __raw__={'_id': {'$in': list(unit_ids)}})
-        if unit_fields:
-            qs = qs.only(*unit_fields)
+    for page in paginate(qs):
+        type_map = {}
+        for repo_content_unit in page:
+            id_list = type_map.setdefault(repo_content_unit.unit_type_id, [])
+            id_list.append(repo_content_unit.unit_id)
+
+        content_units = {}
+        for unit_type, unit_ids in type_map.iteritems():
+            _model = plugin_api.get_unit_model_by_id(unit_type)
+            units = _model.objects(q_obj=units_q, __raw__={'_id': {'$in': unit_ids}})
+            if unit_fields:
+                units = units.only(*unit_fields)
+            for unit in units:
+                content_units[(unit_type, unit.id)] = unit
+
+        for repo_content_unit in page:
+            unit = content_units.get((repo_content_unit.unit_type_id, repo_content_unit.unit_id))
+            if unit is None:
+                continue
 
-        for unit in qs:
             if skip and skip_count < skip:
                 skip_count += 1
                 continue
@@ -233,9 +301,8 @@ def find_repo_content_units(
             if yield_content_unit:
                 yield unit
             else:
-                cu = content_units[unit_type][unit.id]
-                cu.unit = unit
-                yield cu
+                repo_content_unit.unit = unit
+                yield repo_content_unit
 
             if limit:
                 if yield_count >= limit:
@@ -334,6 +401,98 @@ def associate_single_unit(repository, unit):
         upsert=True)
 
 
+def associate_units(repository, units):
+    """
+    Associate units to a repository in bulk.
+
+    This is the bulk equivalent of associate_single_unit(). Associations are upserted in
+    unordered batches; the "created" timestamp is only set on new associations while "updated"
+    is always set. The repository's content_unit_counts are incremented by the number of new
+    associations of each type.
+
+    :param repository: The repository to update.
+    :type repository: pulp.server.db.model.Repository
+    :param units: The units to associate to the repository.
+    :type units: iterable of pulp.server.db.model.ContentUnit
+
+    :return: The number of units newly associated to the repository.
+    :rtype: int
+    """
+    return associate_units_by_id(repository.repo_id,
+                                 ((unit._content_type_id, unit.id) for unit in units))
+
+
+def associate_units_by_id(repo_id, unit_refs, update_existing=True):
+    """
+    Associate units to a repository in bulk, identifying the units by type and ID.
+
+    See associate_units().
+
+    :param repo_id: ID of the repository to update.
+    :type repo_id: str
+    :param unit_refs: The units to associate to the repository.
+    :type unit_refs: iterable of (unit_type_id, unit_id) tuples
+    :param update_existing: If False, associations that already exist are left untouched rather
+                            than having their "updated" timestamp set.
+    :type update_existing: bool
+
+    :return: The number of units newly associated to the repository.
+    :rtype: int
+    """
+    collection = model.RepositoryContentUnit._get_collection()
+    added = {}
+
+    for page in paginate(unit_refs):
+        current_timestamp = dateutils.now_utc_timestamp()
+        formatted_datetime = dateutils.format_iso8601_utc_timestamp(current_timestamp)
+        # duplicates within a batch would race each other on the unique index
+        refs = list(OrderedDict.fromkeys(page))
+        if update_existing:
+            document = {'$setOnInsert': {'created': formatted_datetime},
+                        '$set': {'updated': formatted_datetime}}
+        else:
+            document = {'$setOnInsert': {'created': formatted_datetime,
+                                         'updated': formatted_datetime}}
+        requests = [UpdateOne({'repo_id': repo_id, 'unit_type_id': unit_type_id,
+                               'unit_id': unit_id}, document, upsert=True)
+                    for unit_type_id, unit_id in refs]
+        for index in _bulk_upsert(collection, requests):
+            unit_type_id = refs[index][0]
+            added[unit_type_id] = added.get(unit_type_id, 0) + 1
+
+    for unit_type_id, count in added.iteritems():
+        update_unit_count(repo_id, unit_type_id, count)
+    if added:
+        update_last_unit_added(repo_id)
+    return sum(added.itervalues())
+
+
+def _bulk_upsert(collection, requests):
+    """
+    Perform an unordered bulk write of upserts.
+
+    When the same document is upserted concurrently, one of the inserts fails with a duplicate
+    key error. Those requests are retried once, at which point they update the existing document.
+
+    :param collection: The collection to write to.
+    :type collection: pymongo.collection.Collection
+    :param requests: The upsert requests.
+    :type requests: list of pymongo.UpdateOne
+
+    :return: The indexes of the requests that inserted a document.
+    :rtype: list of int
+    """
+    try:
+        result = collection.bulk_write(requests, ordered=False)
+    except BulkWriteError, e:
+        errors = e.details['writeErrors']
+        if any(error['code'] != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        collection.bulk_write([requests[error['index']] for error in errors], ordered=False)
+        return [upserted['index'] for upserted in e.details['upserted']]
+    return result.upserted_ids.keys()
+
+
 def disassociate_units(repository, unit_iterable):
     """
     Disassociate all units in the iterable from the repository.
@@ -5,41 +5,110 @@ from pulp.plugins.types import database as types_db
 from pulp.plugins.util import misc
 
 
-def find_units(units, pagination_size=50):
+# Units are looked up by digest in larger pages since the query is a single indexed $in.
+DIGEST_PAGINATION_SIZE = 5000
+
+
+def find_units(units, pagination_size=None, by_digest=False):
     """
     Query for units matching the unit key fields of an iterable of ContentUnit objects.
 
     This requires that all the ContentUnit objects are of the same content type.
 
+    When by_digest is True, units are matched on the indexed digest of their unit key instead of
+    on the unit key fields themselves, which is much faster for large numbers of units. The unit
+    keys of the units found are compared with the requested ones so that a digest collision does
+    not yield an unrelated unit, and the requested units that are not found by digest are looked
+    up by unit key among the stored units that have no digest.
+
     :param units: Iterable of content units with the unit key fields specified.
     :type units: iterable of pulp.server.db.model.ContentUnit
     :param pagination_size: How large a page size to use when querying units.
-    :type pagination_size: int (default 50)
+    :type pagination_size: int (default 50, or DIGEST_PAGINATION_SIZE when by_digest is True)
+    :param by_digest: Match units on the digest of their unit key.
+    :type by_digest: bool
 
     :returns: unit models that pulp already knows about.
     :rtype: Generator of pulp.server.db.model.ContentUnit
     """
+    if pagination_size is None:
+        pagination_size = DIGEST_PAGINATION_SIZE if by_digest else 50
+
     # get the class from the first unit
     model_class = None
 
     for units_group in misc.paginate(units, pagination_size):
-        q_object = mongoengine.Q()
-        # Build a query for the units in this group
-        for unit in units_group:
-            if model_class is None:
-                model_class = unit.__class__
+        if model_class is None:
+            model_class = units_group[0].__class__
 
-            # Build the query for all the units, the | operator here
-            # creates the equivalent of a mongo $or of all the unit keys
-            unit_q_obj = mongoengine.Q(**unit.unit_key)
-            q_object = q_object | unit_q_obj
+        if by_digest:
+            for found_unit in _find_units_by_digest(model_class, units_group):
+                yield found_unit
+            continue
 
         # Get this group of units
-        query = model_class.objects(q_object)
+        for found_unit in model_class.objects(_unit_key_q(units_group)):
+            yield found_unit
+
+
+def _find_units_by_digest(model_class, units):
+    """
+    Query for units matching the unit keys of a page of units by unit key digest.
+
+    :param model_class: The model class of the units.
+    :type model_class: type
+    :param units: The units with the unit key fields specified.
+    :type units: list of pulp.server.db.model.ContentUnit
 
-        for found_unit in query:
+    :returns: unit models that pulp already knows about.
+    :rtype: Generator of pulp.server.db.model.ContentUnit
+    """
+    missing = dict((_unit_key_tuple(unit), unit) for unit in units)
+    digests = set(unit.unit_key_as_digest() for unit in units)
+    for found_unit in model_class.objects(_unit_key_digest__in=list(digests)):
+        # a unit with a colliding digest has a different unit key
+        if missing.pop(_unit_key_tuple(found_unit), None) is not None:
             yield found_unit
 
+    if not missing:
+        return
+
+    # units saved without going through the pre_save signal have no digest
+    query = model_class.objects(mongoengine.Q(_unit_key_digest=None) &
+                                _unit_key_q(missing.itervalues()))
+    for found_unit in query:
+        if missing.pop(_unit_key_tuple(found_unit), None) is not None:
+            yield found_unit
+
+
+def _unit_key_q(units):
+    """
+    Build a query matching the unit keys of units.
+
+    :param units: Content units with the unit key fields specified.
+    :type units: iterable of pulp.server.db.model.ContentUnit
+
+    :returns: The query.
+    :rtype: mongoengine.Q
+    """
+    q_object = mongoengine.Q()
+    for unit in units:
+        # Build the query for all the units, the | operator here
+        # creates the equivalent of a mongo $or of all the unit keys
+        q_object = q_object | mongoengine.Q(**unit.unit_key)
+    return q_object
+
+
+def _unit_key_tuple(unit):
+    """
+    :param unit: A content unit with the unit key fields specified.
+    :type unit: pulp.server.db.model.ContentUnit
+
+    :returns: The unit key of the unit in a hashable form.
+    :rtype: tuple
+    """
+    return tuple(sorted(unit.unit_key.items()))
+
 
 def get_unit_key_fields_for_type(type_id):
     """
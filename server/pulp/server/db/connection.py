@@ -218,7 +218,7 @@ class UnsafeRetry(object):
                           'find', 'find_one', 'count', 'create_index', 'ensure_index',
                           'drop_index', 'drop_indexes', 'reindex', 'index_information', 'options',
                           'group', 'rename', 'distinct', 'map_reduce', 'inline_map_reduce',
-                          'find_and_modify')
+                          'find_and_modify', 'bulk_write')
 
     @classmethod
     def decorate_instance(cls, instance, full_name):
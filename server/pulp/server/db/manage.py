@@ -162,6 +162,7 @@ def ensure_database_indexes():
     model.RepositoryContentUnit.ensure_indexes()
     model.Repository.ensure_indexes()
     model.ReservedResource.ensure_indexes()
+    model.ReservationEvent.ensure_indexes()
     model.TaskStatus.ensure_indexes()
     model.Worker.ensure_indexes()
     model.CeleryBeatLock.ensure_indexes()
@@ -181,6 +182,7 @@ def ensure_database_indexes():
                                      "unit key. This is not allowed because the platform handles"
                                      "it for you." % unit_type)
         model_class._meta['indexes'].append(unit_key_index)
+        model_class._meta['indexes'].append('_unit_key_digest')
         model_class._meta['index_specs'] = \
             model_class._build_index_specs(model_class._meta['indexes'])
         model_class.ensure_indexes()
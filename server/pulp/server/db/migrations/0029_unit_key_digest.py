@@ -0,0 +1,29 @@
+"""
+This migration stores the digest of the unit key on every unit of all mongoengine based types so
+that units can be looked up by digest.
+"""
+from pymongo import UpdateOne
+
+from pulp.plugins.loader.manager import PluginManager
+from pulp.plugins.util.misc import paginate
+
+
+def migrate(*args, **kwargs):
+    """
+    Perform the migration as described in this module's docblock.
+
+    :param args:   unused
+    :type  args:   list
+    :param kwargs: unused
+    :type  kwargs: dict
+    """
+    plugin_manager = PluginManager()
+    for unit_type, model_class in plugin_manager.unit_models.items():
+        collection = model_class._get_collection()
+        units = model_class.objects(__raw__={'_unit_key_digest': {'$exists': False}})
+        units = units.only('id', *model_class.unit_key_fields).no_cache()
+        for page in paginate(units, 1000):
+            requests = [UpdateOne({'_id': unit.id},
+                                  {'$set': {'_unit_key_digest': unit.unit_key_as_digest()}})
+                        for unit in page]
+            collection.bulk_write(requests, ordered=False)
@@ -0,0 +1,39 @@
+"""
+This migration moves the consumer profiles stored on every repo_profile_applicability document
+to the applicability_profiles collection, where each profile is stored once with its
+profile_hash as the _id.
+"""
+import datetime
+
+from pymongo import UpdateOne
+
+from pulp.common import dateutils
+from pulp.plugins.util.misc import paginate
+from pulp.server.db import connection
+
+
+def migrate(*args, **kwargs):
+    """
+    Perform the migration as described in this module's docblock.
+
+    :param args:   unused
+    :type  args:   list
+    :param kwargs: unused
+    :type  kwargs: dict
+    """
+    db = connection.get_database()
+    rpa_collection = db['repo_profile_applicability']
+    profile_collection = db['applicability_profiles']
+    applicabilities = rpa_collection.find({'profile': {'$exists': True}},
+                                          projection=['profile_hash', 'profile'])
+    now = datetime.datetime.now(dateutils.utc_tz())
+    for page in paginate(applicabilities, 100):
+        profiles = dict((a['profile_hash'], a['profile']) for a in page)
+        requests = [UpdateOne({'_id': profile_hash},
+                              {'$set': {'last_referenced': now},
+                               '$setOnInsert': {'profile': profile}},
+                              upsert=True)
+                    for profile_hash, profile in profiles.items()]
+        profile_collection.bulk_write(requests, ordered=False)
+        rpa_collection.update_many({'_id': {'$in': [a['_id'] for a in page]}},
+                                   {'$unset': {'profile': ''}})
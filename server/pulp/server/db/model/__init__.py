@@ -110,6 +110,15 @@ class Repository(AutoRetryDocument):
     :type last_unit_added: UTCDateTimeField
     :ivar last_unit_removed: Datetime of the most recent occurence of removing a unit from the repo
     :type last_unit_removed: UTCDateTimeField
+    :ivar last_applicability_regeneration: Datetime at which the most recent regeneration of the
+                                           applicability data of the repo started
+    :type last_applicability_regeneration: UTCDateTimeField
+    :ivar pending_applicability_regeneration: The queued regeneration of the applicability data
+                                              of the repo that is in progress: a unique token,
+                                              the datetime it started, the number of batches
+                                              that have yet to succeed and the ids of the units
+                                              added since the last regeneration
+    :type pending_applicability_regeneration: mongoengine.DictField
     :ivar _ns: (Deprecated) Namespace of repo, included for backwards compatibility.
     :type _is: mongoengine.StringField
     """
@@ -125,6 +134,8 @@ class Repository(AutoRetryDocument):
     content_unit_counts = DictField(default={})
     last_unit_added = UTCDateTimeField()
     last_unit_removed = UTCDateTimeField()
+    last_applicability_regeneration = UTCDateTimeField()
+    pending_applicability_regeneration = DictField()
 
     # For backward compatibility
     _ns = StringField(default='repos')
@@ -169,7 +180,8 @@ class Repository(AutoRetryDocument):
                     self.notes[key] = value
 
         # These keys may not be changed.
-        prohibited = ['content_unit_counts', 'repo_id', 'last_unit_added', 'last_unit_removed']
+        prohibited = ['content_unit_counts', 'repo_id', 'last_unit_added', 'last_unit_removed',
+                      'last_applicability_regeneration', 'pending_applicability_regeneration']
         [setattr(self, key, value) for key, value in repo_delta.items() if key not in prohibited]
 
 
@@ -393,6 +405,34 @@ class ReservedResource(AutoRetryDocument):
             'allow_inheritance': False}
 
 
+class ReservationEvent(AutoRetryDocument):
+    """
+    Instances of this class announce changes to reservations and workers to the resource
+    manager. The collection is capped so the resource manager can follow it with a tailable
+    cursor rather than polling the reserved_resources and workers collections.
+
+    An event with a task_id announces that the reservation held by that task was released.
+    An event without a task_id announces that the named worker came online or went away.
+
+    :ivar worker_name:   The name of the worker associated with the event.
+    :type worker_name:   mongoengine.StringField
+    :ivar task_id:       The uuid of the task whose reservation was released.
+    :type task_id:       mongoengine.StringField
+    :ivar resource_id:   The name of the resource that was released.
+    :type resource_id:   mongoengine.StringField
+    """
+
+    worker_name = StringField()
+    task_id = StringField()
+    resource_id = StringField()
+
+    meta = {'collection': 'reservation_events',
+            'indexes': [],  # capped collection that is only read in natural order
+            'max_documents': 1000,
+            'max_size': 1024 * 1024,
+            'allow_inheritance': False}
+
+
 class Worker(AutoRetryDocument):
     """
     Represents a worker.
@@ -613,12 +653,15 @@ class ContentUnit(AutoRetryDocument):
     :type _last_updated: mongoengine.IntField
     :ivar _storage_path: The absolute path to associated content files.
     :type _storage_path: mongoengine.StringField
+    :ivar _unit_key_digest: The digest of the unit key, used to look up units in bulk.
+    :type _unit_key_digest: mongoengine.StringField
     """
 
     id = StringField(primary_key=True, default=lambda: str(uuid.uuid4()))
     pulp_user_metadata = DictField()
     _last_updated = IntField(required=True)
     _storage_path = StringField()
+    _unit_key_digest = StringField()
 
     meta = {
         'abstract': True,
@@ -704,7 +747,7 @@ class ContentUnit(AutoRetryDocument):
         """
         The signal that is triggered before a unit is saved, this is used to
         support the legacy behavior of generating the unit id and setting
-        the _last_updated timestamp
+        the _last_updated timestamp. The unit key digest is also stored.
 
         :param sender: sender class
         :type sender: object
@@ -712,6 +755,7 @@ class ContentUnit(AutoRetryDocument):
         :type document: ContentUnit
         """
         document._last_updated = dateutils.now_utc_timestamp()
+        document._unit_key_digest = document.unit_key_as_digest()
 
     def get_repositories(self):
         """
@@ -794,7 +838,9 @@ class ContentUnit(AutoRetryDocument):
         _hash = algorithm or sha256()
         for key, value in sorted(self.unit_key.items()):
             _hash.update(key)
-            if not isinstance(value, basestring):
+            if isinstance(value, unicode):
+                _hash.update(value.encode('utf-8'))
+            elif not isinstance(value, basestring):
                 _hash.update(str(value))
             else:
                 _hash.update(value)
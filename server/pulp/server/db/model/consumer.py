@@ -12,12 +12,13 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 import datetime
-import hashlib
-import json
+
+from pymongo.errors import DuplicateKeyError
 
 from pulp.server.db.model.base import Model
 from pulp.server.db.model.reaper_base import ReaperMixin
 from pulp.common import dateutils
+from pulp.common.util import calculate_profile_hash
 
 
 # -- classes -----------------------------------------------------------------
@@ -165,14 +166,79 @@ class Bind(Model):
         self.deleted = False
 
 
+class ApplicabilityProfile(Model):
+    """
+    This class models a Mongo collection that stores the consumer profiles referenced by
+    RepoProfileApplicability objects. Each profile is stored once, content-addressed by its
+    profile_hash, which is used as the document _id. This avoids storing a copy of the profile
+    for every repository it has applicability data for.
+
+    Each time a profile is stored its last_referenced timestamp is updated, so that orphan removal
+    does not collect profiles that were referenced after it started.
+    """
+    collection_name = 'applicability_profiles'
+    unique_indices = ()
+
+    def __init__(self, profile_hash, profile):
+        """
+        :param profile_hash: The hash of the profile, used as the document _id
+        :type  profile_hash: basestring
+        :param profile:      The entire profile that resulted in the profile_hash
+        :type  profile:      object
+        """
+        super(ApplicabilityProfile, self).__init__()
+
+        self._id = profile_hash
+        self.profile = profile
+
+        # The superclass puts an unnecessary id attribute on this model. Let's remove it.
+        del self.id
+
+    @classmethod
+    def store(cls, profile_hash, profile):
+        """
+        Store a profile unless one is already stored for the profile_hash, and record that it
+        is referenced.
+
+        :param profile_hash: The hash of the profile
+        :type  profile_hash: basestring
+        :param profile:      The entire profile that resulted in the profile_hash
+        :type  profile:      object
+        """
+        now = datetime.datetime.now(dateutils.utc_tz())
+        try:
+            cls.get_collection().update_one(
+                {'_id': profile_hash},
+                {'$set': {'last_referenced': now}, '$setOnInsert': {'profile': profile}},
+                upsert=True)
+        except DuplicateKeyError:
+            # stored concurrently
+            pass
+
+    @classmethod
+    def get_profiles(cls, profile_hashes):
+        """
+        Get the stored profiles for the given profile hashes.
+
+        :param profile_hashes: The hashes of the profiles
+        :type  profile_hashes: list
+        :return:               The profiles keyed by profile_hash. Hashes that have no stored
+                               profile are omitted.
+        :rtype:                dict
+        """
+        documents = cls.get_collection().find({'_id': {'$in': list(profile_hashes)}})
+        return dict((d['_id'], d['profile']) for d in documents)
+
+
 class RepoProfileApplicability(Model):
     """
     This class models a Mongo collection that is used to store pre-calculated applicability results
     for a given consumer profile_hash and repository ID. The applicability data is a dictionary
     structure that represents the applicable units for the given profile and repository.
 
-    The profile itself is included here for ease of recalculating the applicability when a
-    repository's contents change.
+    The profile itself is stored once in the ApplicabilityProfile collection for ease of
+    recalculating the applicability when a repository's contents change, and is referenced
+    by the profile_hash.
 
     The RepoProfileApplicabilityManager can be accessed through the classlevel "objects" attribute.
     """
@@ -194,7 +260,8 @@ class RepoProfileApplicability(Model):
         :type  profile_hash:  basestring
         :param repo_id:       The repo ID that this applicability data is for
         :type  repo_id:       basestring
-        :param profile:       The entire profile that resulted in the profile_hash
+        :param profile:       The entire profile that resulted in the profile_hash. It is
+                              stored in the ApplicabilityProfile collection.
         :type  profile:       object
         :param applicability: A dictionary mapping content_type_ids to lists of applicable Unit IDs.
         :type  applicability: dict
@@ -229,12 +296,16 @@ class RepoProfileApplicability(Model):
         # If this object's _id attribute is not None, then it represents an existing DB object.
         # Else, we need to create an object with this object's attributes
         new_document = {'profile_hash': self.profile_hash, 'repo_id': self.repo_id,
-                        'profile': self.profile, 'applicability': self.applicability}
+                        'applicability': self.applicability}
         if self._id is not None:
             self.get_collection().update({'_id': self._id}, new_document)
         else:
             # Let's set the _id attribute to the newly created document
             self._id = self.get_collection().insert(new_document)
+        # The profile is stored after the document referencing it, so that it can't be removed
+        # as an orphan in between.
+        if self.profile is not None:
+            ApplicabilityProfile.store(self.profile_hash, self.profile)
 
 
 class UnitProfile(Model):
@@ -268,6 +339,9 @@ class UnitProfile(Model):
     :type profile:      object
     :ivar  profile_hash: A hash of the profile, used for quick comparisons of profiles
     :type profile_hash: basestring
+    :ivar  reported_hash: A hash of the profile as it was reported by the consumer, before it was
+                          updated by the profiler. None when not known.
+    :type reported_hash: basestring
     """
 
     collection_name = 'consumer_unit_profiles'
@@ -275,7 +349,8 @@ class UnitProfile(Model):
         ('consumer_id', 'content_type'),
     )
 
-    def __init__(self, consumer_id, content_type, profile, profile_hash=None):
+    def __init__(self, consumer_id, content_type, profile, profile_hash=None,
+                 reported_hash=None):
         """
         :param consumer_id:  A consumer ID.
         :type  consumer_id:  str
@@ -287,12 +362,15 @@ class UnitProfile(Model):
                              None, the constructor will automatically calculate it based on the
                              profile.
         :type  profile_hash: basestring
+        :param reported_hash: A hash of the profile as it was reported by the consumer.
+        :type  reported_hash: basestring
         """
         super(UnitProfile, self).__init__()
         self.consumer_id = consumer_id
         self.content_type = content_type
         self.profile = profile
         self.profile_hash = profile_hash
+        self.reported_hash = reported_hash
 
         if self.profile_hash is None:
             self.profile_hash = self.calculate_hash(self.profile)
@@ -308,10 +386,8 @@ class UnitProfile(Model):
         :return:        Hash of profile
         :rtype:         basestring
         """
-        # Don't use any whitespace in the json separators, and sort dictionary keys to be repeatable
-        serialized_profile = json.dumps(profile, separators=(',', ':'), sort_keys=True)
-        hasher = hashlib.sha256(serialized_profile)
-        return hasher.hexdigest()
+        # Consumers calculate the hash of the profiles they report the same way
+        return calculate_profile_hash(profile)
 
 
 class ConsumerHistoryEvent(Model, ReaperMixin):
@@ -80,6 +80,8 @@ class ContentCatalog(Model):
        - supporting find() operations on a catalog containing multiple entries
          matching the same locator.  In these cases, only the newest entry is
          included for each source in the result set.
+       - supporting refresh into a staged generation of entries that is not
+         visible to find() operations until it is published.
     :ivar source_id: The ID of the contributing content source.
     :type source_id: str
     :ivar expires: The expiration UTC timestamp.
@@ -92,6 +94,11 @@ class ContentCatalog(Model):
     :type locator: str
     :ivar url: The URL used to download the file associated with the unit.
     :type url: str
+    :ivar generation: The ID of the refresh generation the entry was added by.
+    :type generation: str
+    :ivar staged: Indicates the entry belongs to a generation that has not
+        been published yet.
+    :type staged: bool
     """
 
     collection_name = 'content_catalog'
@@ -128,7 +135,7 @@ class ContentCatalog(Model):
         dt = now + timedelta(seconds=duration)
         return dateutils.datetime_to_utc_timestamp(dt)
 
-    def __init__(self, source_id, expiration, type_id, unit_key, url):
+    def __init__(self, source_id, expiration, type_id, unit_key, url, generation=None):
         """
         :param source_id: The ID of the contributing content source.
         :type source_id: str
@@ -140,6 +147,8 @@ class ContentCatalog(Model):
         :type unit_key: dict
         :param url: The URL used to download the file associated with the unit.
         :type url: str
+        :param generation: The ID of a staged refresh generation.
+        :type generation: str
         """
         Model.__init__(self)
         self.source_id = source_id
@@ -148,3 +157,5 @@ class ContentCatalog(Model):
         self.unit_key = unit_key
         self.locator = self.get_locator(type_id, unit_key)
         self.url = url
+        self.generation = generation
+        self.staged = generation is not None
@@ -7,15 +7,18 @@ from logging import getLogger
 from uuid import uuid4
 
 from celery import task
+from pymongo import ReturnDocument, UpdateOne
 from pymongo.errors import DuplicateKeyError
 
+from pulp.common import dateutils
 from pulp.plugins.conduits.profiler import ProfilerConduit
 from pulp.plugins.config import PluginCallConfiguration
 from pulp.plugins.loader import api as plugin_api, exceptions as plugin_exceptions
 from pulp.plugins.profiler import Profiler
 from pulp.server.async.tasks import Task
 from pulp.server.db import model
-from pulp.server.db.model.consumer import Bind, RepoProfileApplicability, UnitProfile
+from pulp.server.db.model.consumer import (ApplicabilityProfile, Bind, RepoProfileApplicability,
+                                           UnitProfile)
 from pulp.server.db.model.criteria import Criteria
 from pulp.server.managers import factory as managers
 from pulp.server.managers.consumer.query import ConsumerQueryManager
@@ -24,6 +27,14 @@ from pulp.plugins.util.misc import paginate
 
 _logger = getLogger(__name__)
 
+# number of consumer profiles whose applicability is calculated together against a repository
+# by regenerate_applicability_for_repos
+APPLICABILITY_BATCH_SIZE = 100
+
+# largest number of units added to a repository since its last applicability regeneration for
+# which the applicability is patched incrementally instead of being regenerated in full
+APPLICABILITY_DELTA_MAX_UNITS = 5000
+
 
 class ApplicabilityRegenerationManager(object):
     @staticmethod
@@ -121,29 +132,28 @@ class ApplicabilityRegenerationManager(object):
         repo_criteria.fields = ['id']
         repo_ids = [r.repo_id for r in model.Repository.objects.find_by_criteria(repo_criteria)]
 
+        collection = RepoProfileApplicability.get_collection()
         for repo_id in repo_ids:
-            # Find all existing applicabilities for given repo_id. Setting batch size of 5 ensures
-            # the MongoDB cursor does not time out. See https://pulp.plan.io/issues/998#note-6 for
-            # more details.
-            existing_applicabilities = RepoProfileApplicability.get_collection().find(
-                {'repo_id': repo_id}).batch_size(5)
-            for existing_applicability in existing_applicabilities:
-                existing_applicability = RepoProfileApplicability(**dict(existing_applicability))
-                profile_hash = existing_applicability['profile_hash']
-                unit_profile = UnitProfile.get_collection().find_one({'profile_hash': profile_hash},
-                                                                     projection=['id',
-                                                                                 'content_type'])
-                if unit_profile is None:
-                    # Unit profiles change whenever packages are installed or removed on consumers,
-                    # and it is possible that existing_applicability references a UnitProfile
-                    # that no longer exists. This is harmless, as Pulp has a monthly cleanup task
-                    # that will identify these dangling references and remove them.
-                    continue
-
-                # Regenerate applicability data for given unit_profile and repo id
-                ApplicabilityRegenerationManager.regenerate_applicability(
-                    profile_hash, unit_profile['content_type'], unit_profile['id'], repo_id,
-                    existing_applicability)
+            regeneration_start = dateutils.now_utc_datetime_with_tzinfo()
+            added_units = ApplicabilityRegenerationManager._get_added_units(repo_id)
+
+            # Only the profile hashes are read up front, so no cursor is kept open while
+            # applicability is calculated. See https://pulp.plan.io/issues/998#note-6 for
+            # more details on cursor timeouts.
+            profile_hashes = [a['profile_hash'] for a in collection.find(
+                {'repo_id': repo_id}, projection={'profile_hash': 1, '_id': 0})]
+
+            if profile_hashes:
+                # The content of the repository is loaded only once for all of the batches.
+                repo_content_types = \
+                    ApplicabilityRegenerationManager._get_existing_repo_content_types(repo_id)
+                profiler_conduit = ProfilerConduit(cache_repo_units=True)
+                for batch in paginate(profile_hashes, APPLICABILITY_BATCH_SIZE):
+                    ApplicabilityRegenerationManager._regenerate_applicability_batch(
+                        repo_id, list(batch), repo_content_types, profiler_conduit, added_units)
+
+            model.Repository.objects(repo_id=repo_id).update_one(
+                set__last_applicability_regeneration=regeneration_start)
 
     @staticmethod
     def queue_regenerate_applicability_for_repos(repo_criteria):
@@ -151,6 +161,9 @@ class ApplicabilityRegenerationManager(object):
         Queue a group of tasks to generate and save applicability data affected by given updated
         repositories.
 
+        The time of the regeneration is only recorded on a repository once all of its batch tasks
+        have succeeded, so that a later regeneration doesn't skip the work of a failed batch.
+
         :param repo_criteria: The repo selection criteria
         :type repo_criteria: dict
         """
@@ -163,45 +176,257 @@ class ApplicabilityRegenerationManager(object):
         task_group_id = uuid4()
 
         for repo_id in repo_ids:
+            regeneration_start = dateutils.now_utc_datetime_with_tzinfo()
+            added_units = ApplicabilityRegenerationManager._get_added_units(repo_id)
             profile_hashes = RepoProfileApplicability.get_collection().find(
-                {'repo_id': repo_id}, {'profile_hash': 1})
-            for batch in paginate(profile_hashes, 10):
-                batch_regenerate_applicability_task.apply_async((repo_id, batch),
-                                                                **{'group_id': task_group_id})
+                {'repo_id': repo_id}, {'profile_hash': 1, '_id': 0})
+            batches = list(paginate(profile_hashes, 10))
+            if not batches:
+                model.Repository.objects(repo_id=repo_id).update_one(
+                    set__last_applicability_regeneration=regeneration_start,
+                    unset__pending_applicability_regeneration=True)
+                continue
+
+            # The batch tasks read the added units from the pending regeneration rather than
+            # from their arguments, so that they are not sent to the broker with every batch.
+            # They count down the pending batches, the last one to succeed records the
+            # regeneration. A newer regeneration of the repo replaces the token, so the batches
+            # of an older one no longer count.
+            token = uuid4().hex
+            model.Repository.objects(repo_id=repo_id).update_one(
+                set__pending_applicability_regeneration={
+                    'token': token, 'started': regeneration_start, 'batches': len(batches),
+                    'added_units': added_units})
+            for batch in batches:
+                batch_regenerate_applicability_task.apply_async(
+                    (repo_id, batch, token), **{'group_id': task_group_id})
         return task_group_id
 
     @staticmethod
-    def batch_regenerate_applicability(repo_id, profile_hashes):
+    def _get_pending_regeneration(repo_id, token):
+        """
+        Get the queued regeneration of a repository's applicability a batch belongs to.
+
+        :param repo_id: The repository id
+        :type  repo_id: basestring
+        :param token:   Identifies the queued regeneration the batch belongs to
+        :type  token:   basestring
+        :return: The pending regeneration, or None when it was replaced by a newer one
+        :rtype:  dict or None
+        """
+        pending = 'pending_applicability_regeneration'
+        repo = model.Repository._get_collection().find_one(
+            {'repo_id': repo_id, pending + '.token': token}, projection=[pending])
+        if repo is None:
+            return None
+        return repo[pending]
+
+    @staticmethod
+    def _batch_regenerated(repo_id, token):
+        """
+        Count down the pending batches of a queued regeneration of a repository's applicability,
+        and record the time the regeneration started once all of them have succeeded.
+
+        :param repo_id: The repository id
+        :type  repo_id: basestring
+        :param token:   Identifies the queued regeneration the batch belongs to
+        :type  token:   basestring
+        """
+        collection = model.Repository._get_collection()
+        pending = 'pending_applicability_regeneration'
+        repo = collection.find_one_and_update(
+            {'repo_id': repo_id, pending + '.token': token},
+            {'$inc': {pending + '.batches': -1}},
+            projection=[pending], return_document=ReturnDocument.AFTER)
+        if repo is None or repo[pending]['batches'] > 0:
+            return
+        collection.update_one(
+            {'repo_id': repo_id, pending + '.token': token},
+            {'$set': {'last_applicability_regeneration': repo[pending]['started']},
+             '$unset': {pending: ''}})
+
+    @staticmethod
+    def _get_added_units(repo_id):
+        """
+        Find the units that were added to a repository since its applicability was last
+        regenerated, so that the stored applicability can be patched instead of being
+        regenerated in full.
+
+        None is returned when the applicability has to be regenerated in full: when it was
+        never regenerated before, when units were removed from the repository since then, when
+        units that were already in the repository were updated since then, when too many units
+        were added, or when no change is detected at all, as is the case when the regeneration
+        was requested explicitly.
+
+        :param repo_id: The repository id
+        :type  repo_id: basestring
+        :return: ids of the added units keyed by content type id, or None
+        :rtype:  dict or None
+        """
+        repo_obj = model.Repository.objects(repo_id=repo_id).only(
+            'last_unit_removed', 'last_applicability_regeneration').first()
+        if repo_obj is None or repo_obj.last_applicability_regeneration is None:
+            return None
+        last_regeneration = repo_obj.last_applicability_regeneration
+        if repo_obj.last_unit_removed and repo_obj.last_unit_removed >= last_regeneration:
+            return None
+
+        # Association timestamps only have a resolution of one second, so units added during
+        # the second in which the last regeneration started are included again.
+        since = dateutils.format_iso8601_utc_timestamp(
+            dateutils.datetime_to_utc_timestamp(last_regeneration))
+        associations = model.RepositoryContentUnit.objects(
+            repo_id=repo_id, updated__gte=since).only(
+                'unit_id', 'unit_type_id', 'created').as_pymongo()
+
+        added_units = {}
+        for count, association in enumerate(associations):
+            if count >= APPLICABILITY_DELTA_MAX_UNITS:
+                return None
+            if association['created'] < since:
+                # The unit was already in the repository, and may have changed in place.
+                return None
+            added_units.setdefault(association['unit_type_id'], []).append(
+                association['unit_id'])
+        return added_units or None
+
+    @staticmethod
+    def batch_regenerate_applicability(repo_id, profile_hashes, token=None):
         """
         Regenerate and save applicability data for a batch of existing applicabilities
 
+        When the batch belongs to a queued regeneration, only the applicability of the units
+        added to the repository that the regeneration recorded is calculated, if any. A batch
+        of a regeneration that was replaced by a newer one is skipped, as the newer one covers
+        the same changes.
+
         :param repo_id: Repository id for which applicability is being calculated
         :type repo_id: str
         :param profile_hashes: Tuple of consumer profile hashes for applicability profiles.
                                Don't pass too much of these, all the profile data
                                associated with these hashes is loaded into the memory.
         :type profile_hashes: tuple of dicts in form of {'profile_hash': str}
+        :param token: identifies the queued regeneration of the repository the batch belongs to;
+                      None regenerates the applicability in full
+        :type token: basestring or None
         """
+        added_units = None
+        if token is not None:
+            pending = ApplicabilityRegenerationManager._get_pending_regeneration(repo_id, token)
+            if pending is None:
+                _logger.debug('Applicability regeneration of repository [%s] was superseded' %
+                              repo_id)
+                return
+            added_units = pending.get('added_units')
         profile_hash_list = [phash['profile_hash'] for phash in profile_hashes]
-        existing_applicabilities = RepoProfileApplicability.get_collection().find(
-            {"repo_id": repo_id, "profile_hash": {"$in": profile_hash_list}})
-        for existing_applicability in list(existing_applicabilities):
-                # Convert cursor to RepoProfileApplicability object
-            existing_applicability = RepoProfileApplicability(**dict(existing_applicability))
-            profile_hash = existing_applicability['profile_hash']
-            unit_profile = UnitProfile.get_collection().find_one({'profile_hash': profile_hash},
-                                                                 projection=['id', 'content_type'])
-            if unit_profile is None:
-                # Unit profiles change whenever packages are installed or removed on consumers,
-                # and it is possible that existing_applicability references a UnitProfile
-                # that no longer exists. This is harmless, as Pulp has a monthly cleanup task
-                # that will identify these dangling references and remove them.
+        repo_content_types = ApplicabilityRegenerationManager._get_existing_repo_content_types(
+            repo_id)
+        ApplicabilityRegenerationManager._regenerate_applicability_batch(
+            repo_id, profile_hash_list, repo_content_types, ProfilerConduit(cache_repo_units=True),
+            added_units)
+        if token is not None:
+            ApplicabilityRegenerationManager._batch_regenerated(repo_id, token)
+
+    @staticmethod
+    def _regenerate_applicability_batch(repo_id, profile_hashes, repo_content_types,
+                                        profiler_conduit, added_units=None):
+        """
+        Regenerate and save applicability data for a batch of existing applicabilities of a repo.
+
+        The unit profiles of the whole batch are resolved with a single query, each profiler is
+        called once with all of the profiles it handles and the results are saved with a single
+        bulk write.
+
+        When added_units is given, profilers that implement calculate_applicable_units_delta()
+        only calculate the applicability of the added units, which is then added to the stored
+        applicability. Profiles handled by other profilers are regenerated in full.
+
+        :param repo_id: Repository id for which applicability is being calculated
+        :type repo_id: str
+        :param profile_hashes: consumer profile hashes of existing applicabilities of the repo
+        :type profile_hashes: list of str
+        :param repo_content_types: content type ids that have units in the repository
+        :type repo_content_types: list
+        :param profiler_conduit: conduit passed to the profilers
+        :type profiler_conduit: pulp.plugins.conduits.profiler.ProfilerConduit
+        :param added_units: ids of the units added to the repository since its applicability was
+                            last regenerated, keyed by content type id; None regenerates the
+                            applicability in full
+        :type added_units: dict or None
+        """
+        collection = RepoProfileApplicability.get_collection()
+        existing_applicabilities = collection.find(
+            {'repo_id': repo_id, 'profile_hash': {'$in': profile_hashes}},
+            projection=['profile_hash'])
+        existing_hashes = [a['profile_hash'] for a in existing_applicabilities]
+        if not existing_hashes:
+            return
+        profiles = ApplicabilityRegenerationManager._get_profiles(existing_hashes)
+        if not profiles:
+            return
+
+        # Unit profiles change whenever packages are installed or removed on consumers, and it is
+        # possible that an existing applicability references a UnitProfile that no longer exists.
+        # This is harmless, as Pulp has a monthly cleanup task that will identify these dangling
+        # references and remove them.
+        pipeline = [
+            {'$match': {'profile_hash': {'$in': profiles.keys()}}},
+            {'$group': {'_id': '$profile_hash', 'content_type': {'$first': '$content_type'}}}]
+        profile_hashes_by_type = {}
+        for unit_profile in UnitProfile.get_collection().aggregate(pipeline):
+            profile_hashes_by_type.setdefault(unit_profile['content_type'], []).append(
+                unit_profile['_id'])
+
+        requests = []
+        for content_type, type_profile_hashes in profile_hashes_by_type.iteritems():
+            profiler, profiler_cfg = ApplicabilityRegenerationManager._profiler(content_type)
+
+            # Check if the profiler supports applicability, else skip these profiles
+            if profiler.calculate_applicable_units == Profiler.calculate_applicable_units:
+                continue
+            if not (set(repo_content_types) & set(profiler.metadata()['types'])):
                 continue
 
-            # Regenerate applicability data for given unit_profile and repo id
-            ApplicabilityRegenerationManager.regenerate_applicability(
-                profile_hash, unit_profile['content_type'], unit_profile['id'], repo_id,
-                existing_applicability)
+            call_config = PluginCallConfiguration(plugin_config=profiler_cfg,
+                                                  repo_plugin_config=None)
+            unit_profiles = dict((h, profiles[h]) for h in type_profile_hashes)
+
+            if added_units is not None:
+                profiler_added_units = dict((t, added_units[t]) for t in
+                                            profiler.metadata()['types'] if t in added_units)
+                if not profiler_added_units:
+                    # nothing this profiler handles was added, the applicability is current
+                    continue
+                try:
+                    applicabilities = profiler.calculate_applicable_units_delta(
+                        unit_profiles, repo_id, profiler_added_units, call_config,
+                        profiler_conduit)
+                except NotImplementedError:
+                    pass
+                else:
+                    for profile_hash, applicability in applicabilities.iteritems():
+                        update = dict(('applicability.%s' % t, {'$each': unit_ids})
+                                      for t, unit_ids in applicability.iteritems() if unit_ids)
+                        if update:
+                            requests.append(
+                                UpdateOne({'repo_id': repo_id, 'profile_hash': profile_hash},
+                                          {'$addToSet': update}))
+                    continue
+
+            try:
+                applicabilities = profiler.calculate_applicable_units_bulk(
+                    unit_profiles, repo_id, call_config, profiler_conduit)
+            except NotImplementedError:
+                msg = "Profiler for content type [%s] does not support applicability" % content_type
+                _logger.debug(msg)
+                continue
+
+            for profile_hash, applicability in applicabilities.iteritems():
+                requests.append(UpdateOne({'repo_id': repo_id, 'profile_hash': profile_hash},
+                                          {'$set': {'applicability': applicability}}))
+
+        if requests:
+            collection.bulk_write(requests, ordered=False)
 
     @staticmethod
     def regenerate_applicability(profile_hash, content_type, profile_id,
@@ -245,6 +470,12 @@ class ApplicabilityRegenerationManager(object):
             # Get the actual profile for existing_applicability or lookup using profile_id
             if existing_applicability:
                 profile = existing_applicability.profile
+                if profile is None:
+                    profiles = ApplicabilityRegenerationManager._get_profiles([profile_hash])
+                    if profile_hash not in profiles:
+                        # No unit profile has this hash any more, the applicability is orphaned
+                        return
+                    profile = profiles[profile_hash]
             else:
                 unit_profile = UnitProfile.get_collection().find_one({'id': profile_id},
                                                                      projection=['profile'])
@@ -272,7 +503,8 @@ class ApplicabilityRegenerationManager(object):
                 if not existing_applicability:
                     applicability_dict = RepoProfileApplicability.get_collection().find_one(
                         {'repo_id': bound_repo_id, 'profile_hash': profile_hash})
-                    existing_applicability = RepoProfileApplicability(**applicability_dict)
+                    existing_applicability = RepoProfileApplicability(profile=profile,
+                                                                      **applicability_dict)
                 existing_applicability.applicability = applicability
                 existing_applicability.save()
 
@@ -315,6 +547,31 @@ class ApplicabilityRegenerationManager(object):
             return True
         return False
 
+    @staticmethod
+    def _get_profiles(profile_hashes):
+        """
+        Get the profiles of existing applicabilities. Profiles that are missing from the
+        ApplicabilityProfile collection are read from a UnitProfile with the same profile_hash
+        and stored again.
+
+        :param profile_hashes: unit profile hashes
+        :type profile_hashes:  list of str
+        :return:               the profiles keyed by profile_hash. Hashes that no profile could
+                               be found for are omitted.
+        :rtype:                dict
+        """
+        profiles = ApplicabilityProfile.get_profiles(profile_hashes)
+        missing_hashes = list(set(profile_hashes) - set(profiles))
+        if missing_hashes:
+            unit_profiles = UnitProfile.get_collection().find(
+                {'profile_hash': {'$in': missing_hashes}}, projection=['profile_hash', 'profile'])
+            for unit_profile in unit_profiles:
+                profile_hash = unit_profile['profile_hash']
+                if profile_hash not in profiles:
+                    profiles[profile_hash] = unit_profile['profile']
+                    ApplicabilityProfile.store(profile_hash, unit_profile['profile'])
+        return profiles
+
     @staticmethod
     def _profiler(type_id):
         """
@@ -400,9 +657,14 @@ class RepoProfileApplicabilityManager(object):
         :rtype:              list
         """
         collection = RepoProfileApplicability.get_collection()
-        mongo_applicabilities = collection.find(query_params)
-        applicabilities = [RepoProfileApplicability(**dict(applicability))
-                           for applicability in mongo_applicabilities]
+        mongo_applicabilities = list(collection.find(query_params))
+        profiles = ApplicabilityProfile.get_profiles(
+            set(a['profile_hash'] for a in mongo_applicabilities))
+        applicabilities = []
+        for applicability in mongo_applicabilities:
+            applicability = dict(applicability)
+            applicability['profile'] = profiles.get(applicability['profile_hash'])
+            applicabilities.append(RepoProfileApplicability(**applicability))
         return applicabilities
 
     def get(self, query_params):
@@ -432,8 +694,11 @@ class RepoProfileApplicabilityManager(object):
         """
         The RepoProfileApplicability objects can become orphaned over time, as repositories are
         deleted, or as consumer profiles change. This method searches for RepoProfileApplicability
-        objects that reference either repositories or profile hashes that no longer exist in Pulp.
+        objects that reference either repositories or profile hashes that no longer exist in Pulp,
+        and then removes the ApplicabilityProfile objects that are no longer referenced.
         """
+        started = dateutils.now_utc_datetime_with_tzinfo()
+
         # Find all of the repo_ids that are referenced by RepoProfileApplicability objects
         rpa_collection = RepoProfileApplicability.get_collection()
         rpa_repo_ids = rpa_collection.distinct('repo_id')
@@ -462,6 +727,18 @@ class RepoProfileApplicabilityManager(object):
         if missing_profile_hashes:
             rpa_collection.remove({'profile_hash': {'$in': missing_profile_hashes}})
 
+        # Finally, remove the shared profiles that are no longer referenced by any
+        # RepoProfileApplicability object. A profile is stored after the RepoProfileApplicability
+        # object that references it, so profiles referenced since this method started are kept
+        # as the new reference may be missing from the hashes listed here.
+        ap_collection = ApplicabilityProfile.get_collection()
+        stored_profile_hashes = ap_collection.distinct('_id')
+        rpa_profile_hashes = rpa_collection.distinct('profile_hash')
+        unreferenced_profile_hashes = list(set(stored_profile_hashes) - set(rpa_profile_hashes))
+        if unreferenced_profile_hashes:
+            ap_collection.remove({'_id': {'$in': unreferenced_profile_hashes},
+                                  'last_referenced': {'$lt': started}})
+
 
 # Instantiate one of the managers on the object it manages for convenience
 RepoProfileApplicability.objects = RepoProfileApplicabilityManager()
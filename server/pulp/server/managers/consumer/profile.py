@@ -35,6 +35,8 @@ class ProfileManager(object):
         Update a unit profile.
         Created if not already exists.
 
+        Nothing is written and no history event is recorded when the profile is unchanged.
+
         :param consumer_id:  uniquely identifies the consumer.
         :type  consumer_id:  str
         :param content_type: The profile (content) type ID.
@@ -52,15 +54,26 @@ class ProfileManager(object):
         # Allow the profiler a chance to update the profile before we save it
         if profile is None:
             raise MissingValue('profile')
+        # The profiler may alter the profile in place
+        reported_hash = UnitProfile.calculate_hash(profile)
         profile = profiler.update_profile(consumer, content_type, profile, config)
+        profile_hash = UnitProfile.calculate_hash(profile)
+        collection = UnitProfile.get_collection()
         try:
             p = ProfileManager.get_profile(consumer_id, content_type)
+        except MissingResource:
+            p = UnitProfile(consumer_id, content_type, profile, profile_hash, reported_hash)
+        else:
+            if p['profile_hash'] == profile_hash:
+                if p.get('reported_hash') != reported_hash:
+                    p['reported_hash'] = reported_hash
+                    collection.update({'_id': p['_id']},
+                                      {'$set': {'reported_hash': reported_hash}})
+                return p
             p['profile'] = profile
             # We store the profile's hash anytime the profile gets altered
-            p['profile_hash'] = UnitProfile.calculate_hash(profile)
-        except MissingResource:
-            p = UnitProfile(consumer_id, content_type, profile)
-        collection = UnitProfile.get_collection()
+            p['profile_hash'] = profile_hash
+            p['reported_hash'] = reported_hash
         collection.save(p)
         history_manager = factory.consumer_history_manager()
         history_manager.record_event(
@@ -114,6 +127,33 @@ class ProfileManager(object):
         else:
             return profile
 
+    @staticmethod
+    def get_reported_profile(consumer_id, content_type, reported_hash):
+        """
+        Get a profile by consumer ID and content type ID when it was last reported with the
+        given hash. Consumers use this to find out whether a profile needs to be reported
+        again. The profile itself is not included.
+
+        :param consumer_id:     uniquely identifies the consumer.
+        :type consumer_id:      str
+        :param content_type:    The profile (content) type ID.
+        :type content_type:     str
+        :param reported_hash:   The hash of the profile the consumer would report, calculated
+                                by pulp.common.util.calculate_profile_hash().
+        :type reported_hash:    str
+        :return:                The requested profile without the profile structure.
+        :rtype:                 dict
+        :raise MissingResource: when no profile was last reported with the hash.
+        """
+        collection = UnitProfile.get_collection()
+        profile_id = dict(consumer_id=consumer_id, content_type=content_type)
+        query = dict(profile_id, reported_hash=reported_hash)
+        profile = collection.find_one(query, projection={'profile': False})
+        if profile is None:
+            raise MissingResource(profile_id=profile_id)
+        else:
+            return profile
+
     def get_profiles(self, consumer_id):
         """
         Get all profiles associated with a consumer.
@@ -11,7 +11,7 @@
 
 from logging import getLogger
 
-from pymongo import ASCENDING
+from pymongo import ASCENDING, InsertOne
 
 from pulp.server.db.model.content import ContentCatalog
 
@@ -40,6 +40,9 @@ class ContentCatalogManager(object):
        - supporting find() operations on a catalog containing multiple entries
          matching the same locator.  In these cases, only the newest entry is
          included for each source in the result set.
+       - supporting refresh into a staged generation of entries.  Staged entries
+         are excluded from find() operations until the generation is published
+         at which time the entries of previous generations are purged.
     """
 
     def add_entry(self, source_id, expires, type_id, unit_key, url):
@@ -60,6 +63,59 @@ class ContentCatalogManager(object):
         entry = ContentCatalog(source_id, expires, type_id, unit_key, url)
         collection.insert(entry)
 
+    def add_entries(self, source_id, expires, entries, generation=None):
+        """
+        Add entries to the content catalog using a single unordered bulk insert.
+        :param source_id: A content source ID.
+        :type source_id: str
+        :param expires: The entry expiration in seconds.
+        :type expires: int
+        :param entries: A list of: (type_id, unit_key, url).
+        :type entries: list
+        :param generation: The ID of a staged generation the entries are added to.
+            The entries are not visible until the generation is published.
+        :type generation: str
+        :return: The number of entries added.
+        :rtype: int
+        """
+        requests = [
+            InsertOne(ContentCatalog(source_id, expires, type_id, unit_key, url, generation))
+            for type_id, unit_key, url in entries
+        ]
+        if not requests:
+            return 0
+        collection = ContentCatalog.get_collection()
+        result = collection.bulk_write(requests, ordered=False)
+        return result.inserted_count
+
+    def publish(self, source_id, generation, purge=True):
+        """
+        Publish a staged generation of entries belonging to the specified
+        content source.  Entries of previous generations are purged after the
+        staged entries become visible.  The catalog may contain entries for both
+        generations briefly in which case find() includes only the newest.
+        :param source_id: A content source ID.
+        :type source_id: str
+        :param generation: The ID of the staged generation.
+        :type generation: str
+        :param purge: Purge the entries of previous generations.
+        :type purge: bool
+        :return: The number of entries purged.
+        :rtype: int
+        """
+        collection = ContentCatalog.get_collection()
+        query = {'source_id': source_id, 'generation': generation}
+        collection.update(query, {'$set': {'staged': False}}, multi=True)
+        if not purge:
+            return 0
+        query = {
+            'source_id': source_id,
+            'generation': {'$ne': generation},
+            'staged': {'$ne': True}
+        }
+        result = collection.remove(query)
+        return result['n']
+
     def delete_entry(self, source_id, type_id, unit_key):
         """
         Delete an entry from the content catalog.
@@ -141,13 +197,38 @@ class ContentCatalogManager(object):
         locator = ContentCatalog.get_locator(type_id, unit_key)
         query = {
             'locator': locator,
-            'expiration': {'$gte': ContentCatalog.get_expiration(0)}
+            'expiration': {'$gte': ContentCatalog.get_expiration(0)},
+            'staged': {'$ne': True}
         }
         newest_by_source = {}
         for entry in collection.find(query, sort=[('_id', ASCENDING)]):
             newest_by_source[entry['source_id']] = entry
         return newest_by_source.values()
 
+    def find_by_locators(self, locators):
+        """
+        Find entries in the content catalog for many locators using a single
+        query.  As with find(), only the newest entry for each source is
+        included for each locator.
+        :param locators: A list of locators.
+        :type locators: list
+        :return: A dictionary of: list of matching entries keyed by locator.
+            Locators without entries are not included.
+        :rtype: dict
+        """
+        collection = ContentCatalog.get_collection()
+        query = {
+            'locator': {'$in': list(set(locators))},
+            'expiration': {'$gte': ContentCatalog.get_expiration(0)},
+            'staged': {'$ne': True}
+        }
+        newest_by_locator = {}
+        for entry in collection.find(query, sort=[('_id', ASCENDING)]):
+            newest_by_source = newest_by_locator.setdefault(entry['locator'], {})
+            newest_by_source[entry['source_id']] = entry
+        return dict((locator, newest_by_source.values())
+                    for locator, newest_by_source in newest_by_locator.items())
+
     def has_entries(self, source_id):
         """
         Get whether the specified content source has entries in the catalog.
@@ -159,7 +240,28 @@ class ContentCatalogManager(object):
         collection = ContentCatalog.get_collection()
         query = {
             'source_id': source_id,
-            'expiration': {'$gte': ContentCatalog.get_expiration(0)}
+            'expiration': {'$gte': ContentCatalog.get_expiration(0)},
+            'staged': {'$ne': True}
         }
         cursor = collection.find(query)
         return cursor.count() > 0
+
+    def earliest_expiration(self, source_id):
+        """
+        Get the earliest expiration of the unexpired entries contributed by
+        the specified content source.
+        :param source_id: A content source ID.
+        :type source_id: str
+        :return: The expiration timestamp or None when the source has no
+            unexpired entries.
+        :rtype: int
+        """
+        collection = ContentCatalog.get_collection()
+        query = {
+            'source_id': source_id,
+            'expiration': {'$gte': ContentCatalog.get_expiration(0)},
+            'staged': {'$ne': True}
+        }
+        cursor = collection.find(query, {'expiration': 1, '_id': 0})
+        for entry in cursor.sort('expiration', 1).limit(1):
+            return entry['expiration']
@@ -1,9 +1,13 @@
 from gettext import gettext as _
+from multiprocessing.pool import ThreadPool
+import functools
 import itertools
 import logging
 import os
 import re
 import shutil
+import threading
+import time
 
 from celery import task
 
@@ -20,22 +24,51 @@ from pulp.server.exceptions import MissingResource
 
 _logger = logging.getLogger(__name__)
 
+# number of content units whose associations are looked up with a single query
+ORPHAN_BATCH_SIZE = 1000
+
+# maximum number of threads used to remove orphaned files from storage
+ORPHAN_DELETE_THREADS = 8
+
+# per-process snapshot of the most recently computed orphans summary
+_summary_snapshot = {'summary': None, 'timestamp': 0}
+_summary_lock = threading.Lock()
+
 
 class OrphanManager(object):
 
-    def orphans_summary(self):
+    def orphans_summary(self, max_age=None):
         """
         Return a summary of the orphaned units as a dictionary of
         content type -> number of orphaned units
 
+        If max_age is given, a summary computed by this process no more than max_age
+        seconds ago is returned instead of querying the database again. Orphans are deleted
+        by tasks running in other processes, so the returned summary may be up to max_age
+        seconds out of date.
+
+        :param max_age: maximum age in seconds of a cached summary that may be returned;
+                        None or 0 means always compute a fresh summary
+        :type  max_age: int or None
         :return: summary of orphaned units
         :rtype: dict
         """
+        if max_age:
+            with _summary_lock:
+                snapshot = _summary_snapshot['summary']
+                if snapshot is not None and \
+                        time.time() - _summary_snapshot['timestamp'] < max_age:
+                    return dict(snapshot)
+
         summary = {}
         for content_type_id in content_types_db.all_type_ids():
             summary[content_type_id] = self.orphans_count_by_type(content_type_id)
         for content_type_id in plugin_api.list_unit_models():
             summary[content_type_id] = self.orphans_count_by_type(content_type_id)
+
+        with _summary_lock:
+            _summary_snapshot['summary'] = dict(summary)
+            _summary_snapshot['timestamp'] = time.time()
         return summary
 
     def orphans_count_by_type(self, content_type_id):
@@ -48,8 +81,8 @@ class OrphanManager(object):
         :rtype: int
         """
         count = 0
-        for unit in OrphanManager.generate_orphans_by_type(content_type_id):
-            count += 1
+        for orphan_ids in OrphanManager.generate_orphan_ids_by_type(content_type_id):
+            count += len(orphan_ids)
         return count
 
     def generate_all_orphans(self, fields=None):
@@ -101,17 +134,54 @@ class OrphanManager(object):
 
         fields = fields if fields is not None else ['_id']
         content_units_collection = content_types_db.type_units_collection(content_type_id)
-        repo_content_units_collection = RepoContentUnit.get_collection()
+        cursor = content_units_collection.find({}, projection=fields).batch_size(ORPHAN_BATCH_SIZE)
 
-        for content_unit in content_units_collection.find({}, projection=fields).batch_size(100):
+        for page in plugin_misc.paginate(cursor, ORPHAN_BATCH_SIZE):
+            associated_ids = OrphanManager.associated_unit_ids([unit['_id'] for unit in page])
+            for content_unit in page:
+                if content_unit['_id'] not in associated_ids:
+                    yield content_unit
 
-            repo_content_units_cursor = repo_content_units_collection.find(
-                {'unit_id': content_unit['_id']})
+    @staticmethod
+    def generate_orphan_ids_by_type(content_type_id):
+        """
+        Return a generator of lists of orphaned content unit ids of the given content type.
 
-            if repo_content_units_cursor.count() > 0:
-                continue
+        Only the unit ids are read from the database and each list holds the orphans of one
+        page of at most ORPHAN_BATCH_SIZE units, so the associations of a whole page are
+        looked up with a single query.
 
-            yield content_unit
+        :param content_type_id: id of the content type
+        :type content_type_id: basestring
+        :return: generator of lists of orphaned content unit ids
+        :rtype: generator
+        """
+        content_units_collection = content_types_db.type_units_collection(content_type_id)
+        cursor = content_units_collection.find({}, projection=['_id']).batch_size(
+            ORPHAN_BATCH_SIZE)
+
+        for page in plugin_misc.paginate(cursor, ORPHAN_BATCH_SIZE):
+            unit_ids = [unit['_id'] for unit in page]
+            associated_ids = OrphanManager.associated_unit_ids(unit_ids)
+            orphan_ids = [unit_id for unit_id in unit_ids if unit_id not in associated_ids]
+            if orphan_ids:
+                yield orphan_ids
+
+    @staticmethod
+    def associated_unit_ids(unit_ids):
+        """
+        Return which of the given content unit ids are associated with at least one repository.
+
+        :param unit_ids: content unit ids to look up
+        :type  unit_ids: list
+        :return: the subset of unit_ids that are associated with a repository
+        :rtype: set
+        """
+        if not unit_ids:
+            return set()
+        repo_content_units_collection = RepoContentUnit.get_collection()
+        return set(repo_content_units_collection.distinct('unit_id',
+                                                          {'unit_id': {'$in': list(unit_ids)}}))
 
     @staticmethod
     def generate_orphans_by_type_with_unit_keys(content_type_id):
@@ -149,16 +219,15 @@ class OrphanManager(object):
         :raises MissingResource: if no orphaned content unit corresponds to the
                                  given content type and unit id
         """
+        content_units_collection = content_types_db.type_units_collection(content_type_id)
+        content_unit = content_units_collection.find_one({'_id': content_unit_id},
+                                                         projection=['_id'])
 
-        for content_unit in OrphanManager.generate_orphans_by_type(content_type_id):
-
-            if content_unit['_id'] != content_unit_id:
-                continue
-
-            return content_unit
+        if content_unit is None or OrphanManager.associated_unit_ids([content_unit_id]):
+            raise pulp_exceptions.MissingResource(content_type=content_type_id,
+                                                  content_unit=content_unit_id)
 
-        raise pulp_exceptions.MissingResource(content_type=content_type_id,
-                                              content_unit=content_unit_id)
+        return content_unit
 
     @staticmethod
     def delete_all_orphans():
@@ -232,25 +301,38 @@ class OrphanManager(object):
             raise MissingResource(content_type_id=content_type_id)
 
         fields = ('_id', '_storage_path') + unit_key_fields
-        count = 0
-        for content_unit in OrphanManager.generate_orphans_by_type(content_type_id, fields=fields):
+        if content_unit_ids is not None:
+            content_unit_ids = set(content_unit_ids)
+        orphans = OrphanManager.generate_orphans_by_type(content_type_id, fields=fields)
 
-            if content_unit_ids is not None and content_unit['_id'] not in content_unit_ids:
+        count = 0
+        parent_dirs = set()
+        for page in plugin_misc.paginate(orphans, ORPHAN_BATCH_SIZE):
+            if content_unit_ids is not None:
+                page = [unit for unit in page if unit['_id'] in content_unit_ids]
+            if not page:
                 continue
 
+            id_list = [content_unit['_id'] for content_unit in page]
             model.LazyCatalogEntry.objects(
-                unit_id=content_unit['_id'],
+                unit_id__in=id_list,
                 unit_type_id=content_type_id
             ).delete()
-            content_units_collection.remove(content_unit['_id'])
+            content_units_collection.remove({'_id': {'$in': id_list}})
+
+            storage_paths = []
+            for content_unit in page:
+                if hasattr(content_model, 'do_post_delete_actions'):
+                    content_model.do_post_delete_actions(content_unit)
+
+                storage_path = content_unit.get('_storage_path', None)
+                if storage_path is not None:
+                    storage_paths.append(storage_path)
 
-            if hasattr(content_model, 'do_post_delete_actions'):
-                content_model.do_post_delete_actions(content_unit)
+            parent_dirs.update(OrphanManager.unlink_orphaned_files(storage_paths))
+            count += len(page)
 
-            storage_path = content_unit.get('_storage_path', None)
-            if storage_path is not None:
-                OrphanManager.delete_orphaned_file(storage_path)
-            count += 1
+        OrphanManager.prune_empty_directories(parent_dirs)
         return count
 
     @staticmethod
@@ -286,6 +368,7 @@ class OrphanManager(object):
             content_units = content_model.objects.only(*fields)
 
         count = 0
+        parent_dirs = set()
 
         # Paginate the content units
         for units_group in plugin_misc.paginate(content_units):
@@ -302,21 +385,30 @@ class OrphanManager(object):
             for non_orphan_id in non_orphan:
                 unit_dict.pop(non_orphan_id)
 
-            # Remove the unit, lazy catalog entries, and any content in storage.
-            for unit_to_delete in unit_dict.itervalues():
-                model.LazyCatalogEntry.objects(
-                    unit_id=str(unit_to_delete.id),
-                    unit_type_id=str(type_id)
-                ).delete()
-                unit_to_delete.delete()
+            if not unit_dict:
+                continue
 
+            # Remove the lazy catalog entries and the units of the whole page at once.
+            orphan_ids = list(unit_dict.iterkeys())
+            model.LazyCatalogEntry.objects(
+                unit_id__in=[str(unit_id) for unit_id in orphan_ids],
+                unit_type_id=str(type_id)
+            ).delete()
+            content_model.objects(id__in=orphan_ids).delete()
+
+            storage_paths = []
+            for unit_to_delete in unit_dict.itervalues():
                 if hasattr(content_model, 'do_post_delete_actions'):
                     content_model.do_post_delete_actions(unit_to_delete)
 
                 if unit_to_delete._storage_path:
-                    OrphanManager.delete_orphaned_file(unit_to_delete._storage_path)
-                count += 1
+                    storage_paths.append(unit_to_delete._storage_path)
+
+            # Remove any content in storage.
+            parent_dirs.update(OrphanManager.unlink_orphaned_files(storage_paths))
+            count += len(orphan_ids)
 
+        OrphanManager.prune_empty_directories(parent_dirs)
         return count
 
     @staticmethod
@@ -326,36 +418,100 @@ class OrphanManager(object):
         @param path: absolute path to the file to delete
         @type  path: str
         """
+        storage_dir = pulp_config.config.get('server', 'storage_dir')
+        if OrphanManager._unlink_orphaned_file(storage_dir, path):
+            OrphanManager.prune_empty_directories([os.path.dirname(path)])
+
+    @staticmethod
+    def unlink_orphaned_files(paths):
+        """
+        Delete orphaned files using a bounded pool of threads.
+
+        Parent directories are left in place; pass the returned directories to
+        prune_empty_directories() once all files of an operation have been removed.
+
+        :param paths: absolute paths to the files to delete
+        :type  paths: list of str
+        :return: parent directories of the deleted files that may have become empty
+        :rtype: set
+        """
+        if not paths:
+            return set()
+
+        storage_dir = pulp_config.config.get('server', 'storage_dir')
+        unlink = functools.partial(OrphanManager._unlink_orphaned_file, storage_dir)
+        pool = ThreadPool(min(ORPHAN_DELETE_THREADS, len(paths)))
+        try:
+            deleted = pool.map(unlink, paths)
+        finally:
+            pool.close()
+            pool.join()
+
+        return set(os.path.dirname(path) for path, unlinked in zip(paths, deleted) if unlinked)
+
+    @staticmethod
+    def _unlink_orphaned_file(storage_dir, path):
+        """
+        Delete an orphaned file without removing any parent directories.
+
+        :param storage_dir: The absolute path to the pulp content storage directory.
+        :type  storage_dir: str
+        :param path: absolute path to the file to delete
+        :type  path: str
+        :return: True if the parent directories of path may need to be pruned
+        :rtype: bool
+        """
         if not os.path.lexists(path):
             _logger.debug(_('Path: {p} does not exist').format(p=path))
-            return
+            return False
 
         _logger.debug(_('Deleting orphaned file: %(p)s') % {'p': path})
 
         if not os.path.isabs(path):
             raise ValueError(_('Path: %(p)s must be absolute path') % {'p': path})
 
-        storage_dir = pulp_config.config.get('server', 'storage_dir')
-
         # shared content
         if OrphanManager.is_shared(storage_dir, path):
             OrphanManager.unlink_shared(path)
-            return
+            return False
 
         OrphanManager.delete(path)
+        return True
 
-        # delete parent directories on the path as long as they fall empty
+    @staticmethod
+    def prune_empty_directories(directories):
+        """
+        Delete the given directories and their parents as long as they are empty.
+
+        Directories directly below <storage-dir>/content/ are never deleted. Deeper
+        directories are handled first, so each directory is removed at most once even
+        when it held many of the deleted files.
+
+        :param directories: absolute paths of directories that may have become empty
+        :type  directories: iterable of str
+        """
+        if not directories:
+            return
+
+        storage_dir = pulp_config.config.get('server', 'storage_dir')
         root_content_regex = re.compile(os.path.join(storage_dir, 'content', '[^/]+/?$'))
-        while True:
-            path = os.path.dirname(path)
-            if root_content_regex.match(path):
-                break
-            contents = os.listdir(path)
-            if contents:
-                break
-            if not os.access(path, os.W_OK):
-                break
-            os.rmdir(path)
+        done = set()
+        for path in sorted(directories, key=lambda p: p.count(os.sep), reverse=True):
+            while path not in done:
+                if root_content_regex.match(path):
+                    break
+                try:
+                    contents = os.listdir(path)
+                except OSError:
+                    # already removed, or not a directory
+                    break
+                if contents:
+                    break
+                done.add(path)
+                if not os.access(path, os.W_OK):
+                    break
+                os.rmdir(path)
+                path = os.path.dirname(path)
 
     @staticmethod
     def is_shared(storage_dir, path):
@@ -121,22 +121,27 @@ class RepoUnitAssociationManager(object):
 
         @raise InvalidType: if the given owner type is not of the valid enumeration
         """
+        # Like associate_unit_by_id, associations that already exist are left untouched.
+        return repo_controller.associate_units_by_id(
+            repo_id, ((unit_type_id, unit_id) for unit_id in unit_id_list),
+            update_existing=False)
 
-        # There may be a way to batch this in mongo which would be ideal for a
-        # bulk operation like this. But for deadline purposes, this call will
-        # simply loop and call the single method.
+    @staticmethod
+    def associate_units_by_id(repo_id, unit_refs):
+        """
+        Creates associations between the given repo and content units of any
+        type using bulk writes. Associations that already exist have their
+        "updated" timestamp refreshed.
 
-        unique_count = 0
-        for unit_id in unit_id_list:
-            if not RepoUnitAssociationManager.association_exists(repo_id, unit_id, unit_type_id):
-                unique_count += 1
-            self.associate_unit_by_id(repo_id, unit_type_id, unit_id, False)
+        :param repo_id:     identifies the repo
+        :type  repo_id:     str
+        :param unit_refs:   units to associate
+        :type  unit_refs:   iterable of (unit_type_id, unit_id) tuples
 
-        # update the count of associated units on the repo object
-        if unique_count:
-            repo_controller.update_unit_count(repo_id, unit_type_id, unique_count)
-            repo_controller.update_last_unit_added(repo_id)
-        return unique_count
+        :return:    number of new units added to the repo
+        :rtype:     int
+        """
+        return repo_controller.associate_units_by_id(repo_id, unit_refs)
 
     @staticmethod
     def _units_from_criteria(source_repo, criteria):
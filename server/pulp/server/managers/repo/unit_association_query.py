@@ -6,6 +6,8 @@ import itertools
 import pymongo
 
 from pulp.plugins.types import database as types_db
+from pulp.plugins.util.misc import paginate
+from pulp.server.controllers import repository as repo_controller
 from pulp.server.controllers import units
 from pulp.server.db.model.criteria import UnitAssociationCriteria
 from pulp.server.db.model.repository import RepoContentUnit
@@ -159,6 +161,68 @@ class RepoUnitAssociationQueryManager(object):
         # to a list. Should probably log this. Is there a log-level "stupid"?
         return list(units_generator)
 
+    @staticmethod
+    def supports_paging(criteria):
+        """
+        Determine whether the criteria can be served by get_units_paged(). Paging requires
+        the default ordering by unit type and unit ID.
+
+        :param criteria: the search criteria
+        :type  criteria: UnitAssociationCriteria
+
+        :return: True if get_units_paged() can be used for the criteria
+        :rtype:  bool
+        """
+        return not (criteria.association_sort or criteria.unit_sort or
+                    criteria.remove_duplicates)
+
+    def get_units_paged(self, repo_id, criteria=None, resume_token=None):
+        """
+        Get the units associated with the repository based on the provided unit association
+        criteria, ordered by unit type and unit ID.
+
+        Unlike get_units(), the associations are read with a cursor and the units are fetched
+        a page of associations at a time, so memory use does not depend on the size of the
+        repository. When the criteria has no unit filters, skip and limit are applied by the
+        database. Deep pages are better fetched with a resume token than with a large skip.
+
+        The criteria must not specify sorting or duplicate removal; see supports_paging().
+
+        :param repo_id: identifies the repository
+        :type  repo_id: str
+        :param criteria: if specified will drive the query
+        :type  criteria: UnitAssociationCriteria
+        :param resume_token: only return units after the unit the token was created for by
+                             pulp.server.controllers.repository.get_resume_token()
+        :type  resume_token: str
+
+        :return: generator of units associated with the repo
+        :rtype: generator
+
+        :raises pulp.server.exceptions.InvalidValue: if the resume token is not valid
+        """
+        criteria = criteria or UnitAssociationCriteria()
+
+        cursor = self._unit_associations_cursor(repo_id, criteria, resume_token)
+        cursor.sort([('unit_type_id', SORT_ASCENDING), ('unit_id', SORT_ASCENDING)])
+
+        skip = criteria.skip
+        limit = criteria.limit
+        if not criteria.unit_filters:
+            # Each association matches exactly one unit
+            if skip:
+                cursor.skip(skip)
+            if limit:
+                cursor.limit(limit)
+            skip = limit = None
+
+        units_generator = self._paged_units(criteria, cursor)
+
+        if skip or limit:
+            units_generator = self._with_skip_and_limit(units_generator, skip, limit)
+
+        return units_generator
+
     def get_units_across_types(self, repo_id, criteria=None, as_generator=False):
         """
         DEPRECATED: please use get_units()
@@ -247,13 +311,14 @@ class RepoUnitAssociationQueryManager(object):
     # -- unit association methods ----------------------------------------------
 
     @staticmethod
-    def _unit_associations_cursor(repo_id, criteria):
+    def _unit_associations_cursor(repo_id, criteria, resume_token=None):
         """
         Retrieve a pymongo cursor for unit associations for the given repository
         that match the given criteria.
 
         :type repo_id: str
         :type criteria: UnitAssociationCriteria
+        :type resume_token: str
         :rtype: pymongo.cursor.Cursor
         """
 
@@ -263,6 +328,9 @@ class RepoUnitAssociationQueryManager(object):
         if criteria.type_ids:
             spec['unit_type_id'] = {'$in': criteria.type_ids}
 
+        if resume_token:
+            spec = {'$and': [spec, repo_controller.resume_token_spec(resume_token)]}
+
         collection = RepoContentUnit.get_collection()
 
         cursor = collection.find(spec, projection=criteria.association_fields)
@@ -337,6 +405,36 @@ class RepoUnitAssociationQueryManager(object):
 
             generated_elements += 1
 
+    @classmethod
+    def _paged_units(cls, criteria, associations):
+        """
+        Return associated units as the unit association information and the unit information
+        as metadata on the unit association information, in the order of the associations.
+
+        The units are looked up a page of associations at a time. Associations whose unit does
+        not match the unit filters are left out.
+
+        :type criteria: UnitAssociationCriteria
+        :type associations: iterator
+        :rtype: generator
+        """
+        for page in paginate(associations):
+            unit_ids = {}
+            for association in page:
+                unit_ids.setdefault(association['unit_type_id'], []).append(association['unit_id'])
+
+            units_lookup = {}
+            for unit_type_id, ids in unit_ids.iteritems():
+                for unit in cls._associated_units_by_type_cursor(unit_type_id, criteria, ids):
+                    units_lookup[(unit_type_id, unit['_id'])] = unit
+
+            for association in page:
+                unit = units_lookup.get((association['unit_type_id'], association['unit_id']))
+                if unit is None:
+                    continue
+                association['metadata'] = unit
+                yield association
+
     # -- associated units methods ----------------------------------------------
 
     @staticmethod
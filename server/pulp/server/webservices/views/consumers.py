@@ -699,12 +699,18 @@ class ConsumerProfilesView(View):
         """
         Associate a profile with a consumer by content type ID.
 
+        A consumer may send only the hash of the profile it would report as 'profile_hash'. The
+        profile is not changed and is returned without the profile structure when it was last
+        reported with that hash. Otherwise, MissingResource is raised and the consumer needs to
+        report the full profile.
+
         :param request: WSGI request object
         :type request: django.core.handlers.wsgi.WSGIRequest
         :param consumer_id: A consumer ID.
         :type consumer_id: str
 
         :raises MissingValue: if some parameter were not provided
+        :raises MissingResource: if only a profile hash is given and it is not recognized
 
         :return: Response representing the created profile
         :rtype: django.http.HttpResponse
@@ -713,8 +719,16 @@ class ConsumerProfilesView(View):
         body = request.body_as_json
         content_type = body.get('content_type')
         profile = body.get('profile')
+        reported_hash = body.get('profile_hash')
 
         manager = factory.consumer_profile_manager()
+        if profile is None and reported_hash is not None:
+            if content_type is None:
+                raise MissingValue('content_type')
+            current_profile = manager.get_reported_profile(consumer_id, content_type,
+                                                           reported_hash)
+            add_link_profile(current_profile)
+            return generate_json_response_with_pulp_encoder(current_profile)
         new_profile = manager.create(consumer_id, content_type, profile)
         if content_type is None:
             raise MissingValue('content_type')
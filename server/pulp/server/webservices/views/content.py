@@ -8,8 +8,10 @@ from pulp.common import tags
 from pulp.common.tags import (ACTION_REFRESH_ALL_CONTENT_SOURCES,
                               ACTION_REFRESH_CONTENT_SOURCE,
                               RESOURCE_CONTENT_SOURCE)
+from pulp.plugins.util.misc import paginate
 from pulp.server import constants
 from pulp.server.auth import authorization
+from pulp.server.config import config as pulp_config
 from pulp.server.content.sources.container import ContentContainer
 from pulp.server.controllers import content
 from pulp.server.controllers import units as units_controller
@@ -24,7 +26,8 @@ from pulp.server.webservices.views.serializers import content as serial_content
 from pulp.server.webservices.views.util import (generate_json_response,
                                                 generate_json_response_with_pulp_encoder,
                                                 generate_redirect_response,
-                                                parse_json_body)
+                                                parse_json_body,
+                                                STREAM_CHUNK_SIZE)
 
 
 def _process_content_unit(content_unit, content_type):
@@ -69,7 +72,8 @@ class OrphanCollectionView(View):
         # convert the counts into sub-documents so we can add _href fields to them
         # add links to the content type sub-collections
         rest_summary = {}
-        for key, value in orphan_manager.orphans_summary().items():
+        max_age = pulp_config.getint('server', 'orphan_summary_max_age')
+        for key, value in orphan_manager.orphans_summary(max_age=max_age).items():
             rest_summary[key] = {
                 'count': value,
                 '_href': reverse('content_orphan_type_subcollection', kwargs={'content_type': key})
@@ -244,7 +248,10 @@ class ContentUnitSearch(search.SearchView):
     Adds GET and POST searching for content units.
     """
     optional_bool_fields = ('include_repos',)
+    optional_string_fields = ('resume_token',)
     manager = content_query.ContentQueryManager()
+    stream_results = True
+    paged = True
 
     @staticmethod
     def _add_repo_memberships(units, type_id):
@@ -285,17 +292,25 @@ class ContentUnitSearch(search.SearchView):
         """
         Overrides the base class so additional information can optionally be added.
         """
+        return list(cls.iter_results(query, search_method, options, *args, **kwargs))
 
+    @classmethod
+    def iter_results(cls, query, search_method, options, *args, **kwargs):
+        """
+        Overrides the base class so additional information can optionally be added. Repository
+        memberships are added a page of units at a time.
+        """
         type_id = kwargs['type_id']
         serializer = units_controller.get_model_serializer_for_type(type_id)
         if serializer and query.get('filters') is not None:
             # if we have a model serializer, translate the filter for this content unit type
             query['filters'] = serializer.translate_filters(serializer.model, query['filters'])
-        units = list(search_method(type_id, query))
-        units = [_process_content_unit(unit, type_id) for unit in units]
-        if options.get('include_repos') is True:
-            cls._add_repo_memberships(units, type_id)
-        return units
+        for page in paginate(search_method(type_id, query), STREAM_CHUNK_SIZE):
+            units = [_process_content_unit(unit, type_id) for unit in page]
+            if options.get('include_repos') is True:
+                cls._add_repo_memberships(units, type_id)
+            for unit in units:
+                yield unit
 
 
 class ContentUnitResourceView(View):
@@ -6,6 +6,7 @@ from django.views.generic import View
 from pulp.common import constants, dateutils, tags
 from pulp.server import exceptions
 from pulp.server.auth import authorization
+from pulp.server.constants import PULP_RESUME_TOKEN_HEADER
 from pulp.server.controllers import importer as importer_controller
 from pulp.server.controllers import repository as repo_controller
 from pulp.server.controllers import distributor as dist_controller
@@ -23,6 +24,7 @@ from pulp.server.webservices.views.serializers import content
 from pulp.server.webservices.views.util import (generate_json_response,
                                                 generate_json_response_with_pulp_encoder,
                                                 generate_redirect_response,
+                                                get_page_size,
                                                 parse_json_body)
 
 
@@ -261,8 +263,14 @@ class RepoSearch(search.SearchView):
 class RepoUnitSearch(search.SearchView):
     """
     Adds GET and POST searching for units within a repository.
+
+    Searches using the default ordering are paged with the database and limited to the
+    configured page size. When the page is full, a resume token for the next page is returned
+    in the Pulp-Resume-Token header and may be passed back as the resume_token option.
     """
 
+    optional_string_fields = ('resume_token',)
+
     @classmethod
     def _generate_response(cls, query, options, *args, **kwargs):
         """
@@ -279,19 +287,39 @@ class RepoUnitSearch(search.SearchView):
 
         :return:      The serialized search results in an HttpReponse
         :rtype:       django.http.HttpResponse
+
+        :raises exceptions.InvalidValue: if a resume token is given for a sorted search
         """
         repo_id = kwargs.get('repo_id')
         model.Repository.objects.get_repo_or_missing_resource(repo_id)
         criteria = UnitAssociationCriteria.from_client_input(query)
         manager = manager_factory.repo_unit_association_query_manager()
-        if criteria.type_ids is not None and len(criteria.type_ids) == 1:
+        resume_token = options.get('resume_token')
+        paged = manager.supports_paging(criteria)
+        # Sorted searches cannot be resumed so they are only limited when asked to be
+        criteria.limit = get_page_size(criteria.limit, default=paged)
+        if paged:
+            units = list(manager.get_units_paged(repo_id, criteria=criteria,
+                                                 resume_token=resume_token))
+        elif resume_token:
+            raise exceptions.InvalidValue(['resume_token'])
+        elif criteria.type_ids is not None and len(criteria.type_ids) == 1:
             type_id = criteria.type_ids[0]
             units = manager.get_units_by_type(repo_id, type_id, criteria=criteria)
         else:
             units = manager.get_units(repo_id, criteria=criteria)
+        if paged and criteria.limit and len(units) == criteria.limit:
+            last = units[-1]
+            resume_token = repo_controller.get_resume_token(last['unit_type_id'],
+                                                            last['unit_id'])
+        else:
+            resume_token = None
         for unit in units:
             content.serialize_unit_with_serializer(unit['metadata'])
-        return generate_json_response_with_pulp_encoder(units)
+        response = generate_json_response_with_pulp_encoder(units)
+        if resume_token:
+            response[PULP_RESUME_TOKEN_HEADER] = resume_token
+        return response
 
 
 class RepoImportersView(View):
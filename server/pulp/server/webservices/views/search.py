@@ -5,10 +5,13 @@ search view for a specific model.
 import json
 
 from django.views import generic
+from pymongo import ASCENDING
 from pymongo.errors import OperationFailure
 
+from pulp.plugins.util.misc import paginate
 from pulp.server import exceptions
 from pulp.server.auth import authorization
+from pulp.server.constants import PULP_RESUME_TOKEN_HEADER
 from pulp.server.db.model import criteria
 from pulp.server.webservices.views import util
 from pulp.server.webservices.views.decorators import auth_required
@@ -46,9 +49,22 @@ class SearchView(generic.View):
                                model instance, sane serializers are used by default, and this
                                method should not be defined.
     :vartype serializer:       staticmethod
+    :cvar    stream_results:   If True, the results are read from the database and serialized
+                               lazily by iter_results() and streamed to the caller as a JSON
+                               array. The response_builder is not used.
+    :vartype stream_results:   bool
+    :cvar    paged:            If True, searches that do not specify a sort are ordered by _id
+                               and limited to the configured page size. When the page is full,
+                               a resume token for the next page is returned in the
+                               Pulp-Resume-Token header and may be passed back as the
+                               resume_token option, which must be in optional_string_fields.
+                               The serialized results must include the _id.
+    :vartype paged:            bool
     """
 
     response_builder = staticmethod(util.generate_json_response_with_pulp_encoder)
+    stream_results = False
+    paged = False
     optional_string_fields = tuple()
     optional_bool_fields = tuple()
 
@@ -105,7 +121,8 @@ class SearchView(generic.View):
                 search_params[field] = value
 
         query, options = self._parse_args(search_params)
-        return self._generate_response(query, options, *args, **kwargs)
+        response = self._generate_response(query, options, *args, **kwargs)
+        return util.add_next_page_link(request, response)
 
     @auth_required(authorization.READ)
     @util.parse_json_body(json_type=dict)
@@ -166,9 +183,17 @@ class SearchView(generic.View):
         :return:      The serialized search results in an HttpReponse
         :rtype:       django.http.HttpResponse
 
-        :raises exceptions.InvalidValue: if pymongo is unable to use the criteria object
+        :raises exceptions.InvalidValue: if pymongo is unable to use the criteria object or a
+                                         resume token is given for a sorted search
         """
         query = criteria.Criteria.from_client_input(query)
+        resume_token = options.get('resume_token')
+        paged = cls.paged and not query.sort
+        if resume_token and not paged:
+            raise exceptions.InvalidValue(['resume_token'])
+        if cls.paged:
+            # Sorted searches cannot be resumed so they are only limited when asked to be
+            query.limit = util.get_page_size(query.limit, default=paged)
 
         # Our MongoEngine SearchViews will have cls.model set to the MongoEngine model, while the
         # "old" style objects will have the cls.manager attribute set to the model's manager. While
@@ -188,9 +213,27 @@ class SearchView(generic.View):
                 query.fields.append('id')
             search_method = cls.manager.find_by_criteria
 
+        if paged:
+            # in mongoengine id is an alias to _id
+            query.sort = [('id' if hasattr(cls, 'model') else '_id', ASCENDING)]
+            if resume_token:
+                spec = util.page_token_spec(resume_token)
+                query.filters = {'$and': [query.filters, spec]} if query.filters else spec
+
         # We do not validate all aspects of the criteria object, so if pymongo has a problem we
         # raise an InvalidValue.
         try:
+            if paged and query.limit:
+                # A page is bounded, so it is read before the response is built to know
+                # whether it is full.
+                results = cls.get_results(query, search_method, options, *args, **kwargs)
+                response = cls.response_builder(results)
+                if len(results) == query.limit:
+                    response[PULP_RESUME_TOKEN_HEADER] = util.get_page_token(results[-1]['_id'])
+                return response
+            if cls.stream_results:
+                return util.generate_streaming_json_response_with_pulp_encoder(
+                    cls.iter_results(query, search_method, options, *args, **kwargs))
             return cls.response_builder(cls.get_results(query, search_method, options,
                                                         *args, **kwargs))
         except OperationFailure, e:
@@ -218,6 +261,32 @@ class SearchView(generic.View):
         results = list(search_method(query))
         return cls._serialize_results(results, only=only)
 
+    @classmethod
+    def iter_results(cls, query, search_method, options, *args, **kwargs):
+        """
+        Search using the class's search method and serialize the results lazily, a page of
+        util.STREAM_CHUNK_SIZE results at a time. This is used instead of get_results() when
+        stream_results is set and can be overriden in the same way.
+
+        :param query: The criteria that should be used to search for objects
+        :type  query: dict
+        :param search_method: function that should be used to search
+        :type  search_method: func
+        :param options: additional options for including extra data
+        :type  options: dict
+
+        :return: generator of serialized search results
+        :rtype:  generator
+        """
+        only = query.get('fields')
+        results = search_method(query)
+        if hasattr(results, 'no_cache'):
+            # MongoEngine QuerySets otherwise keep every document that has been iterated
+            results = results.no_cache()
+        for page in paginate(results, util.STREAM_CHUNK_SIZE):
+            for result in cls._serialize_results(list(page), only=only):
+                yield result
+
 
 def _trim_results(model, results, only):
     """
@@ -12,13 +12,16 @@ from pulp.common.constants import CALL_CANCELED_STATE, CALL_COMPLETE_STATES
 from pulp.server import exceptions as pulp_exceptions
 from pulp.server.async import tasks
 from pulp.server.auth import authorization
+from pulp.server.constants import PULP_RESUME_TOKEN_HEADER
 from pulp.server.db.model import Worker, TaskStatus
 from pulp.server.exceptions import MissingResource
 from pulp.server.webservices.views import search
 from pulp.server.webservices.views.decorators import auth_required
 from pulp.server.webservices.views.serializers import dispatch as serial_dispatch
-from pulp.server.webservices.views.util import (generate_json_response,
-                                                generate_json_response_with_pulp_encoder)
+from pulp.server.webservices.views.util import (
+    add_next_page_link, generate_json_response, generate_json_response_with_pulp_encoder,
+    generate_streaming_json_response_with_pulp_encoder, get_page_size, get_page_token,
+    page_token_spec)
 
 
 # This constant set is used for deleting the completed tasks from the collection.
@@ -46,6 +49,9 @@ class TaskSearchView(search.SearchView):
     This view provides GET and POST searching on TaskStatus objects.
     """
     response_builder = staticmethod(generate_json_response_with_pulp_encoder)
+    optional_string_fields = ('resume_token',)
+    stream_results = True
+    paged = True
     model = TaskStatus
     serializer = staticmethod(task_serializer)
 
@@ -60,19 +66,38 @@ class TaskCollectionView(View):
         Return a response containing a list of all tasks or a response containing
         a list of tasks filtered by the optional GET parameter 'tags'.
 
+        Tasks are returned in the order they were created, a page of at most the optional GET
+        parameter 'limit' tasks at a time. When the page is full, a resume token for the next
+        page is returned in the Pulp-Resume-Token header and a link to the next page in the Link
+        header. The token may be passed back as the GET parameter 'resume_token'.
+
         :param request: WSGI request object
         :type  request: django.core.handlers.wsgi.WSGIRequest
 
         :return: Response containing a serialized list of dicts, one for each task
-        :rtype:  django.http.HttpResponse
+        :rtype:  django.http.HttpResponse or django.http.StreamingHttpResponse
+
+        :raises InvalidValue: if the limit or the resume token is not valid
         """
         tags = request.GET.getlist('tag')
         if tags:
             raw_tasks = TaskStatus.objects(tags__all=tags, group_id=None)
         else:
             raw_tasks = TaskStatus.objects(group_id=None)
-        serialized_task_statuses = [task_serializer(task) for task in raw_tasks]
-        return generate_json_response_with_pulp_encoder(serialized_task_statuses)
+        resume_token = request.GET.get('resume_token')
+        if resume_token:
+            raw_tasks = raw_tasks.filter(__raw__=page_token_spec(resume_token))
+        raw_tasks = raw_tasks.order_by('id')
+        limit = get_page_size(request.GET.get('limit'))
+        if not limit:
+            serialized_task_statuses = (task_serializer(task) for task in raw_tasks.no_cache())
+            return generate_streaming_json_response_with_pulp_encoder(serialized_task_statuses)
+        serialized_task_statuses = [task_serializer(task) for task in raw_tasks.limit(limit)]
+        response = generate_json_response_with_pulp_encoder(serialized_task_statuses)
+        if len(serialized_task_statuses) == limit:
+            response[PULP_RESUME_TOKEN_HEADER] = get_page_token(
+                serialized_task_statuses[-1]['_id'])
+        return add_next_page_link(request, response)
 
     @auth_required(authorization.DELETE)
     def delete(self, request):
@@ -3,16 +3,21 @@ from functools import wraps
 
 import functools
 import httplib
+import base64
+import itertools
 import json
 import sys
 
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils.encoding import iri_to_uri
 
 from pulp.common import dateutils, error_codes
 from pulp.common.util import decode_unicode, encode_unicode
 from pulp.server.compat import json_util
-from pulp.server.exceptions import PulpCodedValidationException, InputEncodingError
+from pulp.server.config import config as pulp_config
+from pulp.server.constants import PULP_RESUME_TOKEN_HEADER
+from pulp.server.exceptions import (
+    InputEncodingError, InvalidValue, PulpCodedValidationException)
 
 
 def pulp_json_encoder(obj):
@@ -65,6 +70,84 @@ generate_json_response_with_pulp_encoder = functools.partial(
 )
 
 
+# The number of objects encoded in each chunk of a streaming JSON response.
+STREAM_CHUNK_SIZE = 100
+
+
+def iter_json_array(content, default=None, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Serialize the objects in an iterable as a JSON array. The array is yielded in chunks of
+    encoded objects so the iterable is consumed lazily and never held in memory.
+
+    :param content    : objects to be serialized
+    :type  content    : iterable
+    :param default    : function used by json to serialize content (also called default)
+    :type  default    : function or None
+    :param chunk_size : number of objects encoded in each chunk
+    :type  chunk_size : int
+
+    :return           : generator of str chunks that together form a JSON array
+    :rtype            : generator
+    """
+    encoder = json.JSONEncoder(default=default)
+    yield '['
+    chunk = []
+    separator = ''
+    for obj in content:
+        chunk.append(separator)
+        chunk.append(encoder.encode(obj))
+        separator = ', '
+        if len(chunk) >= chunk_size * 2:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+    yield ']'
+
+
+def generate_streaming_json_response(content=None, default=None,
+                                     content_type='application/json; charset=utf-8'):
+    """
+    Serialize the objects in an iterable and return a django response that streams them as
+    a JSON array.
+
+    The first object is retrieved before the response is returned so that errors raised when
+    starting a query, such as an invalid criteria, are raised by the view rather than while
+    the response is being streamed.
+
+    :param content        : objects to be serialized
+    :type  content        : iterable
+    :param default        : function used by json to serialize content (also called default)
+    :type  default        : function or None
+    :param content_type   : type of returned content
+    :type  content_type   : str
+
+    :return               : response streaming the serialized content
+    :rtype                : django.http.StreamingHttpResponse
+    """
+    content = iter(content or [])
+    try:
+        first = next(content)
+    except StopIteration:
+        pass
+    else:
+        content = itertools.chain([first], content)
+    return StreamingHttpResponse(iter_json_array(content, default=default),
+                                 content_type=content_type)
+
+
+"""
+Shortcut function to generate a streaming json response using the in house json_encoder.
+
+This function is equivalent to:
+generate_streaming_json_response(content, default=pulp_json_encoder)
+"""
+generate_streaming_json_response_with_pulp_encoder = functools.partial(
+    generate_streaming_json_response,
+    default=pulp_json_encoder,
+)
+
+
 def generate_redirect_response(response, href):
     response['Location'] = iri_to_uri(href)
     response.status_code = httplib.CREATED
@@ -72,6 +155,96 @@ def generate_redirect_response(response, href):
     return response
 
 
+def get_page_size(limit=None, default=True):
+    """
+    Apply the page sizes configured in the [server] section to the limit requested by a client.
+    The limit is reduced to max_page_size. When no limit is requested, default_page_size is
+    used, or max_page_size when that is not set. A size of 0 means no limit.
+
+    :param limit:   The number of results requested by the client.
+    :type  limit:   int
+    :param default: Apply the default page size when no limit is requested. This should only
+                    be done for listings the client can page through with a resume token.
+    :type  default: bool
+
+    :return: The number of results to return or None when they are not limited.
+    :rtype:  int
+
+    :raises InvalidValue: if the limit is not a positive integer
+    """
+    max_size = pulp_config.getint('server', 'max_page_size')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise InvalidValue(['limit'])
+        if limit < 1:
+            raise InvalidValue(['limit'])
+    elif default:
+        limit = pulp_config.getint('server', 'default_page_size') or max_size
+    if limit and max_size:
+        limit = min(limit, max_size)
+    return limit or None
+
+
+def get_page_token(_id):
+    """
+    Create an opaque token that resumes an _id ordered listing after the given document.
+
+    :param _id: The _id of the last document returned.
+    :type  _id: bson.objectid.ObjectId or basestring
+
+    :return: A token that may be passed to page_token_spec().
+    :rtype:  str
+    """
+    return base64.urlsafe_b64encode(json_util.dumps(_id))
+
+
+def page_token_spec(resume_token):
+    """
+    Build the query for the documents that come after the document identified by a resume
+    token, in _id order.
+
+    :param resume_token: A token created by get_page_token().
+    :type  resume_token: str
+
+    :return: A mongo spec.
+    :rtype:  dict
+
+    :raises InvalidValue: if the token is not valid
+    """
+    try:
+        _id = json_util.loads(base64.urlsafe_b64decode(str(resume_token)))
+    except (TypeError, ValueError):
+        raise InvalidValue(['resume_token'])
+    if isinstance(_id, (dict, list)):
+        raise InvalidValue(['resume_token'])
+    return {'_id': {'$gt': _id}}
+
+
+def add_next_page_link(request, response):
+    """
+    When a response to a GET request carries a resume token, add a Link header referring to
+    the next page. The link repeats the request with the resume_token parameter set to the
+    token.
+
+    :param request:  WSGI request object
+    :type  request:  django.core.handlers.wsgi.WSGIRequest
+    :param response: The response to the request.
+    :type  response: django.http.HttpResponseBase
+
+    :return: The response.
+    :rtype:  django.http.HttpResponseBase
+    """
+    if request.method != 'GET' or not response.has_header(PULP_RESUME_TOKEN_HEADER):
+        return response
+    params = request.GET.copy()
+    params['resume_token'] = response[PULP_RESUME_TOKEN_HEADER]
+    href = '%s?%s' % (request.path, params.urlencode())
+    response['Link'] = '<%s>; rel="next"' % iri_to_uri(href)
+    return response
+
+
 def _ensure_input_encoding(input):
     """
     Recursively traverse any input structures and ensure any strings are
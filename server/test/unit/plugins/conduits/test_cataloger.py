@@ -3,6 +3,7 @@ from uuid import uuid4
 from ... import base
 from pulp.plugins.conduits.cataloger import CatalogerConduit
 from pulp.server.db.model.content import ContentCatalog
+from pulp.server.managers.content.catalog import ContentCatalogManager
 
 
 TYPE_ID = 'type_a'
@@ -39,6 +40,8 @@ class TestCatalogerConduit(base.PulpServerTests):
         for unit_key, url in units:
             conduit.add_entry(TYPE_ID, unit_key, url)
         collection = ContentCatalog.get_collection()
+        self.assertEqual(collection.find().count(), 0)
+        conduit.flush()
         self.assertEqual(conduit.source_id, SOURCE_ID)
         self.assertEqual(conduit.expires, EXPIRES)
         self.assertEqual(len(units), collection.find().count())
@@ -51,6 +54,58 @@ class TestCatalogerConduit(base.PulpServerTests):
             self.assertEqual(entry['unit_key'], unit_key)
             self.assertEqual(entry['url'], url)
 
+    def test_add_batched(self):
+        units = self.units(0, 10)
+        conduit = CatalogerConduit(SOURCE_ID, EXPIRES, batch_size=4)
+        for unit_key, url in units:
+            conduit.add_entry(TYPE_ID, unit_key, url)
+        collection = ContentCatalog.get_collection()
+        self.assertEqual(collection.find().count(), 8)
+        conduit.flush()
+        self.assertEqual(collection.find().count(), len(units))
+        self.assertEqual(conduit.added_count, len(units))
+
+    def test_stage_and_publish(self):
+        collection = ContentCatalog.get_collection()
+        manager = ContentCatalogManager()
+        old_units = self.units(0, 10)
+        for unit_key, url in old_units:
+            manager.add_entry(SOURCE_ID, EXPIRES, TYPE_ID, unit_key, url)
+        units = self.units(10, 5)
+        conduit = CatalogerConduit(SOURCE_ID, EXPIRES)
+        conduit.stage()
+        for unit_key, url in units:
+            conduit.add_entry(TYPE_ID, unit_key, url)
+        conduit.flush()
+        # staged entries are not visible
+        self.assertEqual(collection.find().count(), len(old_units) + len(units))
+        for unit_key, url in units:
+            self.assertEqual(manager.find(TYPE_ID, unit_key), [])
+        for unit_key, url in old_units:
+            self.assertEqual(len(manager.find(TYPE_ID, unit_key)), 1)
+        purged = conduit.publish()
+        # old generation purged
+        self.assertEqual(purged, len(old_units))
+        self.assertEqual(conduit.generation, None)
+        self.assertEqual(collection.find().count(), len(units))
+        for unit_key, url in units:
+            self.assertEqual(len(manager.find(TYPE_ID, unit_key)), 1)
+
+    def test_publish_without_purge(self):
+        collection = ContentCatalog.get_collection()
+        manager = ContentCatalogManager()
+        unit_key, url = self.units(0, 1)[0]
+        manager.add_entry(SOURCE_ID, EXPIRES, TYPE_ID, unit_key, url)
+        conduit = CatalogerConduit(SOURCE_ID, EXPIRES)
+        conduit.stage()
+        conduit.add_entry(TYPE_ID, unit_key, url + '/new')
+        purged = conduit.publish(purge=False)
+        self.assertEqual(purged, 0)
+        self.assertEqual(collection.find().count(), 2)
+        entries = manager.find(TYPE_ID, unit_key)
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['url'], url + '/new')
+
     def test_delete(self):
         units = self.units(0, 10)
         conduit = CatalogerConduit(SOURCE_ID, EXPIRES)
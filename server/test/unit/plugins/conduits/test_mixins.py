@@ -487,6 +487,28 @@ class AddUnitMixinTests(unittest.TestCase):
         self.assertRaises(mixins.ImporterConduitException, self.mixin.init_unit, 't', {'k': 'v'},
                           {'m': 'm1'}, '/bar')
 
+    @mock.patch('pulp.server.managers.repo.unit_association.RepoUnitAssociationManager.'
+                'associate_units_by_id')
+    def test_associate_units(self, mock_associate):
+        mock_associate.return_value = 1
+        units = [Unit('t', {'k': 'v1'}, {}, None), Unit('t', {'k': 'v2'}, {}, None)]
+        units[0].id = 'u1'
+        units[1].id = 'u2'
+
+        added = self.mixin.associate_units(units)
+
+        self.assertEqual(added, 1)
+        repo_id, unit_refs = mock_associate.call_args[0]
+        self.assertEqual(repo_id, self.repo_id)
+        self.assertEqual(list(unit_refs), [('t', 'u1'), ('t', 'u2')])
+
+    @mock.patch('pulp.server.managers.repo.unit_association.RepoUnitAssociationManager.'
+                'associate_units_by_id')
+    def test_associate_units_server_error(self, mock_associate):
+        mock_associate.side_effect = Exception()
+
+        self.assertRaises(mixins.ImporterConduitException, self.mixin.associate_units, [])
+
     @mock.patch('pulp.server.managers.content.query.ContentQueryManager.'
                 'request_content_unit_file_path')
     @mock.patch('pulp.server.managers.content.query.ContentQueryManager.'
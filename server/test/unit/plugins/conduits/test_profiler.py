@@ -1,3 +1,5 @@
+import unittest
+
 import mock
 
 from ... import base
@@ -149,3 +151,32 @@ class BaseProfilerConduitTests(base.PulpServerTests):
         for u in units:
             self.assertTrue('key-1' in u.unit_key)
             self.assertTrue('extra_field' in u.metadata)
+
+
+class TestProfilerConduitRepoUnitsCache(unittest.TestCase):
+
+    @mock.patch('pulp.plugins.conduits.profiler.ProfilerConduit._get_repo_units')
+    def test_no_cache(self, mock_get_repo_units):
+        mock_get_repo_units.return_value = ['unit']
+        conduit = ProfilerConduit()
+
+        conduit.get_repo_units('repo', 'type-1')
+        conduit.get_repo_units('repo', 'type-1')
+
+        self.assertEqual(mock_get_repo_units.call_count, 2)
+
+    @mock.patch('pulp.plugins.conduits.profiler.ProfilerConduit._get_repo_units')
+    def test_cache(self, mock_get_repo_units):
+        mock_get_repo_units.return_value = ['unit']
+        conduit = ProfilerConduit(cache_repo_units=True)
+
+        units1 = conduit.get_repo_units('repo', 'type-1', ['b', 'a'])
+        units2 = conduit.get_repo_units('repo', 'type-1', ['a', 'b'])
+        conduit.get_repo_units('repo', 'type-2')
+
+        self.assertEqual(units1, ['unit'])
+        self.assertEqual(units2, ['unit'])
+        self.assertTrue(units1 is not units2)
+        self.assertEqual(mock_get_repo_units.call_args_list,
+                         [mock.call('repo', 'type-1', ['b', 'a']),
+                          mock.call('repo', 'type-2', [])])
@@ -0,0 +1,45 @@
+from unittest import TestCase
+
+from mock import Mock
+
+from pulp.plugins.profiler import Profiler
+
+
+class TestCalculateApplicableUnitsBulk(TestCase):
+    """
+    This class contains tests for pulp.plugins.profiler.Profiler.calculate_applicable_units_bulk().
+    """
+    def test_default_calls_per_profile(self):
+        """
+        Test that the default implementation falls back to calculate_applicable_units().
+        """
+        profiler = Profiler()
+        profiler.calculate_applicable_units = Mock(side_effect=lambda p, r, c, x: {'rpm': p})
+        config = Mock()
+        conduit = Mock()
+
+        result = profiler.calculate_applicable_units_bulk({'hash-1': ['a'], 'hash-2': ['b']},
+                                                          'repo-1', config, conduit)
+
+        self.assertEqual(result, {'hash-1': {'rpm': ['a']}, 'hash-2': {'rpm': ['b']}})
+        self.assertEqual(profiler.calculate_applicable_units.call_count, 2)
+        profiler.calculate_applicable_units.assert_any_call(['a'], 'repo-1', config, conduit)
+
+    def test_not_implemented(self):
+        """
+        Test that profilers without applicability support raise NotImplementedError.
+        """
+        self.assertRaises(NotImplementedError, Profiler().calculate_applicable_units_bulk,
+                          {'hash-1': ['a']}, 'repo-1', Mock(), Mock())
+
+
+class TestCalculateApplicableUnitsDelta(TestCase):
+    """
+    This class contains tests for pulp.plugins.profiler.Profiler.calculate_applicable_units_delta().
+    """
+    def test_not_implemented_by_default(self):
+        """
+        Test that Pulp falls back to full regeneration unless a profiler implements the delta.
+        """
+        self.assertRaises(NotImplementedError, Profiler().calculate_applicable_units_delta,
+                          {'hash-1': ['a']}, 'repo-1', {'rpm': ['unit-1']}, Mock(), Mock())
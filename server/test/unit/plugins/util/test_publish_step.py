@@ -4,12 +4,13 @@ import shutil
 import sys
 import tarfile
 import tempfile
+import threading
 import time
 import traceback
 import unittest
 
 import mongoengine
-from mock import Mock, patch, MagicMock
+from mock import call, Mock, patch, MagicMock
 from nectar.downloaders.local import LocalFileDownloader
 from nectar.request import DownloadRequest
 
@@ -21,6 +22,7 @@ from pulp.plugins.config import PluginCallConfiguration
 from pulp.plugins.model import Repository, SyncReport, Unit
 from pulp.plugins.util import publish_step
 from pulp.server.db import model
+from pulp.server.exceptions import PulpCodedTaskFailedException
 from pulp.server.managers import factory
 
 factory.initialize()
@@ -128,6 +130,118 @@ class TestUnitModelPluginStep(PluginBase):
 
         self.assertEqual(list(ret), [u1, u2, u3])
 
+    def test_get_iterator_batches(self):
+        units = [MagicMock() for i in range(5)]
+        self.step._unit_querysets = [units[:3], units[3:]]
+        self.step.batch_size = 2
+
+        ret = self.step.get_iterator()
+
+        self.assertEqual(list(ret), [tuple(units[:2]), tuple(units[2:4]), (units[4],)])
+
+    def _batch_step(self, units, batch_size, **kwargs):
+        step = publish_step.UnitModelPluginStep('mytype', [self.ModelA], repo=self.repo,
+                                                conduit=self.conduit, batch_size=batch_size,
+                                                **kwargs)
+        step._unit_querysets = [units]
+        step._total = len(units)
+        step.report_progress = Mock()
+        return step
+
+    def test_process_batches(self):
+        step = self._batch_step(range(7), 3)
+        step.process_batch = Mock(side_effect=lambda units: len(units))
+        step.process_result = Mock()
+
+        step.process()
+
+        self.assertEqual([c[0][0] for c in step.process_batch.call_args_list],
+                         [(0, 1, 2), (3, 4, 5), (6,)])
+        step.process_result.assert_has_calls([call((0, 1, 2), 3), call((3, 4, 5), 3),
+                                              call((6,), 1)])
+        self.assertEqual(step.progress_successes, 7)
+        self.assertEqual(step.report_progress.call_count, 5)
+
+    def test_process_batch_default(self):
+        step = self._batch_step(range(5), 2)
+        step.process_main = Mock(side_effect=lambda item: item * 2)
+        step.process_result = Mock()
+
+        step.process()
+
+        self.assertEqual(step.process_main.call_count, 5)
+        step.process_result.assert_has_calls([call((0, 1), [0, 2]), call((2, 3), [4, 6]),
+                                              call((4,), [8])])
+
+    def test_process_batch_default_unit_failure(self):
+        self.conduit.task_id = 'task'
+        step = self._batch_step(range(6), 3, non_halting_exceptions=[ValueError])
+
+        def process_main(item):
+            if item == 1:
+                raise ValueError('bad unit')
+            return item * 2
+
+        step.process_main = Mock(side_effect=process_main)
+        step.process_result = Mock()
+
+        self.assertRaises(PulpCodedTaskFailedException, step.process)
+
+        # the units after the failing one are still processed
+        self.assertEqual(step.process_main.call_count, 6)
+        step.process_result.assert_has_calls([call((0, 1, 2), [0, None, 4]),
+                                              call((3, 4, 5), [6, 8, 10])])
+        self.assertEqual(step.progress_successes, 5)
+        self.assertEqual(step.progress_failures, 1)
+        self.assertEqual(len(step.error_details), 1)
+
+    def test_process_batch_default_unit_failure_concurrently(self):
+        self.conduit.task_id = 'task'
+        step = self._batch_step(range(6), 3, non_halting_exceptions=[ValueError], max_workers=2)
+
+        def process_main(item):
+            if item == 4:
+                raise ValueError('bad unit')
+            return item
+
+        step.process_main = Mock(side_effect=process_main)
+
+        self.assertRaises(PulpCodedTaskFailedException, step.process)
+
+        self.assertEqual(step.process_main.call_count, 6)
+        self.assertEqual(step.progress_successes, 5)
+        self.assertEqual(step.progress_failures, 1)
+
+    def test_process_batch_default_halting_failure(self):
+        step = self._batch_step(range(3), 3, non_halting_exceptions=[ValueError])
+        step.process_main = Mock(side_effect=[None, TypeError('bad unit'), None])
+
+        self.assertRaises(TypeError, step.process)
+
+        self.assertEqual(step.process_main.call_count, 2)
+
+    def test_process_batch_non_halting_failure(self):
+        self.conduit.task_id = 'task'
+        step = self._batch_step(range(5), 2, non_halting_exceptions=[ValueError])
+        step.process_batch = Mock(side_effect=[None, ValueError('bad batch'), None])
+
+        self.assertRaises(PulpCodedTaskFailedException, step.process)
+
+        self.assertEqual(step.progress_successes, 3)
+        self.assertEqual(step.progress_failures, 2)
+        self.assertEqual(len(step.error_details), 1)
+
+    def test_process_batches_concurrently(self):
+        step = self._batch_step(range(10), 3, max_workers=2)
+        step.process_batch = Mock(side_effect=lambda units: sum(units))
+        step.process_result = Mock()
+
+        step.process()
+
+        step.process_result.assert_has_calls([call((0, 1, 2), 3), call((3, 4, 5), 12),
+                                              call((6, 7, 8), 21), call((9,), 9)])
+        self.assertEqual(step.progress_successes, 10)
+
 
 class PostOrderTests(unittest.TestCase):
 
@@ -199,6 +313,92 @@ class StepTests(PublisherBase):
         step.report_progress()
         self.assertFalse(step.status_conduit.report_progress.called)
 
+    def test_report_progress_throttled(self):
+        step = publish_step.Step('foo_step', status_conduit=Mock())
+        step.progress_throttle = publish_step.ProgressThrottle(interval=60, min_delta=1)
+        child = publish_step.Step('child_step')
+        step.add_child(child)
+
+        for i in range(10):
+            child.report_progress()
+
+        # only the first update is written, the rest are coalesced
+        self.assertEqual(step.status_conduit.set_progress.call_count, 1)
+        self.assertEqual(step.progress_throttle.suppressed, 9)
+
+    def test_report_progress_state_change_forces_write(self):
+        step = publish_step.Step('foo_step', status_conduit=Mock())
+        step.progress_throttle = publish_step.ProgressThrottle(interval=60, min_delta=1)
+        child = publish_step.Step('child_step')
+        step.add_child(child)
+        child.report_progress()
+
+        child.state = reporting_constants.STATE_RUNNING
+        child.report_progress()
+        child.report_progress()
+
+        self.assertEqual(step.status_conduit.set_progress.call_count, 2)
+        self.assertEqual(step.progress_throttle.suppressed, 1)
+
+    @patch('pulp.plugins.util.publish_step.pulp_config')
+    def test_report_progress_creates_throttle(self, mock_config):
+        mock_config.getfloat.return_value = 5.0
+        mock_config.getint.return_value = 10
+        step = publish_step.Step('foo_step', status_conduit=Mock())
+
+        step.report_progress()
+
+        self.assertEqual(step.progress_throttle.interval, 5.0)
+        self.assertEqual(step.progress_throttle.min_delta, 10)
+        mock_config.getfloat.assert_called_once_with('tasks', 'progress_interval')
+        mock_config.getint.assert_called_once_with('tasks', 'progress_min_delta')
+        step.status_conduit.set_progress.assert_called_once_with(step.get_progress_report())
+
+
+@patch('pulp.plugins.util.publish_step.time')
+class TestProgressThrottle(unittest.TestCase):
+
+    def test_first_update_written(self, mock_time):
+        mock_time.time.return_value = 100.0
+        throttle = publish_step.ProgressThrottle(interval=1, min_delta=1)
+
+        self.assertTrue(throttle.update())
+        self.assertEqual(throttle.writes, 1)
+        self.assertEqual(throttle.last_write, 100.0)
+
+    def test_interval(self, mock_time):
+        mock_time.time.return_value = 100.0
+        throttle = publish_step.ProgressThrottle(interval=1, min_delta=1)
+        throttle.update()
+
+        mock_time.time.return_value = 100.5
+        self.assertFalse(throttle.update())
+        mock_time.time.return_value = 101.0
+        self.assertTrue(throttle.update())
+
+        self.assertEqual(throttle.writes, 2)
+        self.assertEqual(throttle.suppressed, 1)
+
+    def test_min_delta(self, mock_time):
+        mock_time.time.return_value = 100.0
+        throttle = publish_step.ProgressThrottle(interval=0, min_delta=3)
+        throttle.update()
+
+        self.assertFalse(throttle.update())
+        self.assertFalse(throttle.update())
+        self.assertTrue(throttle.update())
+        self.assertEqual(throttle.pending, 0)
+        self.assertEqual(throttle.suppressed, 2)
+
+    def test_force(self, mock_time):
+        mock_time.time.return_value = 100.0
+        throttle = publish_step.ProgressThrottle(interval=60, min_delta=100)
+        throttle.update()
+
+        self.assertTrue(throttle.update(force=True))
+        self.assertEqual(throttle.writes, 2)
+        self.assertEqual(throttle.suppressed, 0)
+
 
 class TestStepProcessBlock(unittest.TestCase):
     def test_increments_progress(self):
@@ -220,6 +420,170 @@ class TestStepProcessBlock(unittest.TestCase):
         self.assertEqual(step.progress_successes, 1)
 
 
+class ItemStep(publish_step.Step):
+    """
+    Processes a list of items, recording the results handed to process_result().
+    """
+
+    def __init__(self, items, delays=None, **kwargs):
+        super(ItemStep, self).__init__('item_step', status_conduit=Mock(), **kwargs)
+        self.items = items
+        self.delays = delays or {}
+        self.results = []
+        self.threads = set()
+
+    def get_iterator(self):
+        return iter(self.items)
+
+    def get_total(self):
+        return len(self.items)
+
+    def process_main(self, item=None):
+        self.threads.add(threading.current_thread().name)
+        time.sleep(self.delays.get(item, 0))
+        if isinstance(item, Exception):
+            raise item
+        return item * 2
+
+    def process_result(self, item, result):
+        self.results.append((item, result))
+
+
+class TestStepConcurrentItems(unittest.TestCase):
+
+    def test_process_result_serial(self):
+        step = ItemStep([1, 2, 3])
+
+        step.process()
+
+        self.assertEqual(step.results, [(1, 2), (2, 4), (3, 6)])
+        self.assertEqual(step.threads, set([threading.current_thread().name]))
+
+    def test_results_in_order(self):
+        items = range(1, 21)
+        # earlier items finish last
+        delays = dict((i, 0.002 * (20 - i)) for i in items)
+        step = ItemStep(items, delays=delays, max_workers=4)
+
+        step.process()
+
+        self.assertEqual(step.results, [(i, i * 2) for i in items])
+        self.assertEqual(step.progress_successes, 20)
+        self.assertEqual(step.state, reporting_constants.STATE_COMPLETE)
+        self.assertFalse(threading.current_thread().name in step.threads)
+
+    def test_non_halting_exception(self):
+        error = ValueError('bad item')
+        step = ItemStep([1, error, 3], max_workers=2, non_halting_exceptions=[ValueError])
+
+        self.assertRaises(PulpCodedTaskFailedException, step.process)
+
+        self.assertEqual(step.results, [(1, 2), (3, 6)])
+        self.assertEqual(step.exceptions, [error])
+        self.assertEqual(step.progress_failures, 1)
+        self.assertEqual(step.progress_successes, 2)
+
+    def test_halting_exception(self):
+        error = ValueError('bad item')
+        step = ItemStep([1, error] + range(3, 50), max_workers=2)
+
+        self.assertRaises(ValueError, step.process)
+
+        self.assertEqual(step.results, [(1, 2)])
+        self.assertEqual(step.state, reporting_constants.STATE_FAILED)
+        self.assertEqual(threading.active_count(), 1)
+
+    def test_canceled(self):
+        step = ItemStep(range(1, 50), max_workers=2)
+
+        def process_result(item, result):
+            step.results.append((item, result))
+            step.canceled = True
+
+        step.process_result = process_result
+        step.process()
+
+        self.assertEqual(step.results, [(1, 2)])
+        self.assertEqual(threading.active_count(), 1)
+
+
+class RecordingStep(publish_step.Step):
+    """
+    Records the order steps are processed in and, optionally, waits for another step to start.
+    """
+
+    def __init__(self, step_id, log, wait_for=None, error=None, **kwargs):
+        super(RecordingStep, self).__init__(step_id, status_conduit=Mock(), **kwargs)
+        self.log = log
+        self.wait_for = wait_for
+        self.error = error
+        self.started = threading.Event()
+
+    def process_main(self, item=None):
+        self.started.set()
+        if self.wait_for is not None:
+            self.log.append((self.step_id, self.wait_for.started.wait(5) or
+                             self.wait_for.started.is_set()))
+        else:
+            self.log.append(self.step_id)
+        if self.error:
+            raise self.error
+
+
+class TestStepConcurrentSiblings(unittest.TestCase):
+
+    def test_independent_siblings_concurrent(self):
+        log = []
+        root = RecordingStep('root', log)
+        first = RecordingStep('first', log)
+        a = RecordingStep('a', log, independent=True)
+        b = RecordingStep('b', log, wait_for=a, independent=True)
+        a.wait_for = b
+        last = RecordingStep('last', log)
+        for step in (first, a, b, last):
+            root.add_child(step)
+
+        root.process_lifecycle()
+
+        self.assertEqual(log[0], 'first')
+        # a and b each saw the other running
+        self.assertEqual(sorted(log[1:3]), [('a', True), ('b', True)])
+        self.assertEqual(log[3:], ['last', 'root'])
+        for step in (root, first, a, b, last):
+            self.assertEqual(step.state, reporting_constants.STATE_COMPLETE)
+
+    def test_independent_children_post_order(self):
+        log = []
+        root = RecordingStep('root', log)
+        a = RecordingStep('a', log, independent=True)
+        a.add_child(RecordingStep('a1', log))
+        root.add_child(a)
+        root.add_child(RecordingStep('b', log, independent=True))
+
+        root.process_lifecycle()
+
+        self.assertTrue(log.index('a1') < log.index('a'))
+        self.assertEqual(log[-1], 'root')
+        self.assertEqual(sorted(log), ['a', 'a1', 'b', 'root'])
+
+    def test_independent_sibling_fails(self):
+        log = []
+        root = RecordingStep('root', log)
+        a = RecordingStep('a', log, error=ValueError('a failed'), independent=True)
+        b = RecordingStep('b', log, independent=True)
+        last = RecordingStep('last', log)
+        for step in (a, b, last):
+            root.add_child(step)
+
+        self.assertRaises(ValueError, root.process_lifecycle)
+
+        self.assertEqual(sorted(log), ['a', 'b'])
+        self.assertEqual(a.state, reporting_constants.STATE_FAILED)
+        self.assertEqual(b.state, reporting_constants.STATE_COMPLETE)
+        self.assertEqual(root.state, reporting_constants.STATE_FAILED)
+        self.assertEqual(last.state, reporting_constants.STATE_NOT_STARTED)
+
+
 class PluginStepTests(PluginBase):
     """
     This class has a lot of duplicated tests from PublishStepTests, in order to
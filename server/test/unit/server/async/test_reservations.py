@@ -0,0 +1,261 @@
+"""
+This module contains tests for the pulp.server.async.reservations module.
+"""
+import unittest
+
+import mock
+
+from pulp.server.async import reservations
+
+
+MODULE = 'pulp.server.async.reservations'
+
+
+def _worker(name):
+    return {'name': name}
+
+
+def _reservation(task_id, worker_name, resource_id):
+    return {'task_id': task_id, 'worker_name': worker_name, 'resource_id': resource_id}
+
+
+@mock.patch(MODULE + '.ReservedResource')
+@mock.patch(MODULE + '.Worker')
+class TestReservationScheduler(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch(MODULE + '.ReservationEvent')
+        self.mock_event = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.events = []
+        self.cursor = self.mock_event._get_collection.return_value.find.return_value
+        self.cursor.alive = True
+        self.cursor.__iter__.return_value = iter([])
+        self.cursor.next.side_effect = self._next_event
+
+    def _next_event(self):
+        if not self.events:
+            raise StopIteration()
+        return self.events.pop(0)
+
+    def _scheduler(self, mock_worker, mock_reserved, workers, reserved=()):
+        mock_worker.objects.get_online.return_value = [_worker(n) for n in workers]
+        mock_reserved.objects.all.return_value = [_reservation(*r) for r in reserved]
+        return reservations.ReservationScheduler(
+            worker_filter=lambda name: not name.startswith('resource_manager'))
+
+    def test_refresh(self, mock_worker, mock_reserved):
+        scheduler = self._scheduler(mock_worker, mock_reserved,
+                                    ['w1', 'w2', 'resource_manager@host'],
+                                    [('t1', 'w1', 'r1'), ('t2', 'w1', 'r2')])
+        scheduler.refresh()
+        self.assertEqual(scheduler.workers, set(['w1', 'w2']))
+        self.assertEqual(scheduler.reservations, {'t1': ('w1', 'r1'), 't2': ('w1', 'r2')})
+        self.assertEqual(scheduler.resources, {'r1': 'w1', 'r2': 'w1'})
+        self.assertEqual(scheduler.load, {'w1': set(['t1', 't2'])})
+
+    def test_reserve_held_resource(self, mock_worker, mock_reserved):
+        scheduler = self._scheduler(mock_worker, mock_reserved, ['w1', 'w2'],
+                                    [('t1', 'w1', 'r1')])
+        self.assertEqual(scheduler.reserve('t2', 'r1'), 'w1')
+        self.assertEqual(scheduler.load['w1'], set(['t1', 't2']))
+
+    def test_reserve_unreserved_worker(self, mock_worker, mock_reserved):
+        scheduler = self._scheduler(mock_worker, mock_reserved, ['w1', 'w2'],
+                                    [('t1', 'w1', 'r1')])
+        self.assertEqual(scheduler.reserve('t2', 'r2'), 'w2')
+        self.assertEqual(scheduler.resources['r2'], 'w2')
+
+    def test_reserve_held_by_offline_worker(self, mock_worker, mock_reserved):
+        scheduler = self._scheduler(mock_worker, mock_reserved, ['w2'],
+                                    [('t1', 'w1', 'r1')])
+        self.assertEqual(scheduler.reserve('t2', 'r1'), 'w2')
+
+    def test_reserve_does_not_query_when_fresh(self, mock_worker, mock_reserved):
+        scheduler = self._scheduler(mock_worker, mock_reserved, ['w1', 'w2', 'w3'])
+        scheduler.reserve('t1', 'r1')
+        scheduler.reserve('t2', 'r2')
+        self.assertEqual(mock_worker.objects.get_online.call_count, 1)
+        self.assertEqual(mock_reserved.objects.all.call_count, 1)
+
+    @mock.patch(MODULE + '.time')
+    def test_reserve_refreshes_when_stale(self, mock_time, mock_worker, mock_reserved):
+        mock_time.time.return_value = 100.0
+        scheduler = self._scheduler(mock_worker, mock_reserved, ['w1'])
+        scheduler.reserve('t1', 'r1')
+        mock_time.time.return_value = 100.0 + scheduler.refresh_interval
+        scheduler.reserve('t2', 'r1')
+        self.assertEqual(mock_worker.objects.get_online.call_count, 2)
+
+    def test_reserve_applies_pending_events(self, mock_worker, mock_reserved):
+        scheduler = self._scheduler(mock_worker, mock_reserved, ['w1', 'w2'],
+                                    [('t1', 'w1', 'r1')])
+        self.assertEqual(scheduler.reserve('t2', 'r1'), 'w1')
+
+        # w2 goes away and w3 comes online between the two reservations
+        mock_worker.objects.get_online.return_value = [_worker('w1'), _worker('w3')]
+        self.events.append({'worker_name': 'w2'})
+
+        self.assertEqual(scheduler.reserve('t3', 'r3'), 'w3')
+        self.assertEqual(scheduler.workers, set(['w1', 'w3']))
+        self.assertEqual(self.events, [])
+
+    def test_reserve_waits_for_release(self, mock_worker, mock_reserved):
+        scheduler = self._scheduler(mock_worker, mock_reserved, ['w1'],
+                                    [('t1', 'w1', 'r1')])
+        events = [{'task_id': 't1'}]
+
+        def wait():
+            scheduler.apply(events.pop(0))
+            return True
+
+        with mock.patch.object(scheduler, 'wait', side_effect=wait) as mock_wait:
+            self.assertEqual(scheduler.reserve('t2', 'r2'), 'w1')
+
+        self.assertEqual(mock_wait.call_count, 1)
+        self.assertEqual(scheduler.reservations, {'t2': ('w1', 'r2')})
+        self.assertEqual(scheduler.resources, {'r2': 'w1'})
+        self.assertEqual(scheduler.stats()['waited'], 1)
+
+    def test_apply_release(self, mock_worker, mock_reserved):
+        scheduler = self._scheduler(mock_worker, mock_reserved, ['w1'],
+                                    [('t1', 'w1', 'r1'), ('t2', 'w1', 'r1')])
+        scheduler.refresh()
+
+        scheduler.apply({'task_id': 't1'})
+        self.assertEqual(scheduler.resources, {'r1': 'w1'})
+        self.assertEqual(scheduler.load, {'w1': set(['t2'])})
+
+        scheduler.apply({'task_id': 't2'})
+        self.assertEqual(scheduler.resources, {})
+        self.assertEqual(scheduler.load, {})
+
+        # releasing again is harmless
+        scheduler.apply({'task_id': 't2'})
+        self.assertEqual(scheduler.reservations, {})
+
+    def test_apply_worker_event_refreshes(self, mock_worker, mock_reserved):
+        scheduler = self._scheduler(mock_worker, mock_reserved, ['w1'])
+        scheduler.refresh()
+        mock_worker.objects.get_online.return_value = [_worker('w1'), _worker('w2')]
+
+        scheduler.apply({'worker_name': 'w2'})
+        self.assertEqual(scheduler.workers, set(['w1', 'w2']))
+
+    def test_apply_empty_event_ignored(self, mock_worker, mock_reserved):
+        scheduler = self._scheduler(mock_worker, mock_reserved, ['w1'])
+        scheduler.apply({})
+        self.assertFalse(mock_worker.objects.get_online.called)
+
+    @mock.patch(MODULE + '.time')
+    def test_stats(self, mock_time, mock_worker, mock_reserved):
+        scheduler = self._scheduler(mock_worker, mock_reserved, ['w1'])
+        mock_time.time.side_effect = [100.0, 100.0, 100.0, 102.0]
+        scheduler.reserve('t1', 'r1', queued_at=95.0)
+
+        stats = scheduler.stats()
+        self.assertEqual(stats['dispatched'], 1)
+        self.assertEqual(stats['waited'], 0)
+        self.assertEqual(stats['wait_total'], 2.0)
+        self.assertEqual(stats['wait_max'], 2.0)
+        self.assertEqual(stats['latency_total'], 7.0)
+        self.assertEqual(stats['latency_max'], 7.0)
+        self.assertEqual(stats['workers'], 1)
+        self.assertEqual(stats['reserved'], 1)
+
+
+@mock.patch(MODULE + '.ReservedResource')
+@mock.patch(MODULE + '.Worker')
+@mock.patch(MODULE + '.ReservationEvent')
+class TestReservationSchedulerWait(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = reservations.ReservationScheduler()
+
+    def test_opens_cursor(self, mock_event, mock_worker, mock_reserved):
+        collection = mock_event._get_collection.return_value
+        cursor = collection.find.return_value
+        cursor.__iter__.return_value = iter([{'task_id': 'old'}])
+        cursor.next.side_effect = [{'task_id': 't1'}, StopIteration()]
+
+        self.assertTrue(self.scheduler.wait())
+
+        collection.find.assert_called_once_with(cursor_type=reservations.CursorType.TAILABLE)
+        self.assertTrue(self.scheduler._cursor is cursor)
+        # the existing events are reflected by the refresh
+        self.assertEqual(mock_worker.objects.get_online.call_count, 1)
+        self.assertFalse(mock_event.called)
+
+    @mock.patch(MODULE + '.time')
+    def test_seeds_empty_collection(self, mock_time, mock_event, mock_worker, mock_reserved):
+        collection = mock_event._get_collection.return_value
+        collection.find_one.return_value = None
+        collection.find.return_value.next.side_effect = StopIteration()
+
+        self.scheduler.wait()
+
+        mock_event.return_value.save.assert_called_once_with()
+
+    def test_applies_event(self, mock_event, mock_worker, mock_reserved):
+        self.scheduler._cursor = mock.Mock(alive=True)
+        self.scheduler._cursor.next.side_effect = [{'task_id': 't1'}, StopIteration()]
+
+        with mock.patch.object(self.scheduler, 'apply') as mock_apply:
+            self.assertTrue(self.scheduler.wait())
+
+        mock_apply.assert_called_once_with({'task_id': 't1'})
+
+    def test_drain(self, mock_event, mock_worker, mock_reserved):
+        self.scheduler._cursor = mock.Mock(alive=True)
+        self.scheduler._cursor.next.side_effect = [
+            {'task_id': 't1'}, {'task_id': 't2'}, StopIteration()]
+
+        with mock.patch.object(self.scheduler, 'apply') as mock_apply:
+            self.assertEqual(self.scheduler.drain(), 2)
+
+        self.assertEqual(mock_apply.call_args_list,
+                         [mock.call({'task_id': 't1'}), mock.call({'task_id': 't2'})])
+        self.assertTrue(self.scheduler._cursor is not None)
+
+    @mock.patch(MODULE + '.time')
+    def test_no_event(self, mock_time, mock_event, mock_worker, mock_reserved):
+        self.scheduler._cursor = mock.Mock(alive=True)
+        self.scheduler._cursor.next.side_effect = StopIteration()
+
+        self.assertFalse(self.scheduler.wait())
+        self.assertTrue(self.scheduler._cursor is not None)
+        mock_time.sleep.assert_called_once_with(self.scheduler.POLL_INTERVAL)
+
+    @mock.patch(MODULE + '.time')
+    def test_dead_cursor(self, mock_time, mock_event, mock_worker, mock_reserved):
+        cursor = mock.Mock(alive=True)
+        cursor.next.side_effect = StopIteration()
+        self.scheduler._cursor = cursor
+
+        def next():
+            cursor.alive = False
+            raise StopIteration()
+
+        cursor.next.side_effect = next
+
+        self.assertFalse(self.scheduler.wait())
+        self.assertTrue(self.scheduler._cursor is None)
+        mock_time.sleep.assert_called_once_with(self.scheduler.RETRY_INTERVAL)
+
+    @mock.patch(MODULE + '.time')
+    def test_cursor_lost(self, mock_time, mock_event, mock_worker, mock_reserved):
+        self.scheduler._cursor = mock.Mock(alive=True)
+        self.scheduler._cursor.next.side_effect = reservations.OperationFailure(
+            'CappedPositionLost', code=136)
+
+        self.assertFalse(self.scheduler.wait())
+        self.assertTrue(self.scheduler._cursor is None)
+
+        # the next wait reopens the cursor and reloads the view
+        collection = mock_event._get_collection.return_value
+        cursor = collection.find.return_value
+        cursor.next.side_effect = [{'task_id': 't1'}, StopIteration()]
+
+        self.assertTrue(self.scheduler.wait())
+        self.assertTrue(self.scheduler._cursor is cursor)
+        self.assertEqual(mock_worker.objects.get_online.call_count, 1)
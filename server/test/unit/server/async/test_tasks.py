@@ -1,7 +1,6 @@
 """
 This module contains tests for the pulp.server.async.tasks module.
 """
-from datetime import datetime
 import signal
 import unittest
 import uuid
@@ -20,9 +19,9 @@ from pulp.common.constants import (CALL_CANCELED_STATE, CALL_FINISHED_STATE,
 from pulp.common.tags import action_tag, resource_tag, RESOURCE_CONSUMER_TYPE
 from pulp.devel.unit.util import compare_dict
 from pulp.server.async import app, tasks
-from pulp.server.db.model import Worker, TaskStatus
+from pulp.server.db.model import TaskStatus
 from pulp.server.db.reaper import queue_reap_expired_documents
-from pulp.server.exceptions import NoWorkers, PulpException, PulpCodedException
+from pulp.server.exceptions import PulpException, PulpCodedException
 from pulp.server.maintenance.monthly import queue_monthly_maintenance
 
 celery_version = celery.__version__
@@ -38,14 +37,9 @@ WORKER_3 = 'worker-3'
 class TestQueueReservedTask(ResourceReservationTests):
 
     def setUp(self):
-        self.patch_a = mock.patch('pulp.server.async.tasks.get_worker_for_reservation')
-        self.mock_get_worker_for_reservation = self.patch_a.start()
-
-        self.patch_b = mock.patch('pulp.server.async.tasks._get_unreserved_worker')
-        self.mock_get_unreserved_worker = self.patch_b.start()
-
-        self.patch_c = mock.patch('pulp.server.async.tasks.time', autospec=True)
-        self.mock_time = self.patch_c.start()
+        self.patch_a = mock.patch('pulp.server.async.tasks._get_scheduler')
+        self.mock_get_scheduler = self.patch_a.start()
+        self.mock_get_scheduler.return_value.reserve.return_value = 'worker1'
 
         self.patch_d = mock.patch('pulp.server.async.tasks.ReservedResource', autospec=True)
         self.mock_reserved_resource = self.patch_d.start()
@@ -61,16 +55,18 @@ class TestQueueReservedTask(ResourceReservationTests):
 
     def tearDown(self):
         self.patch_a.stop()
-        self.patch_b.stop()
-        self.patch_c.stop()
         self.patch_d.stop()
         self.patch_e.stop()
         self.patch_f.stop()
         super(TestQueueReservedTask, self).tearDown()
 
+    def test_reserves_with_scheduler(self):
+        tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2},
+                                   queued_at=10.0)
+        self.mock_get_scheduler.return_value.reserve.assert_called_once_with(
+            'my_task_id', 'my_resource_id', queued_at=10.0)
+
     def test_creates_and_saves_reserved_resource(self):
-        self.mock_get_worker_for_reservation.return_value = Worker(
-            name='worker1', last_heartbeat=datetime.utcnow())
         tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
         self.mock_reserved_resource.assert_called_once_with(task_id='my_task_id',
                                                             worker_name='worker1',
@@ -78,8 +74,6 @@ class TestQueueReservedTask(ResourceReservationTests):
         self.mock_reserved_resource.return_value.save.assert_called_once_with()
 
     def test_dispatches_inner_task(self):
-        self.mock_get_worker_for_reservation.return_value = Worker(
-            name='worker1', last_heartbeat=datetime.utcnow())
         tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
         apply_async = self.mock_celery.tasks['task_name'].apply_async
         if is_celery_4:
@@ -92,8 +86,6 @@ class TestQueueReservedTask(ResourceReservationTests):
                                                 exchange='C.dq')
 
     def test_dispatches__release_resource(self):
-        self.mock_get_worker_for_reservation.return_value = Worker(
-            name='worker1', last_heartbeat=datetime.utcnow())
         tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
         if is_celery_4:
             self.mock__release_resource.apply_async.assert_called_once_with(('my_task_id',),
@@ -104,44 +96,15 @@ class TestQueueReservedTask(ResourceReservationTests):
                                                                             routing_key='worker1',
                                                                             exchange='C.dq')
 
-    def test_get_worker_for_reservation_breaks_out_of_loop(self):
-        self.mock_get_worker_for_reservation.return_value = Worker(
-            name='worker1', last_heartbeat=datetime.utcnow())
-        tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
-        self.assertTrue(not self.mock_get_unreserved_worker.called)
-        self.assertTrue(not self.mock_time.sleep.called)
 
-    def test_get_unreserved_worker_breaks_out_of_loop(self):
-        self.mock_get_worker_for_reservation.side_effect = NoWorkers()
-        self.mock_get_unreserved_worker.return_value = Worker(name='worker1',
-                                                              last_heartbeat=datetime.utcnow())
-        tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
-        self.assertTrue(not self.mock_time.sleep.called)
-
-    def test_loops_and_sleeps_waiting_for_available_worker(self):
-        self.mock_get_worker_for_reservation.side_effect = NoWorkers()
-        self.mock_get_unreserved_worker.side_effect = NoWorkers()
-
-        class BreakOutException(Exception):
-            pass
+class TestGetScheduler(unittest.TestCase):
 
-        def side_effect(*args):
-            def second_call(*args):
-                raise BreakOutException()
-            self.mock_time.sleep.side_effect = second_call
-            return None
-
-        self.mock_time.sleep.side_effect = side_effect
-
-        try:
-            tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2],
-                                       {'a': 2})
-        except BreakOutException:
-            pass
-        else:
-            self.fail('_queue_reserved_task should have raised a BreakOutException')
-
-        self.mock_time.sleep.assert_has_calls([mock.call(0.25), mock.call(0.25)])
+    @mock.patch('pulp.server.async.tasks._scheduler', None)
+    @mock.patch('pulp.server.async.tasks.ReservationScheduler')
+    def test_created_once(self, mock_scheduler):
+        scheduler = tasks._get_scheduler()
+        self.assertTrue(tasks._get_scheduler() is scheduler)
+        mock_scheduler.assert_called_once_with(worker_filter=tasks._is_worker)
 
 
 class TestDeleteWorker(ResourceReservationTests):
@@ -168,6 +131,9 @@ class TestDeleteWorker(ResourceReservationTests):
         self.patch_i = mock.patch('pulp.server.async.tasks.constants', autospec=True)
         self.mock_constants = self.patch_i.start()
 
+        self.patch_j = mock.patch('pulp.server.async.tasks.ReservationEvent', autospec=True)
+        self.mock_reservation_event = self.patch_j.start()
+
         super(TestDeleteWorker, self).setUp()
 
     def tearDown(self):
@@ -178,6 +144,7 @@ class TestDeleteWorker(ResourceReservationTests):
         self.patch_f.stop()
         self.patch_g.stop()
         self.patch_i.stop()
+        self.patch_j.stop()
         super(TestDeleteWorker, self).tearDown()
 
     def test_normal_shutdown_true_logs_correctly(self):
@@ -198,6 +165,11 @@ class TestDeleteWorker(ResourceReservationTests):
         remove = self.mock_reserved_resource.objects.return_value.delete
         remove.assert_called_once_with()
 
+    def test_saves_reservation_event(self):
+        tasks._delete_worker('worker1')
+        self.mock_reservation_event.assert_called_once_with(worker_name='worker1')
+        self.mock_reservation_event.return_value.save.assert_called_once_with()
+
     @mock.patch('pulp.server.async.tasks.Worker.objects')
     def test_removes_the_worker(self, mock_worker_objects):
         mock_document = mock.Mock()
@@ -244,6 +216,9 @@ class TestReleaseResource(unittest.TestCase):
         self.patch_d = mock.patch('pulp.server.async.tasks.constants', autospec=True)
         self.mock_constants = self.patch_d.start()
 
+        self.patch_e = mock.patch('pulp.server.async.tasks.ReservationEvent', autospec=True)
+        self.mock_reservation_event = self.patch_e.start()
+
         super(TestReleaseResource, self).setUp()
 
     def tearDown(self):
@@ -251,6 +226,7 @@ class TestReleaseResource(unittest.TestCase):
         self.patch_b.stop()
         self.patch_c.stop()
         self.patch_d.stop()
+        self.patch_e.stop()
         super(TestReleaseResource, self).tearDown()
 
     def test_deletes_reserved_resource(self):
@@ -259,6 +235,11 @@ class TestReleaseResource(unittest.TestCase):
         self.mock_reserved_resource.objects.assert_called_once_with(task_id=mock_task_id)
         self.mock_reserved_resource.objects.return_value.delete.assert_called_once_with()
 
+    def test_saves_reservation_event(self):
+        tasks._release_resource('task-1')
+        self.mock_reservation_event.assert_called_once_with(task_id='task-1')
+        self.mock_reservation_event.return_value.save.assert_called_once_with()
+
     def test_finds_running_task_by_uuid(self):
         mock_task_id = mock.Mock()
         tasks._release_resource(mock_task_id)
@@ -316,6 +297,10 @@ class TestReservedTaskMixinApplyAsyncWithReservation(ResourceReservationTests):
         self.task_status_patch = mock.patch('pulp.server.async.tasks.TaskStatus', autospec=True)
         self.mock_task_status = self.task_status_patch.start()
 
+        self.time_patch = mock.patch('pulp.server.async.tasks.time', autospec=True)
+        self.mock_time = self.time_patch.start()
+        self.mock_time.time.return_value = 10.0
+
         self.constants_patch = mock.patch('pulp.server.async.tasks.constants', autospec=True)
         self.mock_constants = self.constants_patch.start()
 
@@ -326,6 +311,7 @@ class TestReservedTaskMixinApplyAsyncWithReservation(ResourceReservationTests):
         self.task_patch.stop()
         self.uuid_patch.stop()
         self.task_status_patch.stop()
+        self.time_patch.stop()
         self.constants_patch.stop()
         super(TestReservedTaskMixinApplyAsyncWithReservation, self).tearDown()
 
@@ -335,7 +321,8 @@ class TestReservedTaskMixinApplyAsyncWithReservation(ResourceReservationTests):
                               self.some_kwargs]
         self.mock__queue_reserved_task.apply_async.assert_called_once_with(
             queue=tasks.RESOURCE_MANAGER_QUEUE,
-            args=expected_arguments)
+            args=expected_arguments,
+            kwargs={'queued_at': 10.0})
 
     def test_task_status_created_and_saved(self):
         self.mock_task_status.assert_called_once_with(
@@ -987,87 +974,7 @@ class TestScheduledTasks(unittest.TestCase):
         mock_monthly_apply_async.assert_called_once_with(tags=[action_tag('monthly')])
 
 
-class TestGetWorkerForReservation(ResourceReservationTests):
-
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_existing_reservation_correctly_found(self, mock_reserved_resource,
-                                                  mock_worker_objects):
-        get_objects = mock_reserved_resource.objects
-        tasks.get_worker_for_reservation('resource1')
-        get_objects.assert_called_once_with(resource_id='resource1')
-        get_objects.return_value.first.assert_called_once_with()
-
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_correct_worker_returned(self, mock_reserved_resource, mock_worker_objects):
-        find_one = mock_reserved_resource.objects.return_value.first
-        find_one.return_value = {'worker_name': 'worker1'}
-        mock_worker_objects.return_value.first.return_value = find_one.return_value
-        result = tasks.get_worker_for_reservation('resource1')
-        self.assertTrue(result is find_one.return_value)
-
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_no_workers_raised_if_no_reservations(self, mock_reserved_resource):
-        find_one = mock_reserved_resource.objects.return_value.first
-        find_one.return_value = False
-        try:
-            tasks.get_worker_for_reservation('resource1')
-        except NoWorkers:
-            pass
-        else:
-            self.fail("NoWorkers() Exception should have been raised.")
-
-
-class TestGetUnreservedWorker(ResourceReservationTests):
-
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_reserved_resources_queried_correctly(self, mock_reserved_resource):
-        find = mock_reserved_resource.objects.all
-        find.return_value = [{'worker_name': 'a'}, {'worker_name': 'b'}]
-        try:
-            tasks._get_unreserved_worker()
-        except NoWorkers:
-            pass
-        else:
-            self.fail("NoWorkers() Exception should have been raised.")
-        find.assert_called_once_with()
-
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_worker_returned_when_one_worker_is_not_reserved(self, mock_reserved_resource,
-                                                             mock_worker_objects):
-        get_online = mock_worker_objects.get_online
-        get_online.return_value = [{'name': 'a'}, {'name': 'b'}]
-        mock_reserved_resource.objects.all.return_value = [{'worker_name': 'a'}]
-        result = tasks._get_unreserved_worker()
-        self.assertEqual(result, {'name': 'b'})
-
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_no_workers_raised_when_all_workers_reserved(self, mock_reserved_resource, mock_worker):
-        mock_worker.objects.return_value = [{'name': 'a'}, {'name': 'b'}]
-        find = mock_reserved_resource.objects
-        find.return_value = [{'worker_name': 'a'}, {'worker_name': 'b'}]
-        try:
-            tasks._get_unreserved_worker()
-        except NoWorkers:
-            pass
-        else:
-            self.fail("NoWorkers() Exception should have been raised.")
-
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_no_workers_raised_when_there_are_no_workers(self, mock_reserved_resource, mock_worker):
-        mock_worker.objects.return_value = []
-        find = mock_reserved_resource.objects
-        find.return_value = [{'worker_name': 'a'}, {'worker_name': 'b'}]
-        try:
-            tasks._get_unreserved_worker()
-        except NoWorkers:
-            pass
-        else:
-            self.fail("NoWorkers() Exception should have been raised.")
+class TestIsWorker(unittest.TestCase):
 
     def test_is_worker(self):
         self.assertTrue(tasks._is_worker("a_worker@some.hostname"))
@@ -8,12 +8,15 @@ from pulp.server.async import worker_watcher
 
 class TestHandleWorkerHeartbeat(unittest.TestCase):
 
+    @mock.patch('pulp.server.async.worker_watcher.ReservationEvent')
     @mock.patch('pulp.server.async.worker_watcher.datetime')
     @mock.patch('pulp.server.async.worker_watcher._logger')
     @mock.patch('pulp.server.async.worker_watcher.Worker')
-    def test_handle_worker_heartbeat_new(self, mock_worker, mock_logger, mock_datetime):
+    def test_handle_worker_heartbeat_new(self, mock_worker, mock_logger, mock_datetime,
+                                         mock_event):
         """
-        Ensure that we save a record and log when a new worker comes online.
+        Ensure that we save a record, notify the resource manager and log when a new worker
+        comes online.
         """
         mock_datetime.utcnow.return_value = datetime.datetime(2017, 1, 1, 1, 1, 1)
         mock_worker.objects.return_value.first.return_value = None
@@ -21,13 +24,17 @@ class TestHandleWorkerHeartbeat(unittest.TestCase):
         mock_logger.info.assert_called_once_with('New worker \'fake-worker\' discovered')
         mock_worker.objects.return_value.update_one.\
             assert_called_once_with(set__last_heartbeat=mock_datetime.utcnow(), upsert=True)
+        mock_event.assert_called_once_with(worker_name='fake-worker')
+        mock_event.return_value.save.assert_called_once_with()
 
+    @mock.patch('pulp.server.async.worker_watcher.ReservationEvent')
     @mock.patch('pulp.server.async.worker_watcher.datetime')
     @mock.patch('pulp.server.async.worker_watcher._logger')
     @mock.patch('pulp.server.async.worker_watcher.Worker')
-    def test_handle_worker_heartbeat_update(self, mock_worker, mock_logger, mock_datetime):
+    def test_handle_worker_heartbeat_update(self, mock_worker, mock_logger, mock_datetime,
+                                            mock_event):
         """
-        Ensure that we don't log when an existing worker is updated.
+        Ensure that we don't log or notify when an existing worker is updated.
         """
         mock_datetime.utcnow.return_value = datetime.datetime(2017, 1, 1, 1, 1, 1)
         mock_worker.objects.return_value.first.return_value = mock.Mock()
@@ -35,6 +42,7 @@ class TestHandleWorkerHeartbeat(unittest.TestCase):
         self.assertEquals(mock_logger.info.called, False)
         mock_worker.objects.return_value.update_one.\
             assert_called_once_with(set__last_heartbeat=mock_datetime.utcnow(), upsert=True)
+        self.assertFalse(mock_event.called)
 
 
 class TestHandleWorkerOffline(unittest.TestCase):
@@ -13,12 +13,16 @@ from unittest import TestCase
 
 from Queue import Queue, Full, Empty
 from collections import namedtuple
+from threading import Event, Thread
+from time import time, sleep
 
 from mock import Mock, patch, call
 
 from pulp.server.content.sources.container import (
     ContentContainer, NectarListener, Item, RequestQueue, Batch, Threaded, Serial,
-    DownloadReport, NectarFeed, Tracker, DownloadFailed, DOWNLOAD_SUCCEEDED)
+    DownloadReport, NectarFeed, Tracker, DownloadFailed, Resolver, EntriesCache, ENTRIES,
+    RefreshRegistry, DOWNLOAD_SUCCEEDED)
+from pulp.server.content.sources import constants
 from pulp.server.content.sources.model import ContentSource
 
 
@@ -41,9 +45,18 @@ class SideEffect(object):
             return value
 
 
+DESCRIPTOR = {constants.EXPIRES: '1h', constants.REFRESH_TIMEOUT: '1h'}
+
+
 class TestContainer(TestCase):
 
-    @patch(MODULE + '.ContentSource.load_all')
+    def setUp(self):
+        ENTRIES.clear()
+        patcher = patch(MODULE + '.REFRESHES', RefreshRegistry())
+        self.refreshes = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch(MODULE + '.REGISTRY.load')
     def test_init(self, fake_load):
         path = 'path-1'
 
@@ -58,7 +71,7 @@ class TestContainer(TestCase):
     @patch(MODULE + '.Serial')
     @patch(MODULE + '.PrimarySource')
     @patch(MODULE + '.ContentContainer.refresh')
-    @patch(MODULE + '.ContentSource.load_all')
+    @patch(MODULE + '.REGISTRY.load')
     def test_serial_download(self, fake_load, fake_refresh, fake_primary, fake_batch):
         path = Mock()
         downloader = Mock()
@@ -85,7 +98,7 @@ class TestContainer(TestCase):
     @patch(MODULE + '.Threaded')
     @patch(MODULE + '.PrimarySource')
     @patch(MODULE + '.ContentContainer.refresh')
-    @patch(MODULE + '.ContentSource.load_all')
+    @patch(MODULE + '.REGISTRY.load')
     def test_threaded_download(self, fake_load, fake_refresh, fake_primary, fake_batch):
         path = Mock()
         downloader = Mock()
@@ -108,17 +121,17 @@ class TestContainer(TestCase):
         _batch.assert_called_with()
         self.assertEqual(report, _batch.return_value)
 
-    @patch(MODULE + '.ContentSource.load_all')
+    @patch(MODULE + '.REGISTRY.load')
     @patch(MODULE + '.managers.content_catalog_manager')
     def test_refresh(self, fake_manager, fake_load):
         sources = {}
         for n in range(3):
-            s = ContentSource('s-%d' % n, {})
+            s = ContentSource('s-%d' % n, DESCRIPTOR)
             s.refresh = Mock(return_value=[n])
             s.get_downloader = Mock()
             sources[s.id] = s
 
-        fake_manager().has_entries.return_value = False
+        fake_manager().earliest_expiration.return_value = None
         fake_load.return_value = sources
 
         # test
@@ -131,17 +144,17 @@ class TestContainer(TestCase):
 
         self.assertEqual(sorted(report), [0, 1, 2])
 
-    @patch(MODULE + '.ContentSource.load_all')
+    @patch(MODULE + '.REGISTRY.load')
     @patch(MODULE + '.managers.content_catalog_manager')
     def test_refresh_raised(self, fake_manager, fake_load):
         sources = {}
         for n in range(3):
-            s = ContentSource('s-%d' % n, {})
+            s = ContentSource('s-%d' % n, DESCRIPTOR)
             s.refresh = Mock(side_effect=ValueError('must be int'))
             s.get_downloader = Mock()
             sources[s.id] = s
 
-        fake_manager().has_entries.return_value = False
+        fake_manager().earliest_expiration.return_value = None
         fake_load.return_value = sources
 
         # test
@@ -152,30 +165,178 @@ class TestContainer(TestCase):
         for s in sources.values():
             s.refresh.assert_called_with()
 
+        self.assertEqual(len(report), len(sources))
         for r in report:
-            r.errors = ['must be int']
+            self.assertEqual(r.errors, ['must be int'])
 
-    @patch(MODULE + '.ContentSource.load_all')
+    @patch(MODULE + '.REGISTRY.load')
     @patch(MODULE + '.managers.content_catalog_manager')
     def test_forced_refresh(self, fake_manager, fake_load):
         sources = {}
         for n in range(3):
-            s = ContentSource('s-%d' % n, {})
-            s.refresh = Mock()
+            s = ContentSource('s-%d' % n, DESCRIPTOR)
+            s.refresh = Mock(return_value=[])
             sources[s.id] = s
 
-        fake_manager().has_entries.return_value = True
+        fake_manager().earliest_expiration.return_value = time() + 3600
         fake_load.return_value = sources
 
         # test
         container = ContentContainer('')
+        container.refresh()
         container.refresh(force=True)
+        container.refresh()
 
         # validation
         for s in sources.values():
-            s.refresh.assert_called_with()
+            s.refresh.assert_called_once_with()
+        # the forced refresh is remembered
+        self.assertEqual(fake_manager().earliest_expiration.call_count, len(sources))
+
+    @patch(MODULE + '.REGISTRY.load')
+    @patch(MODULE + '.managers.content_catalog_manager')
+    def test_refresh_has_entries_cached(self, fake_manager, fake_load):
+        sources = {}
+        for n in range(3):
+            s = ContentSource('s-%d' % n, DESCRIPTOR)
+            s.refresh = Mock(return_value=[])
+            sources[s.id] = s
+
+        fake_manager().earliest_expiration.return_value = time() + 3600
+        fake_load.return_value = sources
+
+        # test
+        container = ContentContainer('')
+        container.refresh()
+        container = ContentContainer('')
+        container.refresh()
+
+        # validation
+        self.assertEqual(fake_manager().earliest_expiration.call_count, len(sources))
+        for s in sources.values():
+            self.assertFalse(s.refresh.called)
+
+    @patch(MODULE + '.REGISTRY.load')
+    @patch(MODULE + '.managers.content_catalog_manager')
+    def test_refresh_timeout(self, fake_manager, fake_load):
+        blocked = Event()
+        slow = ContentSource('s-1', {constants.REFRESH_TIMEOUT: '0'})
+        slow.refresh = Mock(side_effect=lambda: blocked.wait(10) and [])
+        fast = ContentSource('s-2', DESCRIPTOR)
+        fast.refresh = Mock(return_value=[1])
+
+        fake_manager().earliest_expiration.return_value = None
+        fake_load.return_value = {slow.id: slow, fast.id: fast}
+
+        # test
+        container = ContentContainer('')
+        try:
+            report = container.refresh()
+        finally:
+            blocked.set()
+
+        # validation
+        self.assertEqual(len(report), 2)
+        self.assertEqual(report[0].source_id, slow.id)
+        self.assertEqual(report[0].errors, ['timed out'])
+        self.assertEqual(report[1], 1)
+        fake_manager().purge_expired.assert_called_once_with()
 
-    @patch(MODULE + '.ContentSource.load_all')
+    @patch(MODULE + '.REGISTRY.load')
+    @patch(MODULE + '.managers.content_catalog_manager')
+    def test_refreshed_without_entries_cached(self, fake_manager, fake_load):
+        source = ContentSource('s-1', DESCRIPTOR)
+        source.refresh = Mock(return_value=[])
+
+        fake_manager().earliest_expiration.return_value = None
+        fake_load.return_value = {source.id: source}
+
+        # test
+        ContentContainer('').refresh()
+        ContentContainer('').refresh()
+
+        # validation
+        source.refresh.assert_called_once_with()
+
+    @patch(MODULE + '.REGISTRY.load')
+    @patch(MODULE + '.managers.content_catalog_manager')
+    def test_failed_refresh_not_cached(self, fake_manager, fake_load):
+        source = ContentSource('s-1', DESCRIPTOR)
+        source.refresh = Mock(side_effect=ValueError('must be int'))
+
+        fake_manager().earliest_expiration.return_value = None
+        fake_load.return_value = {source.id: source}
+
+        # test
+        ContentContainer('').refresh()
+        ContentContainer('').refresh()
+
+        # validation
+        self.assertEqual(source.refresh.call_count, 2)
+
+    @patch(MODULE + '.REGISTRY.load')
+    @patch(MODULE + '.managers.content_catalog_manager')
+    def test_concurrent_refresh(self, fake_manager, fake_load):
+        started = Event()
+        blocked = Event()
+        source = ContentSource('s-1', DESCRIPTOR)
+        source.refresh = Mock(side_effect=lambda: started.set() or blocked.wait(10) and [1])
+
+        fake_manager().earliest_expiration.return_value = None
+        fake_load.return_value = {source.id: source}
+
+        reports = []
+
+        def refresh():
+            reports.append(ContentContainer('').refresh())
+
+        # test
+        first = Thread(target=refresh)
+        first.start()
+        started.wait(10)
+        second = Thread(target=refresh)
+        second.start()
+        try:
+            thread = self.refreshes._running[source.id]
+            for n in range(100):
+                if len(thread._queues) == 2:
+                    break
+                sleep(0.1)
+        finally:
+            blocked.set()
+        first.join(10)
+        second.join(10)
+
+        # validation
+        source.refresh.assert_called_once_with()
+        self.assertEqual(reports, [[1], [1]])
+        self.assertEqual(self.refreshes._running, {})
+
+    @patch(MODULE + '.REGISTRY.load')
+    @patch(MODULE + '.managers.content_catalog_manager')
+    def test_abandoned_refresh_not_restarted(self, fake_manager, fake_load):
+        blocked = Event()
+        source = ContentSource('s-1', {constants.REFRESH_TIMEOUT: '0'})
+        source.refresh = Mock(side_effect=lambda: blocked.wait(10) and [])
+
+        fake_manager().earliest_expiration.return_value = None
+        fake_load.return_value = {source.id: source}
+
+        # test
+        try:
+            ContentContainer('').refresh()
+            thread = self.refreshes._running[source.id]
+            report = ContentContainer('').refresh()
+        finally:
+            blocked.set()
+        thread.join(10)
+
+        # validation
+        source.refresh.assert_called_once_with()
+        self.assertEqual(self.refreshes._running, {})
+        self.assertEqual(report[0].errors, ['timed out'])
+
+    @patch(MODULE + '.REGISTRY.load')
     @patch(MODULE + '.managers.content_catalog_manager')
     def test_purge_orphans(self, fake_manager, fake_load):
         fake_load.return_value = {'A': 1, 'B': 2, 'C': 3}
@@ -184,9 +345,110 @@ class TestContainer(TestCase):
         container = ContentContainer('')
 
         # validation
-        container.purge_orphans()
+        with patch.object(ENTRIES, 'clear') as fake_clear:
+            container.purge_orphans()
 
         fake_manager().purge_orphans.assert_called_with(fake_load.return_value.keys())
+        fake_clear.assert_called_once_with()
+
+
+class TestEntriesCache(TestCase):
+
+    @patch(MODULE + '.managers.content_catalog_manager')
+    def test_has_entries(self, fake_manager):
+        source = ContentSource('s-1', DESCRIPTOR)
+        fake_manager().earliest_expiration.return_value = time() + 3600
+        cache = EntriesCache()
+
+        # test
+        self.assertTrue(cache.has_entries(source))
+        self.assertTrue(cache.has_entries(source))
+
+        # validation
+        fake_manager().earliest_expiration.assert_called_once_with(source.id)
+
+    @patch(MODULE + '.managers.content_catalog_manager')
+    def test_no_entries_not_cached(self, fake_manager):
+        source = ContentSource('s-1', DESCRIPTOR)
+        fake_manager().earliest_expiration.return_value = None
+        cache = EntriesCache()
+
+        # test
+        self.assertFalse(cache.has_entries(source))
+        self.assertFalse(cache.has_entries(source))
+
+        # validation
+        self.assertEqual(fake_manager().earliest_expiration.call_count, 2)
+
+    @patch(MODULE + '.time')
+    @patch(MODULE + '.managers.content_catalog_manager')
+    def test_expired(self, fake_manager, fake_time):
+        source = ContentSource('s-1', DESCRIPTOR)
+        fake_manager().earliest_expiration.return_value = 100 + EntriesCache.TTL * 2
+        fake_time.return_value = 100.0
+        cache = EntriesCache()
+
+        # test
+        cache.has_entries(source)
+        fake_time.return_value = 100.0 + EntriesCache.TTL
+        cache.has_entries(source)
+
+        # validation
+        self.assertEqual(fake_manager().earliest_expiration.call_count, 2)
+
+    @patch(MODULE + '.time')
+    @patch(MODULE + '.managers.content_catalog_manager')
+    def test_entries_expire(self, fake_manager, fake_time):
+        source = ContentSource('s-1', DESCRIPTOR)
+        fake_manager().earliest_expiration.return_value = 110
+        fake_time.return_value = 100.0
+        cache = EntriesCache()
+
+        # test
+        cache.has_entries(source)
+        fake_time.return_value = 109.0
+        cache.has_entries(source)
+        fake_time.return_value = 110.0
+        fake_manager().earliest_expiration.return_value = None
+        has_entries = cache.has_entries(source)
+
+        # validation
+        self.assertFalse(has_entries)
+        self.assertEqual(fake_manager().earliest_expiration.call_count, 2)
+
+    @patch(MODULE + '.time')
+    @patch(MODULE + '.managers.content_catalog_manager')
+    def test_refreshed(self, fake_manager, fake_time):
+        source = ContentSource('s-1', {constants.EXPIRES: '60s'})
+        fake_manager().earliest_expiration.return_value = None
+        cache = EntriesCache()
+
+        # test
+        cache.refreshed(source, 100.0)
+        fake_time.return_value = 159.0
+        has_entries = cache.has_entries(source)
+        fake_time.return_value = 160.0
+        expired = cache.has_entries(source)
+
+        # validation
+        self.assertTrue(has_entries)
+        self.assertFalse(expired)
+        fake_manager().earliest_expiration.assert_called_once_with(source.id)
+
+    @patch(MODULE + '.managers.content_catalog_manager')
+    def test_forget(self, fake_manager):
+        source = ContentSource('s-1', DESCRIPTOR)
+        fake_manager().earliest_expiration.return_value = time() + 3600
+        cache = EntriesCache()
+
+        # test
+        cache.has_entries(source)
+        cache.forget(source.id)
+        cache.forget(source.id)
+        cache.has_entries(source)
+
+        # validation
+        self.assertEqual(fake_manager().earliest_expiration.call_count, 2)
 
 
 class TestNectarListener(TestCase):
@@ -313,10 +575,11 @@ class TestSerial(TestCase):
         self.assertEqual(batch.requests, requests)
         self.assertEqual(batch.listener, listener)
 
+    @patch(MODULE + '.resolve_sources')
     @patch(MODULE + '.Started')
     @patch(MODULE + '.Succeeded')
     @patch(MODULE + '.Serial._download')
-    def test_download_succeeded(self, download, succeeded, started):
+    def test_download_succeeded(self, download, succeeded, started, resolve):
         primary = Mock()
         sources = [
             Mock(id=1, url='u1'),
@@ -340,8 +603,7 @@ class TestSerial(TestCase):
         # validation
         self.assertEqual(started.call_args_list, [call(r) for r in requests])
         self.assertEqual(started.return_value.call_count, len(requests))
-        for r in requests:
-            r.find_sources.assert_called_once_with(primary, sources)
+        resolve.assert_called_once_with(tuple(requests), primary, sources)
         self.assertEqual(
             download.call_args_list,
             [call(r.sources[0][1], r.destination, r.sources[0][0]) for r in requests])
@@ -356,10 +618,11 @@ class TestSerial(TestCase):
         self.assertEqual(details.total_succeeded, 1)
         self.assertEqual(details.total_failed, 0)
 
+    @patch(MODULE + '.resolve_sources')
     @patch(MODULE + '.Started')
     @patch(MODULE + '.Failed')
     @patch(MODULE + '.Serial._download')
-    def test_download_failed(self, download, failed, started):
+    def test_download_failed(self, download, failed, started, resolve):
         download.side_effect = DownloadFailed()
         primary = Mock()
         sources = [
@@ -384,8 +647,7 @@ class TestSerial(TestCase):
         # validation
         self.assertEqual(started.call_args_list, [call(r) for r in requests])
         self.assertEqual(started.return_value.call_count, len(requests))
-        for r in requests:
-            r.find_sources.assert_called_once_with(primary, sources)
+        resolve.assert_called_once_with(tuple(requests), primary, sources)
         download_calls = []
         for r in requests:
             for s, u in r.sources:
@@ -559,9 +821,10 @@ class TestThreaded(TestCase):
         self.assertEqual(batch.queues[fake_source.id], fake_queue())
         self.assertEqual(queue, fake_queue())
 
+    @patch(MODULE + '.resolve_sources')
     @patch(MODULE + '.Tracker.wait')
     @patch(MODULE + '.Threaded.dispatch')
-    def test_download(self, fake_dispatch, fake_wait):
+    def test_download(self, fake_dispatch, fake_wait, fake_resolve):
         primary = Mock()
         sources = [Mock(), Mock()]
         container = Mock(sources=sources)
@@ -585,8 +848,7 @@ class TestThreaded(TestCase):
 
         # validation
         # initial dispatch
-        for request in requests:
-            request.find_sources.assert_called_with(primary, sources)
+        fake_resolve.assert_called_once_with(tuple(requests), primary, sources)
         calls = fake_dispatch.call_args_list
         self.assertEqual(len(calls), len(requests))
         for i, request in enumerate(requests):
@@ -606,9 +868,10 @@ class TestThreaded(TestCase):
         self.assertEqual(report.downloads['source-2'].total_succeeded, 200)
         self.assertEqual(report.downloads['source-2'].total_failed, 10)
 
+    @patch(MODULE + '.resolve_sources')
     @patch(MODULE + '.Tracker.wait')
     @patch(MODULE + '.Threaded.dispatch')
-    def test_download_nothing(self, fake_dispatch, fake_wait):
+    def test_download_nothing(self, fake_dispatch, fake_wait, fake_resolve):
         primary = Mock()
         container = Mock(sources=[])
         requests = []
@@ -626,9 +889,10 @@ class TestThreaded(TestCase):
         self.assertEqual(len(report.downloads), 0)
         fake_wait.assert_called_once_with(0)
 
+    @patch(MODULE + '.resolve_sources')
     @patch(MODULE + '.Tracker.wait')
     @patch(MODULE + '.Threaded.dispatch')
-    def test_download_with_exception(self, fake_dispatch, fake_wait):
+    def test_download_with_exception(self, fake_dispatch, fake_wait, fake_resolve):
         primary = Mock()
         fake_dispatch.side_effect = ValueError()
         sources = [Mock(), Mock()]
@@ -648,6 +912,98 @@ class TestThreaded(TestCase):
             queue.join.assert_called_with()
 
 
+class TestResolver(TestCase):
+
+    def test_init(self):
+        batch = Mock()
+
+        # test
+        resolver = Resolver(batch)
+
+        # validation
+        self.assertEqual(resolver.batch, batch)
+        self.assertEqual(resolver.queue.maxsize, Resolver.AHEAD)
+        self.assertEqual(resolver.exc_info, None)
+        self.assertFalse(resolver._halted)
+        self.assertTrue(resolver.daemon)
+
+    @patch(MODULE + '.RESOLVE_CHUNK_SIZE', 2)
+    @patch(MODULE + '.resolve_sources')
+    def test_run(self, fake_resolve):
+        requests = range(5)
+        batch = Mock(requests=iter(requests))
+        resolver = Resolver(batch)
+        resolver.queue = Queue()
+
+        # test
+        resolver.run()
+
+        # validation
+        calls = fake_resolve.call_args_list
+        self.assertEqual(calls, [
+            call((0, 1), batch.primary, batch.sources),
+            call((2, 3), batch.primary, batch.sources),
+            call((4,), batch.primary, batch.sources),
+        ])
+        self.assertEqual(list(resolver), requests)
+
+    @patch(MODULE + '.resolve_sources')
+    def test_run_with_exception(self, fake_resolve):
+        fake_resolve.side_effect = ValueError()
+        batch = Mock(requests=iter(range(3)))
+        resolver = Resolver(batch)
+
+        # test
+        resolver.run()
+
+        # validation
+        self.assertEqual(resolver.exc_info[0], ValueError)
+        self.assertRaises(ValueError, list, resolver)
+
+    def test_put(self):
+        resolver = Resolver(Mock())
+
+        # test
+        queued = resolver.put([1, 2])
+
+        # validation
+        self.assertTrue(queued)
+        self.assertEqual(resolver.queue.get_nowait(), [1, 2])
+
+    def test_put_halted(self):
+        resolver = Resolver(Mock())
+        resolver.queue = Mock()
+        resolver.halt()
+
+        # test
+        queued = resolver.put([1, 2])
+
+        # validation
+        self.assertFalse(queued)
+        self.assertFalse(resolver.queue.put.called)
+
+    def test_put_full(self):
+        resolver = Resolver(Mock())
+        resolver.queue = Mock()
+        resolver.queue.put.side_effect = SideEffect([Full(), None])
+
+        # test
+        queued = resolver.put([1, 2])
+
+        # validation
+        self.assertTrue(queued)
+        self.assertEqual(resolver.queue.put.call_count, 2)
+
+    def test_halt(self):
+        resolver = Resolver(Mock())
+
+        # test
+        resolver.halt()
+
+        # validation
+        self.assertTrue(resolver._halted)
+
+
 class TestRequestQueue(TestCase):
 
     @patch(MODULE + '.Thread', new=Mock())
@@ -1,5 +1,7 @@
 import os
+import shutil
 import sys
+import tempfile
 from unittest import TestCase
 
 from mock import patch, Mock
@@ -8,6 +10,7 @@ from pulp.common.constants import PRIMARY_ID
 from pulp.plugins.conduits.cataloger import CatalogerConduit
 from pulp.server.content.sources import constants
 from pulp.server.content.sources.model import Request, PrimarySource, ContentSource, RefreshReport
+from pulp.server.content.sources.model import resolve_sources, DescriptorRegistry
 from pulp.server.content.sources.model import DownloadDetails, DownloadReport
 from pulp.server.content.sources.descriptor import DEFAULT
 
@@ -147,6 +150,23 @@ class TestRequest(TestCase):
         self.assertEqual(request.sources[4][0].id, primary.id)
         self.assertEqual(request.sources[4][1], url)
 
+    @patch('pulp.server.content.sources.model.managers.content_catalog_manager')
+    def test_find_sources_with_entries(self, fake_manager):
+        primary = PrimarySource(None)
+        alternatives = dict([(s, ContentSource(s, d)) for s, d in DESCRIPTOR])
+
+        # test
+        request = Request('test_1', 1, 'http://redhat.com/repository', '/tmp/123')
+        request.find_sources(primary, alternatives, CATALOG[:2])
+
+        # validation
+        self.assertFalse(fake_manager.called)
+        request.sources = list(request.sources)
+        self.assertEqual(len(request.sources), 3)
+        self.assertEqual(request.sources[0][1], CATALOG[0][constants.URL])
+        self.assertEqual(request.sources[1][1], CATALOG[1][constants.URL])
+        self.assertEqual(request.sources[2][0].id, primary.id)
+
     def test_next_source(self):
         sources = [1, 2, 3]
         request = Request('', {}, '', '')
@@ -158,6 +178,46 @@ class TestRequest(TestCase):
             self.assertEqual(source, sources[i])
 
 
+class TestResolveSources(TestCase):
+
+    @patch('pulp.server.content.sources.model.managers.content_catalog_manager')
+    def test_resolve(self, fake_manager):
+        primary = PrimarySource(None)
+        alternatives = dict([(s, ContentSource(s, d)) for s, d in DESCRIPTOR])
+        requests = [
+            Request('test_1', {'n': 1}, 'http://redhat.com/1', '/tmp/1'),
+            Request('test_1', {'n': 2}, 'http://redhat.com/2', '/tmp/2'),
+        ]
+        entries = {requests[0].locator: CATALOG[:2]}
+        fake_manager().find_by_locators.return_value = entries
+
+        # test
+        resolve_sources(requests, primary, alternatives)
+
+        # validation
+        fake_manager().find_by_locators.assert_called_once_with(
+            [r.locator for r in requests])
+        self.assertFalse(fake_manager().find.called)
+        sources = list(requests[0].sources)
+        self.assertEqual([s[1] for s in sources],
+                         [CATALOG[0][constants.URL], CATALOG[1][constants.URL],
+                          'http://redhat.com/1'])
+        sources = list(requests[1].sources)
+        self.assertEqual(sources, [(primary, 'http://redhat.com/2')])
+
+    @patch('pulp.server.content.sources.model.managers.content_catalog_manager')
+    def test_resolve_no_alternates(self, fake_manager):
+        primary = PrimarySource(None)
+        request = Request('test_1', {'n': 1}, 'http://redhat.com/1', '/tmp/1')
+
+        # test
+        resolve_sources([request], primary, {})
+
+        # validation
+        self.assertFalse(fake_manager.called)
+        self.assertEqual(list(request.sources), [(primary, 'http://redhat.com/1')])
+
+
 class TestContentSource(TestCase):
 
     @patch('os.path.isfile')
@@ -405,7 +465,7 @@ class TestContentSource(TestCase):
         cataloger = Mock()
         cataloger.refresh.side_effect = FakeRefresh()
 
-        source = ContentSource('s-1', {constants.BASE_URL: url})
+        source = ContentSource('s-1', {constants.BASE_URL: url, constants.MAX_CONCURRENT: '1'})
         source.get_conduit = Mock(return_value=conduit)
         source.get_cataloger = Mock(return_value=cataloger)
 
@@ -417,6 +477,9 @@ class TestContentSource(TestCase):
 
         self.assertEqual(conduit.reset.call_count, len(urls))
         self.assertEqual(cataloger.refresh.call_count, len(urls))
+        self.assertEqual(conduit.flush.call_count, len(urls))
+        conduit.stage.assert_called_once_with()
+        conduit.publish.assert_called_once_with(purge=True)
 
         n = 0
         added = 10
@@ -443,7 +506,7 @@ class TestContentSource(TestCase):
         cataloger = Mock()
         cataloger.refresh.side_effect = ValueError('just failed')
 
-        source = ContentSource('s-1', {constants.BASE_URL: url})
+        source = ContentSource('s-1', {constants.BASE_URL: url, constants.MAX_CONCURRENT: '1'})
         source.get_conduit = Mock(return_value=conduit)
         source.get_cataloger = Mock(return_value=cataloger)
 
@@ -455,6 +518,8 @@ class TestContentSource(TestCase):
 
         self.assertEqual(conduit.reset.call_count, len(urls))
         self.assertEqual(cataloger.refresh.call_count, len(urls))
+        conduit.stage.assert_called_once_with()
+        conduit.publish.assert_called_once_with(purge=False)
 
         n = 0
         for _url in source.urls:
@@ -467,6 +532,39 @@ class TestContentSource(TestCase):
             self.assertEqual(report[n].deleted_count, 0)
             n += 1
 
+    @patch('pulp.server.content.sources.model.ContentSource.urls')
+    def test_refresh_concurrently(self, fake_urls):
+        url = 'http://xyz.com'
+        urls = ['url-1', 'url-2', 'url-3']
+        fake_urls.__get__ = Mock(return_value=urls)
+
+        conduits = [Mock(generation='g1', added_count=0, deleted_count=0) for n in range(3)]
+        cataloger = Mock()
+        cataloger.refresh.side_effect = [None, ValueError('just failed'), None]
+
+        source = ContentSource('s-1', {constants.BASE_URL: url, constants.MAX_CONCURRENT: '2'})
+        source.get_conduit = Mock(side_effect=conduits)
+        source.get_cataloger = Mock(return_value=cataloger)
+
+        # test
+
+        report = source.refresh()
+
+        # validation
+
+        self.assertEqual(source.get_cataloger.call_count, 2)
+        conduits[0].stage.assert_called_once_with()
+        conduits[1].stage.assert_called_once_with('g1')
+        conduits[2].stage.assert_called_once_with('g1')
+        conduits[0].publish.assert_called_once_with(purge=False)
+        self.assertEqual(cataloger.refresh.call_count, len(urls))
+        self.assertEqual([r.url for r in report], urls)
+        self.assertEqual(len([r for r in report if r.succeeded]), 2)
+
+    def test_refresh_timeout(self):
+        source = ContentSource('s-1', {constants.REFRESH_TIMEOUT: '10m'})
+        self.assertEqual(source.refresh_timeout, 600)
+
     def test_dict(self):
         descriptor = {'A': 1, 'B': 2}
 
@@ -512,6 +610,70 @@ class TestContentSource(TestCase):
         self.assertEqual([s.id for s in _list], [s3.id, s2.id, s1.id])
 
 
+class TestDescriptorRegistry(TestCase):
+
+    def setUp(self):
+        self.conf_d = tempfile.mkdtemp()
+        self.write('one.conf', 'A')
+
+    def tearDown(self):
+        shutil.rmtree(self.conf_d)
+
+    def write(self, name, content):
+        path = os.path.join(self.conf_d, name)
+        with open(path, 'w') as fp:
+            fp.write(content)
+        return path
+
+    @patch('pulp.server.content.sources.model.ContentSource.load_all')
+    def test_load(self, fake_load):
+        fake_load.return_value = {'s-1': ContentSource('s-1', {'A': 1})}
+        registry = DescriptorRegistry()
+
+        # test
+        first = registry.load(self.conf_d)
+        second = registry.load(self.conf_d)
+
+        # validation
+        fake_load.assert_called_once_with(self.conf_d)
+        self.assertEqual(first.keys(), ['s-1'])
+        self.assertEqual(second.keys(), ['s-1'])
+        self.assertEqual(second['s-1'].descriptor, {'A': 1})
+        self.assertFalse(first['s-1'] is second['s-1'])
+        self.assertFalse(first['s-1'].descriptor is second['s-1'].descriptor)
+
+    @patch('pulp.server.content.sources.model.ContentSource.load_all')
+    def test_load_changed(self, fake_load):
+        fake_load.return_value = {}
+        registry = DescriptorRegistry()
+
+        # test
+        registry.load(self.conf_d)
+        self.write('one.conf', 'AB')
+        registry.load(self.conf_d)
+        self.write('two.conf', 'C')
+        registry.load(self.conf_d)
+        registry.clear()
+        registry.load(self.conf_d)
+
+        # validation
+        self.assertEqual(fake_load.call_count, 4)
+
+    @patch('pulp.server.content.sources.model.ContentSource.load_all')
+    def test_load_unreadable(self, fake_load):
+        fake_load.return_value = {}
+        registry = DescriptorRegistry()
+        conf_d = os.path.join(self.conf_d, 'none')
+
+        # test
+        registry.load(conf_d)
+        registry.load(conf_d)
+
+        # validation
+        self.assertEqual(fake_load.call_count, 2)
+        self.assertEqual(registry.stamp(conf_d), None)
+
+
 class TestPrimarySource(TestCase):
 
     def test_construction(self):
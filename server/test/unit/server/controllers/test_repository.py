@@ -5,6 +5,7 @@ from bson.objectid import InvalidId
 from mock import call, Mock, MagicMock, patch
 import mock
 import mongoengine
+from pymongo.errors import BulkWriteError
 
 from pulp.common import dateutils, error_codes
 from pulp.common.compat import unittest
@@ -104,6 +105,19 @@ class TestGetUnitModelQuerySets(unittest.TestCase):
 @patch('pulp.server.controllers.repository.model.RepositoryContentUnit.objects')
 class FindRepoContentUnitsTest(unittest.TestCase):
 
+    def _demo_units(self, count):
+        rcu_list = []
+        unit_list = []
+        for i in range(count):
+            unit_id = 'bar_%i' % i
+            unit_key = 'key_%i' % i
+            rcu = model.RepositoryContentUnit(repo_id='foo',
+                                              unit_type_id='demo_model',
+                                              unit_id=unit_id)
+            rcu_list.append(rcu)
+            unit_list.append(DemoModel(id=unit_id, key_field=unit_key))
+        return rcu_list, unit_list
+
     def test_repo_content_units_query(self, mock_rcu_objects):
         """
         Test the query parameters for the RepositoryContentUnit
@@ -113,6 +127,7 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         list(repo_controller.find_repo_content_units(repo, repo_content_unit_q=rcu_filter))
         self.assertEquals(mock_rcu_objects.call_args[1]['repo_id'], 'foo')
         self.assertEquals(mock_rcu_objects.call_args[1]['q_obj'], rcu_filter)
+        mock_rcu_objects.return_value.order_by.assert_called_once_with('unit_type_id', 'unit_id')
 
     @patch.object(DemoModel, 'objects')
     @patch('pulp.server.controllers.repository.plugin_api.get_unit_model_by_id')
@@ -125,7 +140,7 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         test_rcu = model.RepositoryContentUnit(repo_id='foo',
                                                unit_type_id='demo_model',
                                                unit_id='bar')
-        mock_rcu_objects.return_value = [test_rcu]
+        mock_rcu_objects.return_value.order_by.return_value = [test_rcu]
 
         u_filter = mongoengine.Q(key_field='baz')
         u_fields = ['key_field']
@@ -134,6 +149,8 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         result = list(repo_controller.find_repo_content_units(repo, units_q=u_filter,
                                                               unit_fields=u_fields))
 
+        mock_demo_objects.assert_called_once_with(q_obj=u_filter,
+                                                  __raw__={'_id': {'$in': ['bar']}})
         mock_demo_objects.return_value.only.assert_called_once_with('key_field')
 
         # validate that the repo content unit was returned and that the unit is attached
@@ -152,7 +169,7 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         test_rcu = model.RepositoryContentUnit(repo_id='foo',
                                                unit_type_id='demo_model',
                                                unit_id='bar')
-        mock_rcu_objects.return_value = [test_rcu]
+        mock_rcu_objects.return_value.order_by.return_value = [test_rcu]
 
         u_filter = mongoengine.Q(key_field='baz')
         u_fields = ['key_field']
@@ -167,30 +184,62 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         # validate that the content unit was returned
         self.assertEquals(result, [test_unit])
 
+    @patch.object(DemoModel, 'objects')
+    @patch('pulp.server.controllers.repository.plugin_api.get_unit_model_by_id')
+    def test_association_order(self, mock_get_model, mock_demo_objects, mock_rcu_objects):
+        """
+        Test that units are returned in association order and units that do not match
+        the unit query are left out
+        """
+        repo = MagicMock(repo_id='foo')
+        rcu_list, unit_list = self._demo_units(3)
+        mock_rcu_objects.return_value.order_by.return_value = rcu_list
+
+        mock_get_model.return_value = DemoModel
+        mock_demo_objects.return_value = [unit_list[2], unit_list[0]]
+        result = list(repo_controller.find_repo_content_units(
+            repo, units_q=mongoengine.Q(key_field__ne='key_1')))
+
+        self.assertEquals([r.unit_id for r in result], ['bar_0', 'bar_2'])
+
+    @patch.object(DemoModel, 'objects')
+    @patch('pulp.server.controllers.repository.plugin_api.get_unit_model_by_id')
+    @patch('pulp.server.controllers.repository.paginate')
+    def test_pages(self, mock_paginate, mock_get_model, mock_demo_objects, mock_rcu_objects):
+        """
+        Test that units are fetched a page of associations at a time
+        """
+        repo = MagicMock(repo_id='foo')
+        rcu_list, unit_list = self._demo_units(4)
+        mock_paginate.return_value = [rcu_list[:2], rcu_list[2:]]
+
+        mock_get_model.return_value = DemoModel
+        mock_demo_objects.side_effect = [unit_list[:2], unit_list[2:]]
+        result = list(repo_controller.find_repo_content_units(repo))
+
+        self.assertEquals([r.unit_id for r in result], ['bar_0', 'bar_1', 'bar_2', 'bar_3'])
+        mock_demo_objects.assert_has_calls([
+            call(q_obj=None, __raw__={'_id': {'$in': ['bar_0', 'bar_1']}}),
+            call(q_obj=None, __raw__={'_id': {'$in': ['bar_2', 'bar_3']}})])
+
     @patch.object(DemoModel, 'objects')
     @patch('pulp.server.controllers.repository.plugin_api.get_unit_model_by_id')
     def test_limit(self, mock_get_model, mock_demo_objects, mock_rcu_objects):
         """
-        Test that limits are applied properly to the results
+        Test that limits are applied by the database when there is no unit query
         """
         repo = MagicMock(repo_id='foo')
-        rcu_list = []
-        unit_list = []
-        for i in range(10):
-            unit_id = 'bar_%i' % i
-            unit_key = 'key_%i' % i
-            rcu = model.RepositoryContentUnit(repo_id='foo',
-                                              unit_type_id='demo_model',
-                                              unit_id=unit_id)
-            rcu_list.append(rcu)
-            unit_list.append(DemoModel(id=unit_id, key_field=unit_key))
+        rcu_list, unit_list = self._demo_units(5)
 
-        mock_rcu_objects.return_value = rcu_list
+        ordered = mock_rcu_objects.return_value.order_by.return_value
+        ordered.limit.return_value = rcu_list
 
         mock_get_model.return_value = DemoModel
         mock_demo_objects.return_value = unit_list
         result = list(repo_controller.find_repo_content_units(repo, limit=5))
 
+        ordered.limit.assert_called_once_with(5)
+        self.assertFalse(ordered.skip.called)
         self.assertEquals(5, len(result))
         self.assertEquals(result[0].unit_id, 'bar_0')
         self.assertEquals(result[4].unit_id, 'bar_4')
@@ -199,30 +248,64 @@ class FindRepoContentUnitsTest(unittest.TestCase):
     @patch('pulp.server.controllers.repository.plugin_api.get_unit_model_by_id')
     def test_skip(self, mock_get_model, mock_demo_objects, mock_rcu_objects):
         """
-        Test that the skip parameter is applied properly
+        Test that the skip parameter is applied by the database when there is no unit query
         """
         repo = MagicMock(repo_id='foo')
-        rcu_list = []
-        unit_list = []
-        for i in range(10):
-            unit_id = 'bar_%i' % i
-            unit_key = 'key_%i' % i
-            rcu = model.RepositoryContentUnit(repo_id='foo',
-                                              unit_type_id='demo_model',
-                                              unit_id=unit_id)
-            rcu_list.append(rcu)
-            unit_list.append(DemoModel(id=unit_id, key_field=unit_key))
+        rcu_list, unit_list = self._demo_units(10)
 
-        mock_rcu_objects.return_value = rcu_list
+        ordered = mock_rcu_objects.return_value.order_by.return_value
+        ordered.skip.return_value.limit.return_value = rcu_list[5:]
 
         mock_get_model.return_value = DemoModel
-        mock_demo_objects.return_value = unit_list
+        mock_demo_objects.return_value = unit_list[5:]
         result = list(repo_controller.find_repo_content_units(repo, limit=5, skip=5))
 
+        ordered.skip.assert_called_once_with(5)
+        ordered.skip.return_value.limit.assert_called_once_with(5)
         self.assertEquals(5, len(result))
         self.assertEquals(result[0].unit_id, 'bar_5')
         self.assertEquals(result[4].unit_id, 'bar_9')
 
+    @patch.object(DemoModel, 'objects')
+    @patch('pulp.server.controllers.repository.plugin_api.get_unit_model_by_id')
+    def test_skip_and_limit_with_units_q(self, mock_get_model, mock_demo_objects,
+                                         mock_rcu_objects):
+        """
+        Test that skip and limit count the units matching the unit query
+        """
+        repo = MagicMock(repo_id='foo')
+        rcu_list, unit_list = self._demo_units(10)
+        mock_rcu_objects.return_value.order_by.return_value = rcu_list
+
+        mock_get_model.return_value = DemoModel
+        # only the even units match
+        mock_demo_objects.return_value = unit_list[::2]
+        result = list(repo_controller.find_repo_content_units(
+            repo, units_q=mongoengine.Q(key_field='x'), limit=2, skip=1))
+
+        self.assertEquals([r.unit_id for r in result], ['bar_2', 'bar_4'])
+
+    def test_resume_token(self, mock_rcu_objects):
+        """
+        Test that a resume token limits the search to the units after the unit it was
+        created for
+        """
+        repo = MagicMock(repo_id='foo')
+        token = repo_controller.get_resume_token('demo_model', 'bar_4')
+        list(repo_controller.find_repo_content_units(repo, resume_token=token))
+
+        mock_rcu_objects.return_value.filter.assert_called_once_with(__raw__={
+            '$or': [{'unit_type_id': {'$gt': 'demo_model'}},
+                    {'unit_type_id': 'demo_model', 'unit_id': {'$gt': 'bar_4'}}]})
+        mock_rcu_objects.return_value.filter.return_value.order_by.assert_called_once_with(
+            'unit_type_id', 'unit_id')
+
+    def test_invalid_resume_token(self, mock_rcu_objects):
+        repo = MagicMock(repo_id='foo')
+        for token in ('not a token', repo_controller.base64.urlsafe_b64encode('[1, 2, 3]')):
+            self.assertRaises(pulp_exceptions.InvalidValue, list,
+                              repo_controller.find_repo_content_units(repo, resume_token=token))
+
 
 class FindUnitsNotDownloadedTests(unittest.TestCase):
 
@@ -360,6 +443,117 @@ class AssociateSingleUnitTests(unittest.TestCase):
             upsert=True)
 
 
+@patch('pulp.server.controllers.repository.update_last_unit_added')
+@patch('pulp.server.controllers.repository.update_unit_count')
+@patch('pulp.server.controllers.repository.model.RepositoryContentUnit._get_collection')
+@patch('pulp.server.controllers.repository.dateutils.format_iso8601_utc_timestamp')
+class AssociateUnitsTests(unittest.TestCase):
+
+    def test_associate_units(self, mock_get_timestamp, mock_get_collection, mock_update_count,
+                             mock_update_last):
+        mock_get_timestamp.return_value = 'foo_tstamp'
+        collection = mock_get_collection.return_value
+        collection.bulk_write.return_value.upserted_ids = {0: 'a1', 1: 'a2'}
+        units = [DemoModel(id='bar', key_field='baz'), DemoModel(id='baz', key_field='baz')]
+        repo = MagicMock(repo_id='foo')
+
+        added = repo_controller.associate_units(repo, units)
+
+        self.assertEqual(added, 2)
+        requests = collection.bulk_write.call_args[0][0]
+        self.assertEqual(collection.bulk_write.call_args[1], {'ordered': False})
+        type_id = DemoModel._content_type_id.default
+        self.assertEqual([r._filter for r in requests],
+                         [{'repo_id': 'foo', 'unit_type_id': type_id, 'unit_id': 'bar'},
+                          {'repo_id': 'foo', 'unit_type_id': type_id, 'unit_id': 'baz'}])
+        for request in requests:
+            self.assertEqual(request._doc, {'$setOnInsert': {'created': 'foo_tstamp'},
+                                            '$set': {'updated': 'foo_tstamp'}})
+            self.assertTrue(request._upsert)
+        mock_update_count.assert_called_once_with('foo', type_id, 2)
+        mock_update_last.assert_called_once_with('foo')
+
+    def test_counts_new_associations_by_type(self, mock_get_timestamp, mock_get_collection,
+                                             mock_update_count, mock_update_last):
+        collection = mock_get_collection.return_value
+        # the second unit was already associated
+        collection.bulk_write.return_value.upserted_ids = {0: 'a1', 2: 'a3'}
+        refs = [('type-1', 'u1'), ('type-1', 'u2'), ('type-2', 'u3'), ('type-1', 'u1')]
+
+        added = repo_controller.associate_units_by_id('foo', iter(refs))
+
+        self.assertEqual(added, 2)
+        # duplicates are only written once
+        self.assertEqual(len(collection.bulk_write.call_args[0][0]), 3)
+        mock_update_count.assert_has_calls([call('foo', 'type-1', 1), call('foo', 'type-2', 1)],
+                                           any_order=True)
+        self.assertEqual(mock_update_count.call_count, 2)
+        mock_update_last.assert_called_once_with('foo')
+
+    def test_existing_left_untouched(self, mock_get_timestamp, mock_get_collection,
+                                     mock_update_count, mock_update_last):
+        mock_get_timestamp.return_value = 'foo_tstamp'
+        collection = mock_get_collection.return_value
+        # the second unit was already associated
+        collection.bulk_write.return_value.upserted_ids = {0: 'a1'}
+
+        added = repo_controller.associate_units_by_id('foo', [('type-1', 'u1'), ('type-1', 'u2')],
+                                                      update_existing=False)
+
+        self.assertEqual(added, 1)
+        for request in collection.bulk_write.call_args[0][0]:
+            # nothing is set on an association that already exists
+            self.assertEqual(request._doc, {'$setOnInsert': {'created': 'foo_tstamp',
+                                                             'updated': 'foo_tstamp'}})
+            self.assertTrue(request._upsert)
+        mock_update_count.assert_called_once_with('foo', 'type-1', 1)
+
+    def test_nothing_added(self, mock_get_timestamp, mock_get_collection, mock_update_count,
+                           mock_update_last):
+        collection = mock_get_collection.return_value
+        collection.bulk_write.return_value.upserted_ids = {}
+
+        added = repo_controller.associate_units_by_id('foo', [('type-1', 'u1')])
+
+        self.assertEqual(added, 0)
+        self.assertFalse(mock_update_count.called)
+        self.assertFalse(mock_update_last.called)
+
+    def test_no_units(self, mock_get_timestamp, mock_get_collection, mock_update_count,
+                      mock_update_last):
+        added = repo_controller.associate_units_by_id('foo', [])
+
+        self.assertEqual(added, 0)
+        self.assertFalse(mock_get_collection.return_value.bulk_write.called)
+
+    def test_retries_duplicate_key_errors(self, mock_get_timestamp, mock_get_collection,
+                                          mock_update_count, mock_update_last):
+        collection = mock_get_collection.return_value
+        error = BulkWriteError({'writeErrors': [{'index': 1, 'code': 11000}],
+                                'upserted': [{'index': 0, '_id': 'a1'}]})
+        collection.bulk_write.side_effect = [error, MagicMock()]
+
+        added = repo_controller.associate_units_by_id('foo', [('type-1', 'u1'),
+                                                              ('type-1', 'u2')])
+
+        self.assertEqual(added, 1)
+        self.assertEqual(collection.bulk_write.call_count, 2)
+        requests = collection.bulk_write.call_args_list[0][0][0]
+        retried = collection.bulk_write.call_args_list[1][0][0]
+        self.assertEqual(retried, [requests[1]])
+        mock_update_count.assert_called_once_with('foo', 'type-1', 1)
+
+    def test_other_write_errors_raised(self, mock_get_timestamp, mock_get_collection,
+                                       mock_update_count, mock_update_last):
+        collection = mock_get_collection.return_value
+        error = BulkWriteError({'writeErrors': [{'index': 0, 'code': 2}], 'upserted': []})
+        collection.bulk_write.side_effect = error
+
+        self.assertRaises(BulkWriteError, repo_controller.associate_units_by_id, 'foo',
+                          [('type-1', 'u1')])
+        self.assertFalse(mock_update_count.called)
+
+
 class TestDisassociateUnits(unittest.TestCase):
     @patch('pulp.server.controllers.repository.update_last_unit_removed')
     @patch('pulp.server.controllers.repository.model.RepositoryContentUnit.objects')
@@ -28,6 +28,9 @@ class DemoModelWithSerializer(model.ContentUnit):
 
 class FindUnitsTests(unittest.TestCase):
 
+    def tearDown(self):
+        DemoModel.objects.side_effect = None
+
     @patch('pulp.server.controllers.units.misc.paginate')
     def test_paginate(self, mock_paginate):
         """
@@ -70,6 +73,71 @@ class FindUnitsTests(unittest.TestCase):
         result = list(units_controller.find_units(units_iterable))
         self.assertEqual(result, [model_2_defined])
 
+    @patch('pulp.server.controllers.units.misc.paginate')
+    def test_paginate_by_digest(self, mock_paginate):
+        units_iterable = (DemoModel(key_field='a'),)
+
+        list(units_controller.find_units(units_iterable, by_digest=True))
+
+        mock_paginate.assert_called_once_with(units_iterable,
+                                              units_controller.DIGEST_PAGINATION_SIZE)
+
+    def test_query_by_digest(self):
+        """
+        Test that units are queried by the digest of their unit key
+        """
+        model_1 = DemoModel(key_field='a')
+        model_2 = DemoModel(key_field='B')
+        model_3 = DemoModel(key_field='a')
+        model_2_defined = DemoModel(key_field='B', id='foo')
+        DemoModel.objects.reset_mock()
+        DemoModel.objects.side_effect = [[model_2_defined], []]
+
+        result = list(units_controller.find_units((model_1, model_2, model_3), by_digest=True))
+
+        self.assertEqual(result, [model_2_defined])
+        kwargs = DemoModel.objects.call_args_list[0][1]
+        self.assertEqual(sorted(kwargs['_unit_key_digest__in']),
+                         sorted([model_1.unit_key_as_digest(), model_2.unit_key_as_digest()]))
+        # the unit that was not found is looked up among the units without a digest
+        query_dict = DemoModel.objects.call_args_list[1][0][0].to_query(DemoModel)
+        self.assertEqual(query_dict, {'_unit_key_digest': None, 'key_field': u'a'})
+
+    def test_query_by_digest_all_found(self):
+        model_1 = DemoModel(key_field='a')
+        model_1_defined = DemoModel(key_field='a', id='foo')
+        DemoModel.objects.reset_mock()
+        DemoModel.objects.side_effect = [[model_1_defined]]
+
+        result = list(units_controller.find_units((model_1,), by_digest=True))
+
+        self.assertEqual(result, [model_1_defined])
+        self.assertEqual(DemoModel.objects.call_count, 1)
+
+    def test_query_by_digest_collision(self):
+        """
+        Test that a unit with the same digest but a different unit key is not returned
+        """
+        model_1 = DemoModel(key_field='a')
+        colliding = DemoModel(key_field='z', id='foo')
+        model_1_undigested = DemoModel(key_field='a', id='bar')
+        DemoModel.objects.reset_mock()
+        DemoModel.objects.side_effect = [[colliding], [model_1_undigested]]
+
+        result = list(units_controller.find_units((model_1,), by_digest=True))
+
+        self.assertEqual(result, [model_1_undigested])
+
+    def test_query_by_digest_pages(self):
+        DemoModel.objects.reset_mock()
+        DemoModel.objects.return_value = []
+        units = [DemoModel(key_field=str(i)) for i in range(5)]
+
+        list(units_controller.find_units(units, pagination_size=2, by_digest=True))
+
+        # a digest query and a query for units without a digest per page
+        self.assertEqual(DemoModel.objects.call_count, 6)
+
 
 @patch('pulp.plugins.loader.api.get_unit_model_by_id', spec_set=True)
 @patch('pulp.plugins.types.database.type_definition', spec_set=True)
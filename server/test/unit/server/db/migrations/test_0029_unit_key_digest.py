@@ -0,0 +1,56 @@
+"""
+This module contains tests for pulp.server.db.migrations.0029_unit_key_digest.
+"""
+import unittest
+
+import mock
+
+from pulp.server.db.migrate.models import _import_all_the_way
+
+
+MIGRATION = 'pulp.server.db.migrations.0029_unit_key_digest'
+
+migration = _import_all_the_way(MIGRATION)
+
+
+class TestMigrate(unittest.TestCase):
+    """
+    Test the migrate() function.
+    """
+    @mock.patch(MIGRATION + '.PluginManager')
+    def test_migrate(self, plugin_manager):
+        """
+        Ensure that the digest is stored on the units that do not have one.
+        """
+        units = [mock.Mock(id='u%d' % i) for i in range(3)]
+        for unit in units:
+            unit.unit_key_as_digest.return_value = 'digest-%s' % unit.id
+        model_class = mock.Mock(unit_key_fields=('name', 'version'))
+        query = model_class.objects.return_value.only.return_value.no_cache.return_value
+        query.__iter__ = mock.Mock(return_value=iter(units))
+        plugin_manager.return_value.unit_models = {'type_a': model_class}
+
+        migration.migrate()
+
+        model_class.objects.assert_called_once_with(
+            __raw__={'_unit_key_digest': {'$exists': False}})
+        model_class.objects.return_value.only.assert_called_once_with('id', 'name', 'version')
+        collection = model_class._get_collection.return_value
+        self.assertEqual(collection.bulk_write.call_count, 1)
+        requests = collection.bulk_write.call_args[0][0]
+        self.assertEqual([(r._filter, r._doc) for r in requests],
+                         [({'_id': 'u0'}, {'$set': {'_unit_key_digest': 'digest-u0'}}),
+                          ({'_id': 'u1'}, {'$set': {'_unit_key_digest': 'digest-u1'}}),
+                          ({'_id': 'u2'}, {'$set': {'_unit_key_digest': 'digest-u2'}})])
+        self.assertEqual(collection.bulk_write.call_args[1], {'ordered': False})
+
+    @mock.patch(MIGRATION + '.PluginManager')
+    def test_migrate_nothing_to_do(self, plugin_manager):
+        model_class = mock.Mock(unit_key_fields=('name',))
+        query = model_class.objects.return_value.only.return_value.no_cache.return_value
+        query.__iter__ = mock.Mock(return_value=iter([]))
+        plugin_manager.return_value.unit_models = {'type_a': model_class}
+
+        migration.migrate()
+
+        self.assertFalse(model_class._get_collection.return_value.bulk_write.called)
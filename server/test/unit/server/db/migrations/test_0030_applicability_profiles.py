@@ -0,0 +1,59 @@
+"""
+This module contains tests for pulp.server.db.migrations.0030_applicability_profiles.
+"""
+import unittest
+
+import mock
+
+from pulp.server.db.migrate.models import _import_all_the_way
+
+
+MIGRATION = 'pulp.server.db.migrations.0030_applicability_profiles'
+
+migration = _import_all_the_way(MIGRATION)
+
+
+class TestMigrate(unittest.TestCase):
+    """
+    Test the migrate() function.
+    """
+    @mock.patch(MIGRATION + '.datetime')
+    @mock.patch(MIGRATION + '.connection')
+    def test_migrate(self, connection, mock_datetime):
+        """
+        Ensure that each profile is stored once and removed from the applicability documents.
+        """
+        db = {'repo_profile_applicability': mock.Mock(), 'applicability_profiles': mock.Mock()}
+        connection.get_database.return_value = db
+        rpa_collection = db['repo_profile_applicability']
+        rpa_collection.find.return_value = iter([
+            {'_id': 'a1', 'profile_hash': 'hash-1', 'profile': ['zsh']},
+            {'_id': 'a2', 'profile_hash': 'hash-1', 'profile': ['zsh']},
+            {'_id': 'a3', 'profile_hash': 'hash-2', 'profile': ['ksh']}])
+
+        now = mock_datetime.datetime.now.return_value
+
+        migration.migrate()
+
+        rpa_collection.find.assert_called_once_with(
+            {'profile': {'$exists': True}}, projection=['profile_hash', 'profile'])
+        profile_collection = db['applicability_profiles']
+        requests = profile_collection.bulk_write.call_args[0][0]
+        self.assertEqual(sorted((r._filter, r._doc, r._upsert) for r in requests),
+                         [({'_id': 'hash-1'}, {'$set': {'last_referenced': now},
+                                               '$setOnInsert': {'profile': ['zsh']}}, True),
+                          ({'_id': 'hash-2'}, {'$set': {'last_referenced': now},
+                                               '$setOnInsert': {'profile': ['ksh']}}, True)])
+        rpa_collection.update_many.assert_called_once_with(
+            {'_id': {'$in': ['a1', 'a2', 'a3']}}, {'$unset': {'profile': ''}})
+
+    @mock.patch(MIGRATION + '.connection')
+    def test_migrate_nothing_to_do(self, connection):
+        db = {'repo_profile_applicability': mock.Mock(), 'applicability_profiles': mock.Mock()}
+        connection.get_database.return_value = db
+        db['repo_profile_applicability'].find.return_value = iter([])
+
+        migration.migrate()
+
+        self.assertFalse(db['applicability_profiles'].bulk_write.called)
+        self.assertFalse(db['repo_profile_applicability'].update_many.called)
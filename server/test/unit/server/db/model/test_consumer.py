@@ -3,6 +3,7 @@
 This module contains tests for the pulp.server.db.model.consumer module.
 """
 
+import datetime
 import unittest
 
 import mock
@@ -20,6 +21,7 @@ class TestRepoProfileApplicability(PulpServerTests):
 
     def tearDown(self):
         self.collection.drop()
+        consumer.ApplicabilityProfile.get_collection().drop()
 
     def test___init___no__id(self):
         """
@@ -112,7 +114,9 @@ class TestRepoProfileApplicability(PulpServerTests):
         document = self.collection.find_one()
         self.assertEqual(document['profile_hash'], profile_hash)
         self.assertEqual(document['repo_id'], repo_id)
-        self.assertEqual(document['profile'], profile)
+        self.assertFalse('profile' in document)
+        self.assertEqual(consumer.ApplicabilityProfile.get_profiles([profile_hash]),
+                         {profile_hash: profile})
         self.assertEqual(document['applicability'], applicability_data)
 
         # Our applicability object should still have the correct _id attribute
@@ -141,13 +145,54 @@ class TestRepoProfileApplicability(PulpServerTests):
         document = self.collection.find_one()
         self.assertEqual(document['profile_hash'], profile_hash)
         self.assertEqual(document['repo_id'], repo_id)
-        self.assertEqual(document['profile'], profile)
+        self.assertFalse('profile' in document)
+        self.assertEqual(consumer.ApplicabilityProfile.get_profiles([profile_hash]),
+                         {profile_hash: profile})
         self.assertEqual(document['applicability'], applicability_data)
 
         # Our applicability object should now have the correct _id attribute
         self.assertEqual(applicability._id, document['_id'])
 
 
+class TestApplicabilityProfile(PulpServerTests):
+    """
+    Test the ApplicabilityProfile Model.
+    """
+    def setUp(self):
+        self.collection = consumer.ApplicabilityProfile.get_collection()
+
+    def tearDown(self):
+        self.collection.drop()
+
+    def test_store(self):
+        consumer.ApplicabilityProfile.store('hash', ['a', 'profile'])
+        # storing a profile for the same hash again leaves the stored profile alone
+        consumer.ApplicabilityProfile.store('hash', ['another', 'profile'])
+
+        stored = list(self.collection.find())
+        self.assertEqual(len(stored), 1)
+        self.assertEqual(stored[0]['_id'], 'hash')
+        self.assertEqual(stored[0]['profile'], ['a', 'profile'])
+
+    @mock.patch('pulp.server.db.model.consumer.datetime')
+    def test_store_referenced(self, mock_datetime):
+        mock_datetime.datetime.now.return_value = datetime.datetime(2016, 1, 1)
+        consumer.ApplicabilityProfile.store('hash', ['a', 'profile'])
+        mock_datetime.datetime.now.return_value = datetime.datetime(2016, 1, 2)
+        consumer.ApplicabilityProfile.store('hash', ['a', 'profile'])
+
+        self.assertEqual(self.collection.find_one()['last_referenced'],
+                         datetime.datetime(2016, 1, 2))
+
+    def test_get_profiles(self):
+        consumer.ApplicabilityProfile.store('hash_1', ['profile', '1'])
+        consumer.ApplicabilityProfile.store('hash_2', ['profile', '2'])
+
+        profiles = consumer.ApplicabilityProfile.get_profiles(['hash_1', 'hash_missing'])
+
+        self.assertEqual(profiles, {'hash_1': ['profile', '1']})
+
+
 class TestUnitProfile(unittest.TestCase):
     """
     Test the UnitProfile class.
@@ -145,6 +145,7 @@ class TestManageDB(MigrationTest):
                                                                             test_model)]
         manage.ensure_database_indexes()
         test_model.ensure_indexes.assert_called_once_with()
+        test_model._meta.__getitem__.return_value.append.assert_any_call('_unit_key_digest')
 
     @patch.object(manage, 'PluginManager')
     @patch.object(manage, 'model')
@@ -112,6 +112,7 @@ class TestContentUnit(unittest.TestCase):
         self.assertTrue(isinstance(model.ContentUnit._last_updated, IntField))
         self.assertTrue(model.ContentUnit._last_updated.required)
         self.assertTrue(isinstance(model.ContentUnit._storage_path, StringField))
+        self.assertTrue(isinstance(model.ContentUnit._unit_key_digest, StringField))
         self.assertTrue(isinstance(model.ContentUnit.pulp_user_metadata, DictField))
 
     def test_unit_key_as_digest(self):
@@ -134,6 +135,12 @@ class TestContentUnit(unittest.TestCase):
                 _hash.update(value)
         self.assertEqual(digest, _hash.hexdigest())
 
+    def test_unit_key_as_digest_unicode(self):
+        unit = ContentUnitHelper(apple=u'r\xe9d', pear='yellow', age=21)
+        same = ContentUnitHelper(apple='r\xc3\xa9d', pear=u'yellow', age=21)
+
+        self.assertEqual(unit.unit_key_as_digest(), same.unit_key_as_digest())
+
     def test__hash__(self):
         unit = ContentUnitHelper()
         unit.apple = 'red'
@@ -184,6 +191,7 @@ class TestContentUnit(unittest.TestCase):
 
         # make sure the last updated time has been updated
         self.assertEquals(helper._last_updated, 'foo')
+        self.assertEquals(helper._unit_key_digest, helper.unit_key_as_digest())
 
     @patch('pulp.server.db.model.Repository.objects')
     @patch('pulp.server.db.model.RepositoryContentUnit.objects')
@@ -1,12 +1,16 @@
+import datetime
+import unittest
+
 import mock
 
 from .... import base
+from pulp.common import dateutils
 from pulp.devel import mock_plugins
 from pulp.plugins.loader import api as plugins
 from pulp.server.controllers import distributor as dist_controller
 from pulp.server.db import model
-from pulp.server.db.model.consumer import (Bind, Consumer, RepoProfileApplicability,
-                                           UnitProfile)
+from pulp.server.db.model.consumer import (ApplicabilityProfile, Bind, Consumer,
+                                           RepoProfileApplicability, UnitProfile)
 from pulp.server.db.model.criteria import Criteria
 from pulp.server.db.model import Repository
 from pulp.server.managers import factory as factory
@@ -39,6 +43,7 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         Consumer.get_collection().remove()
         UnitProfile.get_collection().remove()
         RepoProfileApplicability.get_collection().remove()
+        ApplicabilityProfile.get_collection().remove()
         plugins._create_manager()
         mock_plugins.install()
 
@@ -62,10 +67,15 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         Consumer.get_collection().remove()
         UnitProfile.get_collection().remove()
         RepoProfileApplicability.get_collection().remove()
+        ApplicabilityProfile.get_collection().remove()
         mock_plugins.reset()
         ApplicabilityRegenerationManager._get_existing_repo_content_types = staticmethod(
             self.old_get_existing)
 
+    def _profile(self, applicability):
+        profile_hash = applicability['profile_hash']
+        return ApplicabilityProfile.get_profiles([profile_hash])[profile_hash]
+
     def populate_consumers(self):
         # Register consumers with rpm profiles
         manager = factory.consumer_manager()
@@ -129,7 +139,7 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         expected_applicability = {'rpm': ['rpm-1', 'rpm-2'], 'erratum': ['errata-1', u'errata-2']}
         for applicability in applicability_list:
             self.assertEqual(applicability['applicability'], expected_applicability)
-            self.assertTrue(applicability['profile'] in [self.PROFILE1, self.PROFILE2])
+            self.assertTrue(self._profile(applicability) in [self.PROFILE1, self.PROFILE2])
 
     @mock.patch('pulp.server.managers.consumer.bind.model.Repository.objects')
     def test_regenerate_applicability_for_consumers_with_same_profiles(self, mock_repo_qs):
@@ -142,7 +152,7 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         self.assertEqual(len(applicability_list), 2)
         expected_applicability = {'rpm': ['rpm-1', 'rpm-2'], 'erratum': ['errata-1', u'errata-2']}
         for applicability in applicability_list:
-            self.assertEqual(applicability['profile'], self.PROFILE1)
+            self.assertEqual(self._profile(applicability), self.PROFILE1)
             self.assertEqual(applicability['applicability'], expected_applicability)
 
     @mock.patch('pulp.server.managers.consumer.bind.model.Repository.objects')
@@ -156,7 +166,7 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         self.assertEqual(len(applicability_list), 2)
         expected_applicability = {'rpm': ['rpm-1', 'rpm-2'], 'erratum': ['errata-1', u'errata-2']}
         for applicability in applicability_list:
-            self.assertEqual(applicability['profile'], self.PROFILE1)
+            self.assertEqual(self._profile(applicability), self.PROFILE1)
             self.assertEqual(applicability['applicability'], expected_applicability)
 
     def test_regenerate_applicability_for_consumer_criteria_no_bindings(self):
@@ -196,7 +206,7 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         expected_applicability = {'rpm': ['rpm-1', 'rpm-2'], 'erratum': ['errata-1', u'errata-2']}
         for applicability in applicability_list:
             self.assertEqual(applicability['applicability'], expected_applicability)
-            self.assertTrue(applicability['profile'] in [self.PROFILE1, self.PROFILE2])
+            self.assertTrue(self._profile(applicability) in [self.PROFILE1, self.PROFILE2])
 
     @mock.patch('pulp.server.managers.consumer.bind.model.Repository.objects')
     def test_regenerate_applicability_for_repos_with_same_consumer_profiles(self, mock_repo_qs):
@@ -210,7 +220,7 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         self.assertEqual(len(applicability_list), 2)
         expected_applicability = {'rpm': ['rpm-1', 'rpm-2'], 'erratum': ['errata-1', u'errata-2']}
         for applicability in applicability_list:
-            self.assertEqual(applicability['profile'], self.PROFILE1)
+            self.assertEqual(self._profile(applicability), self.PROFILE1)
             self.assertEqual(applicability['applicability'], expected_applicability)
 
     @mock.patch('pulp.server.managers.consumer.bind.model.Repository.objects')
@@ -225,7 +235,7 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         self.assertEqual(len(applicability_list), 2)
         expected_applicability = {'rpm': ['rpm-1', 'rpm-2'], 'erratum': ['errata-1', u'errata-2']}
         for applicability in applicability_list:
-            self.assertEqual(applicability['profile'], self.PROFILE1)
+            self.assertEqual(self._profile(applicability), self.PROFILE1)
             self.assertEqual(applicability['applicability'], expected_applicability)
 
     @mock.patch('pulp.server.managers.consumer.bind.model.Repository.objects')
@@ -271,7 +281,7 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         applicability_list = list(RepoProfileApplicability.get_collection().find())
         self.assertEqual(len(applicability_list), 1)
         expected_applicability = {'rpm': ['rpm-1', 'rpm-2'], 'erratum': ['errata-1', 'errata-2']}
-        self.assertEqual(applicability_list[0]['profile'], self.PROFILE1)
+        self.assertEqual(self._profile(applicability_list[0]), self.PROFILE1)
         self.assertEqual(applicability_list[0]['applicability'], expected_applicability)
 
     @mock.patch('pulp.server.managers.consumer.applicability.model.Repository.objects')
@@ -288,7 +298,8 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         applicability_manager.batch_regenerate_applicability('mock_repo', profile_hashes)
         expected_params = {'profile_hash': {'$in': ['mock-hash-1', 'mock-hash-2']},
                            'repo_id': 'mock_repo'}
-        mock_repo_profile_app_get_collection.return_value.find.assert_called_with(expected_params)
+        mock_repo_profile_app_get_collection.return_value.find.assert_called_with(
+            expected_params, projection=['profile_hash'])
 
     @mock.patch('pulp.server.managers.consumer.applicability.model.Repository.objects')
     def test_get_existing_repo_content_types_no_repo(self, mock_repo_qs):
@@ -337,7 +348,7 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         expected_applicability = {'rpm': ['rpm-1', 'rpm-2'], 'erratum': ['errata-1', u'errata-2']}
         for applicability in applicability_list:
             self.assertEqual(applicability['applicability'], expected_applicability)
-            self.assertTrue(applicability['profile'] in [self.PROFILE1, self.PROFILE2])
+            self.assertTrue(self._profile(applicability) in [self.PROFILE1, self.PROFILE2])
 
     @mock.patch('pulp.server.managers.consumer.bind.model.Repository.objects')
     def test_linear_regenerate_applicability_for_repos_with_same_consumer_profiles(self,
@@ -354,7 +365,7 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         self.assertEqual(len(applicability_list), 2)
         expected_applicability = {'rpm': ['rpm-1', 'rpm-2'], 'erratum': ['errata-1', u'errata-2']}
         for applicability in applicability_list:
-            self.assertEqual(applicability['profile'], self.PROFILE1)
+            self.assertEqual(self._profile(applicability), self.PROFILE1)
             self.assertEqual(applicability['applicability'], expected_applicability)
 
     @mock.patch('pulp.server.managers.consumer.bind.model.Repository.objects')
@@ -371,7 +382,7 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         self.assertEqual(len(applicability_list), 2)
         expected_applicability = {'rpm': ['rpm-1', 'rpm-2'], 'erratum': ['errata-1', u'errata-2']}
         for applicability in applicability_list:
-            self.assertEqual(applicability['profile'], self.PROFILE1)
+            self.assertEqual(self._profile(applicability), self.PROFILE1)
             self.assertEqual(applicability['applicability'], expected_applicability)
 
     @mock.patch('pulp.server.managers.consumer.bind.model.Repository.objects')
@@ -427,24 +438,451 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         applicability_list = list(RepoProfileApplicability.get_collection().find())
         self.assertEqual(len(applicability_list), 1)
         expected_applicability = {'rpm': ['rpm-1', 'rpm-2'], 'erratum': ['errata-1', 'errata-2']}
-        self.assertEqual(applicability_list[0]['profile'], self.PROFILE1)
+        self.assertEqual(self._profile(applicability_list[0]), self.PROFILE1)
         self.assertEqual(applicability_list[0]['applicability'], expected_applicability)
 
+    @mock.patch('pulp.server.managers.consumer.applicability.APPLICABILITY_BATCH_SIZE', 2)
+    @mock.patch('pulp.server.managers.consumer.applicability.ApplicabilityRegenerationManager.'
+                '_regenerate_applicability_batch')
     @mock.patch('pulp.server.managers.consumer.applicability.model.Repository.objects')
     @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
     def test_linear_regen_applicability_for_repos_batch_size(self, mock_get_collection,
-                                                             mock_objects):
+                                                             mock_objects, mock_regenerate_batch):
 
         factory.initialize()
         applicability_manager = ApplicabilityRegenerationManager()
         repo_criteria = {'filters': None, 'sort': None, 'limit': None,
                          'skip': None, 'fields': None}
         mock_objects.find_by_criteria.return_value = [Repository(repo_id='fake-repo')]
+        mock_get_collection.return_value.find.return_value = [
+            {'profile_hash': 'hash-1'}, {'profile_hash': 'hash-2'}, {'profile_hash': 'hash-3'}]
 
         applicability_manager.regenerate_applicability_for_repos(repo_criteria)
 
-        # validate that batch size of 5 is used
-        mock_get_collection.return_value.find.return_value.batch_size.assert_called_with(5)
+        # validate that the profiles are regenerated in batches sharing one conduit
+        self.assertEqual(mock_regenerate_batch.call_count, 2)
+        calls = mock_regenerate_batch.call_args_list
+        self.assertEqual(calls[0][0][:3], ('fake-repo', ['hash-1', 'hash-2'], ['rpm', 'erratum']))
+        self.assertEqual(calls[1][0][:3], ('fake-repo', ['hash-3'], ['rpm', 'erratum']))
+        self.assertTrue(calls[0][0][3] is calls[1][0][3])
+
+    @mock.patch('pulp.server.db.model.consumer.ApplicabilityProfile.get_collection')
+    @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+    @mock.patch('pulp.server.db.model.consumer.UnitProfile.get_collection')
+    def test_regenerate_applicability_batch(self, mock_unit_profile_get_collection,
+                                            mock_rpa_get_collection, mock_ap_get_collection):
+        mock_rpa_get_collection.return_value.find.return_value = [
+            {'profile_hash': 'hash-1'}, {'profile_hash': 'hash-2'}]
+        mock_ap_get_collection.return_value.find.return_value = [
+            {'_id': 'hash-1', 'profile': self.PROFILE1},
+            {'_id': 'hash-2', 'profile': self.PROFILE2}]
+        mock_unit_profile_get_collection.return_value.aggregate.return_value = [
+            {'_id': 'hash-1', 'content_type': 'rpm'},
+            {'_id': 'hash-2', 'content_type': 'rpm'}]
+        profiler, cfg = plugins.get_profiler_by_type('rpm')
+        profiler.calculate_applicable_units_bulk = mock.Mock(
+            return_value={'hash-1': {'rpm': ['rpm-1']}, 'hash-2': {'rpm': []}})
+        conduit = mock.Mock()
+
+        ApplicabilityRegenerationManager._regenerate_applicability_batch(
+            'repo-1', ['hash-1', 'hash-2'], ['rpm'], conduit)
+
+        mock_ap_get_collection.return_value.find.assert_called_once_with(
+            {'_id': {'$in': ['hash-1', 'hash-2']}})
+        call_args = profiler.calculate_applicable_units_bulk.call_args[0]
+        self.assertEqual(call_args[0], {'hash-1': self.PROFILE1, 'hash-2': self.PROFILE2})
+        self.assertEqual(call_args[1], 'repo-1')
+        self.assertTrue(call_args[3] is conduit)
+        requests = mock_rpa_get_collection.return_value.bulk_write.call_args[0][0]
+        self.assertEqual(
+            sorted((r._filter['profile_hash'], r._doc) for r in requests),
+            [('hash-1', {'$set': {'applicability': {'rpm': ['rpm-1']}}}),
+             ('hash-2', {'$set': {'applicability': {'rpm': []}}})])
+
+    @mock.patch('pulp.server.db.model.consumer.ApplicabilityProfile.get_collection')
+    @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+    @mock.patch('pulp.server.db.model.consumer.UnitProfile.get_collection')
+    def test_regenerate_applicability_batch_type_not_in_repo(self,
+                                                             mock_unit_profile_get_collection,
+                                                             mock_rpa_get_collection,
+                                                             mock_ap_get_collection):
+        mock_rpa_get_collection.return_value.find.return_value = [{'profile_hash': 'hash-1'}]
+        mock_ap_get_collection.return_value.find.return_value = [
+            {'_id': 'hash-1', 'profile': self.PROFILE1}]
+        mock_unit_profile_get_collection.return_value.aggregate.return_value = [
+            {'_id': 'hash-1', 'content_type': 'rpm'}]
+
+        ApplicabilityRegenerationManager._regenerate_applicability_batch(
+            'repo-1', ['hash-1'], ['iso'], mock.Mock())
+
+        self.assertFalse(mock_rpa_get_collection.return_value.bulk_write.called)
+
+
+class TestApplicabilityDelta(unittest.TestCase):
+
+    MODULE = 'pulp.server.managers.consumer.applicability.'
+
+    def setUp(self):
+        self.last_regeneration = datetime.datetime(2016, 1, 1, 12, 0, 0, tzinfo=dateutils.utc_tz())
+
+    @mock.patch(MODULE + 'model.Repository.objects')
+    def test_get_added_units_never_regenerated(self, mock_repo_objects):
+        repo = mock_repo_objects.return_value.only.return_value.first.return_value
+        repo.last_applicability_regeneration = None
+
+        self.assertEqual(ApplicabilityRegenerationManager._get_added_units('repo-1'), None)
+
+    @mock.patch(MODULE + 'model.Repository.objects')
+    def test_get_added_units_removed_since(self, mock_repo_objects):
+        repo = mock_repo_objects.return_value.only.return_value.first.return_value
+        repo.last_applicability_regeneration = self.last_regeneration
+        repo.last_unit_removed = self.last_regeneration + datetime.timedelta(hours=1)
+
+        self.assertEqual(ApplicabilityRegenerationManager._get_added_units('repo-1'), None)
+
+    @mock.patch(MODULE + 'model.RepositoryContentUnit.objects')
+    @mock.patch(MODULE + 'model.Repository.objects')
+    def test_get_added_units(self, mock_repo_objects, mock_rcu_objects):
+        repo = mock_repo_objects.return_value.only.return_value.first.return_value
+        repo.last_applicability_regeneration = self.last_regeneration
+        repo.last_unit_removed = self.last_regeneration - datetime.timedelta(hours=1)
+        mock_rcu_objects.return_value.only.return_value.as_pymongo.return_value = [
+            {'unit_id': 'rpm-1', 'unit_type_id': 'rpm', 'created': '2016-01-01T12:00:00Z'},
+            {'unit_id': 'errata-1', 'unit_type_id': 'erratum', 'created': '2016-01-01T13:00:00Z'},
+            {'unit_id': 'rpm-2', 'unit_type_id': 'rpm', 'created': '2016-01-01T13:00:00Z'}]
+
+        added_units = ApplicabilityRegenerationManager._get_added_units('repo-1')
+
+        self.assertEqual(added_units, {'rpm': ['rpm-1', 'rpm-2'], 'erratum': ['errata-1']})
+        mock_rcu_objects.assert_called_once_with(repo_id='repo-1',
+                                                 updated__gte='2016-01-01T12:00:00Z')
+
+    @mock.patch(MODULE + 'model.RepositoryContentUnit.objects')
+    @mock.patch(MODULE + 'model.Repository.objects')
+    def test_get_added_units_updated_in_place(self, mock_repo_objects, mock_rcu_objects):
+        repo = mock_repo_objects.return_value.only.return_value.first.return_value
+        repo.last_applicability_regeneration = self.last_regeneration
+        repo.last_unit_removed = None
+        mock_rcu_objects.return_value.only.return_value.as_pymongo.return_value = [
+            {'unit_id': 'rpm-1', 'unit_type_id': 'rpm', 'created': '2016-01-01T13:00:00Z'},
+            {'unit_id': 'errata-1', 'unit_type_id': 'erratum', 'created': '2015-12-01T00:00:00Z'}]
+
+        self.assertEqual(ApplicabilityRegenerationManager._get_added_units('repo-1'), None)
+
+    @mock.patch(MODULE + 'model.RepositoryContentUnit.objects')
+    @mock.patch(MODULE + 'model.Repository.objects')
+    def test_get_added_units_nothing_changed(self, mock_repo_objects, mock_rcu_objects):
+        repo = mock_repo_objects.return_value.only.return_value.first.return_value
+        repo.last_applicability_regeneration = self.last_regeneration
+        repo.last_unit_removed = None
+        mock_rcu_objects.return_value.only.return_value.as_pymongo.return_value = []
+
+        self.assertEqual(ApplicabilityRegenerationManager._get_added_units('repo-1'), None)
+
+    @mock.patch(MODULE + 'APPLICABILITY_DELTA_MAX_UNITS', 1)
+    @mock.patch(MODULE + 'model.RepositoryContentUnit.objects')
+    @mock.patch(MODULE + 'model.Repository.objects')
+    def test_get_added_units_too_many(self, mock_repo_objects, mock_rcu_objects):
+        repo = mock_repo_objects.return_value.only.return_value.first.return_value
+        repo.last_applicability_regeneration = self.last_regeneration
+        repo.last_unit_removed = None
+        mock_rcu_objects.return_value.only.return_value.as_pymongo.return_value = [
+            {'unit_id': 'rpm-1', 'unit_type_id': 'rpm', 'created': '2016-01-01T13:00:00Z'},
+            {'unit_id': 'rpm-2', 'unit_type_id': 'rpm', 'created': '2016-01-01T13:00:00Z'}]
+
+        self.assertEqual(ApplicabilityRegenerationManager._get_added_units('repo-1'), None)
+
+    @mock.patch(MODULE + 'batch_regenerate_applicability_task')
+    @mock.patch(MODULE + 'RepoProfileApplicability.get_collection')
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._get_added_units')
+    @mock.patch(MODULE + 'model.Repository.objects')
+    def test_queue_regenerate_records_pending(self, mock_repo_objects, mock_get_added_units,
+                                              mock_rpa_get_collection, mock_task):
+        mock_repo_objects.find_by_criteria.return_value = [mock.Mock(repo_id='repo-1')]
+        mock_get_added_units.return_value = {'rpm': ['rpm-1']}
+        mock_rpa_get_collection.return_value.find.return_value = [
+            {'profile_hash': 'hash-%d' % i} for i in range(15)]
+
+        group_id = ApplicabilityRegenerationManager.queue_regenerate_applicability_for_repos(
+            Criteria().as_dict())
+
+        # The regeneration is not recorded yet, only the pending batches
+        update = mock_repo_objects.return_value.update_one.call_args[1]
+        self.assertEqual(update.keys(), ['set__pending_applicability_regeneration'])
+        pending = update['set__pending_applicability_regeneration']
+        self.assertEqual(pending['batches'], 2)
+        # the added units are stored once rather than passed to every batch
+        self.assertEqual(pending['added_units'], {'rpm': ['rpm-1']})
+        self.assertEqual(mock_task.apply_async.call_count, 2)
+        args = mock_task.apply_async.call_args[0][0]
+        self.assertEqual(len(args), 3)
+        self.assertEqual(args[0], 'repo-1')
+        self.assertEqual(args[2], pending['token'])
+        self.assertEqual(mock_task.apply_async.call_args[1], {'group_id': group_id})
+
+    @mock.patch(MODULE + 'batch_regenerate_applicability_task')
+    @mock.patch(MODULE + 'RepoProfileApplicability.get_collection')
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._get_added_units')
+    @mock.patch(MODULE + 'model.Repository.objects')
+    def test_queue_regenerate_no_profiles(self, mock_repo_objects, mock_get_added_units,
+                                          mock_rpa_get_collection, mock_task):
+        mock_repo_objects.find_by_criteria.return_value = [mock.Mock(repo_id='repo-1')]
+        mock_rpa_get_collection.return_value.find.return_value = []
+
+        ApplicabilityRegenerationManager.queue_regenerate_applicability_for_repos(
+            Criteria().as_dict())
+
+        self.assertFalse(mock_task.apply_async.called)
+        update = mock_repo_objects.return_value.update_one.call_args[1]
+        self.assertTrue('set__last_applicability_regeneration' in update)
+
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._batch_regenerated')
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._regenerate_applicability_batch')
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._get_existing_repo_content_types')
+    @mock.patch(MODULE + 'model.Repository._get_collection')
+    def test_batch_regenerate_pending(self, mock_get_collection, mock_content_types,
+                                      mock_regenerate_batch, mock_batch_regenerated):
+        mock_get_collection.return_value.find_one.return_value = {
+            'pending_applicability_regeneration': {'token': 't', 'batches': 2,
+                                                   'added_units': {'rpm': ['rpm-1']}}}
+
+        ApplicabilityRegenerationManager.batch_regenerate_applicability(
+            'repo-1', [{'profile_hash': 'hash-1'}], 't')
+
+        mock_get_collection.return_value.find_one.assert_called_once_with(
+            {'repo_id': 'repo-1', 'pending_applicability_regeneration.token': 't'},
+            projection=['pending_applicability_regeneration'])
+        self.assertEqual(mock_regenerate_batch.call_args[0][0:3],
+                         ('repo-1', ['hash-1'], mock_content_types.return_value))
+        self.assertEqual(mock_regenerate_batch.call_args[0][4], {'rpm': ['rpm-1']})
+        mock_batch_regenerated.assert_called_once_with('repo-1', 't')
+
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._batch_regenerated')
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._regenerate_applicability_batch')
+    @mock.patch(MODULE + 'model.Repository._get_collection')
+    def test_batch_regenerate_superseded(self, mock_get_collection, mock_regenerate_batch,
+                                         mock_batch_regenerated):
+        mock_get_collection.return_value.find_one.return_value = None
+
+        ApplicabilityRegenerationManager.batch_regenerate_applicability(
+            'repo-1', [{'profile_hash': 'hash-1'}], 'old')
+
+        self.assertFalse(mock_regenerate_batch.called)
+        self.assertFalse(mock_batch_regenerated.called)
+
+    @mock.patch(MODULE + 'model.Repository._get_collection')
+    def test_batch_regenerated(self, mock_get_collection):
+        collection = mock_get_collection.return_value
+        started = datetime.datetime(2016, 1, 1)
+        collection.find_one_and_update.return_value = {
+            'pending_applicability_regeneration': {'token': 't', 'started': started,
+                                                   'batches': 0}}
+
+        ApplicabilityRegenerationManager._batch_regenerated('repo-1', 't')
+
+        query = {'repo_id': 'repo-1', 'pending_applicability_regeneration.token': 't'}
+        self.assertEqual(collection.find_one_and_update.call_args[0],
+                         (query, {'$inc': {'pending_applicability_regeneration.batches': -1}}))
+        collection.update_one.assert_called_once_with(
+            query, {'$set': {'last_applicability_regeneration': started},
+                    '$unset': {'pending_applicability_regeneration': ''}})
+
+    @mock.patch(MODULE + 'model.Repository._get_collection')
+    def test_batch_regenerated_batches_left(self, mock_get_collection):
+        collection = mock_get_collection.return_value
+        collection.find_one_and_update.return_value = {
+            'pending_applicability_regeneration': {'token': 't', 'batches': 1}}
+
+        ApplicabilityRegenerationManager._batch_regenerated('repo-1', 't')
+
+        self.assertFalse(collection.update_one.called)
+
+    @mock.patch(MODULE + 'model.Repository._get_collection')
+    def test_batch_regenerated_superseded(self, mock_get_collection):
+        collection = mock_get_collection.return_value
+        collection.find_one_and_update.return_value = None
+
+        ApplicabilityRegenerationManager._batch_regenerated('repo-1', 'old')
+
+        self.assertFalse(collection.update_one.called)
+
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._profiler')
+    @mock.patch('pulp.server.db.model.consumer.ApplicabilityProfile.get_collection')
+    @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+    @mock.patch('pulp.server.db.model.consumer.UnitProfile.get_collection')
+    def test_regenerate_batch_delta(self, mock_unit_profile_get_collection,
+                                    mock_rpa_get_collection, mock_ap_get_collection,
+                                    mock_profiler):
+        mock_rpa_get_collection.return_value.find.return_value = [{'profile_hash': 'hash-1'}]
+        mock_ap_get_collection.return_value.find.return_value = [
+            {'_id': 'hash-1', 'profile': ['zsh']}]
+        mock_unit_profile_get_collection.return_value.aggregate.return_value = [
+            {'_id': 'hash-1', 'content_type': 'rpm'}]
+        profiler = mock.Mock()
+        profiler.metadata.return_value = {'types': ['rpm', 'erratum']}
+        profiler.calculate_applicable_units_delta.return_value = {
+            'hash-1': {'erratum': ['errata-1'], 'rpm': []}}
+        mock_profiler.return_value = (profiler, {})
+
+        ApplicabilityRegenerationManager._regenerate_applicability_batch(
+            'repo-1', ['hash-1'], ['rpm', 'erratum'], mock.Mock(),
+            {'erratum': ['errata-1', 'errata-2'], 'iso': ['iso-1']})
+
+        self.assertEqual(profiler.calculate_applicable_units_delta.call_args[0][2],
+                         {'erratum': ['errata-1', 'errata-2']})
+        self.assertFalse(profiler.calculate_applicable_units_bulk.called)
+        requests = mock_rpa_get_collection.return_value.bulk_write.call_args[0][0]
+        self.assertEqual(len(requests), 1)
+        self.assertEqual(requests[0]._doc,
+                         {'$addToSet': {'applicability.erratum': {'$each': ['errata-1']}}})
+
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._profiler')
+    @mock.patch('pulp.server.db.model.consumer.ApplicabilityProfile.get_collection')
+    @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+    @mock.patch('pulp.server.db.model.consumer.UnitProfile.get_collection')
+    def test_regenerate_batch_delta_not_implemented(self, mock_unit_profile_get_collection,
+                                                    mock_rpa_get_collection, mock_ap_get_collection,
+                                                    mock_profiler):
+        mock_rpa_get_collection.return_value.find.return_value = [{'profile_hash': 'hash-1'}]
+        mock_ap_get_collection.return_value.find.return_value = [
+            {'_id': 'hash-1', 'profile': ['zsh']}]
+        mock_unit_profile_get_collection.return_value.aggregate.return_value = [
+            {'_id': 'hash-1', 'content_type': 'rpm'}]
+        profiler = mock.Mock()
+        profiler.metadata.return_value = {'types': ['rpm']}
+        profiler.calculate_applicable_units_delta.side_effect = NotImplementedError()
+        profiler.calculate_applicable_units_bulk.return_value = {'hash-1': {'rpm': ['rpm-1']}}
+        mock_profiler.return_value = (profiler, {})
+
+        ApplicabilityRegenerationManager._regenerate_applicability_batch(
+            'repo-1', ['hash-1'], ['rpm'], mock.Mock(), {'rpm': ['rpm-1']})
+
+        requests = mock_rpa_get_collection.return_value.bulk_write.call_args[0][0]
+        self.assertEqual(requests[0]._doc, {'$set': {'applicability': {'rpm': ['rpm-1']}}})
+
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._profiler')
+    @mock.patch('pulp.server.db.model.consumer.ApplicabilityProfile.get_collection')
+    @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+    @mock.patch('pulp.server.db.model.consumer.UnitProfile.get_collection')
+    def test_regenerate_batch_delta_other_types(self, mock_unit_profile_get_collection,
+                                                mock_rpa_get_collection, mock_ap_get_collection,
+                                                mock_profiler):
+        mock_rpa_get_collection.return_value.find.return_value = [{'profile_hash': 'hash-1'}]
+        mock_ap_get_collection.return_value.find.return_value = [
+            {'_id': 'hash-1', 'profile': ['zsh']}]
+        mock_unit_profile_get_collection.return_value.aggregate.return_value = [
+            {'_id': 'hash-1', 'content_type': 'rpm'}]
+        profiler = mock.Mock()
+        profiler.metadata.return_value = {'types': ['rpm']}
+        mock_profiler.return_value = (profiler, {})
+
+        ApplicabilityRegenerationManager._regenerate_applicability_batch(
+            'repo-1', ['hash-1'], ['rpm'], mock.Mock(), {'iso': ['iso-1']})
+
+        self.assertFalse(profiler.calculate_applicable_units_delta.called)
+        self.assertFalse(profiler.calculate_applicable_units_bulk.called)
+        self.assertFalse(mock_rpa_get_collection.return_value.bulk_write.called)
+
+
+class TestApplicabilityProfileFallback(unittest.TestCase):
+
+    MODULE = 'pulp.server.managers.consumer.applicability.'
+
+    @mock.patch('pulp.server.db.model.consumer.ApplicabilityProfile.get_collection')
+    @mock.patch('pulp.server.db.model.consumer.UnitProfile.get_collection')
+    def test_get_profiles(self, mock_unit_profile_get_collection, mock_ap_get_collection):
+        mock_ap_get_collection.return_value.find.return_value = [
+            {'_id': 'hash-1', 'profile': ['zsh']}]
+        mock_unit_profile_get_collection.return_value.find.return_value = [
+            {'profile_hash': 'hash-2', 'profile': ['ksh']},
+            {'profile_hash': 'hash-2', 'profile': ['ksh']}]
+
+        profiles = ApplicabilityRegenerationManager._get_profiles(['hash-1', 'hash-2', 'hash-3'])
+
+        self.assertEqual(profiles, {'hash-1': ['zsh'], 'hash-2': ['ksh']})
+        query = mock_unit_profile_get_collection.return_value.find.call_args[0][0]
+        self.assertEqual(sorted(query['profile_hash']['$in']), ['hash-2', 'hash-3'])
+        # the missing shared profile is stored again
+        update_one = mock_ap_get_collection.return_value.update_one
+        self.assertEqual(update_one.call_count, 1)
+        self.assertEqual(update_one.call_args[0][0], {'_id': 'hash-2'})
+
+    @mock.patch('pulp.server.db.model.consumer.ApplicabilityProfile.get_collection')
+    @mock.patch('pulp.server.db.model.consumer.UnitProfile.get_collection')
+    def test_get_profiles_none_missing(self, mock_unit_profile_get_collection,
+                                       mock_ap_get_collection):
+        mock_ap_get_collection.return_value.find.return_value = [
+            {'_id': 'hash-1', 'profile': ['zsh']}]
+
+        profiles = ApplicabilityRegenerationManager._get_profiles(['hash-1'])
+
+        self.assertEqual(profiles, {'hash-1': ['zsh']})
+        self.assertFalse(mock_unit_profile_get_collection.return_value.find.called)
+
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._profiler')
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._get_profiles')
+    @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+    @mock.patch('pulp.server.db.model.consumer.UnitProfile.get_collection')
+    def test_regenerate_batch_missing_profile(self, mock_unit_profile_get_collection,
+                                              mock_rpa_get_collection, mock_get_profiles,
+                                              mock_profiler):
+        mock_rpa_get_collection.return_value.find.return_value = [
+            {'profile_hash': 'hash-1'}, {'profile_hash': 'hash-2'}]
+        mock_get_profiles.return_value = {'hash-1': ['zsh'], 'hash-2': ['ksh']}
+        mock_unit_profile_get_collection.return_value.aggregate.return_value = [
+            {'_id': 'hash-1', 'content_type': 'rpm'}, {'_id': 'hash-2', 'content_type': 'rpm'}]
+        profiler = mock.Mock()
+        profiler.metadata.return_value = {'types': ['rpm']}
+        profiler.calculate_applicable_units_bulk.return_value = {}
+        mock_profiler.return_value = (profiler, {})
+
+        ApplicabilityRegenerationManager._regenerate_applicability_batch(
+            'repo-1', ['hash-1', 'hash-2'], ['rpm'], mock.Mock())
+
+        mock_get_profiles.assert_called_once_with(['hash-1', 'hash-2'])
+        self.assertEqual(profiler.calculate_applicable_units_bulk.call_args[0][0],
+                         {'hash-1': ['zsh'], 'hash-2': ['ksh']})
+
+    @mock.patch(MODULE + 'RepoProfileApplicability.objects')
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._get_existing_repo_content_types')
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._profiler')
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._get_profiles')
+    def test_regenerate_missing_profile(self, mock_get_profiles, mock_profiler,
+                                        mock_content_types, mock_rpa_objects):
+        mock_get_profiles.return_value = {'hash-1': ['zsh']}
+        mock_content_types.return_value = ['rpm']
+        profiler = mock.Mock()
+        profiler.metadata.return_value = {'types': ['rpm']}
+        profiler.calculate_applicable_units.return_value = {'rpm': ['rpm-1']}
+        mock_profiler.return_value = (profiler, {})
+        existing = mock.Mock(profile=None)
+
+        ApplicabilityRegenerationManager.regenerate_applicability(
+            'hash-1', 'rpm', None, 'repo-1', existing_applicability=existing)
+
+        mock_get_profiles.assert_called_once_with(['hash-1'])
+        self.assertEqual(profiler.calculate_applicable_units.call_args[0][0], ['zsh'])
+        mock_rpa_objects.create.assert_called_once_with(
+            'hash-1', 'repo-1', ['zsh'], {'rpm': ['rpm-1']})
+
+    @mock.patch(MODULE + 'RepoProfileApplicability.objects')
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._get_existing_repo_content_types')
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._profiler')
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._get_profiles')
+    def test_regenerate_no_profile(self, mock_get_profiles, mock_profiler, mock_content_types,
+                                   mock_rpa_objects):
+        mock_get_profiles.return_value = {}
+        mock_content_types.return_value = ['rpm']
+        profiler = mock.Mock()
+        profiler.metadata.return_value = {'types': ['rpm']}
+        mock_profiler.return_value = (profiler, {})
+        existing = mock.Mock(profile=None)
+
+        ApplicabilityRegenerationManager.regenerate_applicability(
+            'hash-1', 'rpm', None, 'repo-1', existing_applicability=existing)
+
+        self.assertFalse(profiler.calculate_applicable_units.called)
+        self.assertFalse(mock_rpa_objects.create.called)
 
 
 class TestRepoProfileApplicabilityManager(base.PulpServerTests):
@@ -465,6 +903,7 @@ class TestRepoProfileApplicabilityManager(base.PulpServerTests):
         """
         super(TestRepoProfileApplicabilityManager, self).tearDown()
         self.collection.drop()
+        ApplicabilityProfile.get_collection().drop()
         model.Repository.objects.delete()
         Consumer.get_collection().drop()
         UnitProfile.get_collection().drop()
@@ -491,8 +930,11 @@ class TestRepoProfileApplicabilityManager(base.PulpServerTests):
         document = self.collection.find_one()
         self.assertEqual(document['profile_hash'], profile_hash)
         self.assertEqual(document['repo_id'], repo_id)
-        self.assertEqual(document['profile'], profile)
+        self.assertFalse('profile' in document)
         self.assertEqual(document['applicability'], applicability_data)
+        # The profile is stored once, keyed by its hash
+        self.assertEqual(ApplicabilityProfile.get_profiles([profile_hash]),
+                         {profile_hash: profile})
 
         # Our applicability object should now have the correct _id attribute
         self.assertEqual(applicability._id, document['_id'])
@@ -558,7 +1000,7 @@ class TestRepoProfileApplicabilityManager(base.PulpServerTests):
         # Make sure the object was instantiated correctly
         self.assertEqual(applicability['profile_hash'], a_2.profile_hash)
         self.assertEqual(applicability['repo_id'], a_2.repo_id)
-        self.assertEqual(applicability['profile'], a_2.profile)
+        self.assertEqual(self._profile(applicability), a_2.profile)
         self.assertEqual(applicability['applicability'], a_2.applicability)
 
     def test_get_matches_more_than_one(self):
@@ -620,6 +1062,33 @@ class TestRepoProfileApplicabilityManager(base.PulpServerTests):
         existing_rpas = RepoProfileApplicability.objects.filter({})
         existing_rpa_ids = [rpa._id for rpa in existing_rpas]
         self.assertEqual(set(existing_rpa_ids), set([rpa_1._id, rpa_4._id]))
+        # The profile of rpa_2 is no longer referenced and should have been removed
+        stored_profile_hashes = ApplicabilityProfile.get_collection().distinct('_id')
+        self.assertEqual(set(stored_profile_hashes),
+                         set([profile_1.profile_hash, profile_2.profile_hash]))
+
+    @mock.patch('pulp.server.managers.consumer.applicability.dateutils')
+    @mock.patch('pulp.server.managers.consumer.applicability.model.Repository.objects')
+    def test_remove_orphans_referenced_since_started(self, mock_repo_qs, mock_dateutils):
+        """
+        Test that remove_orphans() keeps unreferenced profiles that were referenced after it
+        started, since the references may not have been listed yet.
+        """
+        mock_repo_qs.distinct.return_value = []
+        ApplicabilityProfile.store('profile_hash', ['a', 'profile'])
+        mock_dateutils.now_utc_datetime_with_tzinfo.return_value = datetime.datetime(
+            2000, 1, 1, tzinfo=dateutils.utc_tz())
+
+        RepoProfileApplicability.objects.remove_orphans()
+
+        self.assertEqual(ApplicabilityProfile.get_collection().distinct('_id'), ['profile_hash'])
+
+        mock_dateutils.now_utc_datetime_with_tzinfo.return_value = \
+            dateutils.now_utc_datetime_with_tzinfo()
+
+        RepoProfileApplicability.objects.remove_orphans()
+
+        self.assertEqual(ApplicabilityProfile.get_collection().distinct('_id'), [])
 
     @mock.patch('pulp.server.managers.consumer.applicability.model.Repository.objects')
     def test_remove_orphans_missing_profile_hash(self, mock_repo_qs):
@@ -2,6 +2,7 @@ import mock
 import pymongo
 
 from .... import base
+from pulp.common.util import calculate_profile_hash
 from pulp.devel import mock_plugins
 from pulp.plugins.profiler import Profiler
 from pulp.server.db.model.consumer import Consumer, ConsumerHistoryEvent, UnitProfile
@@ -146,6 +147,39 @@ class ProfileManagerTests(base.PulpServerTests):
         self.assertEqual(history['originator'], 'SYSTEM')
         self.assertEqual(history['details'], {'profile_content_type': self.TYPE_1})
 
+    def test_update_unchanged(self):
+        # Setup
+        self.populate()
+        manager = factory.consumer_profile_manager()
+        manager.update(self.CONSUMER_ID, self.TYPE_1, self.PROFILE_1)
+        # Test
+        collection = mock.Mock(wraps=UnitProfile.get_collection())
+        with mock.patch.object(UnitProfile, 'get_collection', return_value=collection):
+            profile = manager.update(self.CONSUMER_ID, self.TYPE_1, dict(self.PROFILE_1))
+        # Verify
+        self.assertFalse(collection.save.called)
+        self.assertEqual(profile['profile'], self.PROFILE_1)
+        collection = ConsumerHistoryEvent.get_collection()
+        history = collection.find({'consumer_id': self.CONSUMER_ID,
+                                   'type': 'unit_profile_changed'})
+        self.assertEqual(history.count(), 1)
+
+    def test_get_reported_profile(self):
+        # Setup
+        self.populate()
+        manager = factory.consumer_profile_manager()
+        manager.update(self.CONSUMER_ID, self.TYPE_1, self.PROFILE_1)
+        # Test
+        profile = manager.get_reported_profile(self.CONSUMER_ID, self.TYPE_1,
+                                               calculate_profile_hash(self.PROFILE_1))
+        # Verify
+        self.assertEqual(profile['profile_hash'], UnitProfile.calculate_hash(self.PROFILE_1))
+        self.assertTrue('profile' not in profile)
+        self.assertRaises(MissingResource, manager.get_reported_profile, self.CONSUMER_ID,
+                          self.TYPE_1, calculate_profile_hash(self.PROFILE_2))
+        self.assertRaises(MissingResource, manager.get_reported_profile, self.CONSUMER_ID,
+                          self.TYPE_2, calculate_profile_hash(self.PROFILE_1))
+
     def test_update_calls_profiler_update_profile(self):
         """
         Assert that the update() method calls the profiler update_profile() method.
@@ -62,6 +62,42 @@ class TestCatalogManager(PulpServerTests):
             self.assertEqual(entry['unit_key'], unit_key)
             self.assertEqual(entry['url'], url)
 
+    def test_add_entries(self):
+        units = self.units(0, 10)
+        manager = ContentCatalogManager()
+        added = manager.add_entries(
+            SOURCE_ID, EXPIRATION, [(TYPE_ID, k, u) for k, u in units])
+        collection = ContentCatalog.get_collection()
+        self.assertEqual(added, len(units))
+        self.assertEqual(len(units), collection.find().count())
+        for unit_key, url in units:
+            entries = manager.find(TYPE_ID, unit_key)
+            self.assertEqual(len(entries), 1)
+            self.assertEqual(entries[0]['url'], url)
+        self.assertEqual(manager.add_entries(SOURCE_ID, EXPIRATION, []), 0)
+
+    def test_publish(self):
+        units = self.units(0, 10)
+        manager = ContentCatalogManager()
+        manager.add_entries(SOURCE_ID, EXPIRATION, [(TYPE_ID, k, u) for k, u in units[:5]])
+        manager.add_entries('other', EXPIRATION, [(TYPE_ID, k, u) for k, u in units[:5]])
+        manager.add_entries(
+            SOURCE_ID, EXPIRATION, [(TYPE_ID, k, u) for k, u in units[5:]], generation='g1')
+        manager.add_entries(
+            SOURCE_ID, EXPIRATION, [(TYPE_ID, k, u) for k, u in units[:1]], generation='g2')
+        self.assertFalse(manager.find(TYPE_ID, units[5][0]))
+        purged = manager.publish(SOURCE_ID, 'g1')
+        collection = ContentCatalog.get_collection()
+        self.assertEqual(purged, 5)
+        # the other source and the unpublished generation are untouched
+        self.assertEqual(collection.find({'source_id': 'other'}).count(), 5)
+        self.assertEqual(collection.find({'generation': 'g2', 'staged': True}).count(), 1)
+        entries = manager.find(TYPE_ID, units[0][0])
+        self.assertEqual([e['source_id'] for e in entries], ['other'])
+        for unit_key, url in units[5:]:
+            self.assertEqual(len(manager.find(TYPE_ID, unit_key)), 1)
+        self.assertTrue(manager.has_entries(SOURCE_ID))
+
     def test_delete(self):
         units = self.units(0, 10)
         manager = ContentCatalogManager()
@@ -118,6 +154,22 @@ class TestCatalogManager(PulpServerTests):
         self.assertFalse(manager.has_entries(source_b))
         self.assertFalse(manager.has_entries(source_c))
 
+    def test_earliest_expiration(self):
+        source_a = 'A'
+        source_b = 'B'
+        manager = ContentCatalogManager()
+        for n, (unit_key, url) in enumerate(self.units(0, 10)):
+            manager.add_entry(source_a, EXPIRATION + n, TYPE_ID, unit_key, url)
+        manager.add_entry(source_a, -1, TYPE_ID, *self.units(10, 1)[0])
+        for unit_key, url in self.units(0, 10):
+            manager.add_entry(source_b, -1, TYPE_ID, unit_key, url)
+        manager = ContentCatalogManager()
+        expiration = manager.earliest_expiration(source_a)
+        self.assertTrue(expiration <= ContentCatalog.get_expiration(EXPIRATION))
+        self.assertTrue(expiration > ContentCatalog.get_expiration(0))
+        self.assertEqual(manager.earliest_expiration(source_b), None)
+        self.assertEqual(manager.earliest_expiration('C'), None)
+
     def test_purge_expired(self):
         source_a = 'A'
         source_b = 'B'
@@ -171,6 +223,23 @@ class TestCatalogManager(PulpServerTests):
             self.assertEqual(entry['unit_key'], unit_key)
             self.assertEqual(entry['url'], url)
 
+    def test_find_by_locators(self):
+        units = self.units(0, 10)
+        manager = ContentCatalogManager()
+        for unit_key, url in units:
+            manager.add_entry(SOURCE_ID, EXPIRATION, TYPE_ID, unit_key, url)
+            manager.add_entry(SOURCE_ID, EXPIRATION, TYPE_ID, unit_key, url + '/newer')
+        manager.add_entry(SOURCE_ID, -1, TYPE_ID, units[1][0], units[1][1])
+        locators = [ContentCatalog.get_locator(TYPE_ID, k) for k, u in units[:5]]
+        missing = ContentCatalog.get_locator(TYPE_ID, self.units(10, 1)[0][0])
+        found = manager.find_by_locators(locators + [missing])
+        self.assertEqual(sorted(found.keys()), sorted(locators))
+        for (unit_key, url), locator in zip(units, locators):
+            entries = found[locator]
+            self.assertEqual(len(entries), 1)
+            self.assertEqual(entries[0]['unit_key'], unit_key)
+            self.assertEqual(entries[0]['url'], url + '/newer')
+
     def test_expired(self):
         units = self.units(0, 10)
         manager = ContentCatalogManager()
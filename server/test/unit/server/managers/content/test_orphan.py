@@ -273,32 +273,39 @@ class OrphanManagerGeneratorTests(OrphanManagerTests):
         self.assertEqual(len(orphans), 0)
         self.assertEqual(self.number_of_files_in_content_root(), 0)
         mock_lazy_catalog_objects.assert_called_once_with(
-            unit_id=unit['_id'],
+            unit_id__in=[unit['_id']],
             unit_type_id=unit['_content_type_id']
         )
         mock_lazy_catalog_objects.return_value.delete.assert_called_once_with()
 
     @patch(MODULE_PATH + 'model.LazyCatalogEntry.objects')
-    @patch(MODULE_PATH + 'OrphanManager.delete_orphaned_file')
+    @patch(MODULE_PATH + 'OrphanManager.prune_empty_directories')
+    @patch(MODULE_PATH + 'OrphanManager.unlink_orphaned_files')
     @patch(MODULE_PATH + 'model.RepositoryContentUnit.objects')
     @patch(MODULE_PATH + 'plugin_api.get_unit_model_by_id')
-    def test_delete_content_unit_by_type(
-            self, m_get_model, m_rcu_objects, m_del_orphan, mock_lazy_catalog_objects):
-        orphan = Mock(_storage_path='test_foo_path', id='orphan')
-        non_orphan = Mock(_storage_path='test_foo_path', id='non_orphan')
+    def test_delete_content_unit_by_type(self, m_get_model, m_rcu_objects, m_unlink, m_prune,
+                                         mock_lazy_catalog_objects):
+        orphan = Mock(_storage_path='/a/test_foo_path', id='orphan')
+        non_orphan = Mock(_storage_path='/a/test_bar_path', id='non_orphan')
         m_get_model.return_value.objects.only.return_value = [
             orphan,
             non_orphan
         ]
         m_rcu_objects.return_value.distinct.return_value = ['non_orphan']
+        m_unlink.return_value = set(['/a'])
 
-        self.orphan_manager.delete_orphan_content_units_by_type('foo_type')
+        count = self.orphan_manager.delete_orphan_content_units_by_type('foo_type')
+
+        self.assertEqual(count, 1)
         mock_lazy_catalog_objects.assert_called_once_with(
-            unit_id='orphan',
+            unit_id__in=['orphan'],
             unit_type_id='foo_type'
         )
         mock_lazy_catalog_objects.return_value.delete.assert_called_once_with()
-        m_del_orphan.assert_called_once_with('test_foo_path')
+        m_get_model.return_value.objects.assert_called_once_with(id__in=['orphan'])
+        m_get_model.return_value.objects.return_value.delete.assert_called_once_with()
+        m_unlink.assert_called_once_with(['/a/test_foo_path'])
+        m_prune.assert_called_once_with(set(['/a']))
 
     @patch(MODULE_PATH + 'plugin_api.get_unit_model_by_id')
     def test_delete_content_unit_by_type_filtered(self, mock_get_model):
@@ -309,6 +316,99 @@ class OrphanManagerGeneratorTests(OrphanManagerTests):
         mock_get_model.return_value.objects.assert_called_once_with(id__in=('orphan2',))
 
 
+class TestOrphanDiscovery(TestCase):
+
+    @patch(MODULE_PATH + 'RepoContentUnit.get_collection')
+    def test_associated_unit_ids(self, m_get_collection):
+        m_get_collection.return_value.distinct.return_value = ['a']
+
+        associated = OrphanManager.associated_unit_ids(('a', 'b'))
+
+        self.assertEqual(associated, set(['a']))
+        m_get_collection.return_value.distinct.assert_called_once_with(
+            'unit_id', {'unit_id': {'$in': ['a', 'b']}})
+
+    @patch(MODULE_PATH + 'RepoContentUnit.get_collection')
+    def test_associated_unit_ids_empty(self, m_get_collection):
+        self.assertEqual(OrphanManager.associated_unit_ids([]), set())
+        self.assertFalse(m_get_collection.called)
+
+    @patch(MODULE_PATH + 'ORPHAN_BATCH_SIZE', 2)
+    @patch(MODULE_PATH + 'OrphanManager.associated_unit_ids')
+    @patch(MODULE_PATH + 'content_types_db.type_units_collection')
+    def test_generate_orphans_by_type_batched(self, m_type_collection, m_associated):
+        units = [{'_id': 'a'}, {'_id': 'b'}, {'_id': 'c'}]
+        m_type_collection.return_value.find.return_value.batch_size.return_value = units
+        m_associated.side_effect = [set(['b']), set()]
+
+        orphans = list(OrphanManager.generate_orphans_by_type('foo_type'))
+
+        self.assertEqual(orphans, [{'_id': 'a'}, {'_id': 'c'}])
+        self.assertEqual(m_associated.call_args_list, [call(['a', 'b']), call(['c'])])
+        m_type_collection.return_value.find.assert_called_once_with({}, projection=['_id'])
+
+    @patch(MODULE_PATH + 'ORPHAN_BATCH_SIZE', 2)
+    @patch(MODULE_PATH + 'OrphanManager.associated_unit_ids')
+    @patch(MODULE_PATH + 'content_types_db.type_units_collection')
+    def test_orphans_count_by_type(self, m_type_collection, m_associated):
+        units = [{'_id': 'a'}, {'_id': 'b'}, {'_id': 'c'}, {'_id': 'd'}]
+        m_type_collection.return_value.find.return_value.batch_size.return_value = units
+        m_associated.side_effect = [set(['a', 'b']), set(['d'])]
+
+        self.assertEqual(OrphanManager().orphans_count_by_type('foo_type'), 1)
+        self.assertEqual(m_associated.call_count, 2)
+
+    @patch(MODULE_PATH + 'OrphanManager.associated_unit_ids')
+    @patch(MODULE_PATH + 'content_types_db.type_units_collection')
+    def test_get_orphan(self, m_type_collection, m_associated):
+        m_type_collection.return_value.find_one.return_value = {'_id': 'a'}
+        m_associated.return_value = set()
+
+        self.assertEqual(OrphanManager().get_orphan('foo_type', 'a'), {'_id': 'a'})
+        m_associated.assert_called_once_with(['a'])
+
+    @patch(MODULE_PATH + 'OrphanManager.associated_unit_ids')
+    @patch(MODULE_PATH + 'content_types_db.type_units_collection')
+    def test_get_orphan_associated(self, m_type_collection, m_associated):
+        m_type_collection.return_value.find_one.return_value = {'_id': 'a'}
+        m_associated.return_value = set(['a'])
+
+        self.assertRaises(pulp_exceptions.MissingResource,
+                          OrphanManager().get_orphan, 'foo_type', 'a')
+
+
+@patch.dict(MODULE_PATH + '_summary_snapshot', {'summary': None, 'timestamp': 0})
+@patch(MODULE_PATH + 'plugin_api.list_unit_models', return_value=[])
+@patch(MODULE_PATH + 'content_types_db.all_type_ids', return_value=['foo_type'])
+@patch(MODULE_PATH + 'OrphanManager.orphans_count_by_type', return_value=3)
+class TestOrphansSummary(TestCase):
+
+    def test_no_cache(self, m_count, m_type_ids, m_unit_models):
+        manager = OrphanManager()
+
+        self.assertEqual(manager.orphans_summary(), {'foo_type': 3})
+        self.assertEqual(manager.orphans_summary(), {'foo_type': 3})
+        self.assertEqual(m_count.call_count, 2)
+
+    def test_cached(self, m_count, m_type_ids, m_unit_models):
+        manager = OrphanManager()
+
+        self.assertEqual(manager.orphans_summary(max_age=60), {'foo_type': 3})
+        self.assertEqual(manager.orphans_summary(max_age=60), {'foo_type': 3})
+        self.assertEqual(m_count.call_count, 1)
+
+    @patch(MODULE_PATH + 'time.time')
+    def test_cache_expired(self, m_time, m_count, m_type_ids, m_unit_models):
+        manager = OrphanManager()
+        m_time.return_value = 1000
+
+        manager.orphans_summary(max_age=60)
+        m_time.return_value = 1061
+        manager.orphans_summary(max_age=60)
+
+        self.assertEqual(m_count.call_count, 2)
+
+
 class TestDelete(TestCase):
 
     @patch('shutil.rmtree')
@@ -377,6 +477,73 @@ class TestDelete(TestCase):
         self.assertTrue(log_error.called)
 
 
+@patch('pulp.server.managers.content.orphan.pulp_config.config')
+@patch('pulp.server.managers.content.orphan.OrphanManager._unlink_orphaned_file')
+class TestUnlinkOrphanedFiles(TestCase):
+
+    def test_unlink(self, unlink, config):
+        config.get.return_value = '/storage/pulp'
+        unlink.side_effect = lambda storage_dir, path: path != '/c/shared'
+
+        parents = OrphanManager.unlink_orphaned_files(['/a/1', '/a/2', '/b/1', '/c/shared'])
+
+        self.assertEqual(parents, set(['/a', '/b']))
+        self.assertEqual(unlink.call_count, 4)
+        unlink.assert_any_call('/storage/pulp', '/b/1')
+
+    def test_nothing_to_unlink(self, unlink, config):
+        self.assertEqual(OrphanManager.unlink_orphaned_files([]), set())
+        self.assertFalse(unlink.called)
+
+
+@patch('pulp.server.managers.content.orphan.os.rmdir')
+@patch('pulp.server.managers.content.orphan.os.access', return_value=True)
+@patch('pulp.server.managers.content.orphan.os.listdir')
+@patch('pulp.server.managers.content.orphan.pulp_config.config')
+class TestPruneEmptyDirectories(TestCase):
+
+    def setUp(self):
+        self.tree = {
+            '/storage/pulp/content/test/a': ['b', 'c'],
+            '/storage/pulp/content/test/a/b': [],
+            '/storage/pulp/content/test/a/c': [],
+        }
+
+    def _listdir(self, path):
+        return self.tree[path]
+
+    def _rmdir(self, path):
+        del self.tree[path]
+        parent, name = path.rsplit('/', 1)
+        if parent in self.tree:
+            self.tree[parent].remove(name)
+
+    def test_prune(self, config, listdir, access, rmdir):
+        config.get.return_value = '/storage/pulp'
+        listdir.side_effect = self._listdir
+        rmdir.side_effect = self._rmdir
+
+        OrphanManager.prune_empty_directories(['/storage/pulp/content/test/a/b',
+                                               '/storage/pulp/content/test/a/c'])
+
+        self.assertEqual(rmdir.call_count, 3)
+        rmdir.assert_called_with('/storage/pulp/content/test/a')
+        self.assertEqual(self.tree, {})
+
+    def test_prune_missing_directory(self, config, listdir, access, rmdir):
+        config.get.return_value = '/storage/pulp'
+        listdir.side_effect = OSError()
+
+        OrphanManager.prune_empty_directories(['/storage/pulp/content/test/a/gone'])
+
+        self.assertFalse(rmdir.called)
+
+    def test_prune_nothing(self, config, listdir, access, rmdir):
+        OrphanManager.prune_empty_directories(set())
+
+        self.assertFalse(listdir.called)
+
+
 class TestIsShared(TestCase):
 
     @patch('os.path.islink')
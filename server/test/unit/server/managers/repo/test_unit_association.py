@@ -144,13 +144,15 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
         ids = ['foo', 'bar', 'baz']
         ret = self.manager.associate_all_by_ids(self.repo_id, 'type-1', ids)
 
-        repo_units = list(RepoContentUnit.get_collection().find({'repo_id': self.repo_id}))
-        self.assertEqual(len(ids), len(repo_units))
+        self.assertEqual(mock_ctrl.associate_units_by_id.call_count, 1)
+        repo_id, unit_refs = mock_ctrl.associate_units_by_id.call_args[0]
+        self.assertEqual(repo_id, self.repo_id)
+        self.assertEqual(list(unit_refs), [('type-1', 'foo'), ('type-1', 'bar'), ('type-1', 'baz')])
+        # existing associations keep their "updated" timestamp
+        self.assertEqual(mock_ctrl.associate_units_by_id.call_args[1], {'update_existing': False})
 
         # return value should be the number of units that were associated
-        self.assertEqual(ret, len(repo_units))
-        for unit in repo_units:
-            self.assertTrue(unit['unit_id'] in ids)
+        self.assertTrue(ret is mock_ctrl.associate_units_by_id.return_value)
 
     @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
     def test_unassociate_by_id(self, mock_ctrl, mock_repo):
@@ -305,28 +307,11 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
         self.manager.associate_unit_by_id(self.repo_id, 'type-1', 'unit-1')
         self.assertEqual(mock_ctrl.update_unit_count.call_count, 1)  # only from first associate
 
-    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_associate_all_by_ids_calls_update_unit_count(self, mock_ctrl, mock_repo):
-        IDS = ('foo', 'bar', 'baz')
-        self.manager.associate_all_by_ids(self.repo_id, 'type-1', IDS)
-        mock_ctrl.update_unit_count.assert_called_once_with(self.repo_id, 'type-1', len(IDS))
-
     @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
     def test_associate_all_by_id_calls_update_last_unit_added(self, mock_ctrl, mock_repo_qs):
         self.manager.associate_unit_by_id(self.repo_id, 'type-1', 'unit-1')
         mock_ctrl.update_last_unit_added.assert_called_once_with(self.repo_id)
 
-    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_associate_all_non_unique(self, mock_ctrl, mock_repo):
-        """
-        Makes sure when two identical associations are requested, they only
-        get counted once.
-        """
-        IDS = ('foo', 'bar', 'foo')
-
-        self.manager.associate_all_by_ids(self.repo_id, 'type-1', IDS)
-        mock_ctrl.update_unit_count.assert_called_once_with(self.repo_id, 'type-1', 2)
-
     # This test is skipped for now because it needs to be reworked to reflect the changes from this
     # commit, and we don't have time to do that at the moment.
     @skip.skip_broken
@@ -74,6 +74,89 @@ class RepoUnitAssociationQueryManagerTests(unittest.TestCase):
         self.assertEqual(return_value, expected_return_value)
 
 
+class GetUnitsPagedTests(unittest.TestCase):
+    """
+    Tests for RepoUnitAssociationQueryManager.get_units_paged().
+    """
+
+    def setUp(self):
+        self.manager = association_query_manager.RepoUnitAssociationQueryManager()
+        self.associations = [
+            {'unit_type_id': 'alpha', 'unit_id': 'a1'},
+            {'unit_type_id': 'alpha', 'unit_id': 'a2'},
+            {'unit_type_id': 'beta', 'unit_id': 'b1'},
+        ]
+        self.units = {
+            'alpha': [{'_id': 'a2', '_content_type_id': 'alpha'},
+                      {'_id': 'a1', '_content_type_id': 'alpha'}],
+            'beta': [{'_id': 'b1', '_content_type_id': 'beta'}],
+        }
+
+    def test_supports_paging(self):
+        supports_paging = self.manager.supports_paging
+        self.assertTrue(supports_paging(UnitAssociationCriteria()))
+        self.assertTrue(supports_paging(UnitAssociationCriteria(unit_filters={'a': 1}, limit=5)))
+        self.assertFalse(supports_paging(
+            UnitAssociationCriteria(association_sort=[('created', 1)])))
+        self.assertFalse(supports_paging(UnitAssociationCriteria(unit_sort=[('name', 1)])))
+        self.assertFalse(supports_paging(UnitAssociationCriteria(remove_duplicates=True)))
+
+    @mock.patch.object(association_query_manager.RepoUnitAssociationQueryManager,
+                       '_associated_units_by_type_cursor')
+    @mock.patch.object(association_query_manager.RepoUnitAssociationQueryManager,
+                       '_unit_associations_cursor')
+    def test_association_order(self, mock_associations, mock_units):
+        mock_associations.return_value = mock.MagicMock()
+        mock_associations.return_value.__iter__.return_value = iter(self.associations)
+        mock_units.side_effect = lambda t, c, ids: self.units[t]
+        criteria = UnitAssociationCriteria(skip=1, limit=2)
+
+        units = list(self.manager.get_units_paged('repo-1', criteria, 'token'))
+
+        mock_associations.assert_called_once_with('repo-1', criteria, 'token')
+        cursor = mock_associations.return_value
+        cursor.sort.assert_called_once_with([('unit_type_id', 1), ('unit_id', 1)])
+        # skip and limit are applied by the database
+        cursor.skip.assert_called_once_with(1)
+        cursor.limit.assert_called_once_with(2)
+        self.assertEqual([u['unit_id'] for u in units], ['a1', 'a2', 'b1'])
+        self.assertEqual(units[0]['metadata'], {'_id': 'a1', '_content_type_id': 'alpha'})
+        mock_units.assert_has_calls([mock.call('alpha', criteria, ['a1', 'a2']),
+                                     mock.call('beta', criteria, ['b1'])], any_order=True)
+
+    @mock.patch.object(association_query_manager.RepoUnitAssociationQueryManager,
+                       '_associated_units_by_type_cursor')
+    @mock.patch.object(association_query_manager.RepoUnitAssociationQueryManager,
+                       '_unit_associations_cursor')
+    def test_unit_filters(self, mock_associations, mock_units):
+        mock_associations.return_value = mock.MagicMock()
+        mock_associations.return_value.__iter__.return_value = iter(self.associations)
+        # a1 does not match the unit filters
+        self.units['alpha'].pop()
+        mock_units.side_effect = lambda t, c, ids: self.units[t]
+        criteria = UnitAssociationCriteria(unit_filters={'md_1': 1}, skip=1, limit=1)
+
+        units = list(self.manager.get_units_paged('repo-1', criteria))
+
+        cursor = mock_associations.return_value
+        self.assertFalse(cursor.skip.called)
+        self.assertFalse(cursor.limit.called)
+        self.assertEqual([u['unit_id'] for u in units], ['b1'])
+
+    @mock.patch('pulp.server.managers.repo.unit_association_query.RepoContentUnit')
+    def test_resume_token_spec(self, mock_rcu):
+        token = association_query_manager.repo_controller.get_resume_token('alpha', 'a1')
+        criteria = UnitAssociationCriteria(type_ids=['alpha'])
+
+        self.manager._unit_associations_cursor('repo-1', criteria, token)
+
+        spec = mock_rcu.get_collection.return_value.find.call_args[0][0]
+        self.assertEqual(spec, {'$and': [
+            {'repo_id': 'repo-1', 'unit_type_id': {'$in': ['alpha']}},
+            {'$or': [{'unit_type_id': {'$gt': 'alpha'}},
+                     {'unit_type_id': 'alpha', 'unit_id': {'$gt': 'a1'}}]}]})
+
+
 class UnitAssociationQueryTests(base.PulpServerTests):
 
     def clean(self):
@@ -1064,6 +1064,33 @@ class TestConsumerProfilesView(unittest.TestCase):
         self.assertEqual(response.http_status_code, 400)
         self.assertEqual(response.error_data['property_names'], ['content_type'])
 
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_CREATE())
+    @mock.patch('pulp.server.webservices.views.consumers.generate_redirect_response')
+    @mock.patch(
+        'pulp.server.webservices.views.consumers.generate_json_response_with_pulp_encoder')
+    @mock.patch('pulp.server.webservices.views.consumers.factory.consumer_profile_manager')
+    def test_create_consumer_profile_hash(self, mock_profile, mock_resp, mock_redirect):
+        """
+        Test reporting only the hash of a consumer profile
+        """
+        resp = {'consumer_id': 'test-consumer', 'content_type': 'rpm'}
+        mock_profile.return_value.get_reported_profile.return_value = resp
+
+        request = mock.MagicMock()
+        request.body = json.dumps({'content_type': 'rpm', 'profile_hash': 'abc'})
+        consumer_profiles = ConsumerProfilesView()
+        response = consumer_profiles.post(request, 'test-consumer')
+
+        mock_profile.return_value.get_reported_profile.assert_called_once_with(
+            'test-consumer', 'rpm', 'abc')
+        self.assertFalse(mock_profile.return_value.create.called)
+        mock_resp.assert_called_once_with(
+            {'consumer_id': 'test-consumer', 'content_type': 'rpm',
+             '_href': '/v2/consumers/test-consumer/profiles/rpm/'})
+        self.assertFalse(mock_redirect.called)
+        self.assertTrue(response is mock_resp.return_value)
+
 
 class TestConsumerProfileSearchView(unittest.TestCase):
     """
@@ -351,6 +351,23 @@ class TestContentUnitSearch(unittest.TestCase):
         self.assertEqual(serialized_results, [mock_process.return_value, mock_process.return_value])
         mock_add_repo.assert_called_once_with([mock_process(), mock_process()], 'mock_type')
 
+    @mock.patch('pulp.server.webservices.views.content.STREAM_CHUNK_SIZE', 1)
+    @mock.patch('pulp.server.webservices.views.content.ContentUnitSearch._add_repo_memberships')
+    @mock.patch('pulp.server.webservices.views.content._process_content_unit')
+    def test_iter_results_with_repos(self, mock_process, mock_add_repo):
+        """
+        Repository memberships are added a page of units at a time.
+        """
+        mock_process.side_effect = lambda unit, type_id: unit
+        mock_search = mock.MagicMock(return_value=iter(['result_1', 'result_2']))
+        results = ContentUnitSearch.iter_results(
+            mock.MagicMock(), mock_search, {'include_repos': True}, type_id='mock_type'
+        )
+        self.assertEqual(list(results), ['result_1', 'result_2'])
+        self.assertEqual(mock_add_repo.call_args_list,
+                         [mock.call(['result_1'], 'mock_type'),
+                          mock.call(['result_2'], 'mock_type')])
+
     @mock.patch('pulp.server.webservices.views.content.units_controller')
     @mock.patch('pulp.server.webservices.views.content.ContentUnitSearch._add_repo_memberships')
     @mock.patch('pulp.server.webservices.views.content._process_content_unit')
@@ -700,7 +717,7 @@ class TestContentSourceCollectionView(unittest.TestCase):
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_READ())
     @mock.patch('pulp.server.webservices.views.content.generate_json_response_with_pulp_encoder')
-    @mock.patch('pulp.server.content.sources.container.ContentSource.load_all')
+    @mock.patch('pulp.server.content.sources.container.REGISTRY.load')
     def test_get_content_source(self, mock_sources, mock_resp):
         """
         List all sources
@@ -741,7 +758,7 @@ class TestContentSourceCollectionActionView(unittest.TestCase):
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_UPDATE())
     @mock.patch('pulp.server.webservices.views.content.tags')
-    @mock.patch('pulp.server.content.sources.container.ContentSource.load_all')
+    @mock.patch('pulp.server.content.sources.container.REGISTRY.load')
     @mock.patch('pulp.server.webservices.views.content.content.refresh_content_sources')
     def test_refresh_content_source(self, mock_refresh, mock_sources, mock_tags):
         """
@@ -776,7 +793,7 @@ class TestContentSourceResourceView(unittest.TestCase):
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_READ())
     @mock.patch('pulp.server.webservices.views.content.generate_json_response_with_pulp_encoder')
-    @mock.patch('pulp.server.content.sources.container.ContentSource.load_all')
+    @mock.patch('pulp.server.content.sources.container.REGISTRY.load')
     def test_get_content_source_resource(self, mock_sources, mock_resp):
         """
         Get specific content source
@@ -796,7 +813,7 @@ class TestContentSourceResourceView(unittest.TestCase):
 
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_READ())
-    @mock.patch('pulp.server.content.sources.container.ContentSource.load_all')
+    @mock.patch('pulp.server.content.sources.container.REGISTRY.load')
     def test_get_invalid_content_source_resource(self, mock_sources):
         """
         Get invalid content source
@@ -822,7 +839,7 @@ class TestContentSourceResourceActionView(unittest.TestCase):
 
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_UPDATE())
-    @mock.patch('pulp.server.content.sources.container.ContentSource.load_all')
+    @mock.patch('pulp.server.content.sources.container.REGISTRY.load')
     def test_post_invalid_action(self, mock_sources):
         """
         Test specific content source invalid action
@@ -842,7 +859,7 @@ class TestContentSourceResourceActionView(unittest.TestCase):
 
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_UPDATE())
-    @mock.patch('pulp.server.content.sources.container.ContentSource.load_all')
+    @mock.patch('pulp.server.content.sources.container.REGISTRY.load')
     def test_refresh_invalid_content_source(self, mock_sources):
         """
         Test refresh invalid content source
@@ -864,7 +881,7 @@ class TestContentSourceResourceActionView(unittest.TestCase):
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_UPDATE())
     @mock.patch('pulp.server.webservices.views.content.tags')
-    @mock.patch('pulp.server.content.sources.container.ContentSource.load_all')
+    @mock.patch('pulp.server.content.sources.container.REGISTRY.load')
     @mock.patch('pulp.server.webservices.views.content.content.refresh_content_source')
     def test_refresh_specific_action(self, mock_refresh, mock_sources, mock_tags):
         """
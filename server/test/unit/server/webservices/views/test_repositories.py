@@ -681,6 +681,7 @@ class TestRepoUnitSearch(unittest.TestCase):
         mock_repo_qs.get_repo_or_missing_resource.return_value = 'exists'
         criteria = mock_crit.from_client_input.return_value
         criteria.type_ids = ['one_type']
+        mock_uqm().supports_paging.return_value = False
         repo_unit_search = RepoUnitSearch()
         repo_unit_search._generate_response('mock_q', {}, repo_id='mock_repo')
         mock_crit.from_client_input.assert_called_once_with('mock_q')
@@ -701,12 +702,101 @@ class TestRepoUnitSearch(unittest.TestCase):
         mock_repo_qs.get_repo_or_missing_resource.return_value = 'exists'
         criteria = mock_crit.from_client_input.return_value
         criteria.type_ids = ['one_type', 'two_types']
+        mock_uqm().supports_paging.return_value = False
         repo_unit_search = RepoUnitSearch()
         repo_unit_search._generate_response('mock_q', {}, repo_id='mock_repo')
         mock_crit.from_client_input.assert_called_once_with('mock_q')
         mock_uqm().get_units.assert_called_once_with('mock_repo', criteria=criteria)
         mock_resp.assert_called_once_with(mock_uqm().get_units.return_value)
 
+    @mock.patch('pulp.server.webservices.views.repositories.content')
+    @mock.patch(
+        'pulp.server.webservices.views.repositories.generate_json_response_with_pulp_encoder')
+    @mock.patch('pulp.server.webservices.views.repositories.manager_factory.'
+                'repo_unit_association_query_manager')
+    @mock.patch('pulp.server.webservices.views.repositories.UnitAssociationCriteria')
+    @mock.patch('pulp.server.webservices.views.repositories.model.Repository.objects')
+    def test__generate_response_paged(self, mock_repo_qs, mock_crit, mock_uqm, mock_resp,
+                                      mock_content):
+        """
+        Test that paged searches pass the resume token and return one for the next page.
+        """
+        criteria = mock_crit.from_client_input.return_value
+        criteria.limit = 2
+        mock_uqm().supports_paging.return_value = True
+        units = [{'unit_type_id': 't', 'unit_id': 'a', 'metadata': {}},
+                 {'unit_type_id': 't', 'unit_id': 'b', 'metadata': {}}]
+        mock_uqm().get_units_paged.return_value = iter(units)
+        mock_resp.return_value = {}
+
+        response = RepoUnitSearch()._generate_response('mock_q', {'resume_token': 'token'},
+                                                       repo_id='mock_repo')
+
+        mock_uqm().get_units_paged.assert_called_once_with('mock_repo', criteria=criteria,
+                                                           resume_token='token')
+        mock_resp.assert_called_once_with(units)
+        self.assertEqual(response['Pulp-Resume-Token'],
+                         repo_controller.get_resume_token('t', 'b'))
+
+    @mock.patch('pulp.server.webservices.views.repositories.content')
+    @mock.patch(
+        'pulp.server.webservices.views.repositories.generate_json_response_with_pulp_encoder')
+    @mock.patch('pulp.server.webservices.views.repositories.manager_factory.'
+                'repo_unit_association_query_manager')
+    @mock.patch('pulp.server.webservices.views.repositories.UnitAssociationCriteria')
+    @mock.patch('pulp.server.webservices.views.repositories.model.Repository.objects')
+    def test__generate_response_paged_last_page(self, mock_repo_qs, mock_crit, mock_uqm,
+                                                mock_resp, mock_content):
+        """
+        Test that no resume token is returned when the page is not full.
+        """
+        criteria = mock_crit.from_client_input.return_value
+        criteria.limit = 2
+        mock_uqm().supports_paging.return_value = True
+        mock_uqm().get_units_paged.return_value = iter(
+            [{'unit_type_id': 't', 'unit_id': 'a', 'metadata': {}}])
+        mock_resp.return_value = {}
+
+        response = RepoUnitSearch()._generate_response('mock_q', {}, repo_id='mock_repo')
+
+        self.assertFalse('Pulp-Resume-Token' in response)
+
+    @mock.patch('pulp.server.webservices.views.repositories.get_page_size', return_value=100)
+    @mock.patch('pulp.server.webservices.views.repositories.content')
+    @mock.patch(
+        'pulp.server.webservices.views.repositories.generate_json_response_with_pulp_encoder')
+    @mock.patch('pulp.server.webservices.views.repositories.manager_factory.'
+                'repo_unit_association_query_manager')
+    @mock.patch('pulp.server.webservices.views.repositories.UnitAssociationCriteria')
+    @mock.patch('pulp.server.webservices.views.repositories.model.Repository.objects')
+    def test__generate_response_page_size(self, mock_repo_qs, mock_crit, mock_uqm, mock_resp,
+                                          mock_content, mock_page_size):
+        """
+        Test that the configured page size is applied to paged searches.
+        """
+        criteria = mock_crit.from_client_input.return_value
+        criteria.limit = None
+        mock_uqm().supports_paging.return_value = True
+        mock_uqm().get_units_paged.return_value = iter([])
+        mock_resp.return_value = {}
+
+        RepoUnitSearch()._generate_response('mock_q', {}, repo_id='mock_repo')
+
+        mock_page_size.assert_called_once_with(None, default=True)
+        self.assertEqual(criteria.limit, 100)
+
+    @mock.patch('pulp.server.webservices.views.repositories.manager_factory.'
+                'repo_unit_association_query_manager')
+    @mock.patch('pulp.server.webservices.views.repositories.UnitAssociationCriteria')
+    @mock.patch('pulp.server.webservices.views.repositories.model.Repository.objects')
+    def test__generate_response_resume_token_sorted(self, mock_repo_qs, mock_crit, mock_uqm):
+        """
+        Test that a resume token is rejected for sorted searches.
+        """
+        mock_uqm().supports_paging.return_value = False
+        self.assertRaises(exceptions.InvalidValue, RepoUnitSearch()._generate_response,
+                          'mock_q', {'resume_token': 'token'}, repo_id='mock_repo')
+
 
 class TestRepoImportersView(unittest.TestCase):
     """
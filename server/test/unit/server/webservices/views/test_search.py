@@ -3,12 +3,14 @@ This module contains tests for the pulp.server.webservices.views.search module.
 """
 import mock
 from django import http
+from pymongo import ASCENDING, DESCENDING
 from pymongo.errors import OperationFailure
 
 from base import assert_auth_READ
 from pulp.common.compat import unittest
 from pulp.server import exceptions
-from pulp.server.webservices.views import search
+from pulp.server.constants import PULP_RESUME_TOKEN_HEADER
+from pulp.server.webservices.views import search, util
 
 
 class TestSearchView(unittest.TestCase):
@@ -322,6 +324,121 @@ class TestSearchView(unittest.TestCase):
         FakeSearchView.model.objects.find_by_criteria.side_effect = OperationFailure('dang')
         self.assertRaises(exceptions.InvalidValue, FakeSearchView._generate_response, query, {})
 
+    def test__generate_response_streaming(self):
+        """
+        Test that _generate_response() streams the results when stream_results is set.
+        """
+        class FakeSearchView(search.SearchView):
+            model = mock.MagicMock()
+            stream_results = True
+            del model.SERIALIZER
+
+        query = {'filters': {'money': {'$gt': 1000000}}}
+        results = FakeSearchView.model.objects.find_by_criteria.return_value
+        results.no_cache.return_value = iter(['big money', 'bigger money'])
+
+        response = FakeSearchView._generate_response(query, {})
+
+        self.assertEqual(type(response), http.StreamingHttpResponse)
+        self.assertEqual(''.join(response.streaming_content), '["big money", "bigger money"]')
+        self.assertEqual(response.status_code, 200)
+
+    def test__generate_response_streaming_invalid_criteria(self):
+        """
+        Test that a pymongo exception is handled correctly when streaming.
+        """
+        class FakeSearchView(search.SearchView):
+            model = mock.MagicMock()
+            stream_results = True
+
+        query = {'filters': {'money': {'$gt': 1000000}}}
+        results = FakeSearchView.model.objects.find_by_criteria.return_value
+        results.no_cache.side_effect = OperationFailure('dang')
+        self.assertRaises(exceptions.InvalidValue, FakeSearchView._generate_response, query, {})
+
+    @mock.patch('pulp.server.webservices.views.util.get_page_size', return_value=2)
+    def test__generate_response_paged(self, mock_page_size):
+        """
+        Test that a paged search resumes after the given token and returns a token for the next
+        page when the page is full.
+        """
+        class FakeSearchView(search.SearchView):
+            model = mock.MagicMock()
+            paged = True
+            serializer = staticmethod(lambda r: r)
+
+        FakeSearchView.model.objects.find_by_criteria.return_value = [{'_id': 'b'}, {'_id': 'c'}]
+        options = {'resume_token': util.get_page_token('a')}
+
+        response = FakeSearchView._generate_response({'filters': {'x': 1}}, options)
+
+        mock_page_size.assert_called_once_with(None, default=True)
+        query = FakeSearchView.model.objects.find_by_criteria.call_args[0][0]
+        self.assertEqual(query.limit, 2)
+        self.assertEqual(query.sort, [('id', ASCENDING)])
+        self.assertEqual(query.filters, {'$and': [{'x': 1}, {'_id': {'$gt': 'a'}}]})
+        self.assertEqual(type(response), http.HttpResponse)
+        self.assertEqual(response[PULP_RESUME_TOKEN_HEADER], util.get_page_token('c'))
+
+    @mock.patch('pulp.server.webservices.views.util.get_page_size', return_value=3)
+    def test__generate_response_paged_last_page(self, mock_page_size):
+        """
+        Test that no token is returned when the page is not full.
+        """
+        class FakeSearchView(search.SearchView):
+            manager = mock.MagicMock()
+            paged = True
+            serializer = staticmethod(lambda r: r)
+
+        FakeSearchView.manager.find_by_criteria.return_value = [{'_id': 'b'}, {'_id': 'c'}]
+
+        response = FakeSearchView._generate_response({}, {})
+
+        query = FakeSearchView.manager.find_by_criteria.call_args[0][0]
+        self.assertEqual(query.sort, [('_id', ASCENDING)])
+        self.assertEqual(query.filters, None)
+        self.assertFalse(response.has_header(PULP_RESUME_TOKEN_HEADER))
+
+    @mock.patch('pulp.server.webservices.views.util.get_page_size', return_value=None)
+    def test__generate_response_paged_sorted(self, mock_page_size):
+        """
+        Test that sorted searches keep their order, are not limited by default and cannot be
+        resumed.
+        """
+        class FakeSearchView(search.SearchView):
+            model = mock.MagicMock()
+            paged = True
+            serializer = staticmethod(lambda r: r)
+
+        FakeSearchView.model.objects.find_by_criteria.return_value = [{'_id': 'b'}]
+        query = {'sort': [['x', 'descending']]}
+
+        FakeSearchView._generate_response(query, {})
+
+        mock_page_size.assert_called_once_with(None, default=False)
+        criteria = FakeSearchView.model.objects.find_by_criteria.call_args[0][0]
+        self.assertEqual(criteria.sort, [('x', DESCENDING)])
+        self.assertRaises(exceptions.InvalidValue, FakeSearchView._generate_response, query,
+                          {'resume_token': util.get_page_token('a')})
+
+    @mock.patch('pulp.server.webservices.views.util.STREAM_CHUNK_SIZE', 2)
+    def test_iter_results(self):
+        """
+        Ensure that results are serialized a page at a time.
+        """
+        m_serial = mock.MagicMock(side_effect=lambda results, multiple: mock.Mock(data=results))
+
+        class FakeSearchView(search.SearchView):
+            model = mock.MagicMock()
+            model.SERIALIZER = m_serial
+
+        m_method = mock.MagicMock(return_value=['list', 'of', 'things'])
+
+        results = FakeSearchView.iter_results({'search': 'q'}, m_method, {})
+        self.assertEqual(list(results), ['list', 'of', 'things'])
+        self.assertEqual(m_serial.call_args_list, [mock.call(['list', 'of'], multiple=True),
+                                                   mock.call(['things'], multiple=True)])
+
     def test_get_results_serializer(self):
         """
         Ensure that if a class has an old style serializer, it is used.
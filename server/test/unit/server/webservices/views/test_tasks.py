@@ -48,6 +48,7 @@ class TestTaskSearchView(unittest.TestCase):
                          util.generate_json_response_with_pulp_encoder)
         self.assertEqual(TaskSearchView.model, model.TaskStatus)
         self.assertEqual(TaskSearchView.serializer, task_serializer)
+        self.assertTrue(TaskSearchView.stream_results)
 
 
 class TestTaskCollection(unittest.TestCase):
@@ -67,7 +68,9 @@ class TestTaskCollection(unittest.TestCase):
 
         mock_request = mock.MagicMock()
         mock_request.GET.getlist.return_value = ['mock_tag_1', 'mock_tag_2']
-        mock_task_status.objects.return_value = ['mock_1', 'mock_2']
+        mock_request.GET.get.return_value = None
+        raw_tasks = mock_task_status.objects.return_value.order_by.return_value
+        raw_tasks.limit.return_value = [{'_id': 1}, {'_id': 2}]
         mock_task_serializer.side_effect = lambda x: x
 
         task_collection = TaskCollectionView()
@@ -75,9 +78,12 @@ class TestTaskCollection(unittest.TestCase):
 
         mock_task_status.objects.assert_called_once_with(group_id=None, tags__all=['mock_tag_1',
                                                                                    'mock_tag_2'])
-        mock_resp.assert_called_once_with(['mock_1', 'mock_2'])
-        mock_task_serializer.assert_has_calls([mock.call('mock_1'), mock.call('mock_2')])
+        mock_task_status.objects.return_value.order_by.assert_called_once_with('id')
+        raw_tasks.limit.assert_called_once_with(1000)
+        mock_resp.assert_called_once_with([{'_id': 1}, {'_id': 2}])
         self.assertTrue(response is mock_resp.return_value)
+        # the page is not full
+        self.assertFalse(mock_resp.return_value.__setitem__.called)
 
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_READ())
@@ -91,15 +97,75 @@ class TestTaskCollection(unittest.TestCase):
 
         mock_request = mock.MagicMock()
         mock_request.GET.getlist.return_value = []
-        mock_task_status.objects.return_value = ['mock_1', 'mock_2']
+        mock_request.GET.get.return_value = None
+        raw_tasks = mock_task_status.objects.return_value.order_by.return_value
+        raw_tasks.limit.return_value = [{'_id': 1}, {'_id': 2}]
         mock_task_serializer.side_effect = lambda x: x
 
         task_collection = TaskCollectionView()
         response = task_collection.get(mock_request)
 
         mock_task_status.objects.assert_called_once_with(group_id=None)
-        mock_resp.assert_called_once_with(['mock_1', 'mock_2'])
-        mock_task_serializer.assert_has_calls([mock.call('mock_1'), mock.call('mock_2')])
+        mock_resp.assert_called_once_with([{'_id': 1}, {'_id': 2}])
+        mock_task_serializer.assert_has_calls([mock.call({'_id': 1}), mock.call({'_id': 2})])
+        self.assertTrue(response is mock_resp.return_value)
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.tasks.add_next_page_link')
+    @mock.patch('pulp.server.webservices.views.tasks.task_serializer')
+    @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
+    @mock.patch('pulp.server.webservices.views.tasks.generate_json_response_with_pulp_encoder')
+    def test_get_task_collection_next_page(self, mock_resp, mock_task_status,
+                                           mock_task_serializer, mock_link):
+        """
+        Test that a full page of tasks resumes after the given token and returns a token for
+        the next page.
+        """
+        resume_token = util.get_page_token(1)
+        mock_request = mock.MagicMock()
+        mock_request.GET.getlist.return_value = []
+        mock_request.GET.get.side_effect = {'limit': '2', 'resume_token': resume_token}.get
+        raw_tasks = mock_task_status.objects.return_value.filter.return_value.order_by.return_value
+        raw_tasks.limit.return_value = [{'_id': 2}, {'_id': 3}]
+        mock_task_serializer.side_effect = lambda x: x
+
+        task_collection = TaskCollectionView()
+        response = task_collection.get(mock_request)
+
+        mock_task_status.objects.return_value.filter.assert_called_once_with(
+            __raw__={'_id': {'$gt': 1}})
+        raw_tasks.limit.assert_called_once_with(2)
+        mock_resp.return_value.__setitem__.assert_called_once_with(
+            'Pulp-Resume-Token', util.get_page_token(3))
+        mock_link.assert_called_once_with(mock_request, mock_resp.return_value)
+        self.assertTrue(response is mock_link.return_value)
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.tasks.get_page_size', return_value=None)
+    @mock.patch('pulp.server.webservices.views.tasks.task_serializer')
+    @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
+    @mock.patch('pulp.server.webservices.views.tasks.'
+                'generate_streaming_json_response_with_pulp_encoder')
+    def test_get_task_collection_unlimited(self, mock_resp, mock_task_status,
+                                           mock_task_serializer, mock_page_size):
+        """
+        Test that the tasks are streamed when page sizes are not configured.
+        """
+
+        mock_request = mock.MagicMock()
+        mock_request.GET.getlist.return_value = []
+        mock_request.GET.get.return_value = None
+        raw_tasks = mock_task_status.objects.return_value.order_by.return_value
+        raw_tasks.no_cache.return_value = ['mock_1', 'mock_2']
+        mock_task_serializer.side_effect = lambda x: x
+
+        task_collection = TaskCollectionView()
+        response = task_collection.get(mock_request)
+
+        self.assertEqual(mock_resp.call_count, 1)
+        self.assertEqual(list(mock_resp.call_args[0][0]), ['mock_1', 'mock_2'])
         self.assertTrue(response is mock_resp.return_value)
 
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
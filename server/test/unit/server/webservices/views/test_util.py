@@ -1,11 +1,14 @@
+from datetime import datetime
 import httplib
 import json
 import mock
 
-from django.http import HttpResponse, HttpResponseNotFound
+from django.http import HttpResponse, HttpResponseNotFound, QueryDict, StreamingHttpResponse
 
 from pulp.common.compat import unittest
-from pulp.server.exceptions import InputEncodingError, PulpCodedValidationException
+from pulp.server.compat import ObjectId
+from pulp.server.constants import PULP_RESUME_TOKEN_HEADER
+from pulp.server.exceptions import InputEncodingError, InvalidValue, PulpCodedValidationException
 from pulp.server.webservices.views import util
 from pulp.server.webservices.views.util import (parse_json_body, page_not_found,
                                                 pulp_json_encoder)
@@ -58,6 +61,53 @@ class TestResponseGenerators(unittest.TestCase):
         util.generate_json_response_with_pulp_encoder(test_content)
         mock_json.dumps.assert_called_once_with(test_content, default=pulp_json_encoder)
 
+    def test_iter_json_array(self):
+        """
+        Ensure that the array is encoded in chunks of objects.
+        """
+        content = ({'n': n} for n in range(5))
+        chunks = list(util.iter_json_array(content, chunk_size=2))
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(''.join(chunks), json.dumps([{'n': n} for n in range(5)]))
+
+    def test_iter_json_array_empty(self):
+        """
+        Ensure that an empty iterable is encoded as an empty array.
+        """
+        self.assertEqual(''.join(util.iter_json_array([])), '[]')
+
+    def test_generate_streaming_json_response(self):
+        """
+        Ensure that the streamed content is a JSON array of the objects.
+        """
+        test_content = [{'foo': 'bar'}, {'foo': 'baz'}]
+        response = util.generate_streaming_json_response(iter(test_content))
+        self.assertTrue(isinstance(response, StreamingHttpResponse))
+        self.assertEqual(response.status_code, httplib.OK)
+        self.assertEqual(response._headers.get('content-type'),
+                         ('Content-Type', 'application/json; charset=utf-8'))
+        response_content = json.loads(''.join(response.streaming_content))
+        self.assertEqual(response_content, test_content)
+
+    def test_generate_streaming_json_response_raises_early(self):
+        """
+        Ensure that an error raised when getting the first object is raised immediately.
+        """
+        def content():
+            raise ValueError()
+            yield
+
+        self.assertRaises(ValueError, util.generate_streaming_json_response, content())
+
+    def test_generate_streaming_json_response_with_pulp_encoder(self):
+        """
+        Ensure that the shortcut function uses the specified encoder.
+        """
+        response = util.generate_streaming_json_response_with_pulp_encoder(
+            [{'when': datetime(2016, 1, 1)}])
+        response_content = json.loads(''.join(response.streaming_content))
+        self.assertEqual(response_content, [{'when': '2016-01-01T00:00:00Z'}])
+
     @mock.patch('pulp.server.webservices.views.util.iri_to_uri')
     def test_generate_redirect_response(self, mock_iri_to_uri):
         """
@@ -263,6 +313,65 @@ class TestEnsureInputEncoding(unittest.TestCase):
         self.assertEqual(response, {'valid': 'json'})
 
 
+class TestPaging(unittest.TestCase):
+    """
+    Test the page size and resume token helpers.
+    """
+
+    def _config(self, default_page_size, max_page_size):
+        sizes = {'default_page_size': default_page_size, 'max_page_size': max_page_size}
+        return mock.patch('pulp.server.webservices.views.util.pulp_config.getint',
+                          side_effect=lambda section, name: sizes[name])
+
+    def test_get_page_size(self):
+        with self._config(10, 100):
+            self.assertEqual(util.get_page_size(), 10)
+            self.assertEqual(util.get_page_size(None, default=False), None)
+            self.assertEqual(util.get_page_size('50'), 50)
+            self.assertEqual(util.get_page_size(500), 100)
+            self.assertEqual(util.get_page_size(500, default=False), 100)
+
+    def test_get_page_size_unlimited(self):
+        with self._config(0, 0):
+            self.assertEqual(util.get_page_size(), None)
+            self.assertEqual(util.get_page_size(500), 500)
+        with self._config(0, 100):
+            self.assertEqual(util.get_page_size(), 100)
+
+    def test_get_page_size_invalid(self):
+        with self._config(10, 100):
+            self.assertRaises(InvalidValue, util.get_page_size, 'ten')
+            self.assertRaises(InvalidValue, util.get_page_size, 0)
+
+    def test_page_token(self):
+        for _id in (ObjectId(), 'b4d6a7f1-2f3c-4b7e-9f0e-5c1d2a3b4c5d'):
+            token = util.get_page_token(_id)
+            self.assertEqual(util.page_token_spec(token), {'_id': {'$gt': _id}})
+
+    def test_page_token_invalid(self):
+        self.assertRaises(InvalidValue, util.page_token_spec, 'not a token')
+        self.assertRaises(InvalidValue, util.page_token_spec, util.get_page_token({'$ne': 1}))
+
+    def test_add_next_page_link(self):
+        request = mock.MagicMock(method='GET', path='/pulp/api/v2/tasks/')
+        request.GET = QueryDict('tag=a&resume_token=old')
+        response = HttpResponse()
+        response[PULP_RESUME_TOKEN_HEADER] = 'new'
+
+        self.assertTrue(util.add_next_page_link(request, response) is response)
+        self.assertEqual(response['Link'],
+                         '</pulp/api/v2/tasks/?tag=a&resume_token=new>; rel="next"')
+
+    def test_add_next_page_link_last_page(self):
+        request = mock.MagicMock(method='GET', path='/pulp/api/v2/tasks/')
+        request.GET = QueryDict('')
+        response = HttpResponse()
+
+        util.add_next_page_link(request, response)
+
+        self.assertFalse(response.has_header('Link'))
+
+
 class TestPageNotFound(unittest.TestCase):
 
     @mock.patch('pulp.server.webservices.views.util.generate_json_response')
@@ -2,7 +2,8 @@ import sys
 
 from gettext import gettext as _
 from logging import getLogger
-from threading import RLock
+from collections import OrderedDict
+from threading import Event, RLock, Thread
 from datetime import datetime, timedelta
 
 log = getLogger(__name__)
@@ -19,33 +20,58 @@ class Cache(object):
     """
     Generic object cache.
 
+    The inventory is ordered least recently requested first so that
+    eviction only needs to inspect the oldest items.
+
     Attributes:
         eviction_threshold (timedelta): How long an unrequested item will be cached.
+        max_size (int): The maximum number of cached items.  Unbounded when None.
+        hits (int): The number of successful get() calls.
+        misses (int): The number of get() calls that raised NotCached.
+        evictions (int): The number of items evicted.
         _lock (RLock): The object mutex.
-        _inventory (dict): The inventory of cached objects.
+        _inventory (OrderedDict): The inventory of cached objects.
             Each value is an Item.
+        _sweeper (Sweeper): The background sweeper.  None when not sweeping.
     """
 
-    def __init__(self, eviction_threshold=None):
+    def __init__(self, eviction_threshold=None, max_size=None, sweep_interval=None):
         """
         Args:
             eviction_threshold (timedelta): How long an unrequested item will be cached.
-
+            max_size (int): The maximum number of cached items.  Unbounded when None.
+            sweep_interval (timedelta): How often unused items are evicted
+                by a background thread.  No background sweep when None.
         """
         self.eviction_threshold = eviction_threshold or timedelta(hours=4)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
         self._lock = RLock()
-        self._inventory = {}
+        self._inventory = OrderedDict()
+        self._sweeper = None
+        if sweep_interval:
+            self._sweeper = Sweeper(self, sweep_interval)
+            self._sweeper.start()
 
-    def add(self, key, object_):
+    def add(self, key, object_, ttl=None):
         """
         Add an object to the cache.
+        When the cache is full, the least recently requested unused
+        objects are evicted.
 
         Args:
             key (hashable): The caching key.
             object_ (object): An object to be cached.
+            ttl (timedelta): How long the object may be cached regardless of use.
+                Cached until evicted when None.
         """
         with self._lock:
-            self._inventory[key] = Item(object_)
+            self._inventory.pop(key, None)
+            self._inventory[key] = Item(object_, ttl)
+            if self.max_size and len(self._inventory) > self.max_size:
+                self._trim()
 
     def purge(self, key):
         """
@@ -68,20 +94,28 @@ class Cache(object):
             object: The requested cached object.
 
         Raises:
-            NotCached: When not found in the cache.
+            NotCached: When not found in the cache or expired.
         """
         with self._lock:
             try:
-                item = self._inventory[key]
+                item = self._inventory.pop(key)
             except KeyError:
+                self.misses += 1
+                raise NotCached()
+            if item.expired:
+                self.misses += 1
+                self.evictions += 1
                 raise NotCached()
             item.touch()
-            self.evict()
+            self._inventory[key] = item
+            self.hits += 1
             return item.object
 
     def evict(self):
         """
         Evict all unused cached objects.
+        The scan stops at the first item requested within the eviction threshold
+        because all of the items that follow were requested more recently.
 
         Returns:
             list: The evicted objects.
@@ -90,15 +124,18 @@ class Cache(object):
         evicted = []
         now = Item.now()
         with self._lock:
-            for key, item in self._inventory.items():
+            keys = []
+            for key, item in self._inventory.iteritems():
                 duration = (now - item.last_requested)
                 if item.busy:
                     busy.append(item.object)
                     continue
                 if duration < self.eviction_threshold:
-                    continue
-                self.purge(key)
-                evicted.append(item.object)
+                    break
+                keys.append(key)
+            for key in keys:
+                evicted.append(self.purge(key).object)
+            self.evictions += len(evicted)
         log.debug(
             _('Cache.evict(): %(t)d total, %(e)d evicted, %(b)d busy'),
             {
@@ -108,9 +145,92 @@ class Cache(object):
             })
         return evicted
 
+    def _trim(self):
+        """
+        Evict the least recently requested unused objects until
+        the cache is within max_size.  Busy objects are skipped.
+        """
+        excess = len(self._inventory) - self.max_size
+        keys = []
+        for key, item in self._inventory.iteritems():
+            if len(keys) >= excess:
+                break
+            if item.busy:
+                continue
+            keys.append(key)
+        for key in keys:
+            self.purge(key)
+        self.evictions += len(keys)
+
+    def stats(self):
+        """
+        Get cache statistics.
+
+        Returns:
+            dict: The hits, misses, evictions and (current) size.
+        """
+        with self._lock:
+            return dict(
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                size=len(self._inventory))
+
+    def close(self):
+        """
+        Stop the background sweeper.
+        """
+        if self._sweeper is not None:
+            self._sweeper.stop()
+            self._sweeper = None
+
     def __contains__(self, key):
         return key in self._inventory
 
+    def __len__(self):
+        return len(self._inventory)
+
+
+class Sweeper(Thread):
+    """
+    Background thread that periodically evicts unused cached objects.
+
+    Attributes:
+        cache (Cache): The cache to sweep.
+        interval (timedelta): How often to sweep.
+        _stopped (Event): Set when the sweeper has been stopped.
+    """
+
+    def __init__(self, cache, interval):
+        """
+        Args:
+            cache (Cache): The cache to sweep.
+            interval (timedelta): How often to sweep.
+        """
+        super(Sweeper, self).__init__(name='CacheSweeper')
+        self.daemon = True
+        self.cache = cache
+        self.interval = interval
+        self._stopped = Event()
+
+    def run(self):
+        """
+        Sweep the cache until stopped.
+        """
+        seconds = self.interval.total_seconds()
+        while not self._stopped.wait(seconds):
+            try:
+                self.cache.evict()
+                log.debug(_('Cache statistics: %(s)s'), {'s': self.cache.stats()})
+            except Exception:
+                log.exception(_('Cache sweep failed.'))
+
+    def stop(self):
+        """
+        Stop sweeping.
+        """
+        self._stopped.set()
+
 
 class Item(object):
     """
@@ -121,6 +241,8 @@ class Item(object):
     Attributes:
         last_requested (datetime): The last UTC naive time
             the object was requested.
+        expires (datetime): The UTC naive time after which the object
+            may no longer be used.  None when the object does not expire.
         object (object): The actual cached object.
     """
 
@@ -134,14 +256,26 @@ class Item(object):
         """
         return datetime.utcnow()
 
-    def __init__(self, object_):
+    def __init__(self, object_, ttl=None):
         """
         Args:
             object_ (object): The actual cached object.
+            ttl (timedelta): How long the object may be used.
         """
         self.last_requested = None
         self.object = object_
         self.touch()
+        self.expires = self.last_requested + ttl if ttl else None
+
+    @property
+    def expired(self):
+        """
+        The item has expired.
+
+        Returns:
+            bool: True if expired.
+        """
+        return self.expires is not None and self.now() >= self.expires
 
     @property
     def ref_count(self):
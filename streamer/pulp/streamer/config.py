@@ -9,6 +9,12 @@ DEFAULT_VALUES = {
         'port': '8751',
         'interfaces': 'localhost',
         'cache_timeout': '86400',
+        'lookup_cache_ttl': '60',
+        'lookup_cache_negative_ttl': '10',
+        'lookup_cache_max_size': '10000',
+        'cache_sweep_interval': '300',
+        'spool_retain_ttl': '60',
+        'spool_retain_max': '20',
     },
 }
 
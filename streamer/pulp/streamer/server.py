@@ -1,5 +1,7 @@
+import copy
 import logging
 
+from datetime import timedelta
 from gettext import gettext as _
 from httplib import NOT_FOUND, INTERNAL_SERVER_ERROR
 from urlparse import urlparse
@@ -15,10 +17,11 @@ from pulp.plugins.loader import api as plugin_api
 from pulp.server.constants import PULP_STREAM_REQUEST_HEADER
 from pulp.server.content.sources.container import ContentContainer
 from pulp.server.content.sources.model import Request as ContainerRequest
-from pulp.server.db.model import DeferredDownload, LazyCatalogEntry
+from pulp.server.db.model import DeferredDownload, Importer, LazyCatalogEntry
 from pulp.server.controllers import repository as repo_controller
 from pulp.plugins.loader.exceptions import PluginNotFound
 from pulp.streamer.cache import Cache, NotCached
+from pulp.streamer.spool import SpoolRegistry, SpoolWriter
 
 logger = logging.getLogger(__name__)
 
@@ -52,35 +55,43 @@ class DownloadListener(AggregatingEventListener):
     Nectar download listener.
     """
 
-    def __init__(self, streamer, request):
+    def __init__(self, streamer, request, spool=None):
         """
         :param streamer: The streamer.
         :type  streamer: Streamer
         :param request: The original twisted client HTTP request being handled by the streamer.
         :type  request: twisted.web.server.Request
+        :param spool: An optional spool on which the forwarded headers are recorded.
+        :type  spool: pulp.streamer.spool.Spool
         """
         super(DownloadListener, self).__init__()
         self.streamer = streamer
         self.request = request
+        self.spool = spool
 
     def download_headers(self, report):
         """
         Forward response headers to the original client HTTP request.
         This includes adding the cache-control header with the max-age
-        which is loaded from the configuration.
+        which is loaded from the configuration. The headers are recorded
+        on the spool (when specified) for requests following this one.
 
         :param report: The download report.
         :type  report: nectar.report.DownloadReport
         """
         super(DownloadListener, self).download_headers(report)
+        headers = {}
         # forward
         for key, value in report.headers.items():
             if key.lower() not in HOP_BY_HOP_HEADERS:
-                self.request.setHeader(key, value)
+                headers[key] = value
         # additions
         max_age = self.streamer.config.get('streamer', 'cache_timeout')
-        cache_control = 'public, s-maxage={m}, max-age={m}'.format(m=max_age)
-        self.request.setHeader('Cache-Control', cache_control)
+        headers['Cache-Control'] = 'public, s-maxage={m}, max-age={m}'.format(m=max_age)
+        for key, value in headers.items():
+            self.request.setHeader(key, value)
+        if self.spool is not None:
+            self.spool.set_headers(headers)
 
     def download_failed(self, report):
         """
@@ -112,7 +123,16 @@ class Streamer(Resource):
         """
         Resource.__init__(self)
         self.config = config
-        self.session_cache = SessionCache()
+        sweep_interval = timedelta(seconds=config.getint('streamer', 'cache_sweep_interval'))
+        self.session_cache = SessionCache(sweep_interval=sweep_interval)
+        self.spools = SpoolRegistry(
+            retain_ttl=config.getint('streamer', 'spool_retain_ttl'),
+            max_retained=config.getint('streamer', 'spool_retain_max'))
+        self.lookup_cache = LookupCache(
+            ttl=config.getint('streamer', 'lookup_cache_ttl'),
+            negative_ttl=config.getint('streamer', 'lookup_cache_negative_ttl'),
+            max_size=config.getint('streamer', 'lookup_cache_max_size'),
+            sweep_interval=sweep_interval)
 
     def render_GET(self, request):
         """
@@ -139,35 +159,105 @@ class Streamer(Resource):
         Download the requested content using the content unit catalog and dispatch
         a celery task that causes Pulp to download the newly cached unit.
 
+        Concurrent requests for the same path are coalesced. The first request
+        downloads the content into a shared spool and the others stream the
+        content from the spool as it is written.
+
         :param request: The original twisted client HTTP request being handled by the streamer.
         :type  request: twisted.web.server.Request
         """
         with Responder(request) as responder:
             try:
                 path = urlparse(request.uri).path
-                q_set = LazyCatalogEntry.objects.filter(path=path)
-                q_set = q_set.order_by('-_id', '-revision')
-                count = q_set.count()
-                if not count:
+                entries = self._get_catalog_entries(path)
+                if not entries:
                     logger.error(_('No catalog entry found. path={p}'.format(p=path)))
                     request.setResponseCode(NOT_FOUND)
                     return
-                for entry in q_set.all():
-                    logger.info('Trying URL: {url}'.format(url=entry.url))
-                    try:
-                        last_report = self._download(request, entry, responder)
-                        self._on_succeeded(entry, request, last_report)
-                        return
-                    except (DownloadFailed, DoesNotExist, PluginNotFound):
-                        # try another
-                        continue
-                # Failed
-                self._on_all_failed(request)
+                spool, leader = self.spools.join(path)
+                try:
+                    if leader:
+                        self._fetch(request, entries, responder, spool)
+                    else:
+                        self._follow(request, spool, responder)
+                finally:
+                    self.spools.leave(path, spool)
             except Exception:
                 logger.exception(_('An unexpected error occurred: {url}').format(url=request.uri))
                 request.setResponseCode(INTERNAL_SERVER_ERROR)
                 request.setHeader('Content-Length', '0')
 
+    def _fetch(self, request, entries, responder, spool):
+        """
+        Download the requested content trying each catalog entry until
+        one succeeds. The content is also written to the spool.
+
+        :param request: The original twisted client HTTP request being handled by the streamer.
+        :type  request: twisted.web.server.Request
+        :param entries: The catalog entries for the requested path.
+        :type  entries: list
+        :param responder: The file-like object that nectar should write to.
+        :type  responder: Responder
+        :param spool: The spool shared with concurrent requests for the path.
+        :type  spool: pulp.streamer.spool.Spool
+        """
+        succeeded = False
+        try:
+            for entry in entries:
+                logger.info('Trying URL: {url}'.format(url=entry.url))
+                try:
+                    last_report = self._download(request, entry, responder, spool)
+                    succeeded = True
+                    self._on_succeeded(entry, request, last_report)
+                    return
+                except (DownloadFailed, DoesNotExist, PluginNotFound):
+                    # try another
+                    continue
+            # Failed
+            self._on_all_failed(request)
+        finally:
+            spool.finish(succeeded)
+
+    def _follow(self, request, spool, responder):
+        """
+        Stream the content being downloaded by a concurrent request for
+        the same path from the spool.
+
+        :param request: The original twisted client HTTP request being handled by the streamer.
+        :type  request: twisted.web.server.Request
+        :param spool: The spool being written by the leading request.
+        :type  spool: pulp.streamer.spool.Spool
+        :param responder: The file-like object used to write the response.
+        :type  responder: Responder
+        """
+        logger.debug(_('Following in-flight download: {url}').format(url=request.uri))
+        headers = spool.wait_for_headers()
+        if headers is None:
+            self._on_all_failed(request)
+            return
+        for key, value in headers.items():
+            request.setHeader(key, value)
+        for data in spool.read():
+            responder.write(data)
+        if not spool.succeeded:
+            logger.info(_('Followed download failed: {url}').format(url=request.uri))
+
+    def _get_catalog_entries(self, path):
+        """
+        Get the catalog entries for the requested path, newest first.
+        The entries are served from the lookup cache when possible.
+
+        :param path: The path component of the requested URL.
+        :type  path: str
+        :return: The matching catalog entries (may be empty).
+        :rtype: list
+        """
+        def fetch():
+            q_set = LazyCatalogEntry.objects.filter(path=path)
+            q_set = q_set.order_by('-_id', '-revision')
+            return list(q_set.all())
+        return self.lookup_cache.lookup(('catalog', path), fetch)
+
     def _on_succeeded(self, entry, request, report):
         """
         The download succeeded.
@@ -195,7 +285,7 @@ class Streamer(Resource):
         request.setHeader('Content-Length', '0')
         request.setResponseCode(NOT_FOUND)
 
-    def _download(self, request, entry, responder):
+    def _download(self, request, entry, responder, spool=None):
         """
         Download the file.
 
@@ -205,14 +295,19 @@ class Streamer(Resource):
         :type  entry: pulp.server.db.model.LazyCatalogEntry
         :param responder: The file-like object that nectar should write to.
         :type  responder: Responder
+        :param spool: An optional spool to which the content is also written.
+        :type  spool: pulp.streamer.spool.Spool
         :return: The download report.
         :rtype: nectar.report.DownloadReport
         """
         downloader = None
 
+        if spool is not None:
+            responder = SpoolWriter(spool, responder)
+
         try:
             unit = self._get_unit(entry)
-            downloader = self._get_downloader(request, entry)
+            downloader = self._get_downloader(request, entry, spool)
             alt_request = ContainerRequest(
                 entry.unit_type_id,
                 unit.unit_key,
@@ -232,7 +327,7 @@ class Streamer(Resource):
                 if logger.isEnabledFor(logging.DEBUG):
                     logger.exception(_('finalize() failed.'))
 
-    def _get_downloader(self, request, entry):
+    def _get_downloader(self, request, entry, spool=None):
         """
         Get the configured downloader.
 
@@ -240,18 +335,29 @@ class Streamer(Resource):
         :type  request: twisted.web.server.Request
         :param entry: A catalog entry.
         :type  entry: LazyCatalogEntry
+        :param spool: An optional spool on which the forwarded headers are recorded.
+        :type  spool: pulp.streamer.spool.Spool
         :return: The configured downloader.
         :rtype:  nectar.downloaders.base.Downloader
         :raise: PluginNotFound: when plugin not found.
         :raise: DoesNotExist: when importer not found.
         """
-        try:
+        def fetch():
             importer, config, model = \
                 repo_controller.get_importer_by_id(entry.importer_id)
-            model.config = config.flatten()
+            return model.importer_type_id, model.repo_id, config.flatten()
+
+        try:
+            # Only plain data is cached. The plugin and importer model are created for each
+            # request since they are used by concurrent requests and may not be thread-safe.
+            importer_type_id, repo_id, config = self.lookup_cache.lookup(
+                ('importer', entry.importer_id), fetch, missing=(PluginNotFound, DoesNotExist))
+            importer = plugin_api.get_importer_by_id(importer_type_id)[0]
+            model = Importer(repo_id=repo_id, importer_type_id=importer_type_id,
+                             config=copy.deepcopy(config))
             downloader = importer.get_downloader_for_db_importer(
                 model, entry.url, working_dir='/tmp')
-            listener = DownloadListener(self, request)
+            listener = DownloadListener(self, request, spool)
             downloader.event_listener = listener
             downloader.session = self.session_cache.get_or_create(request.uri, downloader)
             return downloader
@@ -260,21 +366,26 @@ class Streamer(Resource):
             logger.error(msg.format(path=entry.path))
             raise
 
-    @staticmethod
-    def _get_unit(entry):
+    def _get_unit(self, entry):
         """
         Get the content unit referenced by the catalog entry.
+        Only the unit key fields are loaded and the unit is served
+        from the lookup cache when possible.
 
         :param entry: A catalog entry.
         :type  entry: LazyCatalogEntry
         :return: The unit.
         :raises DoesNotExist: when not found.
         """
-        try:
+        def fetch():
             model = plugin_api.get_unit_model_by_id(entry.unit_type_id)
             q_set = model.objects.filter(id=entry.unit_id)
             q_set = q_set.only(*model.unit_key_fields)
             return q_set.get()
+
+        try:
+            key = ('unit', entry.unit_type_id, entry.unit_id)
+            return self.lookup_cache.lookup(key, fetch, missing=(DoesNotExist,))
         except DoesNotExist:
             msg = _('The catalog entry for {path} references unknown unit: {unit_type}:{id}')
             logger.error(msg.format(
@@ -428,3 +539,70 @@ class SessionCache(Cache):
             session.stream = True
             self.add(key, session)
         return session
+
+
+class LookupCache(Cache):
+    """
+    Database lookup cache.
+    Extends generic cache so that each entry expires after a fixed TTL
+    and lookups that found nothing are also cached (using a shorter TTL)
+    so repeated requests for unknown paths do not reach the database.
+
+    Attributes:
+        ttl (timedelta): How long a found object is cached.
+        negative_ttl (timedelta): How long a miss is cached.
+    """
+
+    def __init__(self, ttl, negative_ttl, max_size, sweep_interval=None):
+        """
+        :param ttl: Seconds a found object is cached. Zero (0) disables the cache.
+        :type ttl: int
+        :param negative_ttl: Seconds a miss is cached. Zero (0) disables negative caching.
+        :type negative_ttl: int
+        :param max_size: The maximum number of cached entries.
+        :type max_size: int
+        :param sweep_interval: How often expired entries are evicted.
+        :type sweep_interval: timedelta
+        """
+        super(LookupCache, self).__init__(
+            timedelta(seconds=ttl), max_size=max_size, sweep_interval=sweep_interval)
+        self.ttl = timedelta(seconds=ttl)
+        self.negative_ttl = timedelta(seconds=negative_ttl)
+
+    def lookup(self, key, fetch, missing=()):
+        """
+        Get an object from the cache or fetch (and cache) it.
+        An empty result or one of the *missing* exceptions is cached using
+        the negative TTL. A cached exception is raised on each hit.
+
+        :param key: The caching key.
+        :type key: hashable
+        :param fetch: Called (without arguments) to fetch the object.
+        :type fetch: callable
+        :param missing: Exception classes raised by fetch() to indicate not-found.
+        :type missing: tuple
+        :return: The cached or fetched object.
+        """
+        try:
+            value, = self.get(key)
+        except NotCached:
+            pass
+        else:
+            if isinstance(value, Exception):
+                raise value
+            return value
+        try:
+            value = fetch()
+        except missing as e:
+            value = e
+        if isinstance(value, Exception) or not value:
+            ttl = self.negative_ttl
+        else:
+            ttl = self.ttl
+        if self.ttl and ttl:
+            # Cached in a (private) tuple so that references held to the
+            # value itself do not make the cached item busy.
+            self.add(key, (value,), ttl)
+        if isinstance(value, Exception):
+            raise value
+        return value
@@ -0,0 +1,301 @@
+import os
+
+from collections import OrderedDict
+from logging import getLogger
+from tempfile import mkstemp
+from threading import Condition, Lock
+from time import time
+
+log = getLogger(__name__)
+
+
+class Spool(object):
+    """
+    A download spool shared by concurrent requests for the same file.
+
+    The leading request writes the downloaded content to a temporary file
+    while following requests tail the file as it grows. The response headers
+    forwarded by the leader are recorded so they can be replayed by followers.
+
+    :ivar path: The absolute path to the spool file.
+    :type path: str
+    :ivar headers: The recorded response headers. None until received.
+    :type headers: dict
+    :ivar size: The number of bytes written.
+    :type size: int
+    :ivar finished: The download has finished.
+    :type finished: bool
+    :ivar succeeded: The download has finished successfully.
+    :type succeeded: bool
+    :ivar users: The number of requests using the spool.
+    :type users: int
+    """
+
+    # The size of chunks read by followers.
+    CHUNK_SIZE = 65536
+
+    def __init__(self, directory=None):
+        """
+        :param directory: The directory in which the spool file is created.
+            The system temporary directory is used when not specified.
+        :type directory: str
+        """
+        fd, self.path = mkstemp(prefix='spool-', dir=directory)
+        self._fp = os.fdopen(fd, 'wb')
+        self._condition = Condition()
+        self.headers = None
+        self.size = 0
+        self.finished = False
+        self.succeeded = False
+        self.users = 1
+
+    def set_headers(self, headers):
+        """
+        Record the response headers.
+
+        :param headers: The response headers.
+        :type headers: dict
+        """
+        with self._condition:
+            self.headers = dict(headers)
+            self._condition.notify_all()
+
+    def write(self, data):
+        """
+        Append downloaded content.
+
+        :param data: A chunk of downloaded content.
+        :type data: str
+        """
+        self._fp.write(data)
+        self._fp.flush()
+        with self._condition:
+            self.size += len(data)
+            self._condition.notify_all()
+
+    def finish(self, succeeded):
+        """
+        The download has finished.
+
+        :param succeeded: The download succeeded.
+        :type succeeded: bool
+        """
+        with self._condition:
+            if self.finished:
+                return
+            self._fp.close()
+            self.finished = True
+            self.succeeded = succeeded
+            self._condition.notify_all()
+
+    def wait_for_headers(self):
+        """
+        Wait for the response headers to be recorded or the download to finish.
+
+        :return: The recorded headers or None when finished without headers.
+        :rtype: dict
+        """
+        with self._condition:
+            while self.headers is None and not self.finished:
+                self._condition.wait()
+            return self.headers
+
+    def read(self):
+        """
+        Read the spooled content, waiting for more to be written until
+        the download has finished.
+
+        :return: A generator of content chunks.
+        :rtype: generator
+        """
+        with open(self.path, 'rb') as fp:
+            position = 0
+            while True:
+                with self._condition:
+                    while self.size == position and not self.finished:
+                        self._condition.wait()
+                    size = self.size
+                    finished = self.finished
+                while position < size:
+                    data = fp.read(min(self.CHUNK_SIZE, size - position))
+                    if not data:
+                        break
+                    position += len(data)
+                    yield data
+                if finished and position >= size:
+                    return
+
+    def close(self):
+        """
+        Delete the spool file.
+        """
+        self.finish(False)
+        try:
+            os.unlink(self.path)
+        except OSError:
+            log.debug('Spool file already deleted: %s', self.path)
+
+
+class SpoolWriter(object):
+    """
+    File-like object provided to Nectar by the leading request which writes
+    both to the leader's responder and to the spool.
+    """
+
+    def __init__(self, spool, responder):
+        """
+        :param spool: The spool being written.
+        :type spool: Spool
+        :param responder: The leading request's responder.
+        :type responder: pulp.streamer.server.Responder
+        """
+        self.spool = spool
+        self.responder = responder
+
+    def write(self, data):
+        """
+        Write the data to the spool and the responder.
+
+        :param data: A string to write.
+        :type data: str
+        """
+        self.spool.write(data)
+        self.responder.write(data)
+
+    def close(self):
+        """
+        Forward the call to close to the responder.
+        """
+        self.responder.close()
+
+
+class SpoolRegistry(object):
+    """
+    The in-flight download spools, keyed by the requested path.
+
+    The first request to join for a key becomes the leader and creates the
+    spool. Requests joining while the spool is registered follow it. A spool
+    that finished successfully stays registered for *retain_ttl* seconds, so
+    that later requests for the key are served from the spool file rather
+    than downloaded again. At most *max_retained* finished spools are kept,
+    the least recently joined is released first. Other spools are
+    unregistered when the leader leaves. The file is deleted once the last
+    request has left and the spool is no longer retained.
+    """
+
+    def __init__(self, directory=None, retain_ttl=0, max_retained=0):
+        """
+        :param directory: The directory in which spool files are created.
+        :type directory: str
+        :param retain_ttl: Seconds a finished spool is retained. Zero (0) disables retention.
+        :type retain_ttl: int
+        :param max_retained: The maximum number of retained spools.
+        :type max_retained: int
+        """
+        self.directory = directory
+        self.retain_ttl = retain_ttl
+        self.max_retained = max_retained
+        self._lock = Lock()
+        self._spools = {}
+        # key: expiration of the retained spools, least recently joined first.
+        self._retained = OrderedDict()
+
+    def join(self, key):
+        """
+        Join the spool for the key, creating it when not in-flight or retained.
+
+        :param key: The spool key.
+        :type key: hashable
+        :return: A tuple of: (spool, leader) where *leader* is True when
+            the caller created the spool and is responsible for writing it.
+        :rtype: tuple
+        """
+        with self._lock:
+            released = self._expire()
+            spool = self._spools.get(key)
+            if spool is None:
+                spool = Spool(self.directory)
+                self._spools[key] = spool
+                leader = True
+            else:
+                spool.users += 1
+                if key in self._retained:
+                    self._retained[key] = self._retained.pop(key)
+                leader = False
+        self._close(released)
+        return spool, leader
+
+    def leave(self, key, spool):
+        """
+        Leave the spool.
+        The spool is retained or unregistered once finished and deleted when no
+        longer used.
+
+        :param key: The spool key.
+        :type key: hashable
+        :param spool: The spool joined.
+        :type spool: Spool
+        """
+        released = []
+        with self._lock:
+            if spool.finished and self._spools.get(key) is spool and key not in self._retained:
+                if spool.succeeded and self.retain_ttl > 0 and self.max_retained > 0:
+                    # The registry holds the spool until it is released.
+                    spool.users += 1
+                    self._retained[key] = time() + self.retain_ttl
+                    while len(self._retained) > self.max_retained:
+                        released.extend(self._release(self._retained.keys()[0]))
+                else:
+                    del self._spools[key]
+            spool.users -= 1
+            if spool.users == 0:
+                if self._spools.get(key) is spool:
+                    del self._spools[key]
+                released.append(spool)
+        self._close(released)
+
+    def _expire(self):
+        """
+        Release the retained spools that have expired.
+        Must be called with the lock held.
+
+        :return: The released spools that are no longer used.
+        :rtype: list
+        """
+        now = time()
+        released = []
+        for key, expires in self._retained.items():
+            if expires <= now:
+                released.extend(self._release(key))
+        return released
+
+    def _release(self, key):
+        """
+        Release a retained spool.
+        Must be called with the lock held.
+
+        :param key: The spool key.
+        :type key: hashable
+        :return: The spool when no longer used.
+        :rtype: list
+        """
+        del self._retained[key]
+        spool = self._spools.pop(key)
+        spool.users -= 1
+        if spool.users == 0:
+            return [spool]
+        return []
+
+    @staticmethod
+    def _close(spools):
+        """
+        Delete the files of spools that are no longer used.
+
+        :param spools: The spools to close.
+        :type spools: list
+        """
+        for spool in spools:
+            spool.close()
+
+    def __contains__(self, key):
+        return key in self._spools
@@ -1,8 +1,9 @@
+from datetime import timedelta
 from unittest import TestCase
 
 from mock import Mock, patch
 
-from pulp.streamer.cache import Cache, Item, NotCached
+from pulp.streamer.cache import Cache, Item, NotCached, Sweeper
 
 MODULE = 'pulp.streamer.cache'
 
@@ -76,6 +77,107 @@ class TestCache(TestCase):
         cache.evict()
         self.assertTrue('t1' in cache)
 
+    @patch(MODULE + '.Item.now')
+    def test_evict_ordered(self, now):
+        now.side_effect = [1, 2, 3, 4]
+        cache = Cache(2)
+        cache.add('t1', Mock(key='t1'))
+        cache.add('t2', Mock(key='t2'))
+        cache.get('t1')
+        evicted = cache.evict()
+        self.assertEqual([obj.key for obj in evicted], ['t2'])
+        self.assertEqual(list(cache._inventory), ['t1'])
+        self.assertEqual(cache.evictions, 1)
+
+    def test_get_moves_to_end(self):
+        cache = Cache()
+        cache.add('t1', Mock())
+        cache.add('t2', Mock())
+        cache.get('t1')
+        self.assertEqual(list(cache._inventory), ['t2', 't1'])
+
+    def test_add_replaces(self):
+        cache = Cache()
+        cache.add('t1', Mock())
+        cache.add('t2', Mock())
+        cache.add('t1', Mock(key='new'))
+        self.assertEqual(list(cache._inventory), ['t2', 't1'])
+        self.assertEqual(cache.get('t1').key, 'new')
+
+    def test_max_size(self):
+        cache = Cache(max_size=2)
+        cache.add('t1', Mock())
+        cache.add('t2', Mock())
+        cache.get('t1')
+        cache.add('t3', Mock())
+        self.assertEqual(list(cache._inventory), ['t1', 't3'])
+        self.assertEqual(cache.evictions, 1)
+
+    def test_max_size_busy(self):
+        t1 = Mock()  # hold ref to make it busy.
+        cache = Cache(max_size=2)
+        cache.add('t1', t1)
+        cache.add('t2', Mock())
+        cache.add('t3', Mock())
+        self.assertEqual(list(cache._inventory), ['t1', 't3'])
+
+    @patch(MODULE + '.Item.now')
+    def test_get_expired(self, now):
+        now.side_effect = [1, 2, 3, 4]
+        cache = Cache()
+        cache.add('t1', Mock(), ttl=2)
+        cache.get('t1')
+        self.assertRaises(NotCached, cache.get, 't1')
+        self.assertFalse('t1' in cache)
+        self.assertEqual(cache.stats(), dict(hits=1, misses=1, evictions=1, size=0))
+
+    def test_stats(self):
+        cache = Cache()
+        cache.add('t1', Mock())
+        cache.get('t1')
+        cache.get('t1')
+        self.assertRaises(NotCached, cache.get, 't2')
+        self.assertEqual(cache.stats(), dict(hits=2, misses=1, evictions=0, size=1))
+        self.assertEqual(len(cache), 1)
+
+    @patch(MODULE + '.Sweeper')
+    def test_sweep(self, sweeper):
+        interval = timedelta(seconds=10)
+        cache = Cache(sweep_interval=interval)
+        sweeper.assert_called_once_with(cache, interval)
+        sweeper.return_value.start.assert_called_once_with()
+        cache.close()
+        sweeper.return_value.stop.assert_called_once_with()
+        self.assertEqual(cache._sweeper, None)
+
+
+class TestSweeper(TestCase):
+
+    def test_init(self):
+        cache = Mock()
+        interval = timedelta(seconds=10)
+        sweeper = Sweeper(cache, interval)
+        self.assertTrue(sweeper.daemon)
+        self.assertEqual(sweeper.cache, cache)
+        self.assertEqual(sweeper.interval, interval)
+
+    def test_run(self):
+        cache = Mock()
+        sweeper = Sweeper(cache, timedelta(seconds=10))
+        sweeper._stopped = Mock()
+        sweeper._stopped.wait.side_effect = [False, False, True]
+        cache.evict.side_effect = [ValueError(), None]
+        sweeper.run()
+        self.assertEqual(cache.evict.call_count, 2)
+        sweeper._stopped.wait.assert_called_with(10)
+
+    def test_stop(self):
+        sweeper = Sweeper(Mock(), timedelta(seconds=10))
+        sweeper.start()
+        sweeper.stop()
+        sweeper.join(5)
+        self.assertFalse(sweeper.is_alive())
+
 
 class TestItem(TestCase):
 
@@ -89,6 +191,16 @@ class TestItem(TestCase):
         item = Item(t1)
         self.assertEqual(item.object, t1)
         self.assertEqual(item.last_requested, now.return_value)
+        self.assertEqual(item.expires, None)
+        self.assertFalse(item.expired)
+
+    @patch(MODULE + '.Item.now')
+    def test_expired(self, now):
+        now.side_effect = [1, 2, 3]
+        item = Item(Mock(), 2)
+        self.assertEqual(item.expires, 3)
+        self.assertFalse(item.expired)
+        self.assertTrue(item.expired)
 
     def test_ref_count_and_busy(self):
         item = Item(Mock())
@@ -1,6 +1,7 @@
+from datetime import datetime, timedelta
 from httplib import NOT_FOUND, INTERNAL_SERVER_ERROR
 
-from mock import Mock, patch, call
+from mock import ANY, Mock, patch, call
 from mongoengine import DoesNotExist, NotUniqueError
 from nectar.report import DownloadReport
 
@@ -8,8 +9,10 @@ from pulp.common.compat import unittest
 from pulp.devel.unit.util import SideEffect
 from pulp.plugins.loader.exceptions import PluginNotFound
 from pulp.server import constants
+from pulp.streamer.config import load_configuration
 from pulp.streamer.server import (
-    Responder, SessionCache, Streamer, DownloadListener, DownloadFailed, HOP_BY_HOP_HEADERS
+    Responder, SessionCache, LookupCache, Streamer, DownloadListener, DownloadFailed,
+    HOP_BY_HOP_HEADERS
 )
 
 
@@ -57,6 +60,28 @@ class TestListener(unittest.TestCase):
                 'B': 2,
             })
 
+    def test_download_headers_spooled(self):
+        request = Mock(uri='http://content-world.com/content/bear.rpm')
+        report = DownloadReport('', '')
+        report.headers = {
+            'A': 1,
+            'Connection': 'close',
+        }
+        streamer = Mock()
+        streamer.config.get.return_value = 100
+        spool = Mock()
+
+        # test
+        listener = DownloadListener(streamer, request, spool)
+        listener.download_headers(report)
+
+        # validation
+        spool.set_headers.assert_called_once_with(
+            {
+                'Cache-Control': 'public, s-maxage=100, max-age=100',
+                'A': 1,
+            })
+
     def test_download_failed(self):
         report = DownloadReport('', '')
         report.error_report['response_code'] = 1234
@@ -80,7 +105,7 @@ class TestStreamer(unittest.TestCase):
         request = Mock()
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         streamer.render_GET(request)
 
         # validation
@@ -113,7 +138,7 @@ class TestStreamer(unittest.TestCase):
         model.objects.filter.return_value.order_by.return_value.count.return_value = len(catalog)
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         streamer._handle_get(request)
 
         # validation
@@ -125,8 +150,8 @@ class TestStreamer(unittest.TestCase):
         self.assertEqual(
             _download.call_args_list,
             [
-                call(request, catalog[0], responder.return_value),
-                call(request, catalog[1], responder.return_value)
+                call(request, catalog[0], responder.return_value, ANY),
+                call(request, catalog[1], responder.return_value, ANY)
             ])
 
     @patch(MODULE_PREFIX + 'Responder')
@@ -155,7 +180,7 @@ class TestStreamer(unittest.TestCase):
         model.objects.filter.return_value.order_by.return_value.count.return_value = len(catalog)
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         streamer._handle_get(request)
 
         # validation
@@ -167,9 +192,9 @@ class TestStreamer(unittest.TestCase):
         self.assertEqual(
             _download.call_args_list,
             [
-                call(request, catalog[0], responder.return_value),
-                call(request, catalog[1], responder.return_value),
-                call(request, catalog[2], responder.return_value)
+                call(request, catalog[0], responder.return_value, ANY),
+                call(request, catalog[1], responder.return_value, ANY),
+                call(request, catalog[2], responder.return_value, ANY)
             ])
 
     @patch(MODULE_PREFIX + 'Responder')
@@ -187,7 +212,7 @@ class TestStreamer(unittest.TestCase):
         model.objects.filter.return_value.order_by.return_value.count.return_value = len(catalog)
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         streamer._handle_get(request)
 
         # validation
@@ -197,6 +222,95 @@ class TestStreamer(unittest.TestCase):
         request.setResponseCode.assert_called_once_with(NOT_FOUND)
         self.assertFalse(_download.called)
 
+    @patch(MODULE_PREFIX + 'Responder')
+    @patch(MODULE_PREFIX + 'Streamer._follow')
+    @patch(MODULE_PREFIX + 'Streamer._fetch')
+    @patch(MODULE_PREFIX + 'Streamer._get_catalog_entries')
+    @patch(MODULE_PREFIX + 'reactor', Mock())
+    def test_handle_get_coalesced(self, _get_catalog_entries, _fetch, _follow, responder):
+        """
+        A request for a path being downloaded follows the in-flight download.
+        """
+        request = Mock(uri='http://content-world.com/content/bear.rpm')
+        responder.return_value.__enter__.return_value = responder.return_value
+        _get_catalog_entries.return_value = [Mock(url='url-a')]
+        streamer = Streamer(load_configuration([]))
+        spool, leader = streamer.spools.join('/content/bear.rpm')
+
+        # test
+        streamer._handle_get(request)
+
+        # validation
+        self.assertFalse(_fetch.called)
+        _follow.assert_called_once_with(request, spool, responder.return_value)
+        self.assertEqual(spool.users, 1)
+        spool.finish(True)
+        streamer.spools.leave('/content/bear.rpm', spool)
+
+    @patch(MODULE_PREFIX + 'Streamer._on_all_failed')
+    @patch(MODULE_PREFIX + 'Streamer._download')
+    def test_fetch_all_failed(self, _download, _on_all_failed):
+        request = Mock(uri='http://content-world.com/content/bear.rpm')
+        _download.side_effect = DownloadFailed()
+        entries = [Mock(url='url-a')]
+        responder = Mock()
+        spool = Mock()
+
+        # test
+        streamer = Streamer(load_configuration([]))
+        streamer._fetch(request, entries, responder, spool)
+
+        # validation
+        _download.assert_called_once_with(request, entries[0], responder, spool)
+        _on_all_failed.assert_called_once_with(request)
+        spool.finish.assert_called_once_with(False)
+
+    @patch(MODULE_PREFIX + 'Streamer._on_succeeded')
+    @patch(MODULE_PREFIX + 'Streamer._download')
+    def test_fetch_succeeded(self, _download, _on_succeeded):
+        request = Mock(uri='http://content-world.com/content/bear.rpm')
+        entries = [Mock(url='url-a')]
+        spool = Mock()
+
+        # test
+        streamer = Streamer(load_configuration([]))
+        streamer._fetch(request, entries, Mock(), spool)
+
+        # validation
+        _on_succeeded.assert_called_once_with(entries[0], request, _download.return_value)
+        spool.finish.assert_called_once_with(True)
+
+    def test_follow(self):
+        request = Mock(uri='http://content-world.com/content/bear.rpm')
+        responder = Mock()
+        spool = Mock(succeeded=True)
+        spool.wait_for_headers.return_value = {'A': 1}
+        spool.read.return_value = iter(['abc', 'def'])
+
+        # test
+        streamer = Streamer(load_configuration([]))
+        streamer._follow(request, spool, responder)
+
+        # validation
+        request.setHeader.assert_called_once_with('A', 1)
+        self.assertEqual(responder.write.call_args_list, [call('abc'), call('def')])
+
+    @patch(MODULE_PREFIX + 'Streamer._on_all_failed')
+    def test_follow_failed(self, _on_all_failed):
+        request = Mock(uri='http://content-world.com/content/bear.rpm')
+        responder = Mock()
+        spool = Mock()
+        spool.wait_for_headers.return_value = None
+
+        # test
+        streamer = Streamer(load_configuration([]))
+        streamer._follow(request, spool, responder)
+
+        # validation
+        _on_all_failed.assert_called_once_with(request)
+        self.assertFalse(spool.read.called)
+        self.assertFalse(responder.write.called)
+
     @patch(MODULE_PREFIX + 'LazyCatalogEntry')
     @patch(MODULE_PREFIX + 'reactor', Mock())
     def test_handle_get_failed_badly(self, model):
@@ -204,7 +318,7 @@ class TestStreamer(unittest.TestCase):
         model.objects.filter.side_effect = ValueError()
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         streamer._handle_get(request)
 
         # validation
@@ -224,7 +338,7 @@ class TestStreamer(unittest.TestCase):
         }
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         streamer._on_succeeded(entry, request, report)
 
         # validation
@@ -244,7 +358,7 @@ class TestStreamer(unittest.TestCase):
         }
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         streamer._on_succeeded(entry, request, report)
 
         # validation
@@ -257,7 +371,7 @@ class TestStreamer(unittest.TestCase):
         }.__getitem__
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         streamer._on_all_failed(request)
 
         # validation
@@ -283,12 +397,12 @@ class TestStreamer(unittest.TestCase):
         _get_downloader.return_value = downloader
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         report = streamer._download(twisted_request, entry, responder)
 
         # validation
         _get_unit.assert_called_once_with(entry)
-        _get_downloader.assert_called_once_with(twisted_request, entry)
+        _get_downloader.assert_called_once_with(twisted_request, entry, None)
         request.assert_called_once_with(
             entry.unit_type_id,
             unit.unit_key,
@@ -319,12 +433,12 @@ class TestStreamer(unittest.TestCase):
         _get_downloader.return_value = downloader
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         self.assertRaises(DownloadFailed, streamer._download, twisted_request, entry, responder)
 
         # validation
         _get_unit.assert_called_once_with(entry)
-        _get_downloader.assert_called_once_with(twisted_request, entry)
+        _get_downloader.assert_called_once_with(twisted_request, entry, None)
         request.assert_called_once_with(
             entry.unit_type_id,
             unit.unit_key,
@@ -336,26 +450,32 @@ class TestStreamer(unittest.TestCase):
 
     @patch(MODULE_PREFIX + 'Session')
     @patch(MODULE_PREFIX + 'DownloadListener')
+    @patch(MODULE_PREFIX + 'Importer')
+    @patch(MODULE_PREFIX + 'plugin_api')
     @patch(MODULE_PREFIX + 'repo_controller')
-    def test_get_downloader(self, controller, listener, session):
+    def test_get_downloader(self, controller, plugin_api, model_class, listener, session):
         request = Mock(uri='http://pulp.org/content')
         entry = Mock(importer_id='123')
-        importer = Mock()
         config = Mock()
-        model = Mock()
-        plugin = (importer, config, model)
-        controller.get_importer_by_id.return_value = plugin
+        config.flatten.return_value = {'feed': 'http://mirror'}
+        model = Mock(importer_type_id='yum_importer', repo_id='repo-1')
+        controller.get_importer_by_id.return_value = (Mock(), config, model)
+        importer = Mock()
+        plugin_api.get_importer_by_id.return_value = (importer, {})
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         downloader = streamer._get_downloader(request, entry)
 
         # validation
         controller.get_importer_by_id.assert_called_once_with(entry.importer_id)
         config.flatten.assert_called_once_with()
+        plugin_api.get_importer_by_id.assert_called_once_with('yum_importer')
+        model_class.assert_called_once_with(repo_id='repo-1', importer_type_id='yum_importer',
+                                            config={'feed': 'http://mirror'})
         importer.get_downloader_for_db_importer.assert_called_once_with(
-            model, entry.url, working_dir='/tmp')
-        listener.assert_called_once_with(streamer, request)
+            model_class.return_value, entry.url, working_dir='/tmp')
+        listener.assert_called_once_with(streamer, request, None)
         self.assertEqual(downloader, importer.get_downloader_for_db_importer.return_value)
         self.assertEqual(downloader.event_listener, listener.return_value)
         self.assertEqual(downloader.session, session.return_value)
@@ -367,7 +487,7 @@ class TestStreamer(unittest.TestCase):
         controller.get_importer_by_id.side_effect = PluginNotFound()
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         self.assertRaises(PluginNotFound, streamer._get_downloader, Mock(), entry)
 
     @patch(MODULE_PREFIX + 'plugin_api')
@@ -382,7 +502,7 @@ class TestStreamer(unittest.TestCase):
         plugin_api.get_unit_model_by_id.return_value = model
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         unit = streamer._get_unit(entry)
 
         # validation
@@ -404,7 +524,7 @@ class TestStreamer(unittest.TestCase):
         q_set.get.side_effect = DoesNotExist
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         self.assertRaises(DoesNotExist, streamer._get_unit, entry)
 
     @patch(MODULE_PREFIX + 'DeferredDownload')
@@ -413,13 +533,76 @@ class TestStreamer(unittest.TestCase):
         model.return_value.save.side_effect = NotUniqueError()
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         streamer._insert_deferred(entry)
 
         # validation
         model.assert_called_once_with(unit_id=entry.unit_id, unit_type_id=entry.unit_type_id)
         model.return_value.save.assert_called_once_with()
 
+    @patch(MODULE_PREFIX + 'LazyCatalogEntry')
+    def test_get_catalog_entries_cached(self, model):
+        catalog = [Mock(url='url-a')]
+        model.objects.filter.return_value.order_by.return_value.all.return_value = catalog
+
+        # test
+        streamer = Streamer(load_configuration([]))
+        first = streamer._get_catalog_entries('/content/bear.rpm')
+        second = streamer._get_catalog_entries('/content/bear.rpm')
+
+        # validation
+        model.objects.filter.assert_called_once_with(path='/content/bear.rpm')
+        self.assertEqual(first, catalog)
+        self.assertEqual(second, catalog)
+
+    @patch(MODULE_PREFIX + 'plugin_api')
+    def test_get_unit_not_found_cached(self, plugin_api):
+        q_set = Mock()
+        q_set.filter.return_value = q_set
+        q_set.only.return_value = q_set
+        q_set.get.side_effect = DoesNotExist
+        plugin_api.get_unit_model_by_id.return_value = Mock(objects=q_set, unit_key_fields=[1])
+        entry = Mock(importer_id='123', unit_id=345, unit_type_id='xx')
+
+        # test
+        streamer = Streamer(load_configuration([]))
+        self.assertRaises(DoesNotExist, streamer._get_unit, entry)
+        self.assertRaises(DoesNotExist, streamer._get_unit, entry)
+
+        # validation
+        q_set.get.assert_called_once_with()
+
+    @patch(MODULE_PREFIX + 'Session', Mock())
+    @patch(MODULE_PREFIX + 'DownloadListener', Mock())
+    @patch(MODULE_PREFIX + 'plugin_api')
+    @patch(MODULE_PREFIX + 'repo_controller')
+    def test_get_downloader_importer_cached(self, controller, plugin_api):
+        config = Mock()
+        config.flatten.return_value = {'feed': 'http://mirror'}
+        model = Mock(importer_type_id='yum_importer', repo_id='repo-1')
+        controller.get_importer_by_id.return_value = (Mock(), config, model)
+        importers = [Mock(), Mock()]
+        plugin_api.get_importer_by_id.side_effect = [(i, {}) for i in importers]
+        entry = Mock(importer_id='123', url='url-a')
+
+        # test
+        streamer = Streamer(load_configuration([]))
+        streamer._get_downloader(Mock(uri='http://pulp.org/a'), entry)
+        streamer._get_downloader(Mock(uri='http://pulp.org/b'), entry)
+
+        # validation
+        controller.get_importer_by_id.assert_called_once_with(entry.importer_id)
+        config.flatten.assert_called_once_with()
+        # each request gets its own plugin instance and importer model
+        models = []
+        for importer in importers:
+            self.assertEqual(importer.get_downloader_for_db_importer.call_count, 1)
+            models.append(importer.get_downloader_for_db_importer.call_args[0][0])
+        self.assertFalse(models[0] is models[1])
+        self.assertFalse(models[0].config is models[1].config)
+        self.assertEqual(models[1].config, {'feed': 'http://mirror'})
+        self.assertEqual(models[1].repo_id, 'repo-1')
+
 
 class TestResponder(unittest.TestCase):
 
@@ -529,3 +712,104 @@ class TestSessionCache(unittest.TestCase):
         ssn = cache.get_or_create(url, downloader)
         self.assertEqual(ssn, session.return_value)
         self.assertEqual(cache.get_or_create(url, downloader), session.return_value)
+
+
+class TestLookupCache(unittest.TestCase):
+
+    def test_init(self):
+        cache = LookupCache(ttl=60, negative_ttl=10, max_size=100)
+        self.assertEqual(cache.ttl, timedelta(seconds=60))
+        self.assertEqual(cache.negative_ttl, timedelta(seconds=10))
+        self.assertEqual(cache.max_size, 100)
+        self.assertEqual(cache.stats(), dict(hits=0, misses=0, evictions=0, size=0))
+
+    def test_lookup(self):
+        fetch = Mock(return_value=[1, 2])
+        cache = LookupCache(ttl=60, negative_ttl=10, max_size=100)
+
+        # test
+        first = cache.lookup('k', fetch)
+        second = cache.lookup('k', fetch)
+
+        # validation
+        fetch.assert_called_once_with()
+        self.assertEqual(first, [1, 2])
+        self.assertEqual(second, [1, 2])
+        self.assertEqual(cache.stats(), dict(hits=1, misses=1, evictions=0, size=1))
+
+    @patch('pulp.streamer.cache.Item.now')
+    def test_lookup_expired(self, now):
+        clock = [datetime(2016, 1, 1)]
+        now.side_effect = lambda: clock[0]
+        fetch = Mock(side_effect=['a', 'b'])
+        cache = LookupCache(ttl=60, negative_ttl=10, max_size=100)
+
+        # test
+        first = cache.lookup('k', fetch)
+        clock[0] += timedelta(seconds=61)
+        second = cache.lookup('k', fetch)
+
+        # validation
+        self.assertEqual(first, 'a')
+        self.assertEqual(second, 'b')
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_lookup_negative(self):
+        fetch = Mock(side_effect=DoesNotExist())
+        cache = LookupCache(ttl=60, negative_ttl=10, max_size=100)
+
+        # test
+        self.assertRaises(DoesNotExist, cache.lookup, 'k', fetch, missing=(DoesNotExist,))
+        self.assertRaises(DoesNotExist, cache.lookup, 'k', fetch, missing=(DoesNotExist,))
+
+        # validation
+        fetch.assert_called_once_with()
+        self.assertEqual(cache.stats(), dict(hits=1, misses=1, evictions=0, size=1))
+
+    def test_lookup_negative_disabled(self):
+        fetch = Mock(return_value=[])
+        cache = LookupCache(ttl=60, negative_ttl=0, max_size=100)
+
+        # test
+        cache.lookup('k', fetch)
+        cache.lookup('k', fetch)
+
+        # validation
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_lookup_unexpected_error_not_cached(self):
+        fetch = Mock(side_effect=[ValueError(), 'a'])
+        cache = LookupCache(ttl=60, negative_ttl=10, max_size=100)
+
+        # test
+        self.assertRaises(ValueError, cache.lookup, 'k', fetch, missing=(DoesNotExist,))
+        value = cache.lookup('k', fetch, missing=(DoesNotExist,))
+
+        # validation
+        self.assertEqual(value, 'a')
+
+    def test_lookup_disabled(self):
+        fetch = Mock(return_value='a')
+        cache = LookupCache(ttl=0, negative_ttl=10, max_size=100)
+
+        # test
+        cache.lookup('k', fetch)
+        cache.lookup('k', fetch)
+
+        # validation
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_add_max_size(self):
+        cache = LookupCache(ttl=60, negative_ttl=10, max_size=2)
+
+        # test
+        cache.lookup('a', Mock(return_value=1))
+        cache.lookup('b', Mock(return_value=2))
+        cache.lookup('a', Mock(return_value=1))
+        cache.lookup('c', Mock(return_value=3))
+
+        # validation
+        self.assertTrue('a' in cache)
+        self.assertFalse('b' in cache)
+        self.assertTrue('c' in cache)
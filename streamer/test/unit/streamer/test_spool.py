@@ -0,0 +1,237 @@
+import os
+import shutil
+
+from tempfile import mkdtemp
+from threading import Thread
+from unittest import TestCase
+
+from mock import Mock, call, patch
+
+from pulp.streamer.spool import Spool, SpoolRegistry, SpoolWriter
+
+
+class TestSpool(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_init(self):
+        spool = Spool(self.tmp_dir)
+        self.assertTrue(os.path.exists(spool.path))
+        self.assertEqual(os.path.dirname(spool.path), self.tmp_dir)
+        self.assertEqual(spool.headers, None)
+        self.assertEqual(spool.size, 0)
+        self.assertFalse(spool.finished)
+        self.assertEqual(spool.users, 1)
+
+    def test_write_and_read(self):
+        spool = Spool(self.tmp_dir)
+        spool.set_headers({'A': 1})
+        spool.write('abc')
+        spool.write('def')
+        spool.finish(True)
+        self.assertEqual(spool.wait_for_headers(), {'A': 1})
+        self.assertEqual(''.join(spool.read()), 'abcdef')
+        self.assertEqual(spool.size, 6)
+        self.assertTrue(spool.succeeded)
+
+    def test_read_tails(self):
+        spool = Spool(self.tmp_dir)
+        spool.write('abc')
+        chunks = []
+
+        def follow():
+            for data in spool.read():
+                chunks.append(data)
+
+        thread = Thread(target=follow)
+        thread.start()
+        spool.write('def')
+        spool.finish(True)
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(''.join(chunks), 'abcdef')
+
+    def test_read_chunked(self):
+        spool = Spool(self.tmp_dir)
+        spool.CHUNK_SIZE = 2
+        spool.write('abcde')
+        spool.finish(True)
+        self.assertEqual(list(spool.read()), ['ab', 'cd', 'e'])
+
+    def test_wait_for_headers_finished(self):
+        spool = Spool(self.tmp_dir)
+        spool.finish(False)
+        self.assertEqual(spool.wait_for_headers(), None)
+        self.assertFalse(spool.succeeded)
+
+    def test_finish_once(self):
+        spool = Spool(self.tmp_dir)
+        spool.finish(True)
+        spool.finish(False)
+        self.assertTrue(spool.succeeded)
+
+    def test_close(self):
+        spool = Spool(self.tmp_dir)
+        spool.close()
+        self.assertFalse(os.path.exists(spool.path))
+        self.assertTrue(spool.finished)
+        spool.close()
+
+
+class TestSpoolWriter(TestCase):
+
+    def test_write(self):
+        spool = Mock()
+        responder = Mock()
+        writer = SpoolWriter(spool, responder)
+        writer.write('abc')
+        spool.write.assert_called_once_with('abc')
+        responder.write.assert_called_once_with('abc')
+
+    def test_close(self):
+        responder = Mock()
+        writer = SpoolWriter(Mock(), responder)
+        writer.close()
+        responder.close.assert_called_once_with()
+
+
+class TestSpoolRegistry(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_join(self):
+        registry = SpoolRegistry(self.tmp_dir)
+        spool, leader = registry.join('/a')
+        self.assertTrue(leader)
+        self.assertTrue('/a' in registry)
+        followed, leader = registry.join('/a')
+        self.assertFalse(leader)
+        self.assertTrue(followed is spool)
+        self.assertEqual(spool.users, 2)
+        other, leader = registry.join('/b')
+        self.assertTrue(leader)
+        self.assertFalse(other is spool)
+
+    def test_leave(self):
+        registry = SpoolRegistry(self.tmp_dir)
+        spool, _ = registry.join('/a')
+        registry.join('/a')
+        spool.finish(True)
+
+        # leader leaves
+        registry.leave('/a', spool)
+        self.assertFalse('/a' in registry)
+        self.assertTrue(os.path.exists(spool.path))
+
+        # follower leaves
+        registry.leave('/a', spool)
+        self.assertFalse(os.path.exists(spool.path))
+
+    def test_leave_not_finished(self):
+        registry = SpoolRegistry(self.tmp_dir)
+        spool, _ = registry.join('/a')
+        registry.join('/a')
+        registry.leave('/a', spool)
+        self.assertTrue('/a' in registry)
+
+    def test_join_after_finished(self):
+        registry = SpoolRegistry(self.tmp_dir)
+        spool, _ = registry.join('/a')
+        spool.finish(True)
+        registry.leave('/a', spool)
+        spool_b, leader = registry.join('/a')
+        self.assertTrue(leader)
+        self.assertFalse(spool_b is spool)
+        self.assertEqual(os.listdir(self.tmp_dir), [os.path.basename(spool_b.path)])
+
+    def test_coalesced(self):
+        registry = SpoolRegistry(self.tmp_dir)
+        responder = Mock()
+        spool, _ = registry.join('/a')
+        followed, _ = registry.join('/a')
+        writer = SpoolWriter(spool, responder)
+        writer.write('abc')
+        spool.finish(True)
+        registry.leave('/a', spool)
+        self.assertEqual(''.join(followed.read()), 'abc')
+        registry.leave('/a', followed)
+        self.assertEqual(responder.write.call_args_list, [call('abc')])
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+
+    @patch('pulp.streamer.spool.time')
+    def test_retained(self, fake_time):
+        fake_time.return_value = 100.0
+        registry = SpoolRegistry(self.tmp_dir, retain_ttl=60, max_retained=10)
+        spool, _ = registry.join('/a')
+        SpoolWriter(spool, Mock()).write('abc')
+        spool.finish(True)
+        registry.leave('/a', spool)
+
+        # served from the finished spool
+        self.assertTrue('/a' in registry)
+        fake_time.return_value = 159.0
+        followed, leader = registry.join('/a')
+        self.assertFalse(leader)
+        self.assertTrue(followed is spool)
+        self.assertEqual(''.join(followed.read()), 'abc')
+        registry.leave('/a', followed)
+        self.assertTrue(os.path.exists(spool.path))
+
+        # expired
+        fake_time.return_value = 160.0
+        spool_b, leader = registry.join('/a')
+        self.assertTrue(leader)
+        self.assertFalse(spool_b is spool)
+        self.assertFalse(os.path.exists(spool.path))
+
+    @patch('pulp.streamer.spool.time')
+    def test_retained_expired_in_use(self, fake_time):
+        fake_time.return_value = 100.0
+        registry = SpoolRegistry(self.tmp_dir, retain_ttl=60, max_retained=10)
+        spool, _ = registry.join('/a')
+        spool.finish(True)
+        registry.leave('/a', spool)
+        registry.join('/a')
+
+        fake_time.return_value = 200.0
+        registry.join('/b')
+
+        # released by the registry but still followed
+        self.assertFalse('/a' in registry)
+        self.assertTrue(os.path.exists(spool.path))
+        registry.leave('/a', spool)
+        self.assertFalse(os.path.exists(spool.path))
+
+    def test_retained_max(self):
+        registry = SpoolRegistry(self.tmp_dir, retain_ttl=60, max_retained=2)
+        spools = []
+        for key in ('/a', '/b', '/c'):
+            spool, _ = registry.join(key)
+            spool.finish(True)
+            registry.leave(key, spool)
+            spools.append(spool)
+            if key == '/b':
+                # joining makes /a the most recently used
+                registry.leave('/a', registry.join('/a')[0])
+
+        self.assertTrue('/a' in registry)
+        self.assertFalse('/b' in registry)
+        self.assertTrue('/c' in registry)
+        self.assertFalse(os.path.exists(spools[1].path))
+
+    def test_failed_not_retained(self):
+        registry = SpoolRegistry(self.tmp_dir, retain_ttl=60, max_retained=10)
+        spool, _ = registry.join('/a')
+        spool.finish(False)
+        registry.leave('/a', spool)
+
+        self.assertFalse('/a' in registry)
+        self.assertEqual(os.listdir(self.tmp_dir), [])